@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     Tenant, AmazonAdsCredential, ReportType, AdsReport, 
-    DailyProductAdsData, SearchTermReportData, ReportSchedule
+    DailyProductAdsData, SearchTermReportData, ReportSchedule,
+    ReportCompletionSample, PrunedAdsMonth
 )
 
 @admin.register(Tenant)
@@ -36,7 +37,7 @@ class AdsReportAdmin(admin.ModelAdmin):
     list_display = ('tenant', 'report_type', 'start_date', 'end_date', 'status', 'is_stored', 'rows_processed', 'created_at')
     search_fields = ('tenant__name', 'amazon_report_id')
     list_filter = ('status', 'is_stored', 'start_date', 'end_date')
-    readonly_fields = ('amazon_report_id', 'download_url', 'completed_at', 'created_at', 'updated_at')
+    readonly_fields = ('amazon_report_id', 'download_url', 'next_poll_at', 'poll_count', 'completed_at', 'created_at', 'updated_at')
     ordering = ('-created_at',)
     
     def get_queryset(self, request):
@@ -84,3 +85,23 @@ class ReportScheduleAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.select_related('tenant', 'report_type', 'created_by')
+
+@admin.register(ReportCompletionSample)
+class ReportCompletionSampleAdmin(admin.ModelAdmin):
+    list_display = ('report_type', 'region', 'span_days', 'duration_seconds', 'recorded_at')
+    list_filter = ('report_type', 'region', 'span_days')
+    readonly_fields = ('report', 'recorded_at')
+    ordering = ('-recorded_at',)
+    
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.select_related('report_type')
+
+@admin.register(PrunedAdsMonth)
+class PrunedAdsMonthAdmin(admin.ModelAdmin):
+    # Deleting an entry lets refreshes rebuild the month again (e.g. after restoring its rows)
+    list_display = ('tenant', 'dataset', 'month_start', 'pruned_at')
+    list_filter = ('dataset',)
+    search_fields = ('tenant__name',)
+    readonly_fields = ('pruned_at',)
+    ordering = ('tenant__name', 'dataset', 'month_start')
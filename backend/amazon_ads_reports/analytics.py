@@ -0,0 +1,446 @@
+"""
+Columnar analytics store for ingested ads data
+
+DailyProductAdsData and SearchTermReportData are mirrored into Parquet files
+partitioned by tenant and month (`<root>/<dataset>/tenant=<id>/month=YYYY-MM/`)
+and queried with an embedded, in-process DuckDB connection. Trend and group-by
+queries over months of history then scan a few compressed column chunks on
+local disk instead of the PostgreSQL heap, and don't compete with ingestion
+and API traffic on the primary database.
+
+Partitions are rebuilt from the database for the months a report touches right
+after it is stored, and written to a temporary file first and then renamed, so
+concurrent readers always see a complete month. Parquet files (rather than a
+single DuckDB database file) keep any number of web and cron processes able to
+read while one of them writes.
+"""
+import logging
+import os
+import shutil
+import uuid
+from datetime import date
+
+from django.conf import settings
+
+from .models import DailyProductAdsData, SearchTermReportData
+from .rollups import _iter_months, pruned_months
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+try:
+    import duckdb
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    DUCKDB_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_ROOT = getattr(settings, 'ADS_ANALYTICS_ROOT', os.path.join(settings.MEDIA_ROOT, 'analytics'))
+PARQUET_COMPRESSION = 'zstd'
+
+# Mirrored datasets: source model, text dimensions, summed metrics (integer
+# and decimal), the cost metric used to rank groups and derived ratios as
+# (numerator, denominator, scale)
+DATASETS = {
+    'product_ads': {
+        'model': DailyProductAdsData,
+        'dimensions': (
+            'campaign_id', 'campaign_name', 'ad_group_id', 'ad_group_name', 'portfolio_id',
+            'advertised_asin', 'advertised_sku', 'campaign_status',
+        ),
+        'int_metrics': (
+            'impressions', 'clicks', 'purchases_1d', 'purchases_7d', 'purchases_14d', 'purchases_30d',
+            'units_sold_clicks_30d',
+        ),
+        'decimal_metrics': ('spend', 'sales_1d', 'sales_7d', 'sales_14d', 'sales_30d'),
+        'cost_metric': 'spend',
+        'ratios': {
+            'ctr': ('clicks', 'impressions', 100),
+            'cpc': ('spend', 'clicks', 1),
+            'acos_7d': ('spend', 'sales_7d', 100),
+            'roas_7d': ('sales_7d', 'spend', 1),
+        },
+    },
+    'search_terms': {
+        'model': SearchTermReportData,
+        'dimensions': (
+            'campaign_id', 'campaign_name', 'ad_group_id', 'ad_group_name', 'keyword_text',
+            'match_type', 'query',
+        ),
+        'int_metrics': ('impressions', 'clicks', 'conversions'),
+        'decimal_metrics': ('cost', 'sales_7d', 'sales_14d', 'sales_30d'),
+        'cost_metric': 'cost',
+        'ratios': {
+            'ctr': ('clicks', 'impressions', 100),
+            'cpc': ('cost', 'clicks', 1),
+            'conversion_rate': ('conversions', 'clicks', 100),
+            'acos_7d': ('cost', 'sales_7d', 100),
+        },
+    },
+}
+
+# Which datasets are fed by which report type
+REPORT_TYPE_DATASETS = {
+    'daily-product-ads': ('product_ads',),
+    'search-term': ('search_terms',),
+}
+
+INTERVALS = ('day', 'week', 'month')
+
+
+class AnalyticsQueryError(ValueError):
+    """Raised for analytics queries naming unknown datasets, dimensions or metrics"""
+
+
+def _metrics(spec):
+    return spec['int_metrics'] + spec['decimal_metrics']
+
+
+def _schema(spec):
+    return pa.schema(
+        [('date', pa.date32())] +
+        [(name, pa.string()) for name in spec['dimensions']] +
+        [(name, pa.int64()) for name in spec['int_metrics']] +
+        [(name, pa.float64()) for name in spec['decimal_metrics']]
+    )
+
+
+class AdsAnalyticsStore:
+    """Maintains and queries the Parquet mirror of the ads data tables"""
+
+    @classmethod
+    def _spec(cls, dataset):
+        if dataset not in DATASETS:
+            raise AnalyticsQueryError(f"Unknown dataset '{dataset}'")
+        return DATASETS[dataset]
+
+    @classmethod
+    def _tenant_dir(cls, dataset, tenant_id):
+        # Both values become path components, so only known datasets and real UUIDs
+        cls._spec(dataset)
+        try:
+            tenant_id = uuid.UUID(str(tenant_id))
+        except ValueError:
+            raise AnalyticsQueryError(f"Invalid tenant ID '{tenant_id}'")
+        return os.path.join(ANALYTICS_ROOT, dataset, f'tenant={tenant_id}')
+
+    @classmethod
+    def _partition_dir(cls, dataset, tenant_id, month_start):
+        return os.path.join(cls._tenant_dir(dataset, tenant_id), f'month={month_start:%Y-%m}')
+
+    @classmethod
+    def _partition_file(cls, dataset, tenant_id, month_start):
+        return os.path.join(cls._partition_dir(dataset, tenant_id, month_start), 'data.parquet')
+
+    @classmethod
+    def refresh_for_report(cls, report):
+        """
+        Rewrite the partitions affected by an ingested report
+
+        Args:
+            report: AdsReport instance whose rows have just been stored
+
+        Returns:
+            Number of rows written
+        """
+        count = 0
+        for dataset in REPORT_TYPE_DATASETS.get(report.report_type.slug, ()):
+            count += cls.refresh_range(dataset, report.tenant_id, report.start_date, report.end_date)
+        return count
+
+    @classmethod
+    def refresh_range(cls, dataset, tenant_id, start_date, end_date):
+        """
+        Rewrite every monthly partition touching a date range from the database
+
+        Partitions of months pruned by retention are kept as they are: they
+        hold the only complete copy of those months.
+
+        Args:
+            dataset: Key from DATASETS
+            tenant_id: Tenant primary key
+            start_date: First day of the range (datetime.date)
+            end_date: Last day of the range (datetime.date)
+
+        Returns:
+            Number of rows written
+        """
+        if not PARQUET_AVAILABLE:
+            logger.warning("pyarrow is not installed, skipping ads analytics refresh")
+            return 0
+
+        pruned = pruned_months(dataset, tenant_id, start_date, end_date)
+        count = 0
+        for month_start, month_end in _iter_months(start_date, end_date):
+            if month_start in pruned:
+                logger.info(f"Skipping {dataset} analytics partition of pruned month {month_start:%Y-%m} for tenant {tenant_id}")
+                continue
+            count += cls._write_month(dataset, tenant_id, month_start, month_end)
+        return count
+
+    @classmethod
+    def _write_month(cls, dataset, tenant_id, month_start, month_end):
+        spec = cls._spec(dataset)
+        schema = _schema(spec)
+        decimal_metrics = spec['decimal_metrics']
+        fields = schema.names
+
+        columns = {name: [] for name in fields}
+        queryset = spec['model'].objects.filter(
+            tenant_id=tenant_id,
+            date__range=[month_start, month_end]
+        ).order_by('date').values_list(*fields)
+        for row in queryset.iterator(chunk_size=5000):
+            for name, value in zip(fields, row):
+                if name in decimal_metrics and value is not None:
+                    value = float(value)
+                columns[name].append(value)
+
+        path = cls._partition_file(dataset, tenant_id, month_start)
+        rows = len(columns['date'])
+        if not rows:
+            # No rows left for the month (e.g. its reports were deleted); drop the partition
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+            return 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary name first so readers never see a partial file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+        pq.write_table(pa.Table.from_pydict(columns, schema=schema), tmp_path, compression=PARQUET_COMPRESSION)
+        os.replace(tmp_path, path)
+        logger.info(f"Wrote {dataset} analytics partition for tenant {tenant_id} {month_start:%Y-%m}: {rows} rows")
+        return rows
+
+    @classmethod
+    def rebuild_tenant(cls, tenant_id, datasets=None):
+        """
+        Rebuild all partitions for a tenant from the database (backfill / repair)
+
+        Partitions of months pruned from the database by retention are kept:
+        the store is now their only queryable copy.
+
+        Args:
+            tenant_id: Tenant primary key
+            datasets: Optional iterable of dataset keys, defaults to all
+
+        Returns:
+            Dict of dataset key to number of rows written
+        """
+        results = {}
+        for dataset in datasets or DATASETS.keys():
+            model = cls._spec(dataset)['model']
+            dates = model.objects.filter(tenant_id=tenant_id).order_by('date').values_list('date', flat=True)
+            first = dates.first()
+            results[dataset] = 0
+            if not first:
+                continue
+
+            last = dates.last()
+            kept = {f'month={month_start:%Y-%m}' for month_start in pruned_months(dataset, tenant_id, first, last)}
+            tenant_dir = cls._tenant_dir(dataset, tenant_id)
+            if os.path.isdir(tenant_dir):
+                for name in os.listdir(tenant_dir):
+                    if name.startswith('month=') and name[len('month='):] >= f'{first:%Y-%m}' and name not in kept:
+                        shutil.rmtree(os.path.join(tenant_dir, name), ignore_errors=True)
+            results[dataset] = cls.refresh_range(dataset, tenant_id, first, last)
+        return results
+
+    @classmethod
+    def _files(cls, dataset, tenant_id, start_date, end_date):
+        """Existing partition files for the months of a range (partition pruning happens here)"""
+        return [
+            path for path in (
+                cls._partition_file(dataset, tenant_id, month_start)
+                for month_start, _ in _iter_months(start_date, end_date)
+            )
+            if os.path.exists(path)
+        ]
+
+    @classmethod
+    def _validate(cls, spec, names, allowed, kind):
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise AnalyticsQueryError(f"Unknown {kind}: {', '.join(unknown)}")
+
+    @classmethod
+    def _output_metrics(cls, spec, metrics):
+        """Validate requested metrics/ratios, defaulting to all of them"""
+        available = _metrics(spec) + tuple(spec['ratios'].keys())
+        metrics = list(metrics or available)
+        cls._validate(spec, metrics, available, 'metrics')
+        return metrics
+
+    @classmethod
+    def _metric_expression(cls, spec, name):
+        """SQL over the summed columns for a metric or derived ratio"""
+        if name in spec['ratios']:
+            numerator, denominator, scale = spec['ratios'][name]
+            return f'COALESCE("{numerator}" * {float(scale)} / NULLIF("{denominator}", 0), 0)'
+        return f'"{name}"'
+
+    @classmethod
+    def _where(cls, spec, start_date, end_date, filters):
+        clauses = ['"date" BETWEEN ? AND ?']
+        params = [start_date, end_date]
+        for dimension, value in (filters or {}).items():
+            cls._validate(spec, [dimension], spec['dimensions'], 'filter dimensions')
+            clauses.append(f'"{dimension}" = ?')
+            params.append(value)
+        return ' AND '.join(clauses), params
+
+    @classmethod
+    def _execute(cls, files, sql, params):
+        if not DUCKDB_AVAILABLE:
+            raise RuntimeError("duckdb is not installed, ads analytics queries are unavailable")
+        if not files:
+            return []
+        source = 'read_parquet([{}])'.format(', '.join("'{}'".format(path.replace("'", "''")) for path in files))
+        connection = duckdb.connect()
+        try:
+            cursor = connection.execute(sql.replace('{source}', source), params)
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+        finally:
+            connection.close()
+
+    @classmethod
+    def timeseries(cls, dataset, tenant_id, start_date, end_date, interval='day', metrics=None,
+                   group_by=None, filters=None, top=None):
+        """
+        Metrics per day/week/month, optionally split by one dimension, with change versus the previous period
+
+        Args:
+            dataset: Key from DATASETS
+            tenant_id: Tenant primary key
+            start_date: Range start (datetime.date)
+            end_date: Range end (datetime.date)
+            interval: 'day', 'week' or 'month'
+            metrics: Metrics and ratios to return, defaults to all
+            group_by: Optional dimension to split the series by (e.g. advertised_asin)
+            filters: Optional dict of dimension to exact value
+            top: With group_by, only return the groups with the highest cost over the range
+
+        Returns:
+            List of dicts with period, group_value (with group_by), each metric and `<metric>_change_pct`
+        """
+        spec = cls._spec(dataset)
+        if interval not in INTERVALS:
+            raise AnalyticsQueryError(f"Unknown interval '{interval}'")
+        if group_by:
+            cls._validate(spec, [group_by], spec['dimensions'], 'dimensions')
+        metrics = cls._output_metrics(spec, metrics)
+
+        where, params = cls._where(spec, start_date, end_date, filters)
+        if group_by and top:
+            # Restrict to the biggest groups before bucketing
+            where = (
+                f'{where} AND "{group_by}" IN (SELECT "{group_by}" FROM {{source}} WHERE {where}'
+                f' GROUP BY "{group_by}" ORDER BY SUM("{spec["cost_metric"]}") DESC LIMIT ?)'
+            )
+            params = params + params + [int(top)]
+
+        group_select = f'"{group_by}" AS group_value, ' if group_by else ''
+        group_column = 'group_value, ' if group_by else ''
+        sums = ', '.join(f'SUM("{name}") AS "{name}"' for name in _metrics(spec))
+        outputs = ', '.join(f'{cls._metric_expression(spec, name)} AS "{name}"' for name in metrics)
+        changes = ', '.join(
+            f'("{name}" - LAG("{name}") OVER w) * 100.0 / NULLIF(LAG("{name}") OVER w, 0) AS "{name}_change_pct"'
+            for name in metrics
+        )
+
+        sql = f"""
+            WITH buckets AS (
+                SELECT CAST(date_trunc('{interval}', "date") AS DATE) AS period, {group_select}{sums}
+                FROM {{source}}
+                WHERE {where}
+                GROUP BY ALL
+            ), series AS (
+                SELECT period, {group_column}{outputs}
+                FROM buckets
+            )
+            SELECT *, {changes}
+            FROM series
+            WINDOW w AS ({'PARTITION BY group_value ' if group_by else ''}ORDER BY period)
+            ORDER BY {group_column}period
+        """
+        return cls._execute(cls._files(dataset, tenant_id, start_date, end_date), sql, params)
+
+    @classmethod
+    def breakdown(cls, dataset, tenant_id, start_date, end_date, dimensions, metrics=None,
+                  order_by=None, filters=None, limit=100):
+        """
+        Metrics summed over a date range and grouped by dimensions
+
+        Args:
+            dataset: Key from DATASETS
+            tenant_id: Tenant primary key
+            start_date: Range start (datetime.date)
+            end_date: Range end (datetime.date)
+            dimensions: Dimensions to group by
+            metrics: Metrics and ratios to return, defaults to all
+            order_by: Metric or ratio to sort by, prefix with '-' for descending (default: cost descending)
+            filters: Optional dict of dimension to exact value
+            limit: Maximum number of rows
+
+        Returns:
+            List of dicts with the dimensions and each metric
+        """
+        spec = cls._spec(dataset)
+        dimensions = list(dimensions or [])
+        if not dimensions:
+            raise AnalyticsQueryError("At least one dimension is required")
+        cls._validate(spec, dimensions, spec['dimensions'], 'dimensions')
+        metrics = cls._output_metrics(spec, metrics)
+
+        order_by = order_by or f"-{spec['cost_metric']}"
+        order_name = order_by.lstrip('-')
+        cls._validate(spec, [order_name], _metrics(spec) + tuple(spec['ratios'].keys()), 'metrics')
+
+        where, params = cls._where(spec, start_date, end_date, filters)
+        dimension_list = ', '.join(f'"{name}"' for name in dimensions)
+        sums = ', '.join(f'SUM("{name}") AS "{name}"' for name in _metrics(spec))
+        outputs = ', '.join(f'{cls._metric_expression(spec, name)} AS "{name}"' for name in metrics)
+
+        sql = f"""
+            WITH grouped AS (
+                SELECT {dimension_list}, {sums}
+                FROM {{source}}
+                WHERE {where}
+                GROUP BY {dimension_list}
+            )
+            SELECT {dimension_list}, {outputs}
+            FROM grouped
+            ORDER BY {cls._metric_expression(spec, order_name)} {'DESC' if order_by.startswith('-') else 'ASC'}
+            LIMIT ?
+        """
+        return cls._execute(cls._files(dataset, tenant_id, start_date, end_date), sql, params + [int(limit)])
+
+    @classmethod
+    def coverage(cls, dataset, tenant_id):
+        """
+        List the months mirrored for a tenant
+
+        Returns:
+            List of dicts with month, rows and file size
+        """
+        tenant_dir = cls._tenant_dir(dataset, tenant_id)
+        if not os.path.isdir(tenant_dir):
+            return []
+
+        months = []
+        for name in sorted(os.listdir(tenant_dir)):
+            path = os.path.join(tenant_dir, name, 'data.parquet')
+            if not name.startswith('month=') or not os.path.exists(path):
+                continue
+            year, month = name[len('month='):].split('-')
+            months.append({
+                'month': date(int(year), int(month), 1),
+                'rows': pq.ParquetFile(path).metadata.num_rows if PARQUET_AVAILABLE else None,
+                'size': os.path.getsize(path),
+            })
+        return months
@@ -0,0 +1,365 @@
+"""
+Raw report archive
+
+The decompressed payload of every downloaded report is written once to file
+storage (Azure Blob Storage or local disk, via core.file_service) and linked to
+its AdsReport. Diagnostics and reprocessing read the archive instead of
+downloading the report from Amazon again, which also keeps working after the
+pre-signed download URL has expired.
+
+Record-shaped payloads are stored as Parquet so readers can project columns and
+sample rows without loading the whole report. Anything Parquet cannot represent
+(or when pyarrow is not installed) is stored as gzipped JSON. Downloaded
+documents are archived straight from disk (archive_file), a batch of records at
+a time.
+"""
+import gzip
+import json
+import logging
+import os
+import shutil
+from io import BytesIO
+
+import pandas as pd
+from django.utils import timezone
+
+from core import downloads, file_service
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PREFIX = 'ads_reports'
+PARQUET_COMPRESSION = 'zstd'
+BATCH_ROWS = 10000  # Records decoded per Parquet row group when archiving from disk
+
+# Wrapper keys Amazon has used around the record list, checked in this order
+# (mirrors the unwrapping done by the report processors)
+WRAPPER_KEYS = ('result', 'data', 'reports', 'rows')
+
+
+def extract_records(report_data):
+    """
+    Unwrap a decoded report payload to its list of records
+
+    Args:
+        report_data: Decoded JSON payload
+
+    Returns:
+        List of records, or None if the payload is not record-shaped
+    """
+    for key in WRAPPER_KEYS:
+        if isinstance(report_data, dict) and isinstance(report_data.get(key), (list, dict)):
+            report_data = report_data[key]
+    if isinstance(report_data, dict) and isinstance(report_data.get('response'), dict):
+        report_data = report_data['response'].get('data')
+
+    if isinstance(report_data, list) and all(isinstance(item, dict) for item in report_data):
+        return report_data
+    return None
+
+
+def is_wrapped_payload(value):
+    """True for an object wrapping the report rows (see WRAPPER_KEYS) rather than a row"""
+    return isinstance(value, dict) and any(
+        isinstance(value.get(key), (list, dict)) for key in WRAPPER_KEYS + ('response',)
+    )
+
+
+def _records_from_frame(df):
+    """Convert a DataFrame to JSON-safe records, with missing values as None"""
+    return df.astype(object).where(df.notna(), None).to_dict(orient='records')
+
+
+class ReportArchiveService:
+    """Writes and reads archived raw report payloads"""
+
+    @classmethod
+    def _archive_name(cls, report, extension):
+        return f"{ARCHIVE_PREFIX}/{report.tenant_id}/{report.id}.{extension}"
+
+    @classmethod
+    def archive_report(cls, report, report_data):
+        """
+        Archive a decoded report payload and link it to the report
+
+        Args:
+            report: AdsReport instance
+            report_data: Decoded JSON payload as downloaded from Amazon
+
+        Returns:
+            True if the payload was archived, False otherwise
+        """
+        records = extract_records(report_data)
+        content = None
+        archive_format = 'json.gz'
+
+        if records is not None and PARQUET_AVAILABLE:
+            try:
+                buffer = BytesIO()
+                pq.write_table(pa.Table.from_pylist(records), buffer, compression=PARQUET_COMPRESSION)
+                content = buffer.getvalue()
+                archive_format = 'parquet'
+            except (pa.ArrowException, TypeError, ValueError) as e:
+                # Mixed-type columns and similar; keep the exact JSON instead
+                logger.warning(f"Report {report.id} cannot be stored as Parquet, archiving as JSON: {str(e)}")
+
+        if content is None:
+            payload = records if records is not None else report_data
+            content = gzip.compress(json.dumps(payload).encode('utf-8'))
+
+        try:
+            stored = file_service.save_archive_file(content, cls._archive_name(report, archive_format))
+        except Exception as e:
+            logger.error(f"Error archiving report {report.id}: {str(e)}")
+            return False
+
+        cls._link(report, stored, archive_format, len(records) if records is not None else None)
+        return True
+
+    @classmethod
+    def archive_file(cls, report, path):
+        """
+        Archive a downloaded report document and link it to the report, without loading it into memory
+
+        Record-shaped documents are converted to Parquet in two streaming passes:
+        the first settles the column types over all records (a column that is
+        empty early on or mixes ints and floats still gets one type), the second
+        writes row groups. Anything else is stored as gzipped JSON.
+
+        Args:
+            report: AdsReport instance
+            path: Downloaded document (plain, GZIP or ZIP compressed JSON)
+
+        Returns:
+            True if the document was archived, False otherwise
+        """
+        out_path = f"{path}.archive"
+        try:
+            rows = None
+            if PARQUET_AVAILABLE:
+                try:
+                    rows = cls._write_parquet(path, out_path)
+                except (pa.ArrowException, TypeError, ValueError) as e:
+                    logger.warning(f"Report {report.id} cannot be stored as Parquet, archiving as JSON: {str(e)}")
+            archive_format = 'parquet' if rows is not None else 'json.gz'
+            if rows is None:
+                with downloads.open_decompressed(path) as source, gzip.open(out_path, 'wb') as target:
+                    shutil.copyfileobj(source, target, downloads.CHUNK_SIZE)
+            stored = file_service.save_archive_path(out_path, cls._archive_name(report, archive_format))
+        except Exception as e:
+            logger.error(f"Error archiving report {report.id}: {str(e)}")
+            return False
+        finally:
+            if os.path.exists(out_path):
+                os.remove(out_path)
+
+        cls._link(report, stored, archive_format, rows)
+        return True
+
+    @classmethod
+    def _write_parquet(cls, path, out_path):
+        """
+        Write the records of a downloaded document to a Parquet file
+
+        Returns:
+            Number of rows written, None if the document is not a non-empty list of records
+        """
+        schema = None
+        with downloads.open_decompressed(path) as f:
+            for batch in downloads.iter_json_batches(f, BATCH_ROWS):
+                if not all(isinstance(item, dict) and not is_wrapped_payload(item) for item in batch):
+                    return None
+                # Inferred over every record of the batch, not just the first
+                batch_schema = pa.schema(pa.array(batch).type)
+                schema = batch_schema if schema is None else pa.unify_schemas(
+                    [schema, batch_schema], promote_options='permissive'
+                )
+        if schema is None:
+            return None
+
+        rows = 0
+        row_type = pa.struct(schema)
+        with downloads.open_decompressed(path) as f, \
+                pq.ParquetWriter(out_path, schema, compression=PARQUET_COMPRESSION) as writer:
+            for batch in downloads.iter_json_batches(f, BATCH_ROWS):
+                writer.write_batch(pa.RecordBatch.from_struct_array(pa.array(batch, type=row_type)))
+                rows += len(batch)
+        return rows
+
+    @classmethod
+    def _link(cls, report, stored, archive_format, rows):
+        """Record a stored archive on its report"""
+        report.archive_name = stored['name']
+        report.archive_storage = stored['storage']
+        report.archive_format = archive_format
+        report.archive_rows = rows
+        report.archive_size = stored['size']
+        report.archived_at = timezone.now()
+        report.save(update_fields=[
+            'archive_name', 'archive_storage', 'archive_format', 'archive_rows',
+            'archive_size', 'archived_at', 'updated_at'
+        ])
+        logger.info(f"Archived report {report.id} as {archive_format}: {report.archive_rows} rows, {stored['size']} bytes")
+
+    @classmethod
+    def _read(cls, report):
+        if not report.is_archived:
+            return None
+        if report.archive_format == 'parquet' and not PARQUET_AVAILABLE:
+            logger.error(f"Report {report.id} is archived as Parquet but pyarrow is not installed")
+            return None
+        return file_service.read_archive_file(report.archive_name, report.archive_storage)
+
+    @classmethod
+    def _open(cls, report):
+        """Read an archive once: a ParquetFile for Parquet, the decoded payload for JSON"""
+        content = cls._read(report)
+        if content is None:
+            return None
+        if report.archive_format == 'parquet':
+            return pq.ParquetFile(BytesIO(content))
+        return json.loads(gzip.decompress(content).decode('utf-8'))
+
+    @classmethod
+    def load_payload(cls, report):
+        """
+        Load the archived payload for reprocessing
+
+        Args:
+            report: AdsReport instance
+
+        Returns:
+            List of records (or the original object for non-record payloads), None if unavailable
+        """
+        opened = cls._open(report)
+        if opened is not None and report.archive_format == 'parquet':
+            return _records_from_frame(opened.read().to_pandas())
+        return opened
+
+    @classmethod
+    def load_frame(cls, report, columns=None, limit=None, sample=None):
+        """
+        Load archived records as a DataFrame
+
+        Args:
+            report: AdsReport instance
+            columns: Optional list of columns to read; unknown names are ignored
+            limit: Optional number of leading rows to read
+            sample: Optional number of rows to draw at random (after projection)
+
+        Returns:
+            DataFrame, or None if the report has no readable record archive
+        """
+        opened = cls._open(report)
+        return None if opened is None else cls._frame(report, opened, columns, limit, sample)
+
+    @classmethod
+    def _frame(cls, report, opened, columns, limit, sample):
+        """load_frame on an already opened archive"""
+        if report.archive_format == 'parquet':
+            parquet_file = opened
+            if columns:
+                columns = [c for c in columns if c in parquet_file.schema_arrow.names]
+            if limit and not sample:
+                # Only decode as many row groups as the first batch needs
+                batch = next(parquet_file.iter_batches(batch_size=limit, columns=columns), None)
+                df = batch.to_pandas() if batch is not None else pd.DataFrame(columns=columns or [])
+            else:
+                df = parquet_file.read(columns=columns).to_pandas()
+        else:
+            records = extract_records(opened)
+            if records is None:
+                return None
+            df = pd.DataFrame(records)
+            if columns:
+                df = df[[c for c in columns if c in df.columns]]
+
+        if sample:
+            df = df.sample(n=min(sample, len(df)), random_state=0) if len(df) else df
+        elif limit:
+            df = df.head(limit)
+        return df
+
+    @classmethod
+    def load_records(cls, report, columns=None, limit=None, sample=None):
+        """Same as load_frame but returns JSON-safe records"""
+        df = cls.load_frame(report, columns=columns, limit=limit, sample=sample)
+        return None if df is None else _records_from_frame(df)
+
+    @classmethod
+    def describe(cls, report):
+        """
+        Summarize an archive without materializing its rows where possible
+
+        Args:
+            report: AdsReport instance
+
+        Returns:
+            Dict with format, size, row count and columns, None if not archived
+        """
+        if not report.is_archived:
+            return None
+        return cls._summary(report, cls._open(report))
+
+    @classmethod
+    def inspect(cls, report, columns=None, limit=None, sample=None):
+        """
+        Summarize an archive and read a sample of its rows from a single download
+
+        Args:
+            report: AdsReport instance
+            columns, limit, sample: Row selection, as for load_frame
+
+        Returns:
+            Tuple of (describe() summary, sample records or the original object
+            for non-record payloads); (None, None) if not archived
+        """
+        if not report.is_archived:
+            return None, None
+
+        opened = cls._open(report)
+        info = cls._summary(report, opened)
+        if opened is None:
+            return info, None
+        if report.archive_format != 'parquet' and extract_records(opened) is None:
+            return info, opened
+        return info, _records_from_frame(cls._frame(report, opened, columns, limit, sample))
+
+    @classmethod
+    def _summary(cls, report, opened):
+        """describe() on an already opened archive (None if the file could not be read)"""
+        info = {
+            'format': report.archive_format,
+            'storage': report.archive_storage,
+            'size': report.archive_size,
+            'rows': report.archive_rows,
+            'archived_at': report.archived_at,
+            'columns': None,
+        }
+
+        if opened is None:
+            info['error'] = 'Archive file is missing'
+            return info
+
+        if report.archive_format == 'parquet':
+            # Row count and schema come from the footer alone
+            metadata = opened.metadata
+            info['rows'] = metadata.num_rows
+            info['columns'] = [
+                {'name': field.name, 'type': str(field.type)}
+                for field in metadata.schema.to_arrow_schema()
+            ]
+        else:
+            payload = opened
+            records = extract_records(payload)
+            if records:
+                info['columns'] = [{'name': key, 'type': None} for key in records[0].keys()]
+            elif isinstance(payload, dict):
+                info['keys'] = list(payload.keys())
+        return info
@@ -0,0 +1,122 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+import logging
+import time
+
+from amazon_ads_reports.models import Tenant, SearchTermReportData
+from amazon_ads_reports.rollups import AdsRollupService, _month_start, _month_end
+from amazon_ads_reports.analytics import AdsAnalyticsStore
+
+logger = logging.getLogger(__name__)
+
+KEY_FIELDS = ('date', 'campaign_id', 'ad_group_id', 'keyword_text', 'match_type', 'query', 'keyword_id')
+
+class Command(BaseCommand):
+    help = 'Key search term rows ingested before the natural key existed and delete their duplicates (run once after upgrading)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', help='Only deduplicate this tenant ID')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows keyed per transaction')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        self.stdout.write(self.style.SUCCESS(f'Started deduplicating search term data at {timezone.now()}'))
+
+        tenants = Tenant.objects.all()
+        if options.get('tenant'):
+            tenants = tenants.filter(id=options['tenant'])
+
+        total_keyed = 0
+        total_deleted = 0
+        try:
+            for tenant in tenants:
+                keyed, deleted, months = self._dedupe_tenant(tenant.id, options['batch_size'])
+                if not keyed and not deleted:
+                    continue
+                total_keyed += keyed
+                total_deleted += deleted
+
+                # Rollups and the analytics store were built from the duplicated rows
+                for month_start in sorted(months):
+                    month_end = _month_end(month_start)
+                    AdsRollupService.refresh_range('search_term', tenant.id, month_start, month_end)
+                    AdsAnalyticsStore.refresh_range('search_terms', tenant.id, month_start, month_end)
+                self.stdout.write(
+                    f'Tenant {tenant.name}: keyed {keyed} rows, deleted {deleted} duplicates '
+                    f'({len(months)} months refreshed)'
+                )
+
+            elapsed_time = time.time() - start_time
+            self.stdout.write(self.style.SUCCESS(
+                f'Keyed {total_keyed} rows and deleted {total_deleted} duplicates in {elapsed_time:.2f} seconds'
+            ))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error deduplicating search term data: {str(e)}'))
+            logger.exception("Error in dedupe_search_terms command")
+            raise
+
+    def _dedupe_tenant(self, tenant_id, batch_size):
+        """
+        Key a tenant's unkeyed rows batch by batch, deleting the older copy of rows whose key is taken
+
+        The unkeyed rows are walked once in primary key order (keyset pagination), so
+        no batch re-sorts the rows still left. The newest copy of a row is kept since
+        later reports carry settled attribution metrics.
+
+        Returns:
+            Tuple of (rows keyed, rows deleted, set of month starts with deleted rows)
+        """
+        unkeyed = SearchTermReportData.objects.filter(
+            tenant_id=tenant_id,
+            row_key__isnull=True
+        ).order_by('id')
+
+        keyed = 0
+        deleted = 0
+        months = set()
+        last_id = None
+        while True:
+            page = unkeyed if last_id is None else unkeyed.filter(id__gt=last_id)
+            batch = list(page.values('id', 'updated_at', *KEY_FIELDS)[:batch_size])
+            if not batch:
+                return keyed, deleted, months
+            last_id = batch[-1]['id']
+
+            keep = {}
+            duplicates = []
+            for row in batch:
+                row_key = SearchTermReportData.build_row_key(*(row[field] for field in KEY_FIELDS))
+                kept = keep.get(row_key)
+                if kept is not None and (kept['updated_at'], kept['id']) >= (row['updated_at'], row['id']):
+                    duplicates.append(row)
+                else:
+                    if kept is not None:
+                        duplicates.append(kept)
+                    keep[row_key] = row
+
+            # Keys already taken (keyed in an earlier batch or ingested since the upgrade)
+            taken = SearchTermReportData.objects.filter(
+                tenant_id=tenant_id,
+                row_key__in=list(keep)
+            ).values('id', 'updated_at', 'date', 'row_key')
+            for row in taken:
+                kept = keep[row['row_key']]
+                if (row['updated_at'], row['id']) >= (kept['updated_at'], kept['id']):
+                    duplicates.append(keep.pop(row['row_key']))
+                else:
+                    duplicates.append(row)
+
+            with transaction.atomic():
+                if duplicates:
+                    SearchTermReportData.objects.filter(id__in=[row['id'] for row in duplicates]).delete()
+                SearchTermReportData.objects.bulk_update(
+                    [SearchTermReportData(id=row['id'], row_key=row_key) for row_key, row in keep.items()],
+                    ['row_key'],
+                    batch_size=500
+                )
+
+            keyed += len(keep)
+            deleted += len(duplicates)
+            months.update(_month_start(row['date']) for row in duplicates)
+            logger.info(f"Tenant {tenant_id}: keyed {len(keep)} search term rows, deleted {len(duplicates)} duplicates")
@@ -0,0 +1,94 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+import logging
+import time
+
+from amazon_ads_reports.models import Tenant
+from amazon_ads_reports.analytics import DATASETS
+from amazon_ads_reports.retention import AdsRetentionService, RETENTION_MONTHS, DELETE_BATCH_SIZE, retention_cutoff
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Archive and delete ads report rows older than the retention window (run monthly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', help='Only prune this tenant ID')
+        parser.add_argument(
+            '--dataset',
+            action='append',
+            choices=list(DATASETS.keys()),
+            help='Dataset to prune (repeatable), defaults to all'
+        )
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=RETENTION_MONTHS,
+            help='Whole months kept before the current month (0 disables pruning)'
+        )
+        parser.add_argument('--no-archive', action='store_true', help='Delete expired months without archiving them first')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the months that would be pruned')
+        parser.add_argument('--batch-size', type=int, default=DELETE_BATCH_SIZE, help='Rows deleted per statement')
+        parser.add_argument('--vacuum', action='store_true', help='VACUUM ANALYZE pruned tables afterwards (PostgreSQL)')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        self.stdout.write(self.style.SUCCESS(f'Started pruning ads data at {timezone.now()}'))
+
+        cutoff = retention_cutoff(months=options['months'])
+        if not cutoff:
+            self.stdout.write(self.style.WARNING('Retention is disabled, nothing to prune'))
+            return
+
+        tenants = Tenant.objects.all()
+        if options.get('tenant'):
+            tenants = tenants.filter(id=options['tenant'])
+        datasets = options.get('dataset') or list(DATASETS.keys())
+
+        total_deleted = 0
+        failures = 0
+        pruned_datasets = set()
+        try:
+            for tenant in tenants:
+                for dataset in datasets:
+                    result = AdsRetentionService.prune(
+                        dataset,
+                        tenant.id,
+                        cutoff,
+                        archive=not options['no_archive'],
+                        dry_run=options['dry_run'],
+                        batch_size=options['batch_size']
+                    )
+                    if result['failed']:
+                        failures += len(result['failed'])
+                        self.stdout.write(self.style.ERROR(
+                            f"Tenant {tenant.name} {dataset}: could not archive {', '.join(result['failed'])}, rows kept"
+                        ))
+                    if not result['months']:
+                        continue
+
+                    months = ', '.join(result['months'])
+                    if options['dry_run']:
+                        self.stdout.write(f'Tenant {tenant.name} {dataset}: would prune {months}')
+                        continue
+                    total_deleted += result['rows_deleted']
+                    if result['rows_deleted']:
+                        pruned_datasets.add(dataset)
+                    self.stdout.write(
+                        f"Tenant {tenant.name} {dataset}: pruned {result['rows_deleted']} rows "
+                        f"({months}, {len(result['archives'])} archived)"
+                    )
+
+            if options['vacuum']:
+                for dataset in sorted(pruned_datasets):
+                    if AdsRetentionService.vacuum(dataset):
+                        self.stdout.write(f'Vacuumed {dataset}')
+
+            elapsed_time = time.time() - start_time
+            self.stdout.write(self.style.SUCCESS(
+                f'Pruned {total_deleted} rows older than {cutoff} in {elapsed_time:.2f} seconds ({failures} months not archived)'
+            ))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error pruning ads data: {str(e)}'))
+            logger.exception("Error in prune_ads_data command")
+            raise
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+import logging
+import time
+
+from amazon_ads_reports.models import Tenant
+from amazon_ads_reports.analytics import AdsAnalyticsStore, DATASETS
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Rebuild the local Parquet analytics store from the ads data tables (backfill or repair)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', help='Only rebuild the store for this tenant ID')
+        parser.add_argument(
+            '--dataset',
+            action='append',
+            choices=list(DATASETS.keys()),
+            help='Dataset to rebuild (repeatable), defaults to all'
+        )
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        self.stdout.write(self.style.SUCCESS(f'Started rebuilding ads analytics store at {timezone.now()}'))
+
+        tenants = Tenant.objects.all()
+        if options.get('tenant'):
+            tenants = tenants.filter(id=options['tenant'])
+
+        try:
+            for tenant in tenants:
+                results = AdsAnalyticsStore.rebuild_tenant(tenant.id, datasets=options.get('dataset'))
+                summary = ', '.join(f'{dataset}={count}' for dataset, count in results.items())
+                self.stdout.write(f'Tenant {tenant.name}: {summary}')
+
+            elapsed_time = time.time() - start_time
+            self.stdout.write(self.style.SUCCESS(
+                f'Successfully rebuilt analytics store in {elapsed_time:.2f} seconds'
+            ))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error rebuilding analytics store: {str(e)}'))
+            logger.exception("Error in rebuild_ads_analytics command")
+            raise
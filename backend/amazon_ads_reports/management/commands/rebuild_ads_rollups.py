@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+import logging
+import time
+
+from amazon_ads_reports.models import Tenant
+from amazon_ads_reports.rollups import AdsRollupService, ROLLUP_SPECS
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily/monthly ads rollup tables from raw report data (backfill or repair)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', help='Only rebuild rollups for this tenant ID')
+        parser.add_argument(
+            '--kind',
+            action='append',
+            choices=list(ROLLUP_SPECS.keys()),
+            help='Rollup to rebuild (repeatable), defaults to all'
+        )
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        self.stdout.write(self.style.SUCCESS(f'Started rebuilding ads rollups at {timezone.now()}'))
+
+        tenants = Tenant.objects.all()
+        if options.get('tenant'):
+            tenants = tenants.filter(id=options['tenant'])
+
+        try:
+            for tenant in tenants:
+                results = AdsRollupService.rebuild_tenant(tenant.id, kinds=options.get('kind'))
+                summary = ', '.join(f'{kind}={count}' for kind, count in results.items())
+                self.stdout.write(f'Tenant {tenant.name}: {summary}')
+
+            elapsed_time = time.time() - start_time
+            self.stdout.write(self.style.SUCCESS(
+                f'Successfully rebuilt rollups in {elapsed_time:.2f} seconds'
+            ))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error rebuilding rollups: {str(e)}'))
+            logger.exception("Error in rebuild_ads_rollups command")
+            raise
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+import logging
+import time
+
+from amazon_ads_reports.models import Tenant
+from amazon_ads_reports.optimisation import AdsOptimisationService
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Run the SP optimiser on ingested Amazon Ads data (for scheduled optimisation without bulk file uploads)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', help='Only optimise this tenant ID, defaults to all active tenants')
+        parser.add_argument('--days', type=int, default=30, help='Number of days up to yesterday to optimise over')
+        parser.add_argument('--target-acos', type=float, default=0.30, help='Target ACOS as a fraction')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        self.stdout.write(self.style.SUCCESS(f'Started ads optimisation at {timezone.now()}'))
+
+        end_date = timezone.now().date() - timedelta(days=1)
+        start_date = end_date - timedelta(days=options['days'] - 1)
+
+        tenants = Tenant.objects.filter(is_active=True)
+        if options.get('tenant'):
+            tenants = Tenant.objects.filter(id=options['tenant'])
+
+        failures = 0
+        for tenant in tenants:
+            try:
+                result = AdsOptimisationService.run_sp_optimisation(
+                    tenant, start_date, end_date, options['target_acos']
+                )
+                if result['success']:
+                    self.stdout.write(f"Tenant {tenant.name}: {result['file']['filename']} (file ID {result['file']['file_id']})")
+                else:
+                    self.stdout.write(self.style.WARNING(f"Tenant {tenant.name}: {result['message']}"))
+            except Exception as e:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'Tenant {tenant.name}: error running optimisation: {str(e)}'))
+                logger.exception(f"Error optimising tenant {tenant.id} in run_ads_optimisation command")
+
+        elapsed_time = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished ads optimisation for {start_date} to {end_date} in {elapsed_time:.2f} seconds ({failures} failures)'
+        ))
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_ads_reports', '0006_increase_download_url_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AsinPerformanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('DAY', 'Day'), ('MONTH', 'Month')], max_length=5)),
+                ('period_start', models.DateField(help_text='Day for daily rollups, first day of the month for monthly rollups')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('advertised_asin', models.CharField(max_length=50)),
+                ('advertised_sku', models.CharField(blank=True, max_length=255, null=True)),
+                ('impressions', models.BigIntegerField(default=0)),
+                ('clicks', models.BigIntegerField(default=0)),
+                ('spend', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('sales_1d', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('sales_7d', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('sales_30d', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('units_sold_clicks_30d', models.BigIntegerField(default=0)),
+                ('purchases_30d', models.BigIntegerField(default=0)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='asin_rollups', to='amazon_ads_reports.tenant')),
+            ],
+            options={
+                'verbose_name': 'ASIN Performance Rollup',
+                'verbose_name_plural': 'ASIN Performance Rollups',
+                'indexes': [models.Index(fields=['tenant', 'period', 'period_start'], name='amazon_ads__tenant__09bddd_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CampaignPerformanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('DAY', 'Day'), ('MONTH', 'Month')], max_length=5)),
+                ('period_start', models.DateField(help_text='Day for daily rollups, first day of the month for monthly rollups')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('campaign_id', models.CharField(max_length=255)),
+                ('campaign_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('impressions', models.BigIntegerField(default=0)),
+                ('clicks', models.BigIntegerField(default=0)),
+                ('spend', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('sales_1d', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('sales_7d', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('sales_30d', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('units_sold_clicks_30d', models.BigIntegerField(default=0)),
+                ('purchases_30d', models.BigIntegerField(default=0)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='campaign_rollups', to='amazon_ads_reports.tenant')),
+            ],
+            options={
+                'verbose_name': 'Campaign Performance Rollup',
+                'verbose_name_plural': 'Campaign Performance Rollups',
+                'indexes': [models.Index(fields=['tenant', 'period', 'period_start'], name='amazon_ads__tenant__f330f9_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchTermRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('DAY', 'Day'), ('MONTH', 'Month')], max_length=5)),
+                ('period_start', models.DateField(help_text='Day for daily rollups, first day of the month for monthly rollups')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('query', models.TextField(help_text='Customer search term')),
+                ('impressions', models.BigIntegerField(default=0)),
+                ('clicks', models.BigIntegerField(default=0)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('conversions', models.BigIntegerField(default=0)),
+                ('sales_7d', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('sales_14d', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('sales_30d', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_term_rollups', to='amazon_ads_reports.tenant')),
+            ],
+            options={
+                'verbose_name': 'Search Term Rollup',
+                'verbose_name_plural': 'Search Term Rollups',
+                'indexes': [models.Index(fields=['tenant', 'period', 'period_start'], name='amazon_ads__tenant__31acc8_idx')],
+            },
+        ),
+    ]
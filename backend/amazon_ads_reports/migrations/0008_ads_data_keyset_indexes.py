@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_ads_reports', '0007_ads_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyproductadsdata',
+            index=models.Index(fields=['tenant', 'date', 'id'], name='amazon_ads__tenant__e51f64_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchtermreportdata',
+            index=models.Index(fields=['tenant', 'clicks', 'id'], name='amazon_ads__tenant__1a2714_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# icontains / istartswith compile to UPPER("query"::text) LIKE UPPER(...) on
+# PostgreSQL, so the trigram index is built on the same expression for the
+# planner to use it. Other backends (SQLite in local development) keep the
+# plain LIKE scan.
+INDEX_NAME = 'amazon_ads_search_query_trgm_idx'
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} '
+        'ON amazon_ads_reports_searchtermreportdata '
+        'USING gin (UPPER("query"::text) gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('amazon_ads_reports', '0008_ads_data_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
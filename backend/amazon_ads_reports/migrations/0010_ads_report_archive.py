@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_ads_reports', '0009_search_term_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adsreport',
+            name='archive_format',
+            field=models.CharField(blank=True, choices=[('parquet', 'Parquet'), ('json.gz', 'Gzipped JSON')], max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='adsreport',
+            name='archive_name',
+            field=models.CharField(blank=True, help_text='Name of the archived raw payload in file storage', max_length=512, null=True),
+        ),
+        migrations.AddField(
+            model_name='adsreport',
+            name='archive_rows',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='adsreport',
+            name='archive_size',
+            field=models.BigIntegerField(blank=True, help_text='Archive size in bytes', null=True),
+        ),
+        migrations.AddField(
+            model_name='adsreport',
+            name='archive_storage',
+            field=models.CharField(blank=True, help_text='Storage backend holding the archive (azure_blob or local)', max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='adsreport',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
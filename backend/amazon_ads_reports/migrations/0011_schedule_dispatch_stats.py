@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_ads_reports', '0010_ads_report_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportschedule',
+            name='last_dispatch_latency_ms',
+            field=models.IntegerField(blank=True, help_text='Delay between next_run and the report request being sent, in milliseconds', null=True),
+        ),
+        migrations.AddField(
+            model_name='reportschedule',
+            name='last_error',
+            field=models.TextField(blank=True, help_text='Error from the last dispatch attempt, if it failed', null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_ads_reports', '0011_schedule_dispatch_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adsreport',
+            name='coalesced_count',
+            field=models.IntegerField(default=0, help_text='Number of later requests served by this report'),
+        ),
+        migrations.AddField(
+            model_name='adsreport',
+            name='last_requested_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='adsreport',
+            name='request_key',
+            field=models.CharField(blank=True, help_text='Fingerprint of the request parameters used to reuse equivalent reports', max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='adsreport',
+            index=models.Index(fields=['tenant', 'request_key', 'created_at'], name='amazon_ads__tenant__0691bd_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='adsreport',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['PENDING', 'IN_PROGRESS'])), fields=('request_key',), name='unique_inflight_ads_report_request'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_ads_reports', '0012_report_request_coalescing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportCompletionSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region', models.CharField(choices=[('NA', 'North America'), ('EU', 'Europe'), ('FE', 'Far East')], max_length=2)),
+                ('span_days', models.IntegerField(help_text='Report date span, rounded up to a planner bucket')),
+                ('duration_seconds', models.IntegerField(help_text='Seconds from the report request until Amazon reported it completed')),
+                ('recorded_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Report Completion Sample',
+                'verbose_name_plural': 'Report Completion Samples',
+            },
+        ),
+        migrations.AddField(
+            model_name='adsreport',
+            name='next_poll_at',
+            field=models.DateTimeField(blank=True, help_text="Earliest time the poller checks this report's status again", null=True),
+        ),
+        migrations.AddField(
+            model_name='adsreport',
+            name='poll_count',
+            field=models.IntegerField(default=0, help_text='Number of status checks made for this report'),
+        ),
+        migrations.AddIndex(
+            model_name='adsreport',
+            index=models.Index(fields=['status', 'next_poll_at'], name='amazon_ads__status_f0f6ea_idx'),
+        ),
+        migrations.AddField(
+            model_name='reportcompletionsample',
+            name='report',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='completion_sample', to='amazon_ads_reports.adsreport'),
+        ),
+        migrations.AddField(
+            model_name='reportcompletionsample',
+            name='report_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='completion_samples', to='amazon_ads_reports.reporttype'),
+        ),
+        migrations.AddIndex(
+            model_name='reportcompletionsample',
+            index=models.Index(fields=['report_type', 'region', 'span_days', 'recorded_at'], name='amazon_ads__report__c49827_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# Report rows are inserted roughly in date order, so on PostgreSQL a BRIN index
+# on date (a few pages per table instead of a B-tree the size of the data)
+# lets date-range scans and retention deletes skip whole blocks of the heap.
+# Other backends (SQLite in local development) keep the existing indexes only.
+BRIN_INDEXES = (
+    ('amazon_ads_daily_product_date_brin_idx', 'amazon_ads_reports_dailyproductadsdata'),
+    ('amazon_ads_search_term_date_brin_idx', 'amazon_ads_reports_searchtermreportdata'),
+)
+
+
+def create_brin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index_name, table in BRIN_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} '
+            f'ON {table} USING brin ("date") WITH (pages_per_range = 32)'
+        )
+
+
+def drop_brin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index_name, _ in BRIN_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {index_name}')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('amazon_ads_reports', '0013_adaptive_report_polling'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_brin_indexes, drop_brin_indexes),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:40
+
+from django.db import migrations, models
+
+# Existing rows keep a NULL row_key (NULLs never conflict) until the one-off
+# dedupe_search_terms command keys them and deletes duplicates in batches.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_ads_reports', '0014_ads_data_brin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchtermreportdata',
+            name='row_key',
+            field=models.CharField(blank=True, help_text='Fingerprint of date, campaign, ad group, keyword/target, match type and query', max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='searchtermreportdata',
+            constraint=models.UniqueConstraint(fields=('tenant', 'row_key'), name='unique_search_term_row'),
+        ),
+    ]
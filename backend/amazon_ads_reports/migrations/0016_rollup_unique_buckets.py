@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:36
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+# Concurrent refreshes could each insert a full copy of the same buckets.
+# Every copy is a complete aggregate of the raw rows, so keep the oldest one
+# per bucket before the constraints go on.
+ROLLUP_DIMENSIONS = {
+    'CampaignPerformanceRollup': ('campaign_id', 'campaign_name'),
+    'AsinPerformanceRollup': ('advertised_asin', 'advertised_sku'),
+    'SearchTermRollup': ('query',),
+}
+
+
+def remove_duplicate_buckets(apps, schema_editor):
+    for model_name, dimensions in ROLLUP_DIMENSIONS.items():
+        model = apps.get_model('amazon_ads_reports', model_name)
+        fields = ('tenant_id', 'period', 'period_start') + dimensions
+        duplicates = model.objects.values(*fields).annotate(
+            keep_id=Min('id'), copies=Count('id')
+        ).filter(copies__gt=1).order_by()
+        for row in duplicates.iterator():
+            model.objects.filter(
+                **{field: row[field] for field in fields}
+            ).exclude(id=row['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_ads_reports', '0015_search_term_row_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_buckets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='asinperformancerollup',
+            constraint=models.UniqueConstraint(fields=('tenant', 'period', 'period_start', 'advertised_asin', 'advertised_sku'), name='unique_asin_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='campaignperformancerollup',
+            constraint=models.UniqueConstraint(fields=('tenant', 'period', 'period_start', 'campaign_id', 'campaign_name'), name='unique_campaign_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='searchtermrollup',
+            constraint=models.UniqueConstraint(fields=('tenant', 'period', 'period_start', 'query'), name='unique_search_term_rollup'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_ads_reports', '0016_rollup_unique_buckets'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='adsreport',
+            name='unique_inflight_ads_report_request',
+        ),
+        migrations.AddConstraint(
+            model_name='adsreport',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['PENDING', 'IN_PROGRESS'])), fields=('tenant', 'request_key'), name='unique_inflight_ads_report_request'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:02
+
+from django.db import migrations, models
+
+# Existing rows keep a NULL keyword_id and their key without it; re-ingesting
+# their report replaces them with keyed copies (see _process_search_term_report).
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_ads_reports', '0017_inflight_request_per_tenant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchtermreportdata',
+            name='keyword_id',
+            field=models.CharField(blank=True, help_text='ID of the keyword or target (keywordId) the search term matched', max_length=255, null=True),
+        ),
+    ]
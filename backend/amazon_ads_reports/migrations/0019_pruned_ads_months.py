@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_ads_reports', '0018_search_term_keyword_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrunedAdsMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dataset', models.CharField(help_text='Key from analytics.DATASETS', max_length=50)),
+                ('month_start', models.DateField()),
+                ('pruned_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pruned_ads_months', to='amazon_ads_reports.tenant')),
+            ],
+            options={
+                'verbose_name': 'Pruned Ads Month',
+                'verbose_name_plural': 'Pruned Ads Months',
+                'constraints': [models.UniqueConstraint(fields=('tenant', 'dataset', 'month_start'), name='unique_pruned_ads_month')],
+            },
+        ),
+    ]
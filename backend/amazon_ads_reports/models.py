@@ -1,5 +1,8 @@
 from django.db import models
 import uuid
+import json
+import math
+import hashlib
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
@@ -113,6 +116,27 @@ class AdsReport(models.Model):
     is_stored = models.BooleanField(default=False, help_text="Whether the report data has been stored in the database")
     rows_processed = models.IntegerField(default=0)
     
+    # Raw payload archive (see amazon_ads_reports.archive)
+    ARCHIVE_FORMAT_CHOICES = [
+        ('parquet', 'Parquet'),
+        ('json.gz', 'Gzipped JSON'),
+    ]
+    archive_name = models.CharField(max_length=512, null=True, blank=True, help_text="Name of the archived raw payload in file storage")
+    archive_storage = models.CharField(max_length=20, null=True, blank=True, help_text="Storage backend holding the archive (azure_blob or local)")
+    archive_format = models.CharField(max_length=10, choices=ARCHIVE_FORMAT_CHOICES, null=True, blank=True)
+    archive_rows = models.IntegerField(null=True, blank=True)
+    archive_size = models.BigIntegerField(null=True, blank=True, help_text="Archive size in bytes")
+    archived_at = models.DateTimeField(null=True, blank=True)
+    
+    # Request coalescing (see AmazonAdsReportService.request_report)
+    request_key = models.CharField(max_length=64, null=True, blank=True, help_text="Fingerprint of the request parameters used to reuse equivalent reports")
+    coalesced_count = models.IntegerField(default=0, help_text="Number of later requests served by this report")
+    last_requested_at = models.DateTimeField(null=True, blank=True)
+    
+    # Status polling (see amazon_ads_reports.polling)
+    next_poll_at = models.DateTimeField(null=True, blank=True, help_text="Earliest time the poller checks this report's status again")
+    poll_count = models.IntegerField(default=0, help_text="Number of status checks made for this report")
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -126,10 +150,23 @@ class AdsReport(models.Model):
             models.Index(fields=['tenant', 'status']),
             models.Index(fields=['start_date', 'end_date']),
             models.Index(fields=['amazon_report_id']),
+            models.Index(fields=['tenant', 'request_key', 'created_at']),
+            models.Index(fields=['status', 'next_poll_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant', 'request_key'],
+                condition=models.Q(status__in=['PENDING', 'IN_PROGRESS']),
+                name='unique_inflight_ads_report_request'
+            ),
         ]
     
     def __str__(self):
         return f"{self.tenant.name} - {self.report_type.name} ({self.start_date} to {self.end_date})"
+    
+    @property
+    def is_archived(self):
+        return bool(self.archive_name)
 
 class DailyProductAdsData(models.Model):
     """Model for storing daily product advertising report data"""
@@ -197,10 +234,15 @@ class DailyProductAdsData(models.Model):
             models.Index(fields=['tenant', 'campaign_id']),
             models.Index(fields=['tenant', 'advertised_asin']),
             models.Index(fields=['tenant', 'advertised_sku']),
+            models.Index(fields=['tenant', 'date', 'id']),
         ]
         verbose_name = "Daily Product Ads Data"
         verbose_name_plural = "Daily Product Ads Data"
 
+def _is_missing(value):
+    """None, or NaN from pandas"""
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
 class SearchTermReportData(models.Model):
     """Model for storing search term report data"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -213,10 +255,15 @@ class SearchTermReportData(models.Model):
     campaign_id = models.CharField(max_length=255, db_index=True)
     ad_group_name = models.CharField(max_length=255, null=True, blank=True)
     ad_group_id = models.CharField(max_length=255, null=True, blank=True)
+    keyword_id = models.CharField(max_length=255, null=True, blank=True, help_text="ID of the keyword or target (keywordId) the search term matched")
     keyword_text = models.CharField(max_length=255, null=True, blank=True)
     match_type = models.CharField(max_length=50, null=True, blank=True)
     query = models.TextField(help_text="Customer search term")
     
+    # Natural key fingerprint, unique per tenant (see build_row_key); NULL only on rows
+    # ingested before it existed until dedupe_search_terms has keyed them
+    row_key = models.CharField(max_length=64, null=True, blank=True, help_text="Fingerprint of date, campaign, ad group, keyword/target, match type and query")
+    
     # Metrics
     impressions = models.IntegerField(default=0)
     clicks = models.IntegerField(default=0)
@@ -242,9 +289,34 @@ class SearchTermReportData(models.Model):
             models.Index(fields=['tenant', 'date']),
             models.Index(fields=['tenant', 'query']),
             models.Index(fields=['tenant', 'campaign_id']),
+            models.Index(fields=['tenant', 'clicks', 'id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'row_key'], name='unique_search_term_row'),
         ]
         verbose_name = "Search Term Report Data"
         verbose_name_plural = "Search Term Report Data"
+    
+    @staticmethod
+    def build_row_key(date, campaign_id, ad_group_id, keyword_text, match_type, query, keyword_id=None):
+        """
+        Fingerprint of a search term row's natural key within a tenant
+        
+        Re-processing a report or requesting overlapping date ranges yields rows
+        with the same key, which are then updated in place instead of duplicated.
+        The keyword / target ID tells apart auto and product targeting rows,
+        which share the query and have no keyword text. Without it the key is
+        the one rows were stored under before the ID was kept.
+        
+        Returns:
+            Hex digest string
+        """
+        parts = [campaign_id, ad_group_id, keyword_text, match_type, query]
+        if not _is_missing(keyword_id) and str(keyword_id) != '':
+            parts.append(keyword_id)
+        # Missing values (None, or NaN from pandas) all count as empty
+        fingerprint = json.dumps([date.isoformat()] + ['' if _is_missing(part) else str(part) for part in parts])
+        return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
 
 class ReportSchedule(models.Model):
     """Model for scheduling regular report refreshes"""
@@ -274,6 +346,8 @@ class ReportSchedule(models.Model):
     is_active = models.BooleanField(default=True)
     last_run = models.DateTimeField(null=True, blank=True)
     next_run = models.DateTimeField()
+    last_dispatch_latency_ms = models.IntegerField(null=True, blank=True, help_text="Delay between next_run and the report request being sent, in milliseconds")
+    last_error = models.TextField(null=True, blank=True, help_text="Error from the last dispatch attempt, if it failed")
     
     # User relationship
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='ads_report_schedules')
@@ -364,3 +438,133 @@ class ReportSchedule(models.Model):
             )
             
         return next_run
+
+class AdsRollupBase(models.Model):
+    """Abstract base for pre-aggregated ads metrics (daily and monthly buckets)"""
+    PERIOD_CHOICES = [
+        ('DAY', 'Day'),
+        ('MONTH', 'Month'),
+    ]
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField(help_text="Day for daily rollups, first day of the month for monthly rollups")
+    
+    # Timestamps
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        abstract = True
+
+class CampaignPerformanceRollup(AdsRollupBase):
+    """Daily/monthly aggregates of DailyProductAdsData by campaign"""
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='campaign_rollups')
+    campaign_id = models.CharField(max_length=255)
+    campaign_name = models.CharField(max_length=255, null=True, blank=True)
+    
+    # Metrics
+    impressions = models.BigIntegerField(default=0)
+    clicks = models.BigIntegerField(default=0)
+    spend = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    sales_1d = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    sales_7d = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    sales_30d = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    units_sold_clicks_30d = models.BigIntegerField(default=0)
+    purchases_30d = models.BigIntegerField(default=0)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'period', 'period_start']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant', 'period', 'period_start', 'campaign_id', 'campaign_name'],
+                name='unique_campaign_rollup'
+            ),
+        ]
+        verbose_name = "Campaign Performance Rollup"
+        verbose_name_plural = "Campaign Performance Rollups"
+
+class AsinPerformanceRollup(AdsRollupBase):
+    """Daily/monthly aggregates of DailyProductAdsData by advertised ASIN"""
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='asin_rollups')
+    advertised_asin = models.CharField(max_length=50)
+    advertised_sku = models.CharField(max_length=255, null=True, blank=True)
+    
+    # Metrics
+    impressions = models.BigIntegerField(default=0)
+    clicks = models.BigIntegerField(default=0)
+    spend = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    sales_1d = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    sales_7d = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    sales_30d = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    units_sold_clicks_30d = models.BigIntegerField(default=0)
+    purchases_30d = models.BigIntegerField(default=0)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'period', 'period_start']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant', 'period', 'period_start', 'advertised_asin', 'advertised_sku'],
+                name='unique_asin_rollup'
+            ),
+        ]
+        verbose_name = "ASIN Performance Rollup"
+        verbose_name_plural = "ASIN Performance Rollups"
+
+class SearchTermRollup(AdsRollupBase):
+    """Daily/monthly aggregates of SearchTermReportData by customer search query"""
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='search_term_rollups')
+    query = models.TextField(help_text="Customer search term")
+    
+    # Metrics
+    impressions = models.BigIntegerField(default=0)
+    clicks = models.BigIntegerField(default=0)
+    cost = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    conversions = models.BigIntegerField(default=0)
+    sales_7d = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    sales_14d = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    sales_30d = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'period', 'period_start']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant', 'period', 'period_start', 'query'],
+                name='unique_search_term_rollup'
+            ),
+        ]
+        verbose_name = "Search Term Rollup"
+        verbose_name_plural = "Search Term Rollups"
+
+class ReportCompletionSample(models.Model):
+    """Observed time from request to completion of an Amazon Ads report, used to plan status polls"""
+    report_type = models.ForeignKey(ReportType, on_delete=models.CASCADE, related_name='completion_samples')
+    region = models.CharField(max_length=2, choices=AmazonAdsCredential.REGION_CHOICES)
+    span_days = models.IntegerField(help_text="Report date span, rounded up to a planner bucket")
+    duration_seconds = models.IntegerField(help_text="Seconds from the report request until Amazon reported it completed")
+    report = models.OneToOneField(AdsReport, on_delete=models.SET_NULL, null=True, blank=True, related_name='completion_sample')
+    recorded_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['report_type', 'region', 'span_days', 'recorded_at']),
+        ]
+        verbose_name = "Report Completion Sample"
+        verbose_name_plural = "Report Completion Samples"
+
+class PrunedAdsMonth(models.Model):
+    """A tenant month of a raw ads data table deleted by retention (see retention.py)"""
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='pruned_ads_months')
+    dataset = models.CharField(max_length=50, help_text="Key from analytics.DATASETS")
+    month_start = models.DateField()
+    pruned_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'dataset', 'month_start'], name='unique_pruned_ads_month'),
+        ]
+        verbose_name = "Pruned Ads Month"
+        verbose_name_plural = "Pruned Ads Months"
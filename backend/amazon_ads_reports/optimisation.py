@@ -0,0 +1,377 @@
+"""
+Run the bulk-file optimisers on ingested Ads API data
+
+The SP optimiser (sp.header) works on two DataFrames shaped like the
+"Sponsored Products Campaigns" and "SP Search Term Report" sheets of an Amazon
+bulk file. This module builds those frames from DailyProductAdsData and
+SearchTermReportData, aggregating over the date range in the database, so an
+optimisation can run without exporting, uploading and parsing a workbook.
+
+Only entities present in the ingested reports can be rebuilt: campaigns, ad
+groups and product ads come from the product ads report, keywords and product
+targets from the search term report. Keyword bids and placement (bidding
+adjustment) rows are not part of those reports, so placement bid optimisation
+has nothing to work on and returns empty results for this data source.
+"""
+import logging
+import os
+import tempfile
+
+import pandas as pd
+from django.db.models import Max, OuterRef, Subquery, Sum
+
+from core.file_service import save_temp_file, get_excel_preview, PREVIEW_PAGE_SIZE
+from .models import DailyProductAdsData, SearchTermReportData
+
+logger = logging.getLogger(__name__)
+
+PRODUCT = 'Sponsored Products'
+
+# Summed bulk-file metric columns and their source field per model
+METRIC_FIELDS = {
+    DailyProductAdsData: {
+        'Impressions': 'impressions',
+        'Clicks': 'clicks',
+        'Spend': 'spend',
+        'Sales': 'sales_7d',
+        'Orders': 'purchases_7d',
+    },
+    SearchTermReportData: {
+        'Impressions': 'impressions',
+        'Clicks': 'clicks',
+        'Spend': 'cost',
+        'Sales': 'sales_7d',
+        'Orders': 'conversions',
+    },
+}
+
+# Derived columns as (numerator, denominator); fractions like the bulk file
+RATIO_COLUMNS = {
+    'Click-through Rate': ('Clicks', 'Impressions'),
+    'Conversion Rate': ('Orders', 'Clicks'),
+    'ACOS': ('Spend', 'Sales'),
+    'CPC': ('Spend', 'Clicks'),
+    'ROAS': ('Sales', 'Spend'),
+}
+
+# Neither report has 7 day units, orders stand in for them
+UNITS_SOURCE = 'Orders'
+
+METRIC_COLUMNS = ['Impressions', 'Clicks', 'Click-through Rate', 'Spend', 'Sales', 'Orders', 'Units',
+                  'Conversion Rate', 'ACOS', 'CPC', 'ROAS']
+
+SEARCH_TERM_COLUMNS = [
+    'Product', 'Campaign ID', 'Ad Group ID', 'Campaign Name (Informational only)',
+    'Ad Group Name (Informational only)', 'Campaign State (Informational only)', 'Keyword Text',
+    'Match Type', 'Product Targeting Expression', 'Customer Search Term',
+] + METRIC_COLUMNS
+
+BULK_COLUMNS = [
+    'Product', 'Entity', 'Operation', 'Campaign ID', 'Ad Group ID', 'Portfolio ID', 'Ad ID',
+    'Campaign Name', 'Ad Group Name', 'Campaign Name (Informational only)',
+    'Ad Group Name (Informational only)', 'State', 'Campaign State (Informational only)',
+    'Daily Budget', 'SKU', 'ASIN', 'Bid', 'Keyword Text', 'Match Type', 'Placement',
+    'Product Targeting Expression',
+] + METRIC_COLUMNS
+
+# Keyword match types as reported by the API, mapped to bulk-file spelling;
+# anything else in the search term report is a targeting expression
+MATCH_TYPES = {'BROAD': 'Broad', 'PHRASE': 'Phrase', 'EXACT': 'Exact'}
+
+
+def _required_metrics(columns):
+    """Summed metric columns needed to produce the requested columns"""
+    if columns is None:
+        return set(METRIC_FIELDS[DailyProductAdsData].keys())
+    needed = set()
+    for column in columns:
+        if column in RATIO_COLUMNS:
+            needed.update(RATIO_COLUMNS[column])
+        elif column == 'Units':
+            needed.add(UNITS_SOURCE)
+        else:
+            needed.add(column)
+    return needed & set(METRIC_FIELDS[DailyProductAdsData].keys())
+
+
+def _metric_annotations(model, metrics):
+    return {f'total_{field}': Sum(field) for column, field in METRIC_FIELDS[model].items() if column in metrics}
+
+
+def _metric_values(model, row, metrics):
+    return {column: row[f'total_{field}'] or 0 for column, field in METRIC_FIELDS[model].items() if column in metrics}
+
+
+def _finish_frame(rows, all_columns, columns, metrics):
+    """Build the DataFrame, derive ratio columns zero-safely and project the requested columns"""
+    wanted = [c for c in all_columns if columns is None or c in columns]
+    if not rows:
+        return pd.DataFrame(columns=wanted)
+
+    df = pd.DataFrame(rows)
+    for column in metrics:
+        df[column] = pd.to_numeric(df[column], errors='coerce').fillna(0).astype(float)
+    if UNITS_SOURCE in metrics:
+        df['Units'] = df[UNITS_SOURCE]
+    for name, (numerator, denominator) in RATIO_COLUMNS.items():
+        if numerator in metrics and denominator in metrics:
+            df[name] = (df[numerator] / df[denominator].where(df[denominator] != 0)).fillna(0)
+    return df.reindex(columns=wanted)
+
+
+class AdsOptimisationDataAdapter:
+    """Builds bulk-file shaped DataFrames from ingested Amazon Ads report data"""
+
+    @classmethod
+    def _campaign_states(cls, tenant_id, start_date, end_date):
+        """
+        Latest status and daily budget of each campaign in the range
+
+        Returns:
+            Dict of campaign ID to (state, daily budget)
+        """
+        latest = DailyProductAdsData.objects.filter(
+            tenant_id=tenant_id,
+            date__range=[start_date, end_date],
+            campaign_id=OuterRef('campaign_id')
+        ).order_by('-date')
+
+        rows = DailyProductAdsData.objects.filter(
+            tenant_id=tenant_id,
+            date__range=[start_date, end_date]
+        ).values('campaign_id').annotate(
+            latest_status=Subquery(latest.values('campaign_status')[:1]),
+            latest_budget=Subquery(latest.values('campaign_budget_amount')[:1])
+        ).order_by()
+
+        return {
+            row['campaign_id']: (
+                (row['latest_status'] or '').lower() or None,
+                float(row['latest_budget']) if row['latest_budget'] is not None else None
+            )
+            for row in rows
+        }
+
+    @classmethod
+    def search_term_frame(cls, tenant_id, start_date, end_date, columns=None, campaign_states=None):
+        """
+        Build the "SP Search Term Report" frame
+
+        Args:
+            tenant_id: Tenant primary key
+            start_date: Range start (datetime.date)
+            end_date: Range end (datetime.date)
+            columns: Optional list of columns to return (metrics not needed are not aggregated)
+            campaign_states: Optional result of _campaign_states to avoid querying it twice
+
+        Returns:
+            DataFrame with one row per campaign, ad group, target and customer search term
+        """
+        metrics = _required_metrics(columns)
+        if campaign_states is None:
+            campaign_states = cls._campaign_states(tenant_id, start_date, end_date)
+
+        queryset = SearchTermReportData.objects.filter(
+            tenant_id=tenant_id,
+            date__range=[start_date, end_date]
+        ).values(
+            'campaign_id', 'ad_group_id', 'keyword_text', 'match_type', 'query'
+        ).annotate(
+            latest_campaign_name=Max('campaign_name'),
+            latest_ad_group_name=Max('ad_group_name'),
+            **_metric_annotations(SearchTermReportData, metrics)
+        ).order_by()
+
+        rows = []
+        for row in queryset.iterator(chunk_size=2000):
+            keyword, targeting = cls._split_target(row['keyword_text'], row['match_type'])
+            rows.append({
+                'Product': PRODUCT,
+                'Campaign ID': row['campaign_id'],
+                'Ad Group ID': row['ad_group_id'],
+                'Campaign Name (Informational only)': row['latest_campaign_name'] or row['campaign_id'],
+                'Ad Group Name (Informational only)': row['latest_ad_group_name'],
+                'Campaign State (Informational only)': campaign_states.get(row['campaign_id'], (None, None))[0],
+                'Keyword Text': keyword,
+                'Match Type': MATCH_TYPES.get((row['match_type'] or '').upper()),
+                'Product Targeting Expression': targeting,
+                'Customer Search Term': row['query'],
+                **_metric_values(SearchTermReportData, row, metrics),
+            })
+
+        return _finish_frame(rows, SEARCH_TERM_COLUMNS, columns, metrics)
+
+    @classmethod
+    def bulk_frame(cls, tenant_id, start_date, end_date, columns=None, campaign_states=None):
+        """
+        Build the "Sponsored Products Campaigns" frame
+
+        Args:
+            tenant_id: Tenant primary key
+            start_date: Range start (datetime.date)
+            end_date: Range end (datetime.date)
+            columns: Optional list of columns to return (metrics not needed are not aggregated)
+            campaign_states: Optional result of _campaign_states to avoid querying it twice
+
+        Returns:
+            DataFrame with Campaign, Ad Group, Product Ad, Keyword and Product Targeting rows
+        """
+        metrics = _required_metrics(columns)
+        if campaign_states is None:
+            campaign_states = cls._campaign_states(tenant_id, start_date, end_date)
+
+        product_ads = DailyProductAdsData.objects.filter(tenant_id=tenant_id, date__range=[start_date, end_date])
+        search_terms = SearchTermReportData.objects.filter(tenant_id=tenant_id, date__range=[start_date, end_date])
+        rows = []
+
+        def base(row, entity):
+            return {
+                'Product': PRODUCT,
+                'Entity': entity,
+                'Campaign ID': row['campaign_id'],
+                'Ad Group ID': row.get('ad_group_id'),
+                'Campaign Name (Informational only)': row.get('latest_campaign_name') or row['campaign_id'],
+                'Ad Group Name (Informational only)': row.get('latest_ad_group_name'),
+                'Campaign State (Informational only)': campaign_states.get(row['campaign_id'], (None, None))[0],
+            }
+
+        for row in product_ads.values('campaign_id').annotate(
+            latest_campaign_name=Max('campaign_name'),
+            portfolio=Max('portfolio_id'),
+            **_metric_annotations(DailyProductAdsData, metrics)
+        ).order_by():
+            state, budget = campaign_states.get(row['campaign_id'], (None, None))
+            rows.append({
+                **base(row, 'Campaign'),
+                'Portfolio ID': row['portfolio'],
+                'Campaign Name': row['latest_campaign_name'],
+                'State': state,
+                'Daily Budget': budget,
+                **_metric_values(DailyProductAdsData, row, metrics),
+            })
+
+        for row in product_ads.values('campaign_id', 'ad_group_id').annotate(
+            latest_campaign_name=Max('campaign_name'),
+            latest_ad_group_name=Max('ad_group_name'),
+            **_metric_annotations(DailyProductAdsData, metrics)
+        ).order_by():
+            rows.append({
+                **base(row, 'Ad Group'),
+                'Ad Group Name': row['latest_ad_group_name'],
+                **_metric_values(DailyProductAdsData, row, metrics),
+            })
+
+        for row in product_ads.values('campaign_id', 'ad_group_id', 'ad_id', 'advertised_asin', 'advertised_sku').annotate(
+            latest_campaign_name=Max('campaign_name'),
+            latest_ad_group_name=Max('ad_group_name'),
+            **_metric_annotations(DailyProductAdsData, metrics)
+        ).order_by():
+            rows.append({
+                **base(row, 'Product Ad'),
+                'Ad ID': row['ad_id'],
+                'ASIN': row['advertised_asin'],
+                'SKU': row['advertised_sku'],
+                **_metric_values(DailyProductAdsData, row, metrics),
+            })
+
+        # Targets are only known from the search term report; their bids are not ingested
+        for row in search_terms.values('campaign_id', 'ad_group_id', 'keyword_text', 'match_type').annotate(
+            latest_campaign_name=Max('campaign_name'),
+            latest_ad_group_name=Max('ad_group_name'),
+            **_metric_annotations(SearchTermReportData, metrics)
+        ).order_by():
+            keyword, targeting = cls._split_target(row['keyword_text'], row['match_type'])
+            if not keyword and not targeting:
+                continue
+            rows.append({
+                **base(row, 'Keyword' if keyword else 'Product Targeting'),
+                'Keyword Text': keyword,
+                'Match Type': MATCH_TYPES.get((row['match_type'] or '').upper()),
+                'Product Targeting Expression': targeting,
+                **_metric_values(SearchTermReportData, row, metrics),
+            })
+
+        return _finish_frame(rows, BULK_COLUMNS, columns, metrics)
+
+    @classmethod
+    def _split_target(cls, keyword_text, match_type):
+        """Return (keyword text, targeting expression) for a reported target"""
+        if (match_type or '').upper() in MATCH_TYPES:
+            return keyword_text, None
+        return None, keyword_text
+
+    @classmethod
+    def sp_frames(cls, tenant_id, start_date, end_date, columns=None):
+        """
+        Build both SP optimiser inputs
+
+        Returns:
+            Tuple of (search term frame, bulk frame)
+        """
+        campaign_states = cls._campaign_states(tenant_id, start_date, end_date)
+        return (
+            cls.search_term_frame(tenant_id, start_date, end_date, columns, campaign_states),
+            cls.bulk_frame(tenant_id, start_date, end_date, columns, campaign_states),
+        )
+
+
+class AdsOptimisationService:
+    """Runs the bulk-file optimisers on ingested report data"""
+
+    @classmethod
+    def run_sp_optimisation(cls, tenant, start_date, end_date, target_acos, preview_rows=PREVIEW_PAGE_SIZE):
+        """
+        Run the SP optimiser over a tenant's ingested data and store the output workbook
+
+        Args:
+            tenant: Tenant instance
+            start_date: Range start (datetime.date)
+            end_date: Range end (datetime.date)
+            target_acos: Target ACOS as a fraction (e.g. 0.30)
+            preview_rows: Rows of each sheet to return, None for all of them
+
+        Returns:
+            Dict with success, message and, on success, the sheet data and stored file reference
+        """
+        from sp.header import final_sp_optimisation_from_frames
+
+        str_df, bulk_df = AdsOptimisationDataAdapter.sp_frames(tenant.id, start_date, end_date)
+        if str_df.empty:
+            return {
+                'success': False,
+                'message': f'No search term data for {tenant.name} between {start_date} and {end_date}'
+            }
+        if bulk_df.empty:
+            return {
+                'success': False,
+                'message': f'No product ads data for {tenant.name} between {start_date} and {end_date}'
+            }
+
+        logger.info(f"Running SP optimisation for tenant {tenant.name}: {len(str_df)} search term rows, {len(bulk_df)} bulk rows")
+
+        filename = f"SP_Output_{tenant.identifier}_{start_date}_{end_date}.xlsx"
+        fd, output_path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            final_sp_optimisation_from_frames(str_df, bulk_df, output_path, target_acos)
+            # Hand over the content, not the path: the temp file is removed below
+            with open(output_path, 'rb') as output_file:
+                file_result = save_temp_file(output_file, f"Optimized_{filename}")
+        finally:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+
+        # First page of each output sheet; further pages come from files/preview/<file_id>/
+        preview = get_excel_preview(file_result['file_id'], limit=preview_rows)
+        return {
+            'success': True,
+            'message': 'Optimisation completed',
+            'data': preview['data'],
+            'sheets': preview['sheets'],
+            'file': {
+                'filename': file_result['filename'],
+                'url': file_result.get('url'),
+                'file_id': file_result['file_id'],
+            },
+            'rows': {'search_terms': len(str_df), 'bulk': len(bulk_df)},
+        }
@@ -0,0 +1,215 @@
+"""
+Adaptive status polling for Amazon Ads reports
+
+Every completed report records how long Amazon took to produce it, keyed by
+report type, region and date span. A new report is first polled when similar
+reports have typically finished (the median of recent samples); if it is not
+ready yet, later polls are spaced by a fraction of the time already waited, so
+a report that takes an hour is checked a handful of times instead of once per
+cron tick, while a report that finishes on time is picked up on the first poll.
+"""
+import logging
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ReportCompletionSample
+
+logger = logging.getLogger(__name__)
+
+# Date spans are bucketed (rounded up) so similar reports share history
+SPAN_BUCKETS = (1, 7, 14, 31, 62, 93)
+
+# Recent samples considered per (report type, region, span) and the minimum
+# needed before trusting them over the wider (report type, region) history
+HISTORY_SIZE = 50
+MIN_SAMPLES = 3
+
+# Percentile of past completion times at which the first poll is made
+FIRST_POLL_PERCENTILE = 50
+
+# After a miss, wait this fraction of the time already elapsed since the request
+BACKOFF_RATIO = 0.25
+
+
+def span_bucket(start_date, end_date):
+    """
+    Bucket the number of days a report covers
+
+    Args:
+        start_date: Report start date
+        end_date: Report end date
+
+    Returns:
+        Smallest bucket in SPAN_BUCKETS covering the span (the largest bucket for longer spans)
+    """
+    days = (end_date - start_date).days + 1
+    for bucket in SPAN_BUCKETS:
+        if days <= bucket:
+            return bucket
+    return SPAN_BUCKETS[-1]
+
+
+def _parse_timestamp(value):
+    """Parse an ISO timestamp from an Amazon response, None if missing or malformed"""
+    try:
+        parsed = parse_datetime(value or '')
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def _percentile(sorted_values, percentile):
+    """Nearest-rank percentile of an already sorted list"""
+    index = int(round(percentile / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[max(0, min(index, len(sorted_values) - 1))]
+
+
+class ReportPollingPlanner:
+    """Chooses when each in-flight report is polled next and records completion times"""
+
+    @classmethod
+    def _min_interval(cls):
+        return getattr(settings, 'AMAZON_ADS_POLL_MIN_SECONDS', 30)
+
+    @classmethod
+    def _max_interval(cls):
+        return getattr(settings, 'AMAZON_ADS_POLL_MAX_SECONDS', 900)
+
+    @classmethod
+    def completion_history(cls, report_type_id, region, span_days):
+        """
+        Recent completion durations for similar reports
+
+        Args:
+            report_type_id: ReportType primary key
+            region: Credential region code
+            span_days: Bucketed date span
+
+        Returns:
+            Sorted list of durations in seconds (empty when there is no history)
+        """
+        samples = ReportCompletionSample.objects.filter(
+            report_type_id=report_type_id,
+            region=region
+        ).order_by('-recorded_at')
+
+        durations = list(
+            samples.filter(span_days=span_days).values_list('duration_seconds', flat=True)[:HISTORY_SIZE]
+        )
+        if len(durations) < MIN_SAMPLES:
+            # Not enough reports of this span yet; any span of the same type is a better guess than none
+            durations = list(samples.values_list('duration_seconds', flat=True)[:HISTORY_SIZE])
+        return sorted(durations)
+
+    @classmethod
+    def expected_duration(cls, report, region):
+        """
+        Predict how long Amazon will take to complete a report
+
+        Args:
+            report: AdsReport instance
+            region: Credential region code
+
+        Returns:
+            Expected seconds from request to completion
+        """
+        durations = cls.completion_history(
+            report.report_type_id, region, span_bucket(report.start_date, report.end_date)
+        )
+        if not durations:
+            return getattr(settings, 'AMAZON_ADS_POLL_DEFAULT_SECONDS', 120)
+        return _percentile(durations, FIRST_POLL_PERCENTILE)
+
+    @classmethod
+    def next_poll_at(cls, report, region, now=None):
+        """
+        Pick the next status check time for an in-flight report
+
+        Args:
+            report: AdsReport instance (created_at and poll_count are used)
+            region: Credential region code
+            now: Current time, defaults to timezone.now()
+
+        Returns:
+            Datetime of the next poll
+        """
+        now = now or timezone.now()
+        requested_at = report.created_at or now
+
+        if report.poll_count == 0:
+            # Predictive first poll, but never sooner than the minimum interval
+            delay = max(cls.expected_duration(report, region), cls._min_interval())
+            return max(requested_at + timedelta(seconds=delay), now + timedelta(seconds=cls._min_interval()))
+
+        elapsed = (now - requested_at).total_seconds()
+        interval = min(max(elapsed * BACKOFF_RATIO, cls._min_interval()), cls._max_interval())
+        return now + timedelta(seconds=interval)
+
+    @classmethod
+    def schedule_first_poll(cls, report, region):
+        """
+        Set the first poll time of a freshly requested report (the caller saves it)
+
+        Args:
+            report: AdsReport instance
+            region: Credential region code
+        """
+        report.poll_count = 0
+        report.next_poll_at = cls.next_poll_at(report, region)
+
+    @classmethod
+    def schedule_next_poll(cls, report, region):
+        """
+        Count a status check that did not find the report finished and schedule the next one
+
+        Args:
+            report: AdsReport instance
+            region: Credential region code
+        """
+        report.poll_count += 1
+        report.next_poll_at = cls.next_poll_at(report, region)
+        report.save(update_fields=['poll_count', 'next_poll_at', 'updated_at'])
+
+    @classmethod
+    def record_completion(cls, report, region, status_response=None):
+        """
+        Store how long a completed report took, for planning later polls
+
+        Amazon's own createdAt/generatedAt timestamps are preferred when the
+        status response has them; our request and observation times include
+        polling lag, which would otherwise push predictions later over time.
+
+        Args:
+            report: AdsReport instance with completed_at set
+            region: Credential region code
+            status_response: Optional decoded status response from Amazon
+
+        Returns:
+            ReportCompletionSample instance, or None if nothing was recorded
+        """
+        status_response = status_response or {}
+        started = _parse_timestamp(status_response.get('createdAt')) or report.created_at
+        finished = _parse_timestamp(
+            status_response.get('generatedAt') or status_response.get('updatedAt')
+        ) or report.completed_at
+        if not started or not finished:
+            return None
+
+        duration = int((finished - started).total_seconds())
+        sample, created = ReportCompletionSample.objects.get_or_create(
+            report=report,
+            defaults={
+                'report_type_id': report.report_type_id,
+                'region': region,
+                'span_days': span_bucket(report.start_date, report.end_date),
+                'duration_seconds': max(duration, 0),
+            }
+        )
+        if created:
+            logger.info(f"Report {report.id} completed in {duration}s after {report.poll_count} status checks")
+        return sample
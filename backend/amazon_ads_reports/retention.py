@@ -0,0 +1,202 @@
+"""
+Retention for the raw ads data tables
+
+DailyProductAdsData and SearchTermReportData otherwise grow without bound.
+Rows older than ADS_DATA_RETENTION_MONTHS whole months are removed one tenant
+month at a time, in small batches so each DELETE holds its locks briefly and
+the BRIN index on date (migration 0014) narrows every batch to a few heap
+blocks.
+
+Before a month is deleted it is mirrored into the Parquet analytics store and
+copied to archive storage, so trend queries and the rollup tables keep the
+full history while the primary tables only hold the recent window. A month is
+never deleted if its archive could not be written.
+
+Pruned months are recorded (PrunedAdsMonth), and rollup and analytics
+refreshes leave them alone from then on: a report re-ingested or replayed for
+a pruned month only brings back part of its rows, and rebuilding from those
+would overwrite the only complete aggregates. Such rows are deleted again by
+the next prune.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from core.file_service import save_archive_file
+from .analytics import AdsAnalyticsStore, DATASETS, PARQUET_AVAILABLE
+from .models import PrunedAdsMonth
+from .rollups import _iter_months
+
+logger = logging.getLogger(__name__)
+
+# Whole months kept before the current month (0 disables retention)
+RETENTION_MONTHS = getattr(settings, 'ADS_DATA_RETENTION_MONTHS', 25)
+DELETE_BATCH_SIZE = 5000
+
+
+def retention_cutoff(today=None, months=None):
+    """
+    First day of the oldest month that is kept
+
+    Args:
+        today: Reference date, defaults to today
+        months: Whole months kept before the current one, defaults to ADS_DATA_RETENTION_MONTHS
+
+    Returns:
+        datetime.date, or None when retention is disabled
+    """
+    months = RETENTION_MONTHS if months is None else months
+    if not months:
+        return None
+    today = today or timezone.now().date()
+    index = today.year * 12 + today.month - 1 - months
+    return today.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+class AdsRetentionService:
+    """Archives and deletes ads data rows older than the retention window"""
+
+    @classmethod
+    def expired_months(cls, dataset, tenant_id, cutoff):
+        """
+        Months of a tenant's data that lie entirely before the cutoff
+
+        Args:
+            dataset: Key from analytics.DATASETS
+            tenant_id: Tenant primary key
+            cutoff: First day that is kept (datetime.date)
+
+        Returns:
+            List of (month_start, month_end) tuples, oldest first
+        """
+        model = DATASETS[dataset]['model']
+        first = model.objects.filter(
+            tenant_id=tenant_id,
+            date__lt=cutoff
+        ).order_by('date').values_list('date', flat=True).first()
+        if not first:
+            return []
+        return list(_iter_months(first, cutoff - timedelta(days=1)))
+
+    @classmethod
+    def archive_month(cls, dataset, tenant_id, month_start, month_end):
+        """
+        Write a tenant month to the analytics store and copy it to archive storage
+
+        Args:
+            dataset: Key from analytics.DATASETS
+            tenant_id: Tenant primary key
+            month_start: First day of the month
+            month_end: Last day of the month
+
+        Returns:
+            Dict from save_archive_file (plus 'rows'), or None if the month has no rows
+        """
+        if not PARQUET_AVAILABLE:
+            raise RuntimeError("pyarrow is not installed, cannot archive ads data")
+
+        rows = AdsAnalyticsStore.refresh_range(dataset, tenant_id, month_start, month_end)
+        if not rows:
+            return None
+
+        with open(AdsAnalyticsStore._partition_file(dataset, tenant_id, month_start), 'rb') as f:
+            data = f.read()
+        archive = save_archive_file(data, f'ads_data/{dataset}/tenant={tenant_id}/{month_start:%Y-%m}.parquet')
+        archive['rows'] = rows
+        return archive
+
+    @classmethod
+    def delete_range(cls, dataset, tenant_id, start_date, end_date, batch_size=DELETE_BATCH_SIZE):
+        """
+        Delete a tenant's rows in a date range in batches
+
+        Args:
+            dataset: Key from analytics.DATASETS
+            tenant_id: Tenant primary key
+            start_date: First day to delete
+            end_date: Last day to delete
+            batch_size: Rows deleted per statement
+
+        Returns:
+            Number of rows deleted
+        """
+        model = DATASETS[dataset]['model']
+        queryset = model.objects.filter(tenant_id=tenant_id, date__range=[start_date, end_date])
+
+        deleted = 0
+        while True:
+            ids = list(queryset.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            # Nothing references these rows, so this is a single DELETE ... WHERE id IN (...)
+            model.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+
+    @classmethod
+    def prune(cls, dataset, tenant_id, cutoff, archive=True, dry_run=False, batch_size=DELETE_BATCH_SIZE):
+        """
+        Archive (optionally) and delete every expired month of a tenant's data
+
+        Args:
+            dataset: Key from analytics.DATASETS
+            tenant_id: Tenant primary key
+            cutoff: First day that is kept (datetime.date)
+            archive: Copy each month to archive storage before deleting it
+            dry_run: Only report the months that would be pruned
+            batch_size: Rows deleted per statement
+
+        Returns:
+            Dict with the pruned months, rows deleted, archive files and failed months
+        """
+        result = {'months': [], 'rows_deleted': 0, 'archives': [], 'failed': []}
+
+        model = DATASETS[dataset]['model']
+        for month_start, month_end in cls.expired_months(dataset, tenant_id, cutoff):
+            label = f'{month_start:%Y-%m}'
+            if not model.objects.filter(tenant_id=tenant_id, date__range=[month_start, month_end]).exists():
+                # Already pruned (or never had data); refreshing it would drop its analytics partition
+                continue
+            if dry_run:
+                result['months'].append(label)
+                continue
+
+            if archive:
+                try:
+                    archived = cls.archive_month(dataset, tenant_id, month_start, month_end)
+                    if archived:
+                        result['archives'].append(archived)
+                except Exception as e:
+                    # Keep the rows until the month can be archived
+                    logger.error(f"Error archiving {dataset} {label} for tenant {tenant_id}, not deleting it: {str(e)}")
+                    result['failed'].append(label)
+                    continue
+
+            deleted = cls.delete_range(dataset, tenant_id, month_start, month_end, batch_size=batch_size)
+            PrunedAdsMonth.objects.update_or_create(tenant_id=tenant_id, dataset=dataset, month_start=month_start)
+            result['months'].append(label)
+            result['rows_deleted'] += deleted
+            logger.info(f"Pruned {deleted} {dataset} rows for tenant {tenant_id} {label}")
+
+        return result
+
+    @classmethod
+    def vacuum(cls, dataset):
+        """
+        VACUUM ANALYZE a dataset's table after a large prune (PostgreSQL only)
+
+        Args:
+            dataset: Key from analytics.DATASETS
+
+        Returns:
+            True if the table was vacuumed
+        """
+        if connection.vendor != 'postgresql':
+            return False
+        table = DATASETS[dataset]['model']._meta.db_table
+        # VACUUM cannot run inside a transaction; management commands run in autocommit mode
+        with connection.cursor() as cursor:
+            cursor.execute(f'VACUUM (ANALYZE) {connection.ops.quote_name(table)}')
+        return True
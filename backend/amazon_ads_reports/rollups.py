@@ -0,0 +1,334 @@
+"""
+Pre-aggregated rollups for the ads analytics endpoints
+
+Raw DailyProductAdsData / SearchTermReportData rows are summed per tenant into
+daily and monthly buckets when a report is ingested. Summary queries then read
+monthly buckets for whole months in the requested range and daily buckets for
+the partial months at either end, so a year of data is ~12 rows per entity
+instead of ~365 raw rows.
+
+Months pruned from the raw tables by retention are never rebuilt: their
+buckets are the only complete copy left, and any rows re-ingested for them
+since are partial.
+"""
+import calendar
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from .models import (
+    Tenant, DailyProductAdsData, SearchTermReportData, PrunedAdsMonth,
+    CampaignPerformanceRollup, AsinPerformanceRollup, SearchTermRollup
+)
+
+logger = logging.getLogger(__name__)
+
+# Rollup definitions: target model, raw source model (and its analytics dataset
+# key, under which retention records pruned months), grouping dimensions,
+# summed metrics, extra filters on the source and derived percentage metrics
+# as (numerator, denominator) pairs
+ROLLUP_SPECS = {
+    'campaign': {
+        'model': CampaignPerformanceRollup,
+        'source': DailyProductAdsData,
+        'dataset': 'product_ads',
+        'dimensions': ('campaign_id', 'campaign_name'),
+        'metrics': (
+            'impressions', 'clicks', 'spend', 'sales_1d', 'sales_7d', 'sales_30d',
+            'units_sold_clicks_30d', 'purchases_30d',
+        ),
+        'source_filters': {},
+        'ratios': {
+            'ctr': ('clicks', 'impressions'),
+            'acos_7d': ('spend', 'sales_7d'),
+        },
+    },
+    'asin': {
+        'model': AsinPerformanceRollup,
+        'source': DailyProductAdsData,
+        'dataset': 'product_ads',
+        'dimensions': ('advertised_asin', 'advertised_sku'),
+        'metrics': (
+            'impressions', 'clicks', 'spend', 'sales_1d', 'sales_7d', 'sales_30d',
+            'units_sold_clicks_30d', 'purchases_30d',
+        ),
+        'source_filters': {'advertised_asin__isnull': False},
+        'ratios': {
+            'ctr': ('clicks', 'impressions'),
+            'acos_7d': ('spend', 'sales_7d'),
+        },
+    },
+    'search_term': {
+        'model': SearchTermRollup,
+        'source': SearchTermReportData,
+        'dataset': 'search_terms',
+        'dimensions': ('query',),
+        'metrics': (
+            'impressions', 'clicks', 'cost', 'conversions',
+            'sales_7d', 'sales_14d', 'sales_30d',
+        ),
+        'source_filters': {},
+        'ratios': {
+            'ctr': ('clicks', 'impressions'),
+            'conversion_rate': ('conversions', 'clicks'),
+            'acos_7d': ('cost', 'sales_7d'),
+        },
+    },
+}
+
+# Which rollups are fed by which report type
+REPORT_TYPE_ROLLUPS = {
+    'daily-product-ads': ('campaign', 'asin'),
+    'search-term': ('search_term',),
+}
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def _month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def _iter_months(start_date, end_date):
+    """Yield (month_start, month_end) for every month touching the range"""
+    current = _month_start(start_date)
+    while current <= end_date:
+        yield current, _month_end(current)
+        current = _month_end(current) + timedelta(days=1)
+
+
+def pruned_months(dataset, tenant_id, start_date, end_date):
+    """Starts of the months touching a range whose raw rows retention deleted"""
+    return set(PrunedAdsMonth.objects.filter(
+        tenant_id=tenant_id,
+        dataset=dataset,
+        month_start__range=[_month_start(start_date), end_date]
+    ).values_list('month_start', flat=True))
+
+
+def _unpruned_ranges(start_date, end_date, pruned):
+    """Split a date range into the runs of consecutive months not in pruned"""
+    ranges = []
+    for month_start, month_end in _iter_months(start_date, end_date):
+        if month_start in pruned:
+            continue
+        first, last = max(start_date, month_start), min(end_date, month_end)
+        if ranges and ranges[-1][1] + timedelta(days=1) == first:
+            ranges[-1] = (ranges[-1][0], last)
+        else:
+            ranges.append((first, last))
+    return ranges
+
+
+def _safe_ratio(numerator, denominator):
+    """Percentage ratio that returns 0 instead of dividing by zero"""
+    if not denominator:
+        return 0
+    return float(numerator or 0) * 100.0 / float(denominator)
+
+
+class AdsRollupService:
+    """Maintains and queries the ads rollup tables"""
+
+    @classmethod
+    def refresh_for_report(cls, report):
+        """
+        Refresh the rollups affected by an ingested report
+
+        Args:
+            report: AdsReport instance whose rows have just been stored
+
+        Returns:
+            Number of daily rollup rows written
+        """
+        kinds = REPORT_TYPE_ROLLUPS.get(report.report_type.slug, ())
+        count = 0
+        for kind in kinds:
+            count += cls.refresh_range(kind, report.tenant_id, report.start_date, report.end_date)
+        return count
+
+    @classmethod
+    def refresh_range(cls, kind, tenant_id, start_date, end_date):
+        """
+        Rebuild daily rollups for a date range and the monthly rollups of every month it touches
+
+        Months pruned by retention are left as they are.
+
+        Args:
+            kind: Rollup key from ROLLUP_SPECS
+            tenant_id: Tenant primary key
+            start_date: First day to rebuild (datetime.date)
+            end_date: Last day to rebuild (datetime.date)
+
+        Returns:
+            Number of daily rollup rows written
+        """
+        spec = ROLLUP_SPECS[kind]
+        model = spec['model']
+        dimensions = spec['dimensions']
+        metrics = spec['metrics']
+
+        pruned = pruned_months(spec['dataset'], tenant_id, start_date, end_date)
+        if pruned:
+            logger.info(f"Skipping {kind} rollups of pruned months {sorted(pruned)} for tenant {tenant_id}")
+            return sum(
+                cls.refresh_range(kind, tenant_id, first, last)
+                for first, last in _unpruned_ranges(start_date, end_date, pruned)
+            )
+
+        with transaction.atomic():
+            # Serialise refreshes per tenant: two ingestions touching the same
+            # range would otherwise both delete and then both insert buckets
+            list(Tenant.objects.select_for_update().filter(pk=tenant_id).values_list('pk', flat=True))
+
+            # Daily buckets straight from the raw rows
+            model.objects.filter(
+                tenant_id=tenant_id,
+                period='DAY',
+                period_start__range=[start_date, end_date]
+            ).delete()
+
+            daily_rows = spec['source'].objects.filter(
+                tenant_id=tenant_id,
+                date__range=[start_date, end_date],
+                **spec['source_filters']
+            ).values('date', *dimensions).annotate(
+                **{f'total_{m}': Sum(m) for m in metrics}
+            ).order_by()
+
+            daily = [
+                model(
+                    tenant_id=tenant_id,
+                    period='DAY',
+                    period_start=row['date'],
+                    **{d: row[d] for d in dimensions},
+                    **{m: row[f'total_{m}'] or 0 for m in metrics}
+                )
+                for row in daily_rows
+            ]
+            model.objects.bulk_create(daily, batch_size=1000)
+
+            # Monthly buckets from the daily buckets of each touched month
+            for month_start, month_end in _iter_months(start_date, end_date):
+                model.objects.filter(
+                    tenant_id=tenant_id,
+                    period='MONTH',
+                    period_start=month_start
+                ).delete()
+
+                monthly_rows = model.objects.filter(
+                    tenant_id=tenant_id,
+                    period='DAY',
+                    period_start__range=[month_start, month_end]
+                ).values(*dimensions).annotate(
+                    **{f'total_{m}': Sum(m) for m in metrics}
+                ).order_by()
+
+                model.objects.bulk_create([
+                    model(
+                        tenant_id=tenant_id,
+                        period='MONTH',
+                        period_start=month_start,
+                        **{d: row[d] for d in dimensions},
+                        **{m: row[f'total_{m}'] or 0 for m in metrics}
+                    )
+                    for row in monthly_rows
+                ], batch_size=1000)
+
+        logger.info(f"Refreshed {kind} rollups for tenant {tenant_id} from {start_date} to {end_date}: {len(daily)} daily rows")
+        return len(daily)
+
+    @classmethod
+    def _period_filter(cls, start_date, end_date):
+        """
+        Build a filter selecting monthly buckets for whole months and daily buckets for partial months
+
+        Returns:
+            Q object over (period, period_start)
+        """
+        full_months = []
+        condition = Q()
+        for month_start, month_end in _iter_months(start_date, end_date):
+            if start_date <= month_start and month_end <= end_date:
+                full_months.append(month_start)
+            else:
+                condition |= Q(
+                    period='DAY',
+                    period_start__range=[max(start_date, month_start), min(end_date, month_end)]
+                )
+        if full_months:
+            condition |= Q(period='MONTH', period_start__in=full_months)
+        return condition
+
+    @classmethod
+    def summarize(cls, kind, tenant_id, start_date, end_date, order_by, limit=None):
+        """
+        Aggregate metrics over a date range from the rollup tables
+
+        Args:
+            kind: Rollup key from ROLLUP_SPECS
+            tenant_id: Tenant primary key
+            start_date: Range start (datetime.date)
+            end_date: Range end (datetime.date)
+            order_by: Metric to sort by, prefix with '-' for descending
+            limit: Optional maximum number of rows
+
+        Returns:
+            List of dicts with the dimensions, summed metrics and derived ratios
+        """
+        spec = ROLLUP_SPECS[kind]
+        dimensions = spec['dimensions']
+        metrics = spec['metrics']
+
+        descending = order_by.startswith('-')
+        order_field = f"{'-' if descending else ''}total_{order_by.lstrip('-')}"
+
+        queryset = spec['model'].objects.filter(
+            cls._period_filter(start_date, end_date),
+            tenant_id=tenant_id
+        ).values(*dimensions).annotate(
+            **{f'total_{m}': Sum(m) for m in metrics}
+        ).order_by(order_field)
+
+        if limit:
+            queryset = queryset[:limit]
+
+        results = []
+        for row in queryset:
+            item = {d: row[d] for d in dimensions}
+            item.update({m: row[f'total_{m}'] or 0 for m in metrics})
+            for name, (numerator, denominator) in spec['ratios'].items():
+                item[name] = _safe_ratio(item[numerator], item[denominator])
+            results.append(item)
+
+        return results
+
+    @classmethod
+    def rebuild_tenant(cls, tenant_id, kinds=None):
+        """
+        Rebuild all rollups for a tenant from raw data (backfill / repair)
+
+        Args:
+            tenant_id: Tenant primary key
+            kinds: Optional iterable of rollup keys, defaults to all
+
+        Returns:
+            Dict of rollup key to number of daily rows written
+        """
+        results = {}
+        for kind in kinds or ROLLUP_SPECS.keys():
+            source = ROLLUP_SPECS[kind]['source']
+            dates = source.objects.filter(tenant_id=tenant_id).order_by('date').values_list('date', flat=True)
+            first = dates.first()
+            last = dates.last()
+            results[kind] = 0
+            if not first:
+                continue
+            # One month per transaction to keep locks short on large tenants
+            for month_start, month_end in _iter_months(first, last):
+                results[kind] += cls.refresh_range(kind, tenant_id, month_start, month_end)
+        return results
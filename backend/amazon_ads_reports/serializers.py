@@ -42,11 +42,15 @@ class AdsReportSerializer(serializers.ModelSerializer):
             'id', 'tenant', 'tenant_name', 'report_type', 'report_type_name',
             'amazon_report_id', 'start_date', 'end_date', 'selected_metrics',
             'group_by', 'status', 'download_url', 'error_message', 'is_stored',
-            'rows_processed', 'created_at', 'updated_at', 'completed_at'
+            'rows_processed', 'archive_format', 'archive_rows', 'archive_size', 'archived_at',
+            'coalesced_count', 'next_poll_at', 'poll_count',
+            'created_at', 'updated_at', 'completed_at'
         ]
         read_only_fields = [
             'id', 'amazon_report_id', 'status', 'download_url', 'error_message',
-            'is_stored', 'rows_processed', 'created_at', 'updated_at', 'completed_at'
+            'is_stored', 'rows_processed', 'archive_format', 'archive_rows', 'archive_size',
+            'archived_at', 'coalesced_count', 'next_poll_at', 'poll_count',
+            'created_at', 'updated_at', 'completed_at'
         ]
     
     def get_tenant_name(self, obj):
@@ -125,6 +129,7 @@ class ReportRequestSerializer(serializers.Serializer):
         child=serializers.CharField(),
         required=False
     )
+    force_new = serializers.BooleanField(default=False)
     
     def validate(self, data):
         if data['start_date'] > data['end_date']:
@@ -138,4 +143,36 @@ class DateRangeSerializer(serializers.Serializer):
     def validate(self, data):
         if data['start_date'] > data['end_date']:
             raise serializers.ValidationError("End date must be after start date")
-        return data 
\ No newline at end of file
+        return data 
+
+class OptimisationRequestSerializer(DateRangeSerializer):
+    tenant_id = serializers.UUIDField()
+    target_acos = serializers.FloatField(default=0.30, min_value=0.01)
+
+class OptimisationFramesSerializer(DateRangeSerializer):
+    tenant_id = serializers.UUIDField()
+    frame = serializers.ChoiceField(choices=['search_terms', 'bulk'], default='search_terms')
+    columns = serializers.ListField(child=serializers.CharField(), required=False)
+    limit = serializers.IntegerField(default=100, min_value=1, max_value=1000)
+
+class AnalyticsTimeseriesSerializer(DateRangeSerializer):
+    tenant_id = serializers.UUIDField()
+    dataset = serializers.ChoiceField(choices=['product_ads', 'search_terms'], default='product_ads')
+    interval = serializers.ChoiceField(choices=['day', 'week', 'month'], default='day')
+    metrics = serializers.ListField(child=serializers.CharField(), required=False)
+    group_by = serializers.CharField(required=False)
+    filters = serializers.DictField(child=serializers.CharField(), required=False)
+    top = serializers.IntegerField(required=False, min_value=1, max_value=500)
+
+class AnalyticsBreakdownSerializer(DateRangeSerializer):
+    tenant_id = serializers.UUIDField()
+    dataset = serializers.ChoiceField(choices=['product_ads', 'search_terms'], default='product_ads')
+    dimensions = serializers.ListField(child=serializers.CharField(), min_length=1)
+    metrics = serializers.ListField(child=serializers.CharField(), required=False)
+    order_by = serializers.CharField(required=False)
+    filters = serializers.DictField(child=serializers.CharField(), required=False)
+    limit = serializers.IntegerField(default=100, min_value=1, max_value=10000)
+
+class AnalyticsCoverageSerializer(serializers.Serializer):
+    tenant_id = serializers.UUIDField()
+    dataset = serializers.ChoiceField(choices=['product_ads', 'search_terms'], default='product_ads')
@@ -1,26 +1,47 @@
-import requests
+import os
 import logging
 import json
-import gzip
 import time
-import random
+import hashlib
 from datetime import datetime, timedelta
 import pandas as pd
-from io import BytesIO
 from django.utils import timezone
 from django.conf import settings
-from django.db import transaction
-from django.db.models import Q
-import zipfile
+from django.db import transaction, IntegrityError
+from django.db.models import Q, F
 import numpy as np
 
+from core import http_client, downloads
+from core.dispatch import KeyedRateLimiter, dispatch_grouped
 from .models import (
     Tenant, AmazonAdsCredential, ReportType, AdsReport, 
     DailyProductAdsData, SearchTermReportData, ReportSchedule
 )
+from .rollups import AdsRollupService
+from .archive import ReportArchiveService, is_wrapped_payload
+from .polling import ReportPollingPlanner
+from .analytics import AdsAnalyticsStore
 
 logger = logging.getLogger(__name__)
 
+# Records decoded and handed to a report processor at a time
+INGEST_BATCH_ROWS = 5000
+
+# Columns refreshed when an ingested search term row matches an existing row's natural key
+SEARCH_TERM_UPSERT_FIELDS = [
+    'report', 'campaign_name', 'ad_group_name', 'impressions', 'clicks', 'click_through_rate',
+    'cost', 'cost_per_click', 'conversions', 'conversion_rate', 'sales_7d', 'sales_14d', 'sales_30d',
+    'updated_at',
+]
+
+def _id_text(value):
+    """An ID column value as text; pandas turns integer IDs into floats when the column has gaps"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
 class AmazonAdsAuth:
     """Authentication service for Amazon Ads API"""
     
@@ -62,7 +83,7 @@ class AmazonAdsAuth:
             logger.debug(f"Client ID: {credential.client_id}")
             logger.debug(f"Profile ID: {credential.profile_id}")
             
-            response = requests.post(url, data=form_data)
+            response = http_client.post(url, region=credential.region, data=form_data)
             logger.debug(f"Token refresh status code: {response.status_code}")
             
             if response.status_code != 200:
@@ -129,10 +150,115 @@ class AmazonAdsReportService:
     """Service for managing Amazon Ads reports"""
     
     @classmethod
-    def request_report(cls, credential, report_type, start_date, end_date, tenant, user=None, group_by=None):
+    def report_request_key(cls, credential, report_type, start_date, end_date, group_by):
+        """
+        Fingerprint of a report request; equal keys mean Amazon would produce the same report
+        
+        Args:
+            credential: AmazonAdsCredential instance
+            report_type: ReportType instance
+            start_date: Start date (datetime.date)
+            end_date: End date (datetime.date)
+            group_by: Effective groupBy list sent to Amazon
+            
+        Returns:
+            Hex digest string
+        """
+        fingerprint = json.dumps([
+            credential.profile_id,
+            credential.region,
+            str(report_type.id),
+            sorted(report_type.metrics or []),
+            start_date.isoformat(),
+            end_date.isoformat(),
+            sorted(group_by or []),
+        ])
+        return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def _stale_cutoff(cls):
+        return timezone.now() - timedelta(hours=getattr(settings, 'AMAZON_ADS_REPORT_STALE_HOURS', 24))
+    
+    @classmethod
+    def fail_stale_reports(cls, tenant=None, request_key=None):
+        """
+        Mark in-flight reports older than AMAZON_ADS_REPORT_STALE_HOURS as failed
+        
+        A report Amazon never finishes would otherwise hold its request key (see the
+        unique_inflight_ads_report_request constraint) and block equivalent requests.
+        
+        Args:
+            tenant: Optional Tenant instance to limit the update to
+            request_key: Optional request key to limit the update to
+            
+        Returns:
+            Number of reports marked as failed
+        """
+        stale = AdsReport.objects.filter(
+            status__in=['PENDING', 'IN_PROGRESS'],
+            created_at__lt=cls._stale_cutoff()
+        )
+        if tenant is not None:
+            stale = stale.filter(tenant=tenant)
+        if request_key is not None:
+            stale = stale.filter(request_key=request_key)
+        count = stale.update(
+            status='FAILED',
+            error_message=f"Report did not complete within {getattr(settings, 'AMAZON_ADS_REPORT_STALE_HOURS', 24)} hours",
+            next_poll_at=None,
+            updated_at=timezone.now()
+        )
+        if count:
+            logger.warning(f"Marked {count} stale in-flight reports as failed")
+        return count
+    
+    @classmethod
+    def find_reusable_report(cls, tenant, request_key):
+        """
+        Find an in-flight or recently completed report for the same request
+        
+        A completed report is only reused when its data was stored without
+        errors; one whose download or ingest failed is never retried, so
+        sharing it would hand out empty results.
+        
+        Args:
+            tenant: Tenant instance
+            request_key: Key from report_request_key
+            
+        Returns:
+            AdsReport instance or None
+        """
+        reuse_since = timezone.now() - timedelta(hours=getattr(settings, 'AMAZON_ADS_REPORT_REUSE_HOURS', 12))
+        return AdsReport.objects.filter(
+            Q(status__in=['PENDING', 'IN_PROGRESS'], created_at__gte=cls._stale_cutoff()) |
+            (Q(status='COMPLETED', is_stored=True, created_at__gte=reuse_since) &
+             (Q(error_message__isnull=True) | Q(error_message=''))),
+            tenant=tenant,
+            request_key=request_key
+        ).order_by('-created_at').first()
+    
+    @classmethod
+    def _attach_to_report(cls, report):
+        """Record another requester on an existing report and return it"""
+        AdsReport.objects.filter(pk=report.pk).update(
+            coalesced_count=F('coalesced_count') + 1,
+            last_requested_at=timezone.now()
+        )
+        report.refresh_from_db()
+        report.coalesced = True
+        logger.info(f"Coalesced request onto existing report {report.id} ({report.status}, {report.coalesced_count} extra requesters)")
+        return report
+    
+    @classmethod
+    def request_report(cls, credential, report_type, start_date, end_date, tenant, user=None, group_by=None, force_new=False):
         """
         Request a report from Amazon Ads API
         
+        Equivalent requests (same profile, report type, metrics, date range and
+        groupBy) are coalesced: if a matching report is pending, in progress or
+        completed and stored within AMAZON_ADS_REPORT_REUSE_HOURS, that report is
+        returned instead of asking Amazon for a new one.
+        
         Args:
             credential: AmazonAdsCredential instance
             report_type: ReportType instance
@@ -141,9 +267,10 @@ class AmazonAdsReportService:
             tenant: Tenant instance
             user: Optional user requesting the report
             group_by: Optional list of group_by parameters
+            force_new: Do not reuse completed reports (an identical in-flight request is still shared)
             
         Returns:
-            AdsReport instance
+            AdsReport instance (with `coalesced` True when an existing report was reused)
         """
         # Prepare report configuration
         url = "https://advertising-api-eu.amazon.com/reporting/reports"
@@ -189,6 +316,16 @@ class AmazonAdsReportService:
                 request_body["configuration"]["groupBy"] = ["advertiser"]
                 logger.info("Using default groupBy ['advertiser'] for spCampaignPlacement")
         
+        effective_group_by = request_body["configuration"].get("groupBy", [])
+        request_key = cls.report_request_key(credential, report_type, start_date, end_date, effective_group_by)
+        
+        existing = cls.find_reusable_report(tenant, request_key)
+        if existing and (not force_new or existing.status != 'COMPLETED'):
+            return cls._attach_to_report(existing)
+        
+        # Release the request key from a report that got stuck in flight
+        cls.fail_stale_reports(tenant, request_key)
+        
         # Get a fresh access token
         access_token = AmazonAdsAuth.get_access_token(credential)
         
@@ -201,17 +338,27 @@ class AmazonAdsReportService:
             "Accept": "application/json",
         }
         
-        # Create report instance
-        report = AdsReport.objects.create(
-            tenant=tenant,
-            report_type=report_type,
-            start_date=start_date,
-            end_date=end_date,
-            selected_metrics=report_type.metrics,
-            group_by=group_by if group_by else getattr(report_type, 'default_group_by', None),
-            status='PENDING',
-            created_by=user
-        )
+        # Create report instance. At most one in-flight report per tenant and request
+        # key is allowed by a partial unique constraint, so a concurrent identical request
+        # lands on the report that won the race
+        try:
+            with transaction.atomic():
+                report = AdsReport.objects.create(
+                    tenant=tenant,
+                    report_type=report_type,
+                    start_date=start_date,
+                    end_date=end_date,
+                    selected_metrics=report_type.metrics,
+                    group_by=effective_group_by,
+                    status='PENDING',
+                    created_by=user,
+                    request_key=request_key
+                )
+        except IntegrityError:
+            existing = cls.find_reusable_report(tenant, request_key)
+            if not existing:
+                raise
+            return cls._attach_to_report(existing)
         
         try:
             # Print debug info
@@ -220,7 +367,7 @@ class AmazonAdsReportService:
             logger.debug(f"Request body: {request_body}")
             
             # Make API request
-            response = requests.post(url, headers=headers, json=request_body)
+            response = http_client.post(url, region=credential.region, headers=headers, json=request_body)
             logger.debug(f"Response status code: {response.status_code}")
             
             if response.status_code != 200:
@@ -245,6 +392,7 @@ class AmazonAdsReportService:
             # Update report with Amazon report ID
             report.amazon_report_id = result.get('reportId')
             report.status = 'IN_PROGRESS'
+            ReportPollingPlanner.schedule_first_poll(report, credential.region)
             report.save()
             
             logger.info(f"Successfully requested report: {report.amazon_report_id}")
@@ -267,6 +415,9 @@ class AmazonAdsReportService:
         """
         Check the status of a report
         
+        Reports still in progress get their next poll time from the polling
+        planner; completed reports record their completion time for it.
+        
         Args:
             credential: AmazonAdsCredential instance
             report: AdsReport instance
@@ -275,7 +426,18 @@ class AmazonAdsReportService:
             Updated report status
         """
         if not report.amazon_report_id:
-            logger.error(f"Cannot check status for report {report.id} - no Amazon report ID")
+            # request_report stores the ID as soon as Amazon accepts the request; a
+            # report still without one after the longest poll interval never will
+            request_timeout = timedelta(seconds=getattr(settings, 'AMAZON_ADS_POLL_MAX_SECONDS', 900))
+            if report.created_at and report.created_at <= timezone.now() - request_timeout:
+                logger.error(f"Cannot check status for report {report.id} - no Amazon report ID, marking as failed")
+                report.status = 'FAILED'
+                report.error_message = "Report request was never accepted by Amazon (no report ID)"
+                report.next_poll_at = None
+                report.save(update_fields=['status', 'error_message', 'next_poll_at', 'updated_at'])
+            else:
+                logger.warning(f"Report {report.id} has no Amazon report ID yet, checking again later")
+                ReportPollingPlanner.schedule_next_poll(report, credential.region)
             return report
         
         url = f"https://advertising-api-eu.amazon.com/reporting/reports/{report.amazon_report_id}"
@@ -293,11 +455,12 @@ class AmazonAdsReportService:
         }
         
         try:
-            response = requests.get(url, headers=headers)
+            response = http_client.get(url, region=credential.region, headers=headers)
             logger.debug(f"Status check response code: {response.status_code}")
             
             if response.status_code != 200:
                 logger.error(f"Error checking report status: {response.status_code} - {response.text}")
+                ReportPollingPlanner.schedule_next_poll(report, credential.region)
                 return report
             
             result = response.json()
@@ -307,6 +470,8 @@ class AmazonAdsReportService:
             
             # Update report
             report.status = status
+            report.poll_count += 1
+            report.next_poll_at = None
             
             if status == 'COMPLETED':
                 # Look for download URL in various locations in the response
@@ -326,14 +491,20 @@ class AmazonAdsReportService:
                 report.completed_at = timezone.now()
             elif status == 'FAILED':
                 report.error_message = result.get('statusDetails', 'Report generation failed')
+            else:
+                report.next_poll_at = ReportPollingPlanner.next_poll_at(report, credential.region)
                 
             report.save()
             
+            if status == 'COMPLETED':
+                ReportPollingPlanner.record_completion(report, credential.region, result)
+            
             logger.info(f"Report {report.amazon_report_id} status: {status}")
             return report
             
         except Exception as e:
             logger.error(f"Error checking report status: {str(e)}")
+            ReportPollingPlanner.schedule_next_poll(report, credential.region)
             return report
     
     @classmethod
@@ -352,191 +523,181 @@ class AmazonAdsReportService:
             logger.error(f"Cannot download report {report.id} - not completed or no URL")
             return False
         
+        path = downloads.download_path(f'ads_report_{report.id}')
         try:
             logger.info(f"Starting download for report {report.id}")
             logger.info(f"Download URL: {report.download_url[:100]}...{report.download_url[-50:] if len(report.download_url) > 150 else ''}")
             
-            # Download report with retry logic
-            MAX_RETRIES = 3
-            RETRY_BACKOFF = 2  # seconds
-            retries = 0
-            
-            while retries < MAX_RETRIES:
-                try:
-                    # Set reasonable timeouts (connect_timeout, read_timeout)
-                    logger.info(f"Download attempt {retries+1}/{MAX_RETRIES}")
-                    response = requests.get(
-                        report.download_url, 
-                        timeout=(10, 300),  # 10s connect, 300s read
-                        stream=True  # Use streaming to handle large files
-                    )
-                    
-                    if response.status_code != 200:
-                        logger.error(f"Failed to download report: {response.status_code} - {response.text}")
-                        retries += 1
-                        if retries >= MAX_RETRIES:
-                            report.error_message = f"Download failed after {MAX_RETRIES} attempts: HTTP {response.status_code}"
-                            report.save(update_fields=['error_message', 'updated_at'])
-                            return False
-                        time.sleep(RETRY_BACKOFF * retries)
-                        continue
-                    
-                    # Stream the response content into memory to avoid loading entire file at once
-                    content = BytesIO()
-                    total_size = 0
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            content.write(chunk)
-                            total_size += len(chunk)
-                    
-                    content.seek(0)
-                    logger.info(f"Successfully downloaded report: {total_size} bytes")
-                    
-                    # Check if we actually got any data
-                    if total_size == 0:
-                        report.error_message = "Downloaded file is empty (0 bytes)"
-                        report.save(update_fields=['error_message', 'updated_at'])
-                        return False
-                    
-                    # We've successfully downloaded the file, break out of retry loop
-                    break
-                    
-                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, 
-                        ConnectionResetError, ConnectionAbortedError) as conn_error:
-                    retries += 1
-                    logger.warning(f"Connection error during download (attempt {retries}/{MAX_RETRIES}): {str(conn_error)}")
-                    if retries >= MAX_RETRIES:
-                        logger.error(f"Max retries exceeded for downloading report")
-                        report.error_message = f"Connection error: {str(conn_error)}"
-                        report.save(update_fields=['error_message', 'updated_at'])
-                        raise
-                    time.sleep(RETRY_BACKOFF * retries)
-            
-            # Decompress and parse the report
+            # Stream the report to disk. HTTP-level retries (throttling, 5xx) are handled by the
+            # shared client; dropped connections resume from the last byte written, as does a
+            # partial file left behind by an earlier run
             try:
-                logger.info(f"Starting decompression for report {report.id}")
-                compressed_data = content  # Use the streamed content
-                # Try GZIP first
-                try:
-                    logger.debug("Attempting to decompress as GZIP")
-                    # Use direct gzip decompression like in the working implementation
-                    decompressed_data = gzip.decompress(compressed_data.getvalue()).decode('utf-8')
-                    report_data = json.loads(decompressed_data)
-                    logger.info(f"Successfully decompressed as GZIP and parsed report data: {len(report_data)} records")
-                except Exception as gzip_error:
-                    logger.debug(f"GZIP decompression failed: {str(gzip_error)}, trying ZIP format")
-                    # Reset the file pointer
-                    compressed_data.seek(0)
-                    # Try regular ZIP
-                    try:
-                        logger.debug("Attempting to decompress as ZIP")
-                        # Save content to temp file for debugging
-                        with open("report_debug.zip", "wb") as f:
-                            f.write(compressed_data.getvalue())
-                        logger.debug("Saved compressed data to report_debug.zip for inspection")
-                        
-                        compressed_data.seek(0)
-                        with zipfile.ZipFile(compressed_data) as zip_ref:
-                            # Get the first file in the ZIP archive
-                            file_name = zip_ref.namelist()[0]
-                            logger.debug(f"Found file in ZIP: {file_name}")
-                            with zip_ref.open(file_name) as file:
-                                decompressed_data = file.read()
-                                # Log the first part of the decompressed data
-                                logger.debug(f"ZIP content preview: {decompressed_data[:200]}")
-                                try:
-                                    report_data = json.loads(decompressed_data)
-                                    # Check if report_data is empty
-                                    if isinstance(report_data, list) and len(report_data) == 0:
-                                        logger.warning("ZIP contains valid JSON but the data array is empty")
-                                    elif isinstance(report_data, dict) and len(report_data) == 0:
-                                        logger.warning("ZIP contains valid JSON but the data object is empty")
-                                    else:
-                                        # Log data structure for debugging
-                                        data_type = type(report_data).__name__
-                                        if isinstance(report_data, list):
-                                            logger.info(f"ZIP contains JSON array with {len(report_data)} items")
-                                            if len(report_data) > 0:
-                                                logger.info(f"First item structure: {json.dumps(report_data[0], indent=2)[:500]}...")
-                                                logger.info(f"Keys in first item: {list(report_data[0].keys()) if isinstance(report_data[0], dict) else 'Not a dict'}")
-                                        elif isinstance(report_data, dict):
-                                            logger.info(f"ZIP contains JSON object with keys: {list(report_data.keys())}")
-                                            # If 'data' field exists, log its structure
-                                            if 'data' in report_data:
-                                                data = report_data['data']
-                                                logger.info(f"'data' field contains: {type(data).__name__}")
-                                                if isinstance(data, list):
-                                                    logger.info(f"'data' array length: {len(data)}")
-                                                    if len(data) > 0:
-                                                        logger.info(f"First item in 'data': {json.dumps(data[0], indent=2)[:500]}...")
-                                    logger.info(f"Successfully decompressed as ZIP and parsed report data: {data_type} with {len(report_data) if isinstance(report_data, (list, dict)) else 'N/A'} items/keys")
-                                except json.JSONDecodeError as json_error:
-                                    logger.error(f"Error decoding JSON from ZIP: {str(json_error)}")
-                                    logger.error(f"First 500 bytes of content: {decompressed_data[:500]}")
-                                    report.error_message = f"JSON parsing error: {str(json_error)}"
-                                    report.save(update_fields=['error_message', 'updated_at'])
-                                    raise
-                    except Exception as zip_error:
-                        logger.error(f"ZIP decompression failed: {str(zip_error)}")
-                        report.error_message = f"Decompression error: {str(zip_error)}"
-                        report.save(update_fields=['error_message', 'updated_at'])
-                        # Try direct JSON as last resort
-                        try:
-                            logger.debug("Attempting to parse as direct JSON")
-                            compressed_data.seek(0)
-                            raw_content = compressed_data.read().decode('utf-8')
-                            report_data = json.loads(raw_content)
-                            logger.info(f"Successfully parsed as direct JSON: {type(report_data).__name__}")
-                        except Exception as json_error:
-                            logger.error(f"Direct JSON parsing failed: {str(json_error)}")
-                            report.error_message = f"All decompression methods failed. Last error: {str(json_error)}"
-                            report.save(update_fields=['error_message', 'updated_at'])
-                            raise Exception(f"Failed to decompress: GZIP error: {str(gzip_error)}, ZIP error: {str(zip_error)}, JSON error: {str(json_error)}")
-            except Exception as e:
-                logger.error(f"Error decompressing or parsing report data: {str(e)}")
-                report.error_message = f"Processing error: {str(e)}"
+                total_size = downloads.download_to_file(report.download_url, path)
+            except downloads.DownloadError as download_error:
+                logger.error(f"Failed to download report {report.id}: {str(download_error)}")
+                report.error_message = f"Download failed: {str(download_error)}"
                 report.save(update_fields=['error_message', 'updated_at'])
                 return False
             
-            # Process based on report type
-            logger.info(f"Starting data processing for report {report.id}")
-            report_type_slug = report.report_type.slug
-            logger.info(f"Processing report of type: {report_type_slug}")
+            logger.info(f"Successfully downloaded report: {total_size} bytes")
             
-            try:
-                rows = 0
-                if report_type_slug == 'daily-product-ads':
-                    rows = cls._process_daily_product_ads_report(report, report_data)
-                    logger.info(f"Processed {rows} rows for daily product ads report")
-                elif report_type_slug == 'search-term':
-                    rows = cls._process_search_term_report(report, report_data)
-                    logger.info(f"Processed {rows} rows for search term report")
-                else:
-                    # Store raw data for report types without specific processors
-                    rows = cls._process_generic_report(report, report_data)
-                    logger.info(f"Stored raw data for {report_type_slug} report with {rows} records")
-                
-                if rows == 0:
-                    logger.warning(f"Processed 0 rows for report {report.id}")
-                
-                # Mark report as stored
-                report.is_stored = True
-                report.save(update_fields=['is_stored', 'updated_at'])
-                
-                return True
-                
-            except Exception as e:
-                logger.error(f"Error in report processing: {str(e)}")
-                report.error_message = f"Data processing error: {str(e)}"
+            # Check if we actually got any data
+            if total_size == 0:
+                os.remove(path)
+                report.error_message = "Downloaded file is empty (0 bytes)"
                 report.save(update_fields=['error_message', 'updated_at'])
                 return False
             
+            try:
+                # Keep the decompressed payload so diagnostics and reprocessing
+                # never need to download the report again
+                try:
+                    ReportArchiveService.archive_file(report, path)
+                except Exception as archive_error:
+                    logger.error(f"Error archiving report {report.id}: {str(archive_error)}")
+                
+                # Decompress (GZIP, ZIP or plain JSON) and decode straight from the file,
+                # handing the processor a batch of records at a time
+                logger.info(f"Starting decompression for report {report.id}")
+                with downloads.open_decompressed(path) as f:
+                    return cls.store_report_batches(report, cls._record_batches(f))
+            finally:
+                # Processed or unreadable, the complete file is not resumed; start over next time
+                os.remove(path)
+            
         except Exception as e:
             logger.error(f"Error downloading and processing report: {str(e)}")
             report.error_message = f"General error: {str(e)}"
             report.save(update_fields=['error_message', 'updated_at'])
             return False
     
+    @staticmethod
+    def _record_batches(f):
+        """
+        Decode a report document into batches of records for the processors
+        
+        Args:
+            f: Binary file-like object with the decompressed JSON document
+            
+        Yields:
+            Lists of up to INGEST_BATCH_ROWS records, or the whole decoded payload when
+            the document wraps its records in an object (see archive.WRAPPER_KEYS)
+        """
+        for batch in downloads.iter_json_batches(f, INGEST_BATCH_ROWS):
+            if len(batch) == 1 and is_wrapped_payload(batch[0]):
+                yield batch[0]
+            else:
+                yield batch
+    
+    @classmethod
+    def store_report_data(cls, report, report_data):
+        """
+        Store decoded report data with the processor for its report type
+        
+        Args:
+            report: AdsReport instance
+            report_data: Decoded JSON data from the report (or its archive)
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if isinstance(report_data, list):
+            batches = [report_data[i:i + INGEST_BATCH_ROWS] for i in range(0, len(report_data), INGEST_BATCH_ROWS)]
+        else:
+            batches = [report_data]
+        return cls.store_report_batches(report, batches)
+    
+    @classmethod
+    def store_report_batches(cls, report, batches):
+        """
+        Store report data batch by batch with the processor for its report type
+        
+        Args:
+            report: AdsReport instance
+            batches: Iterable of record lists (or of whole decoded payloads)
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        logger.info(f"Starting data processing for report {report.id}")
+        report_type_slug = report.report_type.slug
+        logger.info(f"Processing report of type: {report_type_slug}")
+        
+        if report_type_slug == 'daily-product-ads':
+            processor = cls._process_daily_product_ads_report
+        elif report_type_slug == 'search-term':
+            processor = cls._process_search_term_report
+        else:
+            # Store raw data for report types without specific processors
+            processor = cls._process_generic_report
+        
+        try:
+            rows = 0
+            for batch in batches:
+                rows += processor(report, batch)
+            logger.info(f"Processed {rows} rows for {report_type_slug} report")
+            
+            if rows == 0:
+                logger.warning(f"Processed 0 rows for report {report.id}")
+            
+            # Mark report as stored, with the total over all batches
+            report.rows_processed = rows
+            report.is_stored = True
+            report.save(update_fields=['rows_processed', 'is_stored', 'updated_at'])
+            
+            # Keep the analytics rollups in step with the raw data
+            try:
+                AdsRollupService.refresh_for_report(report)
+            except Exception as rollup_error:
+                logger.error(f"Error refreshing rollups for report {report.id}: {str(rollup_error)}")
+            try:
+                AdsAnalyticsStore.refresh_for_report(report)
+            except Exception as analytics_error:
+                logger.error(f"Error refreshing analytics store for report {report.id}: {str(analytics_error)}")
+            
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error in report processing: {str(e)}")
+            report.error_message = f"Data processing error: {str(e)}"
+            report.save(update_fields=['error_message', 'updated_at'])
+            return False
+    
+    @classmethod
+    def reprocess_from_archive(cls, report):
+        """
+        Re-run processing for a report from its raw archive, without downloading it again
+        
+        Args:
+            report: AdsReport instance
+            
+        Returns:
+            True if successful, False if there is no usable archive or processing failed
+        """
+        report_data = ReportArchiveService.load_payload(report)
+        if report_data is None:
+            logger.warning(f"No readable archive for report {report.id}")
+            return False
+        
+        logger.info(f"Reprocessing report {report.id} from archive")
+        # Replace rather than merge the rows this report stored previously. Delete and
+        # re-store in one transaction so readers never see the report without rows and a
+        # failed replay leaves the previous rows in place
+        report.error_message = None
+        with transaction.atomic():
+            report.daily_product_ads_data.all().delete()
+            report.search_term_data.all().delete()
+            stored = cls.store_report_data(report, report_data)
+            # The processors log and swallow row errors, reporting them on the report
+            if not stored or report.error_message:
+                transaction.set_rollback(True)
+        
+        if not stored or report.error_message:
+            logger.error(f"Reprocessing report {report.id} failed, kept the previously stored rows: {report.error_message}")
+            report.save(update_fields=['error_message', 'updated_at'])
+            return False
+        return True
+    
     @classmethod
     def _process_daily_product_ads_report(cls, report, report_data):
         """
@@ -863,18 +1024,32 @@ class AmazonAdsReportService:
                 chunk = df.iloc[i:i+chunk_size]
                 
                 # Process each record in the chunk
-                records = []
+                records = {}
                 for _, row in chunk.iterrows():
                     try:
                         # Create model instances but don't save yet
+                        date_obj = datetime.strptime(row.get('date', ''), '%Y-%m-%d').date()
+                        # Auto and product targeting rows have no keyword text, so the keyword /
+                        # target ID is part of the key to tell them apart
+                        keyword_id = _id_text(row.get('keywordId'))
                         record = SearchTermReportData(
                             tenant=tenant,
                             report=report,
-                            date=datetime.strptime(row.get('date', ''), '%Y-%m-%d').date(),
+                            date=date_obj,
+                            row_key=SearchTermReportData.build_row_key(
+                                date_obj,
+                                row.get('campaignId'),
+                                row.get('adGroupId'),
+                                row.get('keywordText'),
+                                row.get('matchType'),
+                                row.get('query', ''),
+                                keyword_id=keyword_id
+                            ),
                             campaign_name=row.get('campaignName'),
                             campaign_id=row.get('campaignId'),
                             ad_group_name=row.get('adGroupName'),
                             ad_group_id=row.get('adGroupId'),
+                            keyword_id=keyword_id,
                             keyword_text=row.get('keywordText'),
                             match_type=row.get('matchType'),
                             query=row.get('query', ''),
@@ -889,17 +1064,37 @@ class AmazonAdsReportService:
                             sales_14d=row.get('sales14d', 0),
                             sales_30d=row.get('sales30d', 0),
                         )
-                        records.append(record)
+                        # A later row with the same natural key (the same row reported twice)
+                        # replaces an earlier one in the chunk; one upsert statement cannot
+                        # touch the same row twice
+                        records[record.row_key] = record
                     except Exception as e:
                         logger.error(f"Error processing search term record: {str(e)}, row: {row}")
                 
                 if records:
-                    # Bulk create records
+                    records = list(records.values())
+                    # Rows stored before the keyword / target ID was kept have it NULL and
+                    # a key without it; their re-ingested copies replace them
+                    legacy_keys = [
+                        SearchTermReportData.build_row_key(
+                            record.date, record.campaign_id, record.ad_group_id,
+                            record.keyword_text, record.match_type, record.query
+                        )
+                        for record in records if record.keyword_id
+                    ]
+                    # Upsert on the natural key so re-processed reports and overlapping
+                    # date ranges update existing rows instead of adding duplicates
                     with transaction.atomic():
                         try:
+                            if legacy_keys:
+                                SearchTermReportData.objects.filter(
+                                    tenant=tenant, keyword_id__isnull=True, row_key__in=legacy_keys
+                                ).delete()
                             SearchTermReportData.objects.bulk_create(
                                 records,
-                                ignore_conflicts=True,  # Skip duplicates based on unique constraint
+                                update_conflicts=True,
+                                unique_fields=['tenant', 'row_key'],
+                                update_fields=SEARCH_TERM_UPSERT_FIELDS,
                                 batch_size=100
                             )
                             
@@ -922,75 +1117,118 @@ class AmazonAdsReportService:
             report.save(update_fields=['error_message', 'updated_at'])
             return 0
     
+    # Per-profile spacing of report requests, shared by all scheduler threads
+    _profile_limiter = KeyedRateLimiter(
+        rate=getattr(settings, 'AMAZON_PROFILE_REQUESTS_PER_SECOND', 1),
+        burst=getattr(settings, 'AMAZON_PROFILE_REQUEST_BURST', 2)
+    )
+    
+    @classmethod
+    def _claim_due_schedules(cls, now):
+        """
+        Lock due schedules and advance their next_run so overlapping ticks never dispatch them twice
+        
+        Returns:
+            List of (schedule, due_at) tuples
+        """
+        with transaction.atomic():
+            schedules = list(
+                ReportSchedule.objects.select_for_update(skip_locked=True, of=('self',))
+                .filter(is_active=True, next_run__lte=now)
+                .select_related('tenant', 'report_type', 'created_by')
+                .order_by('next_run')
+            )
+            
+            claimed = []
+            for schedule in schedules:
+                claimed.append((schedule, schedule.next_run))
+                schedule.last_run = now
+                schedule.next_run = schedule.calculate_next_run()
+                schedule.updated_at = now
+            
+            ReportSchedule.objects.bulk_update(schedules, ['last_run', 'next_run', 'updated_at'])
+        return claimed
+    
     @classmethod
     def process_scheduled_reports(cls):
         """
         Process reports due to be generated based on schedule
         This method is designed to be called from a cron job
         
+        Due schedules are grouped by advertising profile. Profiles are dispatched
+        concurrently, and requests for the same profile are spaced by a token
+        bucket rather than fixed sleeps.
+        
         Returns:
             Number of reports generated
         """
+        started = time.monotonic()
         now = timezone.now()
-        count = 0
         
-        # Get all active schedules that are due to run (next_run <= now)
-        due_schedules = ReportSchedule.objects.filter(
-            is_active=True,
-            next_run__lte=now
-        )
+        claimed = cls._claim_due_schedules(now)
+        logger.info(f"Processing {len(claimed)} scheduled reports")
+        if not claimed:
+            return 0
+        
+        # One query for the credentials of every tenant involved
+        tenant_ids = {schedule.tenant_id for schedule, _ in claimed}
+        credentials = {}
+        for credential in AmazonAdsCredential.objects.filter(
+            tenant_id__in=tenant_ids, is_active=True
+        ).order_by('created_at'):
+            credentials.setdefault(credential.tenant_id, credential)
+        
+        work = []
+        for schedule, due_at in claimed:
+            credential = credentials.get(schedule.tenant_id)
+            if not credential:
+                logger.warning(f"No active credential found for tenant {schedule.tenant.name}")
+                ReportSchedule.objects.filter(pk=schedule.pk).update(last_error='No active credential found')
+                continue
+            work.append((schedule, due_at, credential))
         
-        logger.info(f"Processing {due_schedules.count()} scheduled reports")
+        # Date range is relative to the tick, as before
+        end_date = now.date() - timedelta(days=1)  # Yesterday
         
-        for schedule in due_schedules:
+        def dispatch(item):
+            schedule, due_at, credential = item
+            cls._profile_limiter.acquire(credential.profile_id)
+            latency_ms = int((timezone.now() - due_at).total_seconds() * 1000)
             try:
-                # Get credential for tenant
-                credential = AmazonAdsCredential.objects.filter(
-                    tenant=schedule.tenant,
-                    is_active=True
-                ).first()
-                
-                if not credential:
-                    logger.warning(f"No active credential found for tenant {schedule.tenant.name}")
-                    continue
-                
-                # Calculate date range
-                end_date = now.date() - timedelta(days=1)  # Yesterday
-                start_date = end_date - timedelta(days=schedule.lookback_days)
-                
-                # Request the report
                 report = cls.request_report(
                     credential=credential,
                     report_type=schedule.report_type,
-                    start_date=start_date,
+                    start_date=end_date - timedelta(days=schedule.lookback_days),
                     end_date=end_date,
                     tenant=schedule.tenant,
                     user=schedule.created_by
                 )
-                
-                # Update schedule
-                schedule.last_run = now
-                schedule.next_run = schedule.calculate_next_run()
-                schedule.save(update_fields=['last_run', 'next_run', 'updated_at'])
-                
-                count += 1
-                logger.info(f"Generated scheduled report {report.id} for schedule {schedule.name}")
-                
-                # Add random delay to avoid hitting API rate limits
-                sleep_time = random.uniform(1, 5)
-                time.sleep(sleep_time)
-                
             except Exception as e:
                 logger.error(f"Error processing scheduled report {schedule.id}: {str(e)}")
-                
-                # Update next_run even if there was an error to prevent retrying too frequently
-                try:
-                    schedule.last_run = now
-                    schedule.next_run = schedule.calculate_next_run()
-                    schedule.save(update_fields=['last_run', 'next_run', 'updated_at'])
-                except Exception as save_error:
-                    logger.error(f"Error updating schedule after failure: {str(save_error)}")
+                ReportSchedule.objects.filter(pk=schedule.pk).update(
+                    last_dispatch_latency_ms=latency_ms, last_error=str(e)
+                )
+                raise
+            
+            ReportSchedule.objects.filter(pk=schedule.pk).update(
+                last_dispatch_latency_ms=latency_ms, last_error=None
+            )
+            logger.info(f"Generated scheduled report {report.id} for schedule {schedule.name} ({latency_ms} ms after due)")
+            return latency_ms
+        
+        results = dispatch_grouped(
+            work,
+            group_key=lambda item: item[2].profile_id,
+            handler=dispatch,
+            max_workers=getattr(settings, 'AMAZON_SCHEDULER_MAX_WORKERS', 16)
+        )
         
+        latencies = [latency for _, latency, error in results if error is None]
+        count = len(latencies)
+        logger.info(
+            f"Dispatched {count}/{len(claimed)} scheduled reports in {time.monotonic() - started:.1f}s"
+            + (f", max dispatch latency {max(latencies)} ms" if latencies else "")
+        )
         return count
     
     @classmethod
@@ -999,30 +1237,44 @@ class AmazonAdsReportService:
         Process pending reports - check status, download and process completed reports
         This method is designed to be called from a cron job
         
+        Only reports whose next_poll_at has passed (or was never set) are
+        checked, so the cron can run often without polling every in-flight
+        report on every tick.
+        
         Returns:
             Number of reports processed
         """
         count = 0
+        now = timezone.now()
+        cls.fail_stale_reports()
         
-        # Get reports that are in progress or pending
-        pending_reports = AdsReport.objects.filter(
-            Q(status='PENDING') | Q(status='IN_PROGRESS')
-        ).select_related('tenant').order_by('created_at')
+        # Get in-flight reports that are due for a status check
+        pending_reports = list(AdsReport.objects.filter(
+            Q(next_poll_at__isnull=True) | Q(next_poll_at__lte=now),
+            status__in=['PENDING', 'IN_PROGRESS']
+        ).select_related('tenant').order_by('created_at'))
         
-        logger.info(f"Processing {pending_reports.count()} pending reports")
+        logger.info(f"Processing {len(pending_reports)} pending reports due for a status check")
+        
+        # One credential per tenant, fetched in a single query
+        credentials = {}
+        for credential in AmazonAdsCredential.objects.filter(
+            tenant_id__in={report.tenant_id for report in pending_reports},
+            is_active=True
+        ).order_by('created_at'):
+            credentials.setdefault(credential.tenant_id, credential)
         
         for report in pending_reports:
             try:
-                # Get credential for tenant
-                credential = AmazonAdsCredential.objects.filter(
-                    tenant=report.tenant,
-                    is_active=True
-                ).first()
+                credential = credentials.get(report.tenant_id)
                 
                 if not credential:
                     logger.warning(f"No active credential found for tenant {report.tenant.name}")
                     continue
                 
+                # Space out calls per profile instead of sleeping after every report
+                cls._profile_limiter.acquire(credential.profile_id)
+                
                 # Check report status
                 updated_report = cls.get_report_status(credential, report)
                 
@@ -1032,10 +1284,6 @@ class AmazonAdsReportService:
                     if success:
                         count += 1
                 
-                # Add random delay to avoid hitting API rate limits
-                sleep_time = random.uniform(1, 3)
-                time.sleep(sleep_time)
-                
             except Exception as e:
                 logger.error(f"Error processing report {report.id}: {str(e)}")
         
@@ -1044,7 +1292,10 @@ class AmazonAdsReportService:
     @classmethod
     def get_report_url(cls, credential, report_id):
         """
-        Get report download URL with retries
+        Get report download URL
+        
+        A single status check; if the URL is not available yet the report is
+        left to the poller rather than blocking the caller.
         
         Args:
             credential: AmazonAdsCredential instance
@@ -1068,44 +1319,30 @@ class AmazonAdsReportService:
         }
         
         report_url = None
-        retry_count = 0
-        max_retries = 5
-        backoff_factor = 2
         
-        while report_url is None and retry_count < max_retries:
-            try:
-                response = requests.get(url, headers=headers)
-                logger.debug(f"Report URL fetch status code: {response.status_code}")
-                
-                if response.status_code == 429:  # Too Many Requests
-                    retry_count += 1
-                    wait_time = backoff_factor ** retry_count
-                    logger.warning(f"Rate limit exceeded. Retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
-                    continue
-                
-                if response.status_code != 200:
-                    logger.error(f"Failed to get report URL: {response.status_code} - {response.text}")
-                    return None
-                
-                response_json = response.json()
-                logger.debug(f"Report URL response: {response_json}")
-                
-                # Check for URL in different possible fields
-                if 'location' in response_json:
-                    report_url = response_json['location']
-                elif 'url' in response_json:
-                    report_url = response_json['url']
-                
-                if not report_url:
-                    logger.warning("Report URL not found in response, waiting 60 seconds")
-                    time.sleep(60)
-            except Exception as e:
-                logger.error(f"Error fetching report URL: {str(e)}")
+        try:
+            # Throttling (429) is retried with backoff by the shared client
+            response = http_client.get(url, region=credential.region, headers=headers)
+            logger.debug(f"Report URL fetch status code: {response.status_code}")
+            
+            if response.status_code != 200:
+                logger.error(f"Failed to get report URL: {response.status_code} - {response.text}")
                 return None
+            
+            response_json = response.json()
+            logger.debug(f"Report URL response: {response_json}")
+            
+            # Check for URL in different possible fields
+            if 'location' in response_json:
+                report_url = response_json['location']
+            elif 'url' in response_json:
+                report_url = response_json['url']
+        except Exception as e:
+            logger.error(f"Error fetching report URL: {str(e)}")
+            return None
         
         if report_url is None:
-            logger.error("Max retries exceeded when fetching report URL")
+            logger.warning(f"Report URL not available yet for report {report_id}")
         
         return report_url
 
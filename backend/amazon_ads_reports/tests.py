@@ -1,3 +1,908 @@
-from django.test import TestCase
+import base64
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core import downloads, file_service
+from . import analytics, archive, optimisation, services
+from .analytics import AdsAnalyticsStore
+from .archive import ReportArchiveService
+from .optimisation import AdsOptimisationDataAdapter
+from .models import (
+    Tenant, AmazonAdsCredential, ReportType, AdsReport, DailyProductAdsData, CampaignPerformanceRollup,
+    SearchTermReportData, PrunedAdsMonth, ReportSchedule
+)
+from .retention import AdsRetentionService
+from .rollups import AdsRollupService
+from .serializers import DailyProductAdsDataSerializer
+from .views import SearchTermReportDataViewSet
+from .services import AmazonAdsAuth, AmazonAdsReportService
+
+
+def make_tenant(identifier='acme'):
+    return Tenant.objects.create(name=identifier.title(), identifier=identifier)
+
+
+def make_report_type(slug='daily-product-ads'):
+    # The standard report types are seeded by a data migration
+    return ReportType.objects.get_or_create(slug=slug, defaults={
+        'name': slug, 'api_report_type': 'spAdvertisedProduct',
+        'ad_product': 'SPONSORED_PRODUCTS', 'metrics': ['impressions', 'clicks'],
+    })[0]
+
+
+class AdsRollupTests(TestCase):
+    """Daily/monthly rollups and the partial-month fallback in summarize"""
+
+    def setUp(self):
+        self.tenant = make_tenant()
+        self.report = AdsReport.objects.create(
+            tenant=self.tenant, report_type=make_report_type(),
+            start_date=date(2026, 1, 15), end_date=date(2026, 3, 10), selected_metrics=[]
+        )
+        # One row per day for two campaigns, 10 clicks / 1.50 spend each
+        day = self.report.start_date
+        while day <= self.report.end_date:
+            for campaign_id in ('c1', 'c2'):
+                DailyProductAdsData.objects.create(
+                    tenant=self.tenant, report=self.report, date=day,
+                    campaign_id=campaign_id, campaign_name=f'Campaign {campaign_id}',
+                    advertised_asin=f'B00{campaign_id}', impressions=100, clicks=10,
+                    spend=Decimal('1.50'), sales_7d=Decimal('3.00')
+                )
+            day += timedelta(days=1)
+
+    def raw_clicks(self, start_date, end_date, campaign_id='c1'):
+        return sum(DailyProductAdsData.objects.filter(
+            tenant=self.tenant, campaign_id=campaign_id, date__range=[start_date, end_date]
+        ).values_list('clicks', flat=True))
+
+    def test_refresh_builds_daily_and_monthly_buckets(self):
+        written = AdsRollupService.refresh_for_report(self.report)
+
+        days = (self.report.end_date - self.report.start_date).days + 1
+        self.assertEqual(written, days * 2 * 2)  # two campaigns, campaign + asin rollups
+        monthly = CampaignPerformanceRollup.objects.filter(
+            tenant=self.tenant, period='MONTH', campaign_id='c1'
+        ).order_by('period_start')
+        self.assertEqual(
+            [(row.period_start, row.clicks) for row in monthly],
+            [(date(2026, 1, 1), 170), (date(2026, 2, 1), 280), (date(2026, 3, 1), 100)]
+        )
+
+    def test_refresh_is_idempotent(self):
+        AdsRollupService.refresh_for_report(self.report)
+        AdsRollupService.refresh_for_report(self.report)
+
+        self.assertEqual(
+            CampaignPerformanceRollup.objects.filter(tenant=self.tenant, period='MONTH').count(), 6
+        )
+        february = CampaignPerformanceRollup.objects.get(
+            tenant=self.tenant, period='MONTH', period_start=date(2026, 2, 1), campaign_id='c1'
+        )
+        self.assertEqual(february.clicks, 280)
+
+    def test_duplicate_bucket_is_rejected(self):
+        AdsRollupService.refresh_for_report(self.report)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CampaignPerformanceRollup.objects.create(
+                tenant=self.tenant, period='DAY', period_start=date(2026, 2, 1),
+                campaign_id='c1', campaign_name='Campaign c1', clicks=10
+            )
+
+    def test_summarize_mixes_monthly_and_partial_month_buckets(self):
+        AdsRollupService.refresh_for_report(self.report)
+        start_date, end_date = date(2026, 1, 20), date(2026, 3, 5)
+
+        # Whole February from its monthly bucket, the ends from daily buckets
+        condition = AdsRollupService._period_filter(start_date, end_date)
+        periods = set(CampaignPerformanceRollup.objects.filter(
+            condition, tenant=self.tenant
+        ).values_list('period', 'period_start'))
+        self.assertIn(('MONTH', date(2026, 2, 1)), periods)
+        self.assertNotIn(('MONTH', date(2026, 1, 1)), periods)
+        self.assertNotIn(('DAY', date(2026, 2, 10)), periods)
+
+        results = AdsRollupService.summarize('campaign', self.tenant.id, start_date, end_date, '-clicks')
+        by_campaign = {row['campaign_id']: row for row in results}
+        self.assertEqual(by_campaign['c1']['clicks'], self.raw_clicks(start_date, end_date))
+        self.assertAlmostEqual(by_campaign['c1']['ctr'], 10.0)
+        self.assertAlmostEqual(by_campaign['c1']['acos_7d'], 50.0)
+
+    def test_summarize_within_one_month_uses_daily_buckets(self):
+        AdsRollupService.refresh_for_report(self.report)
+        start_date, end_date = date(2026, 2, 3), date(2026, 2, 9)
+
+        results = AdsRollupService.summarize('campaign', self.tenant.id, start_date, end_date, '-clicks', limit=1)
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['clicks'], self.raw_clicks(start_date, end_date))
+
+
+def product_ads_rows(start_date, days, clicks=10):
+    return [
+        {
+            'date': (start_date + timedelta(days=offset)).isoformat(),
+            'campaignId': 'c1', 'campaignName': 'Campaign c1', 'advertisedAsin': 'B00TEST',
+            'impressions': 100, 'clicks': clicks, 'spend': 1.5, 'sales7d': 3.0,
+        }
+        for offset in range(days)
+    ]
+
+
+class ReprocessFromArchiveTests(TestCase):
+    """Replaying a report from its archived payload"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        for patcher in (
+            mock.patch.object(file_service, 'ARCHIVE_ROOT', f'{self.tmp_dir}/archive'),
+            mock.patch.object(file_service, 'USE_AZURE_STORAGE', False),
+            mock.patch.object(analytics, 'ANALYTICS_ROOT', f'{self.tmp_dir}/analytics'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.report = AdsReport.objects.create(
+            tenant=make_tenant(), report_type=make_report_type(), status='COMPLETED',
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 7), selected_metrics=[]
+        )
+        payload = product_ads_rows(self.report.start_date, 7)
+        self.assertTrue(ReportArchiveService.archive_report(self.report, payload))
+        self.assertTrue(AmazonAdsReportService.store_report_data(self.report, payload))
+
+    def test_replay_replaces_stored_rows(self):
+        # Rows edited after ingestion are restored from the archive, not merged
+        self.report.daily_product_ads_data.update(clicks=999)
+
+        self.assertTrue(AmazonAdsReportService.reprocess_from_archive(self.report))
+
+        rows = self.report.daily_product_ads_data.all()
+        self.assertEqual(rows.count(), 7)
+        self.assertEqual(set(rows.values_list('clicks', flat=True)), {10})
+        rollup = CampaignPerformanceRollup.objects.get(
+            tenant=self.report.tenant, period='MONTH', period_start=date(2026, 5, 1)
+        )
+        self.assertEqual(rollup.clicks, 70)
+
+    def test_failed_replay_keeps_previous_rows(self):
+        def failing_processor(report, report_data):
+            report.error_message = 'Error processing report: boom'
+            return 0
+
+        with mock.patch.object(AmazonAdsReportService, '_process_daily_product_ads_report', side_effect=failing_processor):
+            self.assertFalse(AmazonAdsReportService.reprocess_from_archive(self.report))
+
+        self.assertEqual(self.report.daily_product_ads_data.count(), 7)
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.error_message, 'Error processing report: boom')
+
+    def test_diagnose_and_examine_read_the_archive_once(self):
+        for action in ('diagnose-report', 'examine-raw-data'):
+            with self.subTest(action=action):
+                url = reverse(f'v1:amazon_ads_reports:adsreport-{action}', args=[self.report.id])
+                with mock.patch.object(file_service, 'read_archive_file', wraps=file_service.read_archive_file) as read:
+                    response = self.client.post(f'{url}?columns=date,clicks&limit=2')
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(read.call_count, 1)
+                data = response.json()
+                self.assertEqual(data['source'], 'archive')
+                self.assertEqual(data['sample'], [
+                    {'date': '2026-05-01', 'clicks': 10}, {'date': '2026-05-02', 'clicks': 10}
+                ])
+
+    def test_replay_without_archive(self):
+        report = AdsReport.objects.create(
+            tenant=self.report.tenant, report_type=self.report.report_type,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 7), selected_metrics=[]
+        )
+
+        self.assertFalse(AmazonAdsReportService.reprocess_from_archive(report))
+
+
+class ReportRequestCoalescingTests(TestCase):
+    """Equivalent report requests share one Amazon report"""
+
+    def setUp(self):
+        self.tenant = make_tenant()
+        self.credential = AmazonAdsCredential.objects.create(
+            tenant=self.tenant, client_id='client', client_secret='secret',
+            refresh_token='refresh', profile_id='1234', region='EU'
+        )
+        self.report_type = make_report_type()
+        self.amazon_report_ids = iter(f'amzn-{n}' for n in range(1, 100))
+        for patcher in (
+            mock.patch.object(AmazonAdsAuth, 'get_access_token', return_value='token'),
+            mock.patch('amazon_ads_reports.services.http_client.post', side_effect=self.fake_post),
+        ):
+            self.post = patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def fake_post(self, url, **kwargs):
+        return mock.Mock(status_code=200, json=lambda: {'reportId': next(self.amazon_report_ids)})
+
+    def request(self, tenant=None, **kwargs):
+        return AmazonAdsReportService.request_report(
+            self.credential, self.report_type, date(2026, 6, 1), date(2026, 6, 30),
+            tenant or self.tenant, **kwargs
+        )
+
+    def test_equivalent_requests_share_a_report(self):
+        first = self.request()
+        second = self.request()
+
+        self.assertEqual(second.id, first.id)
+        self.assertTrue(second.coalesced)
+        self.assertEqual(second.coalesced_count, 1)
+        self.assertEqual(self.post.call_count, 1)
+
+    def test_tenants_sharing_a_profile_get_their_own_reports(self):
+        other_tenant = make_tenant('globex')
+
+        first = self.request()
+        second = self.request(tenant=other_tenant)
+
+        self.assertNotEqual(second.id, first.id)
+        self.assertEqual(second.tenant, other_tenant)
+        self.assertEqual(second.status, 'IN_PROGRESS')
+
+    def test_concurrent_request_lands_on_the_winning_report(self):
+        winner = self.request()
+
+        # Both requests saw no reusable report; the loser hits the unique constraint
+        with mock.patch.object(
+            AmazonAdsReportService, 'find_reusable_report',
+            side_effect=[None, AdsReport.objects.get(pk=winner.pk)]
+        ):
+            loser = self.request()
+
+        self.assertEqual(loser.id, winner.id)
+        self.assertTrue(loser.coalesced)
+        self.assertEqual(AdsReport.objects.count(), 1)
+        self.assertEqual(self.post.call_count, 1)
+
+    def test_force_new_skips_completed_reports_only(self):
+        first = self.request()
+
+        # An identical in-flight request is still shared
+        self.assertEqual(self.request(force_new=True).id, first.id)
+
+        AdsReport.objects.filter(pk=first.pk).update(status='COMPLETED', is_stored=True)
+        self.assertEqual(self.request().id, first.id)
+        fresh = self.request(force_new=True)
+        self.assertNotEqual(fresh.id, first.id)
+        self.assertEqual(self.post.call_count, 2)
+
+    def test_completed_report_without_stored_data_is_not_reused(self):
+        for update in ({'is_stored': False}, {'is_stored': True, 'error_message': 'Error processing report: bad row'}):
+            with self.subTest(**update):
+                AdsReport.objects.all().delete()
+                failed = self.request()
+                AdsReport.objects.filter(pk=failed.pk).update(status='COMPLETED', **update)
+
+                fresh = self.request()
+
+                self.assertNotEqual(fresh.id, failed.id)
+                self.assertFalse(getattr(fresh, 'coalesced', False))
+
+    def test_force_new_is_parsed_as_a_boolean(self):
+        first = self.request()
+        AdsReport.objects.filter(pk=first.pk).update(status='COMPLETED', is_stored=True)
+        url = reverse('v1:amazon_ads_reports:adsreport-request-report')
+        body = {
+            'tenant_id': str(self.tenant.id), 'report_type_id': str(self.report_type.id),
+            'start_date': '2026-06-01', 'end_date': '2026-06-30',
+        }
+
+        for value in ('false', '0', False):
+            response = self.client.post(url, {**body, 'force_new': value}, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['report']['id'], str(first.id))
+        response = self.client.post(url, {**body, 'force_new': 'true'}, content_type='application/json')
+        self.assertNotEqual(response.json()['report']['id'], str(first.id))
+        response = self.client.post(url, {**body, 'force_new': 'maybe'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_stale_inflight_report_releases_its_key(self):
+        stuck = self.request()
+        AdsReport.objects.filter(pk=stuck.pk).update(created_at=timezone.now() - timedelta(days=2))
+
+        fresh = self.request()
+
+        self.assertNotEqual(fresh.id, stuck.id)
+        stuck.refresh_from_db()
+        self.assertEqual(stuck.status, 'FAILED')
+        self.assertIsNone(stuck.next_poll_at)
+
+
+class ScheduledReportDispatchTests(TransactionTestCase):
+    """Due schedules are claimed once and dispatched concurrently per advertising profile"""
+
+    def setUp(self):
+        self.report_type = make_report_type()
+        self.now = timezone.now()
+        self.profiles = {}
+        for identifier, profile_id in (('acme', '1111'), ('globex', '2222'), ('initech', None)):
+            tenant = make_tenant(identifier)
+            if profile_id:
+                AmazonAdsCredential.objects.create(
+                    tenant=tenant, client_id='client', client_secret='secret',
+                    refresh_token='refresh', profile_id=profile_id, region='EU'
+                )
+            self.profiles[identifier] = tenant
+        self.calls = []
+        self.calls_lock = threading.Lock()
+
+    def schedule(self, tenant, name, due=timedelta(minutes=5)):
+        return ReportSchedule.objects.create(
+            tenant=self.profiles[tenant], report_type=self.report_type, name=name,
+            selected_metrics=['clicks'], lookback_days=3, next_run=self.now - due
+        )
+
+    def fake_request_report(self, credential, report_type, start_date, end_date, tenant, user=None):
+        with self.calls_lock:
+            self.calls.append((credential.profile_id, threading.get_ident(), start_date, end_date))
+        if tenant.identifier == 'globex':
+            raise ValueError('Amazon said no')
+        return mock.Mock(id='report')
+
+    def test_due_schedules_are_dispatched_once(self):
+        first = self.schedule('acme', 'first')
+        second = self.schedule('acme', 'second', due=timedelta(minutes=1))
+        failing = self.schedule('globex', 'failing')
+        orphan = self.schedule('initech', 'no credential')
+        later = self.schedule('acme', 'later', due=-timedelta(hours=1))
+
+        with mock.patch.object(AmazonAdsReportService, 'request_report', side_effect=self.fake_request_report):
+            self.assertEqual(AmazonAdsReportService.process_scheduled_reports(), 2)
+            # The next tick finds nothing due
+            self.assertEqual(AmazonAdsReportService.process_scheduled_reports(), 0)
+
+        self.assertEqual(sorted(profile for profile, *_ in self.calls), ['1111', '1111', '2222'])
+        # One profile's requests run in order on one worker
+        self.assertEqual(len({thread for profile, thread, *_ in self.calls if profile == '1111'}), 1)
+        yesterday = timezone.now().date() - timedelta(days=1)
+        self.assertEqual({(start, end) for *_, start, end in self.calls}, {(yesterday - timedelta(days=3), yesterday)})
+
+        for schedule in (first, second, failing, orphan):
+            schedule.refresh_from_db()
+            self.assertGreater(schedule.next_run, self.now)
+        self.assertIsNone(first.last_error)
+        self.assertGreaterEqual(first.last_dispatch_latency_ms, 5 * 60 * 1000)
+        self.assertEqual(failing.last_error, 'Amazon said no')
+        self.assertEqual(orphan.last_error, 'No active credential found')
+        later.refresh_from_db()
+        self.assertIsNone(later.last_run)
+
+
+class ReportStatusWithoutAmazonIdTests(TestCase):
+    """Reports whose request never got an Amazon report ID"""
+
+    def setUp(self):
+        self.tenant = make_tenant()
+        self.credential = AmazonAdsCredential.objects.create(
+            tenant=self.tenant, client_id='client', client_secret='secret',
+            refresh_token='refresh', profile_id='1234', region='EU'
+        )
+        self.report = AdsReport.objects.create(
+            tenant=self.tenant, report_type=make_report_type(),
+            start_date=date(2026, 6, 1), end_date=date(2026, 6, 30), selected_metrics=[]
+        )
+
+    def test_recent_request_is_polled_again(self):
+        report = AmazonAdsReportService.get_report_status(self.credential, self.report)
+
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'PENDING')
+        self.assertGreater(report.next_poll_at, timezone.now())
+
+    def test_abandoned_request_is_failed(self):
+        AdsReport.objects.filter(pk=self.report.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        self.report.refresh_from_db()
+
+        AmazonAdsReportService.get_report_status(self.credential, self.report)
+
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, 'FAILED')
+        self.assertIsNone(self.report.next_poll_at)
+
+
+class AnalyticsCoverageTests(TestCase):
+    """Query parameters of the coverage endpoint become path components"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        patcher = mock.patch.object(analytics, 'ANALYTICS_ROOT', f'{self.tmp_dir}/analytics')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = reverse('v1:amazon_ads_reports:analytics-coverage')
+        self.tenant = make_tenant()
+
+    def test_rejects_tenant_id_that_is_not_a_uuid(self):
+        response = self.client.get(self.url, {'tenant_id': '../../../etc'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('tenant_id', response.json())
+
+    def test_rejects_unknown_dataset(self):
+        response = self.client.get(self.url, {'tenant_id': str(self.tenant.id), 'dataset': '../search_terms'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('dataset', response.json())
+
+    def test_store_rejects_unsafe_values(self):
+        with self.assertRaises(analytics.AnalyticsQueryError):
+            analytics.AdsAnalyticsStore.coverage('product_ads', '../other-tenant')
+        with self.assertRaises(analytics.AnalyticsQueryError):
+            analytics.AdsAnalyticsStore.coverage('../product_ads', str(self.tenant.id))
+
+    def test_lists_no_months_for_a_tenant_without_data(self):
+        response = self.client.get(self.url, {'tenant_id': str(self.tenant.id)})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'success': True, 'data': []})
+
+
+class RawDataPaginationTests(TestCase):
+    """Keyset cursors on the raw data listing"""
+
+    def setUp(self):
+        self.tenant = make_tenant()
+        report = AdsReport.objects.create(
+            tenant=self.tenant, report_type=make_report_type(), status='COMPLETED',
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 5), selected_metrics=[]
+        )
+        with mock.patch.object(AdsRollupService, 'refresh_range'), \
+                mock.patch.object(AdsAnalyticsStore, 'refresh_range'):
+            self.assertTrue(AmazonAdsReportService.store_report_data(report, product_ads_rows(report.start_date, 5)))
+        self.url = reverse('v1:amazon_ads_reports:dailyproductadsdata-list')
+
+    def cursor(self, payload):
+        return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+    def test_cursor_round_trip(self):
+        response = self.client.get(self.url, {'page_size': 2})
+        pages = [response.json()]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).json())
+
+        self.assertEqual([len(page['results']) for page in pages], [2, 2, 1])
+        dates = [row['date'] for page in pages for row in page['results']]
+        self.assertEqual(dates, [f'2026-05-0{day}' for day in range(5, 0, -1)])
+
+    def test_rows_match_the_serializer_output(self):
+        row = self.client.get(self.url).json()['results'][0]
+        instance = DailyProductAdsData.objects.get(id=row['id'])
+
+        expected = json.loads(json.dumps(DailyProductAdsDataSerializer(instance).data, cls=DjangoJSONEncoder))
+        self.assertEqual(row['spend'], '1.50')
+        self.assertEqual(row, expected)
+
+    def test_bad_cursors_are_not_found(self):
+        pk = str(DailyProductAdsData.objects.first().id)
+        cursors = [
+            'not a cursor!', self.cursor({'date': '2026-05-01'}), self.cursor(['2026-05-01']),
+            self.cursor(['2026-13-01', pk]), self.cursor([['2026-05-01'], pk]), self.cursor([True, pk]),
+            self.cursor(['2026-05-01', 5]), self.cursor(['2026-05-01', 'not-a-uuid']),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class DownloadAndProcessReportTests(TestCase):
+    """Downloaded documents are archived and ingested from disk in batches"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        for patcher in (
+            mock.patch.object(downloads, 'DOWNLOAD_DIR', f'{self.tmp_dir}/downloads'),
+            mock.patch.object(file_service, 'ARCHIVE_ROOT', f'{self.tmp_dir}/archive'),
+            mock.patch.object(file_service, 'USE_AZURE_STORAGE', False),
+            mock.patch.object(analytics, 'ANALYTICS_ROOT', f'{self.tmp_dir}/analytics'),
+            mock.patch.object(services, 'INGEST_BATCH_ROWS', 4),
+            mock.patch.object(archive, 'BATCH_ROWS', 4),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        tenant = make_tenant()
+        self.credential = AmazonAdsCredential.objects.create(
+            tenant=tenant, client_id='client', client_secret='secret',
+            refresh_token='refresh', profile_id='1234', region='EU'
+        )
+        self.report = AdsReport.objects.create(
+            tenant=tenant, report_type=make_report_type(), status='COMPLETED',
+            download_url='https://example.com/report.json.gz',
+            start_date=date(2026, 7, 1), end_date=date(2026, 7, 10), selected_metrics=[]
+        )
+
+    def download(self, payload):
+        def fake_download(url, path, **kwargs):
+            body = gzip.compress(json.dumps(payload).encode('utf-8'))
+            with open(path, 'wb') as f:
+                f.write(body)
+            return len(body)
+
+        with mock.patch.object(downloads, 'download_to_file', side_effect=fake_download):
+            return AmazonAdsReportService.download_and_process_report(self.credential, self.report)
+
+    def test_ingests_and_archives_all_batches(self):
+        rows = product_ads_rows(self.report.start_date, 10)
+        # Columns missing or empty in the first batch and ints mixed with floats
+        for row in rows[:4]:
+            row['portfolioId'] = None
+        rows[6]['portfolioId'] = 'p-1'
+        rows[7]['spend'] = 2
+
+        self.assertTrue(self.download(rows))
+
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.rows_processed, 10)
+        self.assertEqual(self.report.daily_product_ads_data.count(), 10)
+        self.assertEqual(self.report.archive_format, 'parquet')
+        self.assertEqual(self.report.archive_rows, 10)
+        archived = ReportArchiveService.load_payload(self.report)
+        self.assertEqual(archived[6]['portfolioId'], 'p-1')
+        self.assertEqual(archived[7]['spend'], 2.0)
+        self.assertEqual(os.listdir(downloads.DOWNLOAD_DIR), [])
+
+    def test_wrapped_payload_is_processed_whole(self):
+        self.assertTrue(self.download({'result': product_ads_rows(self.report.start_date, 6)}))
+
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.rows_processed, 6)
+        self.assertEqual(self.report.archive_format, 'json.gz')
+        self.assertEqual(len(ReportArchiveService.load_payload(self.report)['result']), 6)
+
+
+def search_term_row(query='blue widget', keyword_id=None, keyword_text='', match_type='TARGETING_EXPRESSION', clicks=5, day='2026-04-02'):
+    return {
+        'date': day, 'campaignId': 'c1', 'campaignName': 'Campaign c1', 'adGroupId': 'ag1',
+        'adGroupName': 'Ad group 1', 'keywordId': keyword_id, 'keywordText': keyword_text,
+        'matchType': match_type, 'query': query, 'impressions': 50, 'clicks': clicks, 'cost': 2.5,
+        'conversions': 1, 'sales7d': 10.0, 'sales14d': 12.0, 'sales30d': 15.0,
+    }
+
+
+class SearchTermUpsertTests(TestCase):
+    """Search term rows are upserted on their natural key, which includes the keyword / target ID"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        patcher = mock.patch.object(analytics, 'ANALYTICS_ROOT', f'{self.tmp_dir}/analytics')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.tenant = make_tenant()
+        self.report_type = make_report_type('search-term')
+
+    def make_report(self):
+        return AdsReport.objects.create(
+            tenant=self.tenant, report_type=self.report_type, status='COMPLETED',
+            start_date=date(2026, 4, 1), end_date=date(2026, 4, 30), selected_metrics=[]
+        )
+
+    def store(self, rows):
+        report = self.make_report()
+        self.assertTrue(AmazonAdsReportService.store_report_data(report, rows))
+        return report
+
+    def test_reprocessed_rows_are_updated_in_place(self):
+        self.store([search_term_row(keyword_id=111, clicks=5)])
+        report = self.store([search_term_row(keyword_id=111.0, clicks=8)])
+
+        row = SearchTermReportData.objects.get()
+        self.assertEqual((row.report_id, row.clicks, row.keyword_id), (report.id, 8, '111'))
+
+    def test_targets_matching_the_same_query_are_kept_apart(self):
+        # Auto targeting groups: same query, no keyword text, different target IDs
+        self.store([
+            search_term_row(keyword_id='close-match', clicks=3),
+            search_term_row(keyword_id='loose-match', clicks=4),
+            search_term_row(keyword_id='substitutes', clicks=5),
+        ])
+
+        rows = SearchTermReportData.objects.order_by('keyword_id')
+        self.assertEqual(
+            list(rows.values_list('keyword_id', 'clicks')),
+            [('close-match', 3), ('loose-match', 4), ('substitutes', 5)]
+        )
+        self.assertEqual(len(set(rows.values_list('row_key', flat=True))), 3)
+
+    def test_rows_keyed_without_target_are_replaced_on_reingest(self):
+        legacy = self.store([{**search_term_row(clicks=2), 'keywordId': None}])
+        self.assertIsNone(SearchTermReportData.objects.get(report=legacy).keyword_id)
+
+        self.store([search_term_row(keyword_id='close-match', clicks=3), search_term_row(keyword_id='loose-match', clicks=4)])
+
+        self.assertEqual(
+            list(SearchTermReportData.objects.order_by('keyword_id').values_list('keyword_id', 'clicks')),
+            [('close-match', 3), ('loose-match', 4)]
+        )
+
+
+class SearchTermFilterTests(TestCase):
+    """Substring, prefix and exact search term filters"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        patcher = mock.patch.object(analytics, 'ANALYTICS_ROOT', f'{self.tmp_dir}/analytics')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        report = AdsReport.objects.create(
+            tenant=make_tenant(), report_type=make_report_type('search-term'), status='COMPLETED',
+            start_date=date(2026, 4, 1), end_date=date(2026, 4, 30), selected_metrics=[]
+        )
+        rows = [search_term_row(query, keyword_id=n) for n, query in enumerate(['Blue Widget', 'light blue widget', 'blue', 'red widget'])]
+        self.assertTrue(AmazonAdsReportService.store_report_data(report, rows))
+        self.url = reverse('v1:amazon_ads_reports:searchtermreportdata-list')
+
+    def queries(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['query'] for row in response.json()['results'])
+
+    def test_match_modes_are_case_insensitive(self):
+        self.assertEqual(self.queries(query='BLUE'), ['Blue Widget', 'blue', 'light blue widget'])
+        self.assertEqual(self.queries(query='blue', query_match='prefix'), ['Blue Widget', 'blue'])
+        self.assertEqual(self.queries(query='Blue', query_match='exact'), ['blue'])
+        # Unknown modes fall back to a substring match
+        self.assertEqual(self.queries(query='widget', query_match='fuzzy'), ['Blue Widget', 'light blue widget', 'red widget'])
+
+    def test_filters_compile_to_like_patterns(self):
+        lookups = SearchTermReportDataViewSet.QUERY_MATCH_LOOKUPS
+        patterns = {
+            match: SearchTermReportData.objects.filter(**{lookup: 'blue'}).query.sql_with_params()[1]
+            for match, lookup in lookups.items()
+        }
+
+        # The leading-wildcard and prefix patterns are the ones the trigram index on UPPER(query) serves
+        self.assertEqual(patterns['contains'], ('%blue%',))
+        self.assertEqual(patterns['prefix'], ('blue%',))
+        self.assertEqual(patterns['exact'], ('blue',))
+
+
+class OptimisationFrameTests(TestCase):
+    """Bulk-file shaped optimiser inputs built from ingested report data"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        patcher = mock.patch.object(analytics, 'ANALYTICS_ROOT', f'{self.tmp_dir}/analytics')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.tenant = make_tenant()
+        self.start, self.end = date(2026, 4, 2), date(2026, 4, 3)
+        product_ads = product_ads_rows(self.start, 2)
+        for row in product_ads:
+            row.update({'adGroupId': 'ag1', 'adId': 'ad1', 'campaignStatus': 'ENABLED', 'campaignBudgetAmount': 20})
+        search_terms = [
+            search_term_row('blue widget', keyword_id=1, keyword_text='blue', match_type='EXACT', day=day)
+            for day in ('2026-04-02', '2026-04-03')
+        ] + [search_term_row('b0test', keyword_id=2, keyword_text='asin="B0TEST"', clicks=0)]
+        for slug, rows in (('daily-product-ads', product_ads), ('search-term', search_terms)):
+            report = AdsReport.objects.create(
+                tenant=self.tenant, report_type=make_report_type(slug), status='COMPLETED',
+                start_date=self.start, end_date=self.end, selected_metrics=[]
+            )
+            self.assertTrue(AmazonAdsReportService.store_report_data(report, rows))
+
+    def test_search_term_frame(self):
+        df = AdsOptimisationDataAdapter.search_term_frame(self.tenant.id, self.start, self.end)
+
+        self.assertEqual(list(df.columns), optimisation.SEARCH_TERM_COLUMNS)
+        keyword = df[df['Customer Search Term'] == 'blue widget'].iloc[0]
+        self.assertEqual(
+            (keyword['Keyword Text'], keyword['Match Type'], keyword['Campaign State (Informational only)']),
+            ('blue', 'Exact', 'enabled')
+        )
+        self.assertEqual((keyword['Clicks'], keyword['Spend'], keyword['Sales']), (10, 5.0, 20.0))
+        self.assertEqual((keyword['ACOS'], keyword['CPC'], keyword['Units']), (0.25, 0.5, 2))
+        target = df[df['Customer Search Term'] == 'b0test'].iloc[0]
+        self.assertTrue(pd.isna(target['Keyword Text']))
+        self.assertEqual(target['Product Targeting Expression'], 'asin="B0TEST"')
+        # Ratios over zero clicks are zero, not NaN or infinite
+        self.assertEqual((target['CPC'], target['Conversion Rate']), (0, 0))
+
+    def test_columns_are_projected(self):
+        df = AdsOptimisationDataAdapter.search_term_frame(
+            self.tenant.id, self.start, self.end, columns=['Customer Search Term', 'ACOS']
+        )
+
+        self.assertEqual(list(df.columns), ['Customer Search Term', 'ACOS'])
+        self.assertEqual(sorted(df['ACOS']), [0.25, 0.25])
+
+    def test_bulk_frame(self):
+        _, df = AdsOptimisationDataAdapter.sp_frames(self.tenant.id, self.start, self.end)
+
+        self.assertEqual(
+            sorted(df['Entity']), ['Ad Group', 'Campaign', 'Keyword', 'Product Ad', 'Product Targeting']
+        )
+        campaign = df[df['Entity'] == 'Campaign'].iloc[0]
+        self.assertEqual((campaign['State'], campaign['Daily Budget'], campaign['Clicks']), ('enabled', 20.0, 20))
+        product_ad = df[df['Entity'] == 'Product Ad'].iloc[0]
+        self.assertEqual((product_ad['Ad ID'], product_ad['ASIN']), ('ad1', 'B00TEST'))
+        self.assertEqual(df[df['Entity'] == 'Keyword'].iloc[0]['Spend'], 5.0)
+
+
+class DedupeSearchTermsCommandTests(TestCase):
+    """dedupe_search_terms keys rows stored before the natural key and keeps the newest copy"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        patcher = mock.patch.object(analytics, 'ANALYTICS_ROOT', f'{self.tmp_dir}/analytics')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.tenant = make_tenant()
+        self.report = AdsReport.objects.create(
+            tenant=self.tenant, report_type=make_report_type('search-term'), status='COMPLETED',
+            start_date=date(2026, 4, 1), end_date=date(2026, 4, 30), selected_metrics=[]
+        )
+
+    def unkeyed(self, query, clicks, age_hours, keyword_id=None):
+        row = SearchTermReportData.objects.create(
+            tenant=self.tenant, report=self.report, date=date(2026, 4, 2), campaign_id='c1',
+            ad_group_id='ag1', keyword_id=keyword_id, keyword_text=query, match_type='EXACT', query=query,
+            clicks=clicks
+        )
+        SearchTermReportData.objects.filter(pk=row.pk).update(updated_at=timezone.now() - timedelta(hours=age_hours))
+        return row
+
+    def test_duplicates_are_removed_keeping_the_newest(self):
+        for index in range(7):
+            self.unkeyed('red shoes', clicks=index, age_hours=10 - index)
+        for index in range(3):
+            self.unkeyed(f'query {index}', clicks=1, age_hours=1)
+        self.unkeyed('red shoes', clicks=50, age_hours=1, keyword_id='kw-1')
+
+        # Small batches, so duplicates meet across batches and against keyed rows
+        call_command('dedupe_search_terms', batch_size=2, stdout=io.StringIO())
+
+        rows = SearchTermReportData.objects.filter(tenant=self.tenant)
+        self.assertFalse(rows.filter(row_key__isnull=True).exists())
+        self.assertEqual(rows.count(), 5)
+        self.assertEqual(rows.get(query='red shoes', keyword_id__isnull=True).clicks, 6)
+        self.assertEqual(rows.get(query='red shoes', keyword_id='kw-1').clicks, 50)
+
+    def test_rows_keyed_since_the_upgrade_win_when_newer(self):
+        self.unkeyed('red shoes', clicks=1, age_hours=5)
+        AmazonAdsReportService.store_report_data(self.report, [{
+            **search_term_row(query='red shoes', keyword_text='red shoes', match_type='EXACT', clicks=9),
+            'keywordId': None,
+        }])
+
+        call_command('dedupe_search_terms', stdout=io.StringIO())
+
+        row = SearchTermReportData.objects.get(tenant=self.tenant)
+        self.assertEqual(row.clicks, 9)
+
+
+class AdsRetentionTests(TestCase):
+    """Pruning expired months, and refreshes leaving pruned months alone"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        for patcher in (
+            mock.patch.object(file_service, 'ARCHIVE_ROOT', f'{self.tmp_dir}/archive'),
+            mock.patch.object(file_service, 'USE_AZURE_STORAGE', False),
+            mock.patch.object(analytics, 'ANALYTICS_ROOT', f'{self.tmp_dir}/analytics'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.tenant = make_tenant()
+        self.report_type = make_report_type()
+        # January to March, 10 clicks a day
+        self.store(date(2026, 1, 1), 90)
+        self.cutoff = date(2026, 3, 1)
+
+    def store(self, start_date, days, clicks=10, campaign_id='c1'):
+        rows = product_ads_rows(start_date, days, clicks)
+        for row in rows:
+            row['campaignId'] = campaign_id
+        report = AdsReport.objects.create(
+            tenant=self.tenant, report_type=self.report_type, status='COMPLETED',
+            start_date=start_date, end_date=start_date + timedelta(days=days - 1), selected_metrics=[]
+        )
+        self.assertTrue(AmazonAdsReportService.store_report_data(report, rows))
+        return report
+
+    def prune(self, **kwargs):
+        return AdsRetentionService.prune('product_ads', self.tenant.id, self.cutoff, **kwargs)
+
+    def month_clicks(self, month_start, campaign_id='c1'):
+        return CampaignPerformanceRollup.objects.get(
+            tenant=self.tenant, period='MONTH', period_start=month_start, campaign_id=campaign_id
+        ).clicks
+
+    def partition_rows(self, month_start):
+        import pyarrow.parquet as pq
+        return pq.read_metadata(AdsAnalyticsStore._partition_file('product_ads', self.tenant.id, month_start)).num_rows
+
+    def test_expired_months_are_archived_and_deleted(self):
+        result = self.prune()
+
+        self.assertEqual(result['months'], ['2026-01', '2026-02'])
+        self.assertEqual(result['rows_deleted'], 31 + 28)
+        self.assertEqual([archived['rows'] for archived in result['archives']], [31, 28])
+        self.assertTrue(os.path.exists(os.path.join(
+            file_service.ARCHIVE_ROOT, f'ads_data/product_ads/tenant={self.tenant.id}/2026-01.parquet'
+        )))
+        rows = DailyProductAdsData.objects.filter(tenant=self.tenant)
+        self.assertEqual(rows.order_by('date').first().date, self.cutoff)
+        self.assertEqual(
+            sorted(PrunedAdsMonth.objects.filter(tenant=self.tenant).values_list('month_start', flat=True)),
+            [date(2026, 1, 1), date(2026, 2, 1)]
+        )
+        # The aggregates keep the full history
+        self.assertEqual(self.month_clicks(date(2026, 1, 1)), 310)
+        self.assertEqual(self.partition_rows(date(2026, 2, 1)), 28)
+
+    def test_dry_run_and_failed_archives_keep_rows(self):
+        self.assertEqual(self.prune(dry_run=True)['months'], ['2026-01', '2026-02'])
+        self.assertEqual(DailyProductAdsData.objects.filter(tenant=self.tenant).count(), 90)
+
+        with mock.patch.object(AdsRetentionService, 'archive_month', side_effect=OSError('disk full')):
+            result = self.prune()
+
+        self.assertEqual(result['failed'], ['2026-01', '2026-02'])
+        self.assertEqual(DailyProductAdsData.objects.filter(tenant=self.tenant).count(), 90)
+        self.assertFalse(PrunedAdsMonth.objects.exists())
+
+    def test_refreshing_a_pruned_month_keeps_its_aggregates(self):
+        self.prune()
+
+        # A report re-ingested for two days of January, and a new campaign in the first week of March
+        self.store(date(2026, 1, 5), 2, clicks=1)
+        self.store(date(2026, 3, 1), 7, clicks=20, campaign_id='c2')
+
+        self.assertEqual(self.month_clicks(date(2026, 1, 1)), 310)
+        self.assertEqual(self.partition_rows(date(2026, 1, 1)), 31)
+        day = CampaignPerformanceRollup.objects.get(
+            tenant=self.tenant, period='DAY', period_start=date(2026, 1, 5), campaign_id='c1'
+        )
+        self.assertEqual(day.clicks, 10)
+        # Months that were not pruned are still refreshed
+        self.assertEqual(self.month_clicks(date(2026, 3, 1), 'c2'), 7 * 20)
+
+        # Full rebuilds leave them alone too
+        AdsRollupService.rebuild_tenant(self.tenant.id)
+        AdsAnalyticsStore.rebuild_tenant(self.tenant.id)
+        self.assertEqual(self.month_clicks(date(2026, 1, 1)), 310)
+        self.assertEqual(self.partition_rows(date(2026, 1, 1)), 31)
+        self.assertEqual(self.month_clicks(date(2026, 3, 1), 'c2'), 7 * 20)
+
+        # The next prune deletes the re-ingested rows without replacing the archive
+        result = self.prune()
+        self.assertEqual(result['rows_deleted'], 2)
+        self.assertEqual(result['archives'], [])
+        self.assertEqual(self.month_clicks(date(2026, 1, 1)), 310)
@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     TenantViewSet, AmazonAdsCredentialViewSet, ReportTypeViewSet,
     AdsReportViewSet, DailyProductAdsDataViewSet, SearchTermReportDataViewSet,
-    ReportScheduleViewSet
+    ReportScheduleViewSet, AdsOptimisationViewSet, AdsAnalyticsViewSet
 )
 
 router = DefaultRouter()
@@ -14,6 +14,8 @@ router.register(r'reports', AdsReportViewSet)
 router.register(r'daily-data', DailyProductAdsDataViewSet)
 router.register(r'search-terms', SearchTermReportDataViewSet)
 router.register(r'schedules', ReportScheduleViewSet)
+router.register(r'optimisations', AdsOptimisationViewSet, basename='optimisation')
+router.register(r'analytics', AdsAnalyticsViewSet, basename='analytics')
 
 app_name = 'amazon_ads_reports'
 
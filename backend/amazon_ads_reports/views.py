@@ -1,5 +1,6 @@
 from django.shortcuts import render
-from rest_framework import viewsets, status, permissions
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets, status, permissions, serializers
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied, NotFound
@@ -19,9 +20,17 @@ from .models import (
 from .serializers import (
     TenantSerializer, AmazonAdsCredentialSerializer, ReportTypeSerializer,
     AdsReportSerializer, DailyProductAdsDataSerializer, SearchTermReportDataSerializer,
-    ReportScheduleSerializer, ReportRequestSerializer, DateRangeSerializer
+    ReportScheduleSerializer, ReportRequestSerializer, DateRangeSerializer,
+    OptimisationRequestSerializer, OptimisationFramesSerializer,
+    AnalyticsTimeseriesSerializer, AnalyticsBreakdownSerializer, AnalyticsCoverageSerializer
 )
 from .services import AmazonAdsReportService
+from .rollups import AdsRollupService
+from .archive import ReportArchiveService
+from .pagination import KeysetPagination, EXPORT_CHUNK_SIZE, stream_csv, stream_ndjson
+from .optimisation import AdsOptimisationDataAdapter, AdsOptimisationService
+from .analytics import AdsAnalyticsStore, AnalyticsQueryError
+from core.file_service import get_file_url, preview_row_limit
 
 logger = logging.getLogger(__name__)
 
@@ -135,6 +144,7 @@ class AdsReportViewSet(viewsets.ModelViewSet):
         start_date = data['start_date']
         end_date = data['end_date']
         group_by = data.get('group_by', [])
+        force_new = data['force_new']
         
         try:
             # Get required objects
@@ -166,12 +176,15 @@ class AdsReportViewSet(viewsets.ModelViewSet):
                     end_date=end_date,
                     tenant=tenant,
                     user=None, # Removed request.user
-                    group_by=group_by  # Pass the group_by parameter
+                    group_by=group_by,  # Pass the group_by parameter
+                    force_new=force_new
                 )
                 
+                coalesced = getattr(report, 'coalesced', False)
                 return Response({
                     'success': True,
-                    'message': 'Report requested successfully',
+                    'message': 'Existing equivalent report reused' if coalesced else 'Report requested successfully',
+                    'coalesced': coalesced,
                     'report': AdsReportSerializer(report).data
                 })
             except Exception as e:
@@ -253,6 +266,17 @@ class AdsReportViewSet(viewsets.ModelViewSet):
                     'message': f'No active credential found for tenant {report.tenant.name}'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
+            # Reuse the archived payload unless a fresh download is requested
+            if report.is_archived and not request.data.get('redownload'):
+                if AmazonAdsReportService.reprocess_from_archive(report):
+                    return Response({
+                        'success': True,
+                        'message': 'Report reprocessed from archive',
+                        'source': 'archive',
+                        'report': AdsReportSerializer(report).data
+                    })
+                logger.warning(f"Reprocessing report {report.id} from archive failed, downloading again")
+            
             # If download_url is not in the report, try to get it
             if not report.download_url:
                 logger.info(f"Report {report.id} is completed but doesn't have a download URL, attempting to get it")
@@ -289,11 +313,104 @@ class AdsReportViewSet(viewsets.ModelViewSet):
                 'message': f'Failed to process report: {str(e)}'
             }, status=status.HTTP_400_BAD_REQUEST)
 
+    def _archive_read_options(self, request):
+        """
+        Read column projection and row sampling options for archive reads
+        
+        Query/body parameters: columns (comma separated), limit, sample
+        """
+        params = request.query_params.copy()
+        if hasattr(request.data, 'get'):
+            for key in ('columns', 'limit', 'sample'):
+                if key not in params and request.data.get(key) is not None:
+                    params[key] = request.data.get(key)
+        
+        columns = params.get('columns')
+        if isinstance(columns, str):
+            columns = [c.strip() for c in columns.split(',') if c.strip()]
+        
+        def _positive_int(value, default):
+            try:
+                return max(1, min(int(value), 1000))
+            except (TypeError, ValueError):
+                return default
+        
+        sample = _positive_int(params.get('sample'), None)
+        limit = _positive_int(params.get('limit'), 3)
+        return columns or None, limit, sample
+    
+    def _diagnose_from_archive(self, report, request):
+        """Diagnostic summary built from the raw report archive, None if it cannot be read"""
+        columns, limit, sample = self._archive_read_options(request)
+        info, rows = ReportArchiveService.inspect(report, columns=columns, limit=limit, sample=sample)
+        if not info or info.get('error'):
+            return None
+        if info['rows'] is None:
+            rows = []
+        
+        return Response({
+            'success': True,
+            'message': 'Report diagnostic completed from archive',
+            'source': 'archive',
+            'format': {
+                'compression_type': info['format'],
+                'data_type': 'list' if info['rows'] is not None else 'dict',
+                'length': info['rows'] if info['rows'] is not None else 'Not a list',
+                'sample_available': bool(rows),
+                'sample_keys': [c['name'] for c in info['columns']] if info['columns'] else None
+            },
+            'archive': info,
+            'sample': rows
+        })
+    
+    def _examine_from_archive(self, report, request):
+        """Raw data structure built from the raw report archive, None if it cannot be read"""
+        columns, limit, sample = self._archive_read_options(request)
+        info, rows = ReportArchiveService.inspect(report, columns=columns, limit=limit, sample=sample)
+        if not info or info.get('error'):
+            return None
+        
+        if info['rows'] is None:
+            # Non-record payload, return its top level like a fresh download would
+            payload = rows
+            return Response({
+                'success': True,
+                'message': 'Raw data examination completed from archive',
+                'source': 'archive',
+                'format_type': info['format'],
+                'structure': {'type': 'object', 'keys': info.get('keys', [])},
+                'sample': payload
+            })
+        
+        rows = rows or []
+        structure_info = {
+            'type': 'array',
+            'length': info['rows'],
+            'keys': [c['name'] for c in info['columns']] if info['columns'] else [],
+            'columns': info['columns'],
+        }
+        if rows:
+            structure_info['first_item'] = rows[0]
+        
+        return Response({
+            'success': True,
+            'message': 'Raw data examination completed from archive',
+            'source': 'archive',
+            'format_type': info['format'],
+            'structure': structure_info,
+            'sample': rows
+        })
+    
     @action(detail=True, methods=['post'])
     def diagnose_report(self, request, pk=None):
-        """Diagnose issues with a report by downloading and examining its raw data"""
+        """Diagnose issues with a report by examining its raw data (archive first, then download)"""
         report = self.get_object()
         
+        if report.is_archived:
+            archived = self._diagnose_from_archive(report, request)
+            if archived is not None:
+                return archived
+        
         if not report.download_url:
             return Response({
                 'success': False,
@@ -487,6 +604,11 @@ class AdsReportViewSet(viewsets.ModelViewSet):
         """Examine the raw data structure of a report for debugging purposes"""
         report = self.get_object()
         
+        if report.is_archived:
+            archived = self._examine_from_archive(report, request)
+            if archived is not None:
+                return archived
+        
         if not report.download_url:
             return Response({
                 'success': False,
@@ -706,11 +828,75 @@ class AdsReportViewSet(viewsets.ModelViewSet):
         
         return Response(data)
 
-class DailyProductAdsDataViewSet(viewsets.ReadOnlyModelViewSet):
+class LeanDataListMixin:
+    """
+    Keyset-paginated, `.values()` based listing plus streaming export for raw ads data
+
+    Viewsets set `keyset_ordering_field`; the list columns are the serializer's
+    fields, with `tenant_name` read through a join instead of per-row lookups.
+    Decimal columns are rendered by the serializer's DecimalFields, so rows
+    match the serializer output. Single-object retrieval still goes through
+    the regular serializer.
+    """
+    pagination_class = KeysetPagination
+    keyset_ordering_field = None
+
+    def get_list_fields(self):
+        return [f for f in self.get_serializer_class().Meta.fields if f != 'tenant_name']
+
+    def get_lean_queryset(self):
+        return self.filter_queryset(self.get_queryset()).values(
+            *self.get_list_fields(),
+            tenant_name=F('tenant__name')
+        )
+
+    def represent_rows(self, rows):
+        """Render the Decimal values of `.values()` rows the way the serializer does"""
+        decimal_fields = {
+            name: field for name, field in self.get_serializer().fields.items()
+            if isinstance(field, serializers.DecimalField)
+        }
+        for row in rows:
+            row = dict(row)
+            for name, field in decimal_fields.items():
+                if row.get(name) is not None:
+                    row[name] = field.to_representation(row[name])
+            yield row
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_lean_queryset())
+        return self.get_paginated_response(list(self.represent_rows(page)))
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream every matching row as CSV (default) or NDJSON (?file_format=ndjson)"""
+        file_format = request.query_params.get('file_format', 'csv').lower()
+        if file_format not in ('csv', 'ndjson'):
+            return Response({
+                'success': False,
+                'message': 'file_format must be csv or ndjson'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = self.get_lean_queryset().order_by(
+            f'-{self.keyset_ordering_field}', '-id'
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        rows = self.represent_rows(rows)
+        filename = f"{self.basename or 'export'}-{timezone.now():%Y%m%d%H%M%S}.{file_format}"
+
+        if file_format == 'csv':
+            fields = self.get_list_fields() + ['tenant_name']
+            response = StreamingHttpResponse(stream_csv(rows, fields), content_type='text/csv')
+        else:
+            response = StreamingHttpResponse(stream_ndjson(rows), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+class DailyProductAdsDataViewSet(LeanDataListMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing daily product ads data"""
-    queryset = DailyProductAdsData.objects.all().select_related('tenant', 'report')
+    queryset = DailyProductAdsData.objects.all().select_related('tenant')
     serializer_class = DailyProductAdsDataSerializer
     permission_classes = [] # Temporarily removing permissions
+    keyset_ordering_field = 'date'
     
     def get_queryset(self):
         """Filter data based on query parameters"""
@@ -752,7 +938,7 @@ class DailyProductAdsDataViewSet(viewsets.ReadOnlyModelViewSet):
         if sku:
             queryset = queryset.filter(advertised_sku=sku)
         
-        return queryset.order_by('-date')
+        return queryset.order_by('-date', '-id')
     
     @action(detail=False, methods=['post'])
     def campaign_summary(self, request):
@@ -773,29 +959,10 @@ class DailyProductAdsDataViewSet(viewsets.ReadOnlyModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            # Get aggregated data
-            summary = DailyProductAdsData.objects.filter(
-                tenant_id=tenant_id,
-                date__range=[start_date, end_date]
-            ).values('campaign_id', 'campaign_name').annotate(
-                impressions=Sum('impressions'),
-                clicks=Sum('clicks'),
-                spend=Sum('spend'),
-                sales_1d=Sum('sales_1d'),
-                sales_7d=Sum('sales_7d'),
-                sales_30d=Sum('sales_30d'),
-                units_sold_clicks_30d=Sum('units_sold_clicks_30d'),
-                purchases_30d=Sum('purchases_30d'),
-                ctr=Sum(F('clicks') * 100.0, output_field=FloatField()) / Sum('impressions'),
-                acos_7d=Sum('spend', output_field=FloatField()) * 100.0 / Sum('sales_7d')
-            ).order_by('-spend')
-            
-            # Fix potential division by zero issues
-            for item in summary:
-                if item['ctr'] is None or not item['impressions']:
-                    item['ctr'] = 0
-                if item['acos_7d'] is None or not item['sales_7d']:
-                    item['acos_7d'] = 0
+            # Served from the pre-aggregated rollups, ratios are zero-safe
+            summary = AdsRollupService.summarize(
+                'campaign', tenant_id, start_date, end_date, order_by='-spend'
+            )
             
             return Response({
                 'success': True,
@@ -827,30 +994,10 @@ class DailyProductAdsDataViewSet(viewsets.ReadOnlyModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            # Get aggregated data by ASIN
-            summary = DailyProductAdsData.objects.filter(
-                tenant_id=tenant_id,
-                date__range=[start_date, end_date],
-                advertised_asin__isnull=False
-            ).values('advertised_asin', 'advertised_sku').annotate(
-                impressions=Sum('impressions'),
-                clicks=Sum('clicks'),
-                spend=Sum('spend'),
-                sales_1d=Sum('sales_1d'),
-                sales_7d=Sum('sales_7d'),
-                sales_30d=Sum('sales_30d'),
-                units_sold_clicks_30d=Sum('units_sold_clicks_30d'),
-                purchases_30d=Sum('purchases_30d'),
-                ctr=Sum(F('clicks') * 100.0, output_field=FloatField()) / Sum('impressions'),
-                acos_7d=Sum('spend', output_field=FloatField()) * 100.0 / Sum('sales_7d')
-            ).order_by('-sales_7d')
-            
-            # Fix potential division by zero issues
-            for item in summary:
-                if item['ctr'] is None or not item['impressions']:
-                    item['ctr'] = 0
-                if item['acos_7d'] is None or not item['sales_7d']:
-                    item['acos_7d'] = 0
+            # Served from the pre-aggregated rollups, ratios are zero-safe
+            summary = AdsRollupService.summarize(
+                'asin', tenant_id, start_date, end_date, order_by='-sales_7d'
+            )
             
             return Response({
                 'success': True,
@@ -863,11 +1010,18 @@ class DailyProductAdsDataViewSet(viewsets.ReadOnlyModelViewSet):
                 'message': f'Failed to get ASIN performance: {str(e)}'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-class SearchTermReportDataViewSet(viewsets.ReadOnlyModelViewSet):
+class SearchTermReportDataViewSet(LeanDataListMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing search term report data"""
-    queryset = SearchTermReportData.objects.all().select_related('tenant', 'report')
+    queryset = SearchTermReportData.objects.all().select_related('tenant')
     serializer_class = SearchTermReportDataSerializer
     permission_classes = [] # Temporarily removing permissions
+    keyset_ordering_field = 'clicks'
+    
+    QUERY_MATCH_LOOKUPS = {
+        'contains': 'query__icontains',
+        'prefix': 'query__istartswith',
+        'exact': 'query__iexact',
+    }
     
     def get_queryset(self):
         """Filter data based on query parameters"""
@@ -899,12 +1053,16 @@ class SearchTermReportDataViewSet(viewsets.ReadOnlyModelViewSet):
         if ad_group_id:
             queryset = queryset.filter(ad_group_id=ad_group_id)
         
-        # Filter by query
+        # Filter by query: substring (default), prefix or exact match. On
+        # PostgreSQL substring and prefix lookups use the trigram index on
+        # UPPER(query), elsewhere they fall back to a LIKE scan
         query = self.request.query_params.get('query')
         if query:
-            queryset = queryset.filter(query__icontains=query)
+            match = self.request.query_params.get('query_match', 'contains')
+            lookup = self.QUERY_MATCH_LOOKUPS.get(match, 'query__icontains')
+            queryset = queryset.filter(**{lookup: query})
         
-        return queryset.order_by('-clicks')
+        return queryset.order_by('-clicks', '-id')
     
     @action(detail=False, methods=['post'])
     def top_search_terms(self, request):
@@ -925,31 +1083,10 @@ class SearchTermReportDataViewSet(viewsets.ReadOnlyModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            # Get aggregated data by search query
-            summary = SearchTermReportData.objects.filter(
-                tenant_id=tenant_id,
-                date__range=[start_date, end_date]
-            ).values('query').annotate(
-                impressions=Sum('impressions'),
-                clicks=Sum('clicks'),
-                cost=Sum('cost'),
-                conversions=Sum('conversions'),
-                sales_7d=Sum('sales_7d'),
-                sales_14d=Sum('sales_14d'),
-                sales_30d=Sum('sales_30d'),
-                ctr=Sum(F('clicks') * 100.0, output_field=FloatField()) / Sum('impressions'),
-                conversion_rate=Sum(F('conversions') * 100.0, output_field=FloatField()) / Sum('clicks'),
-                acos_7d=Sum('cost', output_field=FloatField()) * 100.0 / Sum('sales_7d')
-            ).order_by('-clicks')[:100]  # Limit to top 100 terms
-            
-            # Fix potential division by zero issues
-            for item in summary:
-                if item['ctr'] is None or not item['impressions']:
-                    item['ctr'] = 0
-                if item['conversion_rate'] is None or not item['clicks']:
-                    item['conversion_rate'] = 0
-                if item['acos_7d'] is None or not item['sales_7d']:
-                    item['acos_7d'] = 0
+            # Served from the pre-aggregated rollups, limited to top 100 terms
+            summary = AdsRollupService.summarize(
+                'search_term', tenant_id, start_date, end_date, order_by='-clicks', limit=100
+            )
             
             return Response({
                 'success': True,
@@ -1010,3 +1147,139 @@ class ReportScheduleViewSet(viewsets.ModelViewSet):
             'is_active': schedule.is_active,
             'message': f"Schedule {'activated' if schedule.is_active else 'deactivated'} successfully"
         })
+
+class AdsOptimisationViewSet(viewsets.ViewSet):
+    """ViewSet for running bulk-file optimisations on ingested report data"""
+    permission_classes = [] # Temporarily removing permissions
+    
+    def _get_tenant(self, tenant_id):
+        try:
+            return Tenant.objects.get(id=tenant_id)
+        except Tenant.DoesNotExist:
+            raise NotFound(f'Tenant {tenant_id} not found')
+    
+    @action(detail=False, methods=['post'])
+    def sp(self, request):
+        """Run the SP optimiser over a tenant's ingested data for a date range"""
+        serializer = OptimisationRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        tenant = self._get_tenant(data['tenant_id'])
+        
+        try:
+            result = AdsOptimisationService.run_sp_optimisation(
+                tenant, data['start_date'], data['end_date'], data['target_acos'],
+                preview_rows=preview_row_limit(request)
+            )
+            if not result['success']:
+                return Response(result, status=status.HTTP_400_BAD_REQUEST)
+            
+            if not result['file'].get('url'):
+                result['file']['url'] = get_file_url(result['file']['file_id'], request)
+            return Response(result)
+            
+        except Exception as e:
+            logger.exception(f"SP optimisation failed for tenant {tenant.id}")
+            return Response({
+                'success': False,
+                'message': f'Failed to run optimisation: {str(e)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'])
+    def frames(self, request):
+        """Preview the optimiser input built from ingested data, optionally projected to some columns"""
+        serializer = OptimisationFramesSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        tenant = self._get_tenant(data['tenant_id'])
+        build = (
+            AdsOptimisationDataAdapter.bulk_frame if data['frame'] == 'bulk'
+            else AdsOptimisationDataAdapter.search_term_frame
+        )
+        
+        try:
+            df = build(tenant.id, data['start_date'], data['end_date'], columns=data.get('columns'))
+            head = df.head(data['limit'])
+            return Response({
+                'success': True,
+                'frame': data['frame'],
+                'total_rows': len(df),
+                'columns': list(df.columns),
+                'data': head.astype(object).where(head.notna(), None).to_dict(orient='records')
+            })
+            
+        except Exception as e:
+            return Response({
+                'success': False,
+                'message': f'Failed to build optimisation data: {str(e)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+class AdsAnalyticsViewSet(viewsets.ViewSet):
+    """ViewSet for history queries served from the columnar analytics store"""
+    permission_classes = [] # Temporarily removing permissions
+    
+    def _run(self, query, description):
+        try:
+            return Response({
+                'success': True,
+                'data': query()
+            })
+        except AnalyticsQueryError as e:
+            return Response({
+                'success': False,
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.exception(f"Ads analytics {description} query failed")
+            return Response({
+                'success': False,
+                'message': f'Failed to get {description}: {str(e)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'])
+    def timeseries(self, request):
+        """Get metrics per day/week/month with period-over-period change, optionally per dimension value"""
+        serializer = AnalyticsTimeseriesSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        return self._run(lambda: AdsAnalyticsStore.timeseries(
+            data['dataset'], data['tenant_id'], data['start_date'], data['end_date'],
+            interval=data['interval'],
+            metrics=data.get('metrics'),
+            group_by=data.get('group_by'),
+            filters=data.get('filters'),
+            top=data.get('top')
+        ), 'timeseries')
+    
+    @action(detail=False, methods=['post'])
+    def breakdown(self, request):
+        """Get metrics over a date range grouped by one or more dimensions"""
+        serializer = AnalyticsBreakdownSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        return self._run(lambda: AdsAnalyticsStore.breakdown(
+            data['dataset'], data['tenant_id'], data['start_date'], data['end_date'],
+            dimensions=data['dimensions'],
+            metrics=data.get('metrics'),
+            order_by=data.get('order_by'),
+            filters=data.get('filters'),
+            limit=data['limit']
+        ), 'breakdown')
+    
+    @action(detail=False, methods=['get'])
+    def coverage(self, request):
+        """List the months mirrored in the analytics store for a tenant"""
+        serializer = AnalyticsCoverageSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        return self._run(lambda: AdsAnalyticsStore.coverage(data['dataset'], data['tenant_id']), 'coverage')
@@ -7,6 +7,7 @@ import logging
 from django.conf import settings
 from django.utils import timezone
 
+from core import http_client
 from .models import AmazonSPApiToken
 
 logger = logging.getLogger(__name__)
@@ -21,6 +22,8 @@ class SPApiAuthService:
         'FE': 'https://api.amazon.co.jp/auth/o2/token',
     }
     
+    RESTRICTED_DATA_TOKEN_URL = 'https://sellingpartnerapi-eu.amazon.com/tokens/2021-03-01/restrictedDataToken'
+    
     @classmethod
     def get_access_token(cls, client_id=None, client_secret=None, refresh_token=None, region='EU'):
         """
@@ -52,6 +55,41 @@ class SPApiAuthService:
                 raise ValueError("No token info provided and no active token found in database")
         
         # If we get here, we need to refresh the token
+        token_data = cls.request_access_token(client_id, client_secret, refresh_token, region)
+        access_token = token_data['access_token']
+        token_expires_at = token_data['token_expires_at']
+        
+        # Update or create token record in database
+        token_obj, created = AmazonSPApiToken.objects.update_or_create(
+            client_id=client_id,
+            client_secret=client_secret,
+            refresh_token=refresh_token,
+            defaults={
+                'access_token': access_token,
+                'token_expires_at': token_expires_at,
+                'region': region,
+                'is_active': True
+            }
+        )
+        
+        logger.info(f"{'Created' if created else 'Updated'} SP-API token that expires at {token_expires_at}")
+        
+        return access_token
+    
+    @classmethod
+    def request_access_token(cls, client_id, client_secret, refresh_token, region='EU'):
+        """
+        Exchange a refresh token for a new LWA access token (no database writes)
+        
+        Args:
+            client_id: The LWA client ID
+            client_secret: The LWA client secret
+            refresh_token: The refresh token
+            region: The Amazon region (NA, EU, FE)
+            
+        Returns:
+            Dict with access_token and token_expires_at
+        """
         url = cls.TOKEN_ENDPOINTS.get(region)
         if not url:
             raise ValueError(f"Invalid region: {region}")
@@ -64,32 +102,17 @@ class SPApiAuthService:
         }
         
         try:
-            response = requests.post(url, data=data)
+            response = http_client.post(url, region=region, data=data)
             response.raise_for_status()
             token_data = response.json()
             
             # Calculate token expiration (typically 1 hour)
             expires_in = token_data.get('expires_in', 3600)
-            token_expires_at = timezone.now() + datetime.timedelta(seconds=expires_in)
-            
-            access_token = token_data['access_token']
             
-            # Update or create token record in database
-            token_obj, created = AmazonSPApiToken.objects.update_or_create(
-                client_id=client_id,
-                client_secret=client_secret,
-                refresh_token=refresh_token,
-                defaults={
-                    'access_token': access_token,
-                    'token_expires_at': token_expires_at,
-                    'region': region,
-                    'is_active': True
-                }
-            )
-            
-            logger.info(f"{'Created' if created else 'Updated'} SP-API token that expires at {token_expires_at}")
-            
-            return access_token
+            return {
+                'access_token': token_data['access_token'],
+                'token_expires_at': timezone.now() + datetime.timedelta(seconds=expires_in)
+            }
         
         except requests.exceptions.RequestException as e:
             logger.error(f"Error refreshing token: {str(e)}")
@@ -109,7 +132,21 @@ class SPApiAuthService:
         Returns:
             The restricted data token
         """
-        url = "https://sellingpartnerapi-eu.amazon.com/tokens/2021-03-01/restrictedDataToken"
+        return cls.request_restricted_data_token(access_token, restricted_resources)['restricted_data_token']
+    
+    @classmethod
+    def request_restricted_data_token(cls, access_token, restricted_resources):
+        """
+        Request a Restricted Data Token along with its expiry
+        
+        Args:
+            access_token: The LWA access token
+            restricted_resources: List of restricted resource objects
+            
+        Returns:
+            Dict with restricted_data_token and expires_at
+        """
+        url = cls.RESTRICTED_DATA_TOKEN_URL
         
         headers = {
             "Content-Type": "application/json",
@@ -121,16 +158,22 @@ class SPApiAuthService:
         }
         
         try:
-            response = requests.post(url, headers=headers, json=data)
+            response = http_client.post(url, region='EU', headers=headers, json=data)
             response.raise_for_status()
             token_data = response.json()
             
             logger.info(f"Successfully obtained restricted data token")
             
-            return token_data.get('restrictedDataToken')
+            # RDTs are valid for an hour unless the response says otherwise
+            expires_in = token_data.get('expiresIn', 3600)
+            
+            return {
+                'restricted_data_token': token_data.get('restrictedDataToken'),
+                'expires_at': timezone.now() + datetime.timedelta(seconds=expires_in)
+            }
         
         except requests.exceptions.RequestException as e:
             logger.error(f"Error getting restricted data token: {str(e)}")
             if hasattr(e, 'response') and e.response:
                 logger.error(f"Response: {e.response.text}")
-            raise 
\ No newline at end of file
+            raise
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
+from datetime import datetime, time as dt_time
+import logging
+import time
+
+from amazon_auth.orders_sync import OrdersSyncService
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Incrementally sync SP-API orders and order items updated since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--marketplace',
+            action='append',
+            required=True,
+            help='Marketplace ID to sync (repeatable)'
+        )
+        parser.add_argument('--region', default='EU', choices=['NA', 'EU', 'FE'], help='SP-API region')
+        parser.add_argument(
+            '--since',
+            help='Sync orders updated since this date or ISO timestamp instead of the checkpoint'
+        )
+        parser.add_argument('--workers', type=int, help='Concurrent order item requests')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        self.stdout.write(self.style.SUCCESS(f'Started syncing SP-API orders at {timezone.now()}'))
+
+        since = None
+        if options.get('since'):
+            since = parse_datetime(options['since'])
+            if since is None:
+                day = parse_date(options['since'])
+                if day is None:
+                    raise CommandError(f"Invalid --since value: {options['since']}")
+                since = datetime.combine(day, dt_time.min)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        try:
+            result = OrdersSyncService.sync(
+                options['marketplace'],
+                region=options['region'],
+                since=since,
+                max_workers=options.get('workers')
+            )
+            self.stdout.write(
+                f"Orders updated {result['from']:%Y-%m-%d %H:%M} - {result['to']:%Y-%m-%d %H:%M}: "
+                f"{result['orders']} orders, {result['items']} items in {result['pages']} pages"
+            )
+            if result['failed']:
+                self.stdout.write(self.style.WARNING(
+                    f"Items of {len(result['failed'])} orders failed; the next run will retry them"
+                ))
+
+            elapsed_time = time.time() - start_time
+            self.stdout.write(self.style.SUCCESS(
+                f'Successfully synced orders in {elapsed_time:.2f} seconds'
+            ))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error syncing orders: {str(e)}'))
+            logger.exception("Error in sync_sp_api_orders command")
+            raise
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_auth', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SPApiOrderSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sync_key', models.CharField(help_text='Region and sorted marketplace IDs', max_length=200, unique=True)),
+                ('last_updated_before', models.DateTimeField(blank=True, help_text='Orders updated before this time have been synced', null=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('orders_synced', models.IntegerField(default=0, help_text='Orders written by the last run')),
+                ('items_synced', models.IntegerField(default=0, help_text='Order items written by the last run')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SPApiOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amazon_order_id', models.CharField(max_length=50, unique=True)),
+                ('marketplace_id', models.CharField(db_index=True, max_length=20)),
+                ('order_status', models.CharField(blank=True, max_length=30, null=True)),
+                ('fulfillment_channel', models.CharField(blank=True, max_length=10, null=True)),
+                ('sales_channel', models.CharField(blank=True, max_length=50, null=True)),
+                ('purchase_date', models.DateTimeField(blank=True, null=True)),
+                ('last_update_date', models.DateTimeField(blank=True, null=True)),
+                ('order_total_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('order_total_currency', models.CharField(blank=True, max_length=3, null=True)),
+                ('number_of_items_shipped', models.IntegerField(default=0)),
+                ('number_of_items_unshipped', models.IntegerField(default=0)),
+                ('raw_data', models.JSONField(default=dict, help_text='Order as returned by the API')),
+                ('synced_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['marketplace_id', 'purchase_date'], name='amazon_auth_marketp_3c706a_idx'), models.Index(fields=['last_update_date'], name='amazon_auth_last_up_34fa86_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SPApiOrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_item_id', models.CharField(max_length=50)),
+                ('asin', models.CharField(blank=True, db_index=True, max_length=20, null=True)),
+                ('seller_sku', models.CharField(blank=True, max_length=200, null=True)),
+                ('title', models.TextField(blank=True, null=True)),
+                ('quantity_ordered', models.IntegerField(default=0)),
+                ('quantity_shipped', models.IntegerField(default=0)),
+                ('item_price_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('item_price_currency', models.CharField(blank=True, max_length=3, null=True)),
+                ('raw_data', models.JSONField(default=dict, help_text='Order item as returned by the API')),
+                ('synced_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('order', models.ForeignKey(db_column='amazon_order_id', on_delete=django.db.models.deletion.CASCADE, related_name='items', to='amazon_auth.spapiorder', to_field='amazon_order_id')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('order', 'order_item_id'), name='unique_sp_api_order_item')],
+            },
+        ),
+    ]
@@ -25,4 +25,71 @@ class AmazonSPApiToken(models.Model):
         """Check if the token is expired"""
         if not self.token_expires_at:
             return True
-        return self.token_expires_at <= timezone.now() 
\ No newline at end of file
+        return self.token_expires_at <= timezone.now()
+
+
+class SPApiOrder(models.Model):
+    """Order synced from the SP-API Orders API (see orders_sync.py)"""
+    amazon_order_id = models.CharField(max_length=50, unique=True)
+    marketplace_id = models.CharField(max_length=20, db_index=True)
+    order_status = models.CharField(max_length=30, blank=True, null=True)
+    fulfillment_channel = models.CharField(max_length=10, blank=True, null=True)
+    sales_channel = models.CharField(max_length=50, blank=True, null=True)
+    purchase_date = models.DateTimeField(null=True, blank=True)
+    last_update_date = models.DateTimeField(null=True, blank=True)
+    order_total_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    order_total_currency = models.CharField(max_length=3, blank=True, null=True)
+    number_of_items_shipped = models.IntegerField(default=0)
+    number_of_items_unshipped = models.IntegerField(default=0)
+    raw_data = models.JSONField(default=dict, help_text="Order as returned by the API")
+    synced_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['marketplace_id', 'purchase_date']),
+            models.Index(fields=['last_update_date']),
+        ]
+
+    def __str__(self):
+        return f"Order {self.amazon_order_id}"
+
+
+class SPApiOrderItem(models.Model):
+    """Line item of a synced SP-API order"""
+    order = models.ForeignKey(
+        SPApiOrder,
+        to_field='amazon_order_id',
+        db_column='amazon_order_id',
+        on_delete=models.CASCADE,
+        related_name='items'
+    )
+    order_item_id = models.CharField(max_length=50)
+    asin = models.CharField(max_length=20, blank=True, null=True, db_index=True)
+    seller_sku = models.CharField(max_length=200, blank=True, null=True)
+    title = models.TextField(blank=True, null=True)
+    quantity_ordered = models.IntegerField(default=0)
+    quantity_shipped = models.IntegerField(default=0)
+    item_price_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    item_price_currency = models.CharField(max_length=3, blank=True, null=True)
+    raw_data = models.JSONField(default=dict, help_text="Order item as returned by the API")
+    synced_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'order_item_id'], name='unique_sp_api_order_item'),
+        ]
+
+    def __str__(self):
+        return f"Order item {self.order_item_id} ({self.order_id})"
+
+
+class SPApiOrderSyncState(models.Model):
+    """Checkpoint of the incremental orders sync for a set of marketplaces"""
+    sync_key = models.CharField(max_length=200, unique=True, help_text="Region and sorted marketplace IDs")
+    last_updated_before = models.DateTimeField(null=True, blank=True, help_text="Orders updated before this time have been synced")
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    orders_synced = models.IntegerField(default=0, help_text="Orders written by the last run")
+    items_synced = models.IntegerField(default=0, help_text="Order items written by the last run")
+
+    def __str__(self):
+        return f"Orders sync {self.sync_key}"
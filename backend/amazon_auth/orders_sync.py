@@ -0,0 +1,283 @@
+"""
+Incremental orders sync for the SP-API Orders API
+
+Each run pulls the orders updated since the last checkpoint
+(LastUpdatedAfter), following NextToken through every page. The items of each
+page of orders are fetched concurrently. Orders and items are written with
+bulk upserts, so re-running a window is harmless.
+
+Calls are spaced by a token bucket per operation using Amazon's default rate
+and burst (RATE_LIMITS), so a burst of item requests drains the bucket and the
+rest follow at the sustained rate instead of being throttled. A 429 that still
+gets through is retried by core.http_client.
+
+The checkpoint only moves forward when every order in the window was synced
+with its items. A failed run is covered again by the next one.
+"""
+import logging
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.dispatch import KeyedRateLimiter, dispatch_grouped
+from . import utils
+from .models import SPApiOrder, SPApiOrderItem, SPApiOrderSyncState
+
+logger = logging.getLogger(__name__)
+
+# Default (requests per second, burst) of each operation in the Orders API
+RATE_LIMITS = {
+    'getOrders': (0.0167, 20),
+    'getOrderItems': (0.5, 30),
+}
+
+PAGE_SIZE = 100
+# LastUpdatedBefore must be at least two minutes in the past
+API_LAG = timedelta(minutes=2)
+# Each run re-reads a few minutes before the checkpoint to catch late updates
+CHECKPOINT_OVERLAP = timedelta(minutes=5)
+INITIAL_DAYS = getattr(settings, 'SP_API_ORDERS_INITIAL_DAYS', 30)
+
+ORDER_UPSERT_FIELDS = [
+    'marketplace_id', 'order_status', 'fulfillment_channel', 'sales_channel', 'purchase_date',
+    'last_update_date', 'order_total_amount', 'order_total_currency', 'number_of_items_shipped',
+    'number_of_items_unshipped', 'raw_data', 'synced_at',
+]
+ITEM_UPSERT_FIELDS = [
+    'asin', 'seller_sku', 'title', 'quantity_ordered', 'quantity_shipped', 'item_price_amount',
+    'item_price_currency', 'raw_data', 'synced_at',
+]
+
+
+def _isoformat(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _money(value):
+    """Return (amount, currency) from an SP-API Money object"""
+    if not value:
+        return None, None
+    try:
+        amount = Decimal(str(value.get('Amount')))
+    except (InvalidOperation, TypeError):
+        amount = None
+    return amount, value.get('CurrencyCode')
+
+
+class OrdersSyncService:
+    """Syncs SP-API orders and order items into SPApiOrder / SPApiOrderItem"""
+
+    @classmethod
+    def sync_key(cls, region, marketplace_ids):
+        """Checkpoint key for a region and set of marketplaces"""
+        return f"{region}:{','.join(sorted(marketplace_ids))}"
+
+    @classmethod
+    def sync(cls, marketplace_ids, region='EU', since=None, max_workers=None):
+        """
+        Pull the orders updated since the last checkpoint, with their items
+
+        Args:
+            marketplace_ids: List of marketplace IDs
+            region: The Amazon region (NA, EU, FE)
+            since: Optional datetime to sync from instead of the checkpoint
+            max_workers: Concurrent order item requests, defaults to SP_API_ORDERS_SYNC_WORKERS
+
+        Returns:
+            Dict with the window synced and counts of pages, orders, items and failed orders
+        """
+        max_workers = max_workers or getattr(settings, 'SP_API_ORDERS_SYNC_WORKERS', 8)
+        key = cls.sync_key(region, marketplace_ids)
+        state, _ = SPApiOrderSyncState.objects.get_or_create(sync_key=key)
+
+        window_end = timezone.now() - API_LAG
+        if since:
+            window_start = since
+        elif state.last_updated_before:
+            window_start = state.last_updated_before - CHECKPOINT_OVERLAP
+        else:
+            window_start = window_end - timedelta(days=INITIAL_DAYS)
+
+        limiters = {operation: KeyedRateLimiter(rate, burst) for operation, (rate, burst) in RATE_LIMITS.items()}
+        logger.info(f"Syncing orders for {key} updated between {window_start} and {window_end}")
+
+        result = {'from': window_start, 'to': window_end, 'pages': 0, 'orders': 0, 'items': 0, 'failed': []}
+        next_token = None
+        while True:
+            limiters['getOrders'].acquire(key)
+            response = utils.get_orders(
+                marketplace_ids=marketplace_ids,
+                region=region,
+                last_updated_after=_isoformat(window_start),
+                last_updated_before=_isoformat(window_end),
+                next_token=next_token,
+                max_results=PAGE_SIZE
+            )
+            payload = (response or {}).get('payload') or {}
+            orders = payload.get('Orders') or []
+
+            result['pages'] += 1
+            result['orders'] += cls.save_orders(orders)
+            items, failed = cls.sync_order_items(
+                [order['AmazonOrderId'] for order in orders],
+                region,
+                limiters['getOrderItems'],
+                key,
+                max_workers
+            )
+            result['items'] += items
+            result['failed'].extend(failed)
+
+            next_token = payload.get('NextToken')
+            if not next_token:
+                break
+
+        state.last_run_at = timezone.now()
+        state.orders_synced = result['orders']
+        state.items_synced = result['items']
+        update_fields = ['last_run_at', 'orders_synced', 'items_synced']
+        if not result['failed']:
+            state.last_updated_before = window_end
+            update_fields.append('last_updated_before')
+        else:
+            logger.warning(f"Items of {len(result['failed'])} orders could not be synced, not advancing the checkpoint")
+        state.save(update_fields=update_fields)
+
+        logger.info(
+            f"Synced {result['orders']} orders and {result['items']} items for {key} "
+            f"in {result['pages']} pages"
+        )
+        return result
+
+    @classmethod
+    def save_orders(cls, orders):
+        """
+        Upsert a page of orders
+
+        Args:
+            orders: Order objects from the Orders API
+
+        Returns:
+            Number of orders written
+        """
+        now = timezone.now()
+        records = {}
+        for order in orders:
+            amount, currency = _money(order.get('OrderTotal'))
+            records[order['AmazonOrderId']] = SPApiOrder(
+                amazon_order_id=order['AmazonOrderId'],
+                marketplace_id=order.get('MarketplaceId') or '',
+                order_status=order.get('OrderStatus'),
+                fulfillment_channel=order.get('FulfillmentChannel'),
+                sales_channel=order.get('SalesChannel'),
+                purchase_date=parse_datetime(order['PurchaseDate']) if order.get('PurchaseDate') else None,
+                last_update_date=parse_datetime(order['LastUpdateDate']) if order.get('LastUpdateDate') else None,
+                order_total_amount=amount,
+                order_total_currency=currency,
+                number_of_items_shipped=order.get('NumberOfItemsShipped') or 0,
+                number_of_items_unshipped=order.get('NumberOfItemsUnshipped') or 0,
+                raw_data=order,
+                synced_at=now,
+            )
+        if records:
+            SPApiOrder.objects.bulk_create(
+                records.values(),
+                update_conflicts=True,
+                unique_fields=['amazon_order_id'],
+                update_fields=ORDER_UPSERT_FIELDS
+            )
+        return len(records)
+
+    @classmethod
+    def fetch_order_items(cls, order_id, region, limiter, key):
+        """
+        All items of an order, following NextToken
+
+        Args:
+            order_id: The Amazon order ID
+            region: The Amazon region (NA, EU, FE)
+            limiter: KeyedRateLimiter for getOrderItems
+            key: Rate limit key
+
+        Returns:
+            List of OrderItem objects
+        """
+        items = []
+        next_token = None
+        while True:
+            limiter.acquire(key)
+            response = utils.get_order_items(order_id, region=region, next_token=next_token)
+            payload = (response or {}).get('payload') or {}
+            items.extend(payload.get('OrderItems') or [])
+            next_token = payload.get('NextToken')
+            if not next_token:
+                return items
+
+    @classmethod
+    def sync_order_items(cls, order_ids, region, limiter, key, max_workers):
+        """
+        Fetch the items of a page of orders concurrently and upsert them
+
+        Items that are no longer part of an order are removed.
+
+        Args:
+            order_ids: Amazon order IDs
+            region: The Amazon region (NA, EU, FE)
+            limiter: KeyedRateLimiter for getOrderItems
+            key: Rate limit key
+            max_workers: Concurrent requests
+
+        Returns:
+            (items written, list of order IDs whose items could not be fetched)
+        """
+        outcomes = dispatch_grouped(
+            order_ids,
+            group_key=lambda order_id: order_id,
+            handler=lambda order_id: cls.fetch_order_items(order_id, region, limiter, key),
+            max_workers=max_workers
+        )
+
+        now = timezone.now()
+        records = {}
+        synced = {}
+        failed = []
+        for order_id, items, error in outcomes:
+            if error is not None:
+                failed.append(order_id)
+                continue
+            synced[order_id] = []
+            for item in items:
+                amount, currency = _money(item.get('ItemPrice'))
+                records[(order_id, item['OrderItemId'])] = SPApiOrderItem(
+                    order_id=order_id,
+                    order_item_id=item['OrderItemId'],
+                    asin=item.get('ASIN'),
+                    seller_sku=item.get('SellerSKU'),
+                    title=item.get('Title'),
+                    quantity_ordered=item.get('QuantityOrdered') or 0,
+                    quantity_shipped=item.get('QuantityShipped') or 0,
+                    item_price_amount=amount,
+                    item_price_currency=currency,
+                    raw_data=item,
+                    synced_at=now,
+                )
+                synced[order_id].append(item['OrderItemId'])
+
+        if records:
+            SPApiOrderItem.objects.bulk_create(
+                records.values(),
+                update_conflicts=True,
+                unique_fields=['order', 'order_item_id'],
+                update_fields=ITEM_UPSERT_FIELDS
+            )
+        if synced:
+            stale = Q()
+            for order_id, item_ids in synced.items():
+                stale |= Q(order_id=order_id) & ~Q(order_item_id__in=item_ids)
+            SPApiOrderItem.objects.filter(stale).delete()
+
+        return len(records), failed
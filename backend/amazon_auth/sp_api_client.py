@@ -4,7 +4,8 @@ Amazon SP API Client
 import logging
 import requests
 import json
-from .auth_service import SPApiAuthService
+from core import http_client
+from .token_cache import SPApiCredentialCache
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +29,7 @@ class SPApiClient:
     def get_headers(self, access_token=None, restricted_data_token=None):
         """Get the headers for API requests"""
         if not access_token:
-            access_token = SPApiAuthService.get_access_token()
+            access_token = SPApiCredentialCache.get_access_token()
         
         headers = {
             'Content-Type': 'application/json',
@@ -56,8 +57,8 @@ class SPApiClient:
             params: Query parameters
             data: Form data
             json_data: JSON data (for POST/PUT requests)
-            access_token: Optional access token (will be fetched if not provided)
-            use_rdt: Whether to use a Restricted Data Token
+            access_token: Optional access token (the cached token is used if not provided)
+            use_rdt: Whether to use a Restricted Data Token (cached per resource set)
             restricted_resources: List of restricted resources (required if use_rdt=True)
             
         Returns:
@@ -65,7 +66,7 @@ class SPApiClient:
         """
         # Get the access token if not provided
         if not access_token:
-            access_token = SPApiAuthService.get_access_token()
+            access_token = SPApiCredentialCache.get_access_token()
         
         # If Restricted Data Token is needed
         restricted_data_token = None
@@ -73,7 +74,7 @@ class SPApiClient:
             if not restricted_resources:
                 raise ValueError("Restricted resources required for RDT")
                 
-            restricted_data_token = SPApiAuthService.get_restricted_data_token(
+            restricted_data_token = SPApiCredentialCache.get_restricted_data_token(
                 access_token, restricted_resources
             )
         
@@ -86,9 +87,10 @@ class SPApiClient:
         
         # Make the request
         try:
-            response = requests.request(
-                method=method,
-                url=url,
+            response = http_client.request(
+                method,
+                url,
+                region=self.region,
                 headers=headers,
                 params=params,
                 data=data,
@@ -108,6 +110,16 @@ class SPApiClient:
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Error making request: {str(e)}")
+            status_code = e.response.status_code if e.response is not None else None
+            if status_code == 401:
+                # Don't keep serving a token the API has rejected
+                SPApiCredentialCache.invalidate(access_token)
+                if restricted_data_token:
+                    SPApiCredentialCache.invalidate(restricted_data_token)
+            elif status_code == 403 and restricted_data_token:
+                # A 403 usually means a missing role, which a new access token would not fix;
+                # only the RDT, which is scoped to the requested resources, is dropped
+                SPApiCredentialCache.invalidate(restricted_data_token)
             if hasattr(e, 'response') and e.response:
                 logger.error(f"Response status: {e.response.status_code}")
                 logger.error(f"Response content: {e.response.text}")
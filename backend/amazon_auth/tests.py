@@ -0,0 +1,303 @@
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import urlparse, parse_qs
+
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from requests.exceptions import HTTPError
+
+from . import orders_sync
+from .auth_service import SPApiAuthService
+from .models import AmazonSPApiToken, SPApiOrder, SPApiOrderItem, SPApiOrderSyncState
+from .orders_sync import OrdersSyncService, _isoformat
+from .sp_api_client import SPApiClient
+from .token_cache import SPApiCredentialCache
+
+
+class FakeSpApiHandler(BaseHTTPRequestHandler):
+    """Serves the LWA token, RDT and Orders API operations used by the orders sync"""
+    orders = []
+    items = {}
+    failing_orders = set()
+    token_status = {}
+    page_size = 10
+    item_page_size = 2
+    latency = 0.0
+    calls = {}
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def count(self, operation):
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def reply(self, body, status=200):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.path == '/auth/o2/token':
+            self.count('token')
+            return self.reply({'access_token': 'lwa-token', 'token_type': 'bearer', 'expires_in': 3600})
+        self.count('rdt')
+        self.reply({'restrictedDataToken': 'rdt-token', 'expiresIn': 3600})
+
+    def do_GET(self):
+        handler = type(self)
+        url = urlparse(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        token = self.headers.get('x-amz-access-token')
+        if token != 'rdt-token' or token in handler.token_status:
+            return self.reply({'errors': [{'code': 'Unauthorized'}]}, handler.token_status.get(token, 403))
+
+        parts = url.path.strip('/').split('/')
+        if parts == ['orders', 'v0', 'orders']:
+            self.count('getOrders')
+            after = parse_datetime(query['LastUpdatedAfter'])
+            before = parse_datetime(query['LastUpdatedBefore'])
+            matching = [
+                order for order in handler.orders
+                if after <= parse_datetime(order['LastUpdateDate']) < before
+            ]
+            return self.reply(self.page(matching, 'Orders', query, handler.page_size))
+
+        self.count('getOrderItems')
+        order_id = parts[3]
+        with handler.lock:
+            handler.active += 1
+            handler.max_active = max(handler.max_active, handler.active)
+        try:
+            time.sleep(handler.latency)
+            if order_id in handler.failing_orders:
+                return self.reply({'errors': [{'code': 'InvalidInput'}]}, 400)
+            self.reply(self.page(handler.items.get(order_id, []), 'OrderItems', query, handler.item_page_size))
+        finally:
+            with handler.lock:
+                handler.active -= 1
+
+    @staticmethod
+    def page(values, name, query, size):
+        start = int(query.get('NextToken') or 0)
+        payload = {name: values[start:start + size]}
+        if start + size < len(values):
+            payload['NextToken'] = str(start + size)
+        return {'payload': payload}
+
+
+def make_order(n, updated):
+    return {
+        'AmazonOrderId': f'202-0000000-{n:07d}',
+        'MarketplaceId': 'A1F83G8C2ARO7P',
+        'OrderStatus': 'Unshipped',
+        'FulfillmentChannel': 'MFN',
+        'PurchaseDate': _isoformat(updated - timedelta(hours=1)),
+        'LastUpdateDate': _isoformat(updated),
+        'OrderTotal': {'CurrencyCode': 'GBP', 'Amount': f'{n}.99'},
+        'NumberOfItemsUnshipped': 3,
+    }
+
+
+def make_items(n, count=3):
+    return [
+        {
+            'OrderItemId': f'{n:07d}{i}',
+            'ASIN': f'B0{n:08d}',
+            'SellerSKU': f'SKU-{n}-{i}',
+            'QuantityOrdered': 1,
+            'ItemPrice': {'CurrencyCode': 'GBP', 'Amount': '9.99'},
+        }
+        for i in range(count)
+    ]
+
+
+class OrdersSyncTest(TransactionTestCase):
+    """OrdersSyncService.sync against a local fake SP-API"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSpApiHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{self.server.server_port}'
+
+        FakeSpApiHandler.orders = []
+        FakeSpApiHandler.items = {}
+        FakeSpApiHandler.failing_orders = set()
+        FakeSpApiHandler.latency = 0.0
+        FakeSpApiHandler.calls = {}
+        FakeSpApiHandler.max_active = 0
+
+        for patcher in (
+            mock.patch.dict(SPApiAuthService.TOKEN_ENDPOINTS, {'EU': f'{base_url}/auth/o2/token'}),
+            mock.patch.object(SPApiAuthService, 'RESTRICTED_DATA_TOKEN_URL', f'{base_url}/tokens/2021-03-01/restrictedDataToken'),
+            mock.patch.dict(SPApiClient.BASE_ENDPOINTS, {'EU': base_url}),
+            mock.patch.dict(SPApiCredentialCache._tokens, clear=True),
+            mock.patch.dict(orders_sync.RATE_LIMITS, {'getOrders': (100, 10), 'getOrderItems': (200, 50)}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        cache.clear()
+        AmazonSPApiToken.objects.create(client_id='client', client_secret='secret', refresh_token='refresh')
+
+        now = timezone.now()
+        for n in range(25):
+            order = make_order(n, now - timedelta(days=1, minutes=n))
+            FakeSpApiHandler.orders.append(order)
+            FakeSpApiHandler.items[order['AmazonOrderId']] = make_items(n)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_sync_pages_through_orders_and_fetches_items_concurrently(self):
+        FakeSpApiHandler.latency = 0.1
+
+        started = time.monotonic()
+        result = OrdersSyncService.sync(['A1F83G8C2ARO7P'], max_workers=8)
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(result['pages'], 3)
+        self.assertEqual(result['orders'], 25)
+        self.assertEqual(result['items'], 75)
+        self.assertEqual(SPApiOrder.objects.count(), 25)
+        self.assertEqual(SPApiOrderItem.objects.count(), 75)
+        # Each order has two pages of items
+        self.assertEqual(FakeSpApiHandler.calls['getOrderItems'], 50)
+        self.assertGreater(FakeSpApiHandler.max_active, 1)
+        self.assertLess(elapsed, 50 * 0.1 / 2)
+        # Credentials are requested once, not per call
+        self.assertEqual(FakeSpApiHandler.calls['token'], 1)
+        self.assertEqual(FakeSpApiHandler.calls['rdt'], 2)
+
+        order = SPApiOrder.objects.get(amazon_order_id='202-0000000-0000007')
+        self.assertEqual(str(order.order_total_amount), '7.99')
+        self.assertEqual(order.items.count(), 3)
+
+        state = SPApiOrderSyncState.objects.get()
+        self.assertEqual(state.last_updated_before, result['to'])
+
+    def test_next_run_only_pulls_updated_orders(self):
+        OrdersSyncService.sync(['A1F83G8C2ARO7P'])
+        FakeSpApiHandler.calls = {}
+
+        # One order is shipped and loses an item after the first run
+        order = FakeSpApiHandler.orders[3]
+        order['OrderStatus'] = 'Shipped'
+        order['LastUpdateDate'] = _isoformat(timezone.now() - timedelta(minutes=3))
+        FakeSpApiHandler.items[order['AmazonOrderId']].pop()
+
+        result = OrdersSyncService.sync(['A1F83G8C2ARO7P'])
+
+        self.assertEqual(result['orders'], 1)
+        self.assertEqual(FakeSpApiHandler.calls['getOrders'], 1)
+        self.assertEqual(SPApiOrder.objects.count(), 25)
+        stored = SPApiOrder.objects.get(amazon_order_id=order['AmazonOrderId'])
+        self.assertEqual(stored.order_status, 'Shipped')
+        self.assertEqual(stored.items.count(), 2)
+        self.assertEqual(SPApiOrderItem.objects.count(), 74)
+
+    def test_item_requests_are_rate_limited(self):
+        with mock.patch.dict(orders_sync.RATE_LIMITS, {'getOrderItems': (20, 5)}):
+            started = time.monotonic()
+            OrdersSyncService.sync(['A1F83G8C2ARO7P'], max_workers=16)
+            elapsed = time.monotonic() - started
+
+        # 50 item requests with a burst of 5 at 20 per second
+        self.assertGreaterEqual(elapsed, (50 - 5) / 20 * 0.9)
+
+    def test_failed_orders_keep_the_checkpoint(self):
+        FakeSpApiHandler.failing_orders = {FakeSpApiHandler.orders[0]['AmazonOrderId']}
+
+        result = OrdersSyncService.sync(['A1F83G8C2ARO7P'])
+
+        self.assertEqual(result['failed'], [FakeSpApiHandler.orders[0]['AmazonOrderId']])
+        self.assertEqual(SPApiOrderItem.objects.count(), 72)
+        self.assertIsNone(SPApiOrderSyncState.objects.get().last_updated_before)
+
+
+class SPApiClientRejectedTokenTest(TransactionTestCase):
+    """Which cached credentials SPApiClient drops when the API rejects a call"""
+
+    ORDERS_RESOURCES = [{'method': 'GET', 'path': '/orders/v0/orders'}]
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSpApiHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{self.server.server_port}'
+
+        FakeSpApiHandler.orders = []
+        FakeSpApiHandler.token_status = {}
+        FakeSpApiHandler.calls = {}
+
+        for patcher in (
+            mock.patch.dict(SPApiAuthService.TOKEN_ENDPOINTS, {'EU': f'{base_url}/auth/o2/token'}),
+            mock.patch.object(SPApiAuthService, 'RESTRICTED_DATA_TOKEN_URL', f'{base_url}/tokens/2021-03-01/restrictedDataToken'),
+            mock.patch.dict(SPApiClient.BASE_ENDPOINTS, {'EU': base_url}),
+            mock.patch.dict(SPApiCredentialCache._tokens, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        cache.clear()
+        self.token = AmazonSPApiToken.objects.create(client_id='client', client_secret='secret', refresh_token='refresh')
+        self.client = SPApiClient('EU')
+        self.params = {
+            'LastUpdatedAfter': _isoformat(timezone.now() - timedelta(days=1)),
+            'LastUpdatedBefore': _isoformat(timezone.now()),
+        }
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_orders(self, **kwargs):
+        return self.client.get('/orders/v0/orders', params=self.params, **kwargs)
+
+    def test_forbidden_call_keeps_the_access_token(self):
+        with self.assertRaises(HTTPError):
+            self.get_orders()
+
+        self.token.refresh_from_db()
+        self.assertIsNotNone(self.token.token_expires_at)
+        self.get_orders(use_rdt=True, restricted_resources=self.ORDERS_RESOURCES)
+        self.assertEqual(FakeSpApiHandler.calls['token'], 1)
+
+    def test_forbidden_restricted_call_drops_only_the_rdt(self):
+        self.get_orders(use_rdt=True, restricted_resources=self.ORDERS_RESOURCES)
+        FakeSpApiHandler.token_status = {'rdt-token': 403}
+
+        with self.assertRaises(HTTPError):
+            self.get_orders(use_rdt=True, restricted_resources=self.ORDERS_RESOURCES)
+
+        FakeSpApiHandler.token_status = {}
+        self.get_orders(use_rdt=True, restricted_resources=self.ORDERS_RESOURCES)
+        self.assertEqual(FakeSpApiHandler.calls['rdt'], 2)
+        self.assertEqual(FakeSpApiHandler.calls['token'], 1)
+
+    def test_unauthorized_call_drops_the_access_token(self):
+        self.get_orders(use_rdt=True, restricted_resources=self.ORDERS_RESOURCES)
+        FakeSpApiHandler.token_status = {'rdt-token': 401}
+
+        with self.assertRaises(HTTPError):
+            self.get_orders(use_rdt=True, restricted_resources=self.ORDERS_RESOURCES)
+
+        self.token.refresh_from_db()
+        self.assertIsNone(self.token.token_expires_at)
+        FakeSpApiHandler.token_status = {}
+        self.get_orders(use_rdt=True, restricted_resources=self.ORDERS_RESOURCES)
+        self.assertEqual(FakeSpApiHandler.calls['token'], 2)
+        self.assertEqual(FakeSpApiHandler.calls['rdt'], 2)
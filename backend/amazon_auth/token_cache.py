@@ -0,0 +1,166 @@
+"""
+Credential cache for the SP-API client
+
+Every SP-API call needs an LWA access token and calls to restricted
+operations also need a Restricted Data Token. Both live for an hour, so they
+are kept until EXPIRY_MARGIN before they expire instead of being requested
+again for each call:
+
+- LWA access tokens are cached in process memory in front of the
+  AmazonSPApiToken row. A refresh locks the row (SELECT ... FOR UPDATE), so
+  across processes one caller refreshes and the others pick up its token.
+- RDTs are cached per access token and restricted resource set, in process
+  memory and in Django's cache, which is shared between processes when a
+  shared backend (e.g. Redis) is configured.
+
+Within a process, concurrent callers that miss the cache wait for a single
+refresh per key instead of each requesting their own token.
+"""
+import json
+import hashlib
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .auth_service import SPApiAuthService
+from .models import AmazonSPApiToken
+
+logger = logging.getLogger(__name__)
+
+# Tokens are treated as expired this long before they actually expire
+EXPIRY_MARGIN = timedelta(seconds=getattr(settings, 'SP_API_TOKEN_EXPIRY_MARGIN', 300))
+RDT_CACHE_PREFIX = 'sp_api_rdt'
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:32]
+
+
+class SPApiCredentialCache:
+    """Process-wide cache of SP-API access tokens and Restricted Data Tokens"""
+
+    # key -> (token, expires_at)
+    _tokens = {}
+    _locks = {}
+    _locks_lock = threading.Lock()
+
+    @classmethod
+    def _lock(cls, key):
+        """Lock that single-flights refreshes of one key within the process"""
+        with cls._locks_lock:
+            return cls._locks.setdefault(key, threading.Lock())
+
+    @classmethod
+    def _valid(cls, token, expires_at):
+        return bool(token) and expires_at is not None and expires_at - EXPIRY_MARGIN > timezone.now()
+
+    @classmethod
+    def _cached(cls, key):
+        entry = cls._tokens.get(key)
+        if entry and cls._valid(*entry):
+            return entry[0]
+        return None
+
+    @classmethod
+    def get_access_token(cls, token_obj=None):
+        """
+        Valid LWA access token for a stored SP-API token, refreshing it only when it is about to expire
+
+        Args:
+            token_obj: Optional AmazonSPApiToken, defaults to the active one
+
+        Returns:
+            The access token
+
+        Raises:
+            ValueError: If there is no active token in the database
+        """
+        if token_obj is None:
+            token_obj = AmazonSPApiToken.objects.filter(is_active=True).first()
+            if token_obj is None:
+                raise ValueError("No active token found in database")
+
+        key = ('lwa', token_obj.pk)
+        access_token = cls._cached(key)
+        if access_token:
+            return access_token
+
+        with cls._lock(key):
+            # Another thread may have refreshed it while we waited
+            access_token = cls._cached(key)
+            if access_token:
+                return access_token
+
+            with transaction.atomic():
+                # Other processes block here until the refresh below is committed
+                token_obj = AmazonSPApiToken.objects.select_for_update().get(pk=token_obj.pk)
+                if not cls._valid(token_obj.access_token, token_obj.token_expires_at):
+                    token_data = SPApiAuthService.request_access_token(
+                        token_obj.client_id,
+                        token_obj.client_secret,
+                        token_obj.refresh_token,
+                        region=token_obj.region
+                    )
+                    token_obj.access_token = token_data['access_token']
+                    token_obj.token_expires_at = token_data['token_expires_at']
+                    token_obj.save(update_fields=['access_token', 'token_expires_at', 'updated_at'])
+                    logger.info(f"Refreshed SP-API token that expires at {token_obj.token_expires_at}")
+
+            cls._tokens[key] = (token_obj.access_token, token_obj.token_expires_at)
+            return token_obj.access_token
+
+    @classmethod
+    def get_restricted_data_token(cls, access_token, restricted_resources):
+        """
+        Restricted Data Token for a set of restricted resources, reused until it is about to expire
+
+        Args:
+            access_token: The LWA access token the RDT is requested with
+            restricted_resources: List of restricted resource objects
+
+        Returns:
+            The restricted data token
+        """
+        resources = json.dumps(restricted_resources, sort_keys=True)
+        key = ('rdt', _digest(access_token), _digest(resources))
+        rdt = cls._cached(key)
+        if rdt:
+            return rdt
+
+        with cls._lock(key):
+            rdt = cls._cached(key)
+            if rdt:
+                return rdt
+
+            cache_key = f'{RDT_CACHE_PREFIX}:{key[1]}:{key[2]}'
+            entry = cache.get(cache_key)
+            if not (entry and cls._valid(*entry)):
+                token_data = SPApiAuthService.request_restricted_data_token(access_token, restricted_resources)
+                entry = (token_data['restricted_data_token'], token_data['expires_at'])
+                timeout = (entry[1] - EXPIRY_MARGIN - timezone.now()).total_seconds()
+                if timeout > 0:
+                    cache.set(cache_key, entry, timeout=timeout)
+
+            cls._tokens[key] = entry
+            return entry[0]
+
+    @classmethod
+    def invalidate(cls, token):
+        """
+        Forget a cached access token or RDT (e.g. after the API rejected it)
+
+        Args:
+            token: The access token or RDT
+        """
+        for key, entry in list(cls._tokens.items()):
+            if entry[0] == token:
+                cls._tokens.pop(key, None)
+                if key[0] == 'rdt':
+                    cache.delete(f'{RDT_CACHE_PREFIX}:{key[1]}:{key[2]}')
+        # A rejected access token must not be served from the database either
+        AmazonSPApiToken.objects.filter(access_token=token).update(token_expires_at=None)
@@ -2,19 +2,19 @@
 Utility functions for Amazon SP API
 """
 import logging
-from .auth_service import SPApiAuthService
 from .sp_api_client import SPApiClient
+from .token_cache import SPApiCredentialCache
 
 logger = logging.getLogger(__name__)
 
 def get_access_token():
     """
-    Simple utility function to get an access token
+    Simple utility function to get an access token (cached until shortly before it expires)
     
     Returns:
         str: The access token
     """
-    return SPApiAuthService.get_access_token()
+    return SPApiCredentialCache.get_access_token()
 
 def get_restricted_data_token(restricted_resources):
     """
@@ -33,7 +33,7 @@ def get_restricted_data_token(restricted_resources):
         str: The restricted data token
     """
     access_token = get_access_token()
-    return SPApiAuthService.get_restricted_data_token(access_token, restricted_resources)
+    return SPApiCredentialCache.get_restricted_data_token(access_token, restricted_resources)
 
 def get_client(region='EU'):
     """
@@ -50,9 +50,10 @@ def get_client(region='EU'):
 # Simple convenience functions for common API operations
 
 def get_orders(marketplace_ids=None, created_after=None, created_before=None, 
-               order_statuses=None, region='EU'):
+               order_statuses=None, region='EU', last_updated_after=None,
+               last_updated_before=None, next_token=None, max_results=None):
     """
-    Get orders from the Orders API
+    Get one page of orders from the Orders API
     
     Args:
         marketplace_ids (list): List of marketplace IDs
@@ -60,9 +61,13 @@ def get_orders(marketplace_ids=None, created_after=None, created_before=None,
         created_before (str): ISO 8601 timestamp for order creation date upper bound
         order_statuses (list): List of order statuses to filter by
         region (str): The Amazon region (NA, EU, FE)
+        last_updated_after (str): ISO 8601 timestamp for order update date lower bound
+        last_updated_before (str): ISO 8601 timestamp for order update date upper bound
+        next_token (str): NextToken from the previous page
+        max_results (int): Orders per page (up to 100)
     
     Returns:
-        dict: The API response with orders
+        dict: The API response with orders (payload.NextToken is set when there are more pages)
     """
     client = get_client(region)
     
@@ -76,6 +81,14 @@ def get_orders(marketplace_ids=None, created_after=None, created_before=None,
         params['CreatedBefore'] = created_before
     if order_statuses:
         params['OrderStatuses'] = ','.join(order_statuses)
+    if last_updated_after:
+        params['LastUpdatedAfter'] = last_updated_after
+    if last_updated_before:
+        params['LastUpdatedBefore'] = last_updated_before
+    if next_token:
+        params['NextToken'] = next_token
+    if max_results:
+        params['MaxResultsPerPage'] = max_results
     
     # Define restricted resources for RDT
     restricted_resources = [
@@ -93,30 +106,32 @@ def get_orders(marketplace_ids=None, created_after=None, created_before=None,
         restricted_resources=restricted_resources
     )
 
-def get_order_items(order_id, region='EU'):
+def get_order_items(order_id, region='EU', next_token=None):
     """
-    Get order items for a specific order
+    Get one page of order items for a specific order
     
     Args:
         order_id (str): The Amazon order ID
         region (str): The Amazon region (NA, EU, FE)
+        next_token (str): NextToken from the previous page
     
     Returns:
-        dict: The API response with order items
+        dict: The API response with order items (payload.NextToken is set when there are more pages)
     """
     client = get_client(region)
     
-    # Define restricted resources for RDT
+    # Generic path, so one cached RDT covers the items of every order
     restricted_resources = [
         {
             "method": "GET",
-            "path": f"/orders/v0/orders/{order_id}/orderItems"
+            "path": "/orders/v0/orders/{orderId}/orderItems"
         }
     ]
     
     # Make the API call with RDT
     return client.get(
         f'/orders/v0/orders/{order_id}/orderItems', 
+        params={'NextToken': next_token} if next_token else None,
         use_rdt=True, 
         restricted_resources=restricted_resources
     ) 
\ No newline at end of file
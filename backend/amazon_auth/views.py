@@ -11,6 +11,7 @@ from rest_framework import status
 
 from .models import AmazonSPApiToken
 from .auth_service import SPApiAuthService
+from .token_cache import SPApiCredentialCache
 from .serializers import AmazonSPApiTokenSerializer
 
 logger = logging.getLogger(__name__)
@@ -149,7 +150,7 @@ def set_active_token(request, token_id):
 def get_current_access_token(request):
     """Get the current access token - for use by other APIs"""
     try:
-        access_token = SPApiAuthService.get_access_token()
+        access_token = SPApiCredentialCache.get_access_token()
         return Response({"access_token": access_token})
     except Exception as e:
         logger.error(f"Error getting access token: {str(e)}")
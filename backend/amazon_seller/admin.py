@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import AmazonSellerAccount, AmazonAdvertisingAccount, AdvertisingReport, ReportSchedule
+from .models import (
+    AmazonSellerAccount, AmazonAdvertisingAccount, AdvertisingReport, ReportSchedule,
+    AdvertisingCampaign, AdvertisingAdGroup, AdvertisingMutationJob, AdvertisingMutation
+)
 
 @admin.register(AmazonSellerAccount)
 class AmazonSellerAccountAdmin(admin.ModelAdmin):
@@ -27,10 +30,10 @@ class AmazonAdvertisingAccountAdmin(admin.ModelAdmin):
     list_display = ('profile_id', 'region', 'is_active', 'token_expires_at', 'last_refreshed_at')
     list_filter = ('region', 'is_active')
     search_fields = ('profile_id', 'user__email')
-    readonly_fields = ('created_at', 'updated_at', 'last_refreshed_at')
+    readonly_fields = ('created_at', 'updated_at', 'last_refreshed_at', 'catalog_synced_at')
     fieldsets = (
         (None, {
-            'fields': ('profile_id', 'region', 'is_active', 'user', 'seller_account')
+            'fields': ('profile_id', 'region', 'is_active', 'user', 'seller_account', 'catalog_synced_at')
         }),
         ('Authentication', {
             'fields': ('access_token', 'refresh_token', 'token_type', 'token_expires_at', 'scopes'),
@@ -48,7 +51,10 @@ class AdvertisingReportAdmin(admin.ModelAdmin):
     list_display = ('report_id', 'report_type', 'status', 'created_at', 'completed_at')
     list_filter = ('status', 'report_type', 'created_at')
     search_fields = ('report_id', 'advertising_account__profile_id', 'user__email')
-    readonly_fields = ('created_at', 'updated_at', 'completed_at')
+    readonly_fields = (
+        'created_at', 'updated_at', 'completed_at', 'data_name', 'data_storage', 'data_format',
+        'data_rows', 'data_size', 'data_summary', 'downloaded_at', 'error_message'
+    )
     fieldsets = (
         (None, {
             'fields': ('report_id', 'report_type', 'status', 'advertising_account', 'user')
@@ -57,7 +63,10 @@ class AdvertisingReportAdmin(admin.ModelAdmin):
             'fields': ('metrics', 'start_date', 'end_date', 'segment'),
         }),
         ('Data', {
-            'fields': ('download_url', 'report_data'),
+            'fields': (
+                'download_url', 'data_name', 'data_storage', 'data_format', 'data_rows', 'data_size',
+                'data_summary', 'downloaded_at', 'error_message', 'report_data'
+            ),
             'classes': ('collapse',),
         }),
         ('Timestamps', {
@@ -91,3 +100,35 @@ class ReportScheduleAdmin(admin.ModelAdmin):
             'classes': ('collapse',),
         }),
     )
+
+@admin.register(AdvertisingCampaign)
+class AdvertisingCampaignAdmin(admin.ModelAdmin):
+    """Admin configuration for AdvertisingCampaign model"""
+    list_display = ('campaign_id', 'name', 'campaign_type', 'state', 'daily_budget', 'last_updated_date', 'synced_at')
+    list_filter = ('state', 'campaign_type', 'targeting_type')
+    search_fields = ('campaign_id', 'name', 'advertising_account__profile_id')
+    readonly_fields = ('synced_at', 'last_updated_date', 'raw_data')
+
+@admin.register(AdvertisingAdGroup)
+class AdvertisingAdGroupAdmin(admin.ModelAdmin):
+    """Admin configuration for AdvertisingAdGroup model"""
+    list_display = ('ad_group_id', 'name', 'campaign_id', 'state', 'default_bid', 'last_updated_date', 'synced_at')
+    list_filter = ('state',)
+    search_fields = ('ad_group_id', 'campaign_id', 'name', 'advertising_account__profile_id')
+    readonly_fields = ('synced_at', 'last_updated_date', 'raw_data')
+
+@admin.register(AdvertisingMutationJob)
+class AdvertisingMutationJobAdmin(admin.ModelAdmin):
+    """Admin configuration for AdvertisingMutationJob model"""
+    list_display = ('id', 'advertising_account', 'status', 'total', 'succeeded', 'failed', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('id', 'advertising_account__profile_id', 'source', 'user__email')
+    readonly_fields = ('created_at', 'started_at', 'completed_at', 'total', 'succeeded', 'failed')
+
+@admin.register(AdvertisingMutation)
+class AdvertisingMutationAdmin(admin.ModelAdmin):
+    """Admin configuration for AdvertisingMutation model"""
+    list_display = ('entity_type', 'operation', 'entity_id', 'status', 'error_code', 'job')
+    list_filter = ('status', 'entity_type', 'operation')
+    search_fields = ('entity_id', 'job__id')
+    readonly_fields = ('updated_at',)
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_seller', '0004_schedule_dispatch_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advertisingreport',
+            name='data_format',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='advertisingreport',
+            name='data_name',
+            field=models.CharField(blank=True, help_text='Archive name of the downloaded report rows', max_length=512, null=True),
+        ),
+        migrations.AddField(
+            model_name='advertisingreport',
+            name='data_rows',
+            field=models.IntegerField(blank=True, help_text='Number of rows in the report', null=True),
+        ),
+        migrations.AddField(
+            model_name='advertisingreport',
+            name='data_size',
+            field=models.BigIntegerField(blank=True, help_text='Size of the rows file in bytes', null=True),
+        ),
+        migrations.AddField(
+            model_name='advertisingreport',
+            name='data_storage',
+            field=models.CharField(blank=True, help_text='Storage of the rows file: azure_blob or local', max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='advertisingreport',
+            name='data_summary',
+            field=models.JSONField(blank=True, help_text='Columns and totals of the numeric columns', null=True),
+        ),
+        migrations.AddField(
+            model_name='advertisingreport',
+            name='downloaded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='advertisingreport',
+            name='error_message',
+            field=models.TextField(blank=True, help_text='Last download error', null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_seller', '0005_advertising_report_data_file'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='amazonadvertisingaccount',
+            name='token_refresh_at',
+            field=models.DateTimeField(blank=True, help_text='When the refresh task renews the token (jittered ahead of expiry)', null=True),
+        ),
+        migrations.AddField(
+            model_name='amazonselleraccount',
+            name='token_refresh_at',
+            field=models.DateTimeField(blank=True, help_text='When the refresh task renews the token (jittered ahead of expiry)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='amazonadvertisingaccount',
+            index=models.Index(fields=['is_active', 'token_refresh_at'], name='amazon_sell_is_acti_d50c12_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='amazonselleraccount',
+            index=models.Index(fields=['is_active', 'token_refresh_at'], name='amazon_sell_is_acti_6bad35_idx'),
+        ),
+    ]
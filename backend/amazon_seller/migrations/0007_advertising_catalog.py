@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_seller', '0006_token_refresh_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='amazonadvertisingaccount',
+            name='catalog_synced_at',
+            field=models.DateTimeField(blank=True, help_text='Last full sync of the campaign and ad group catalog', null=True),
+        ),
+        migrations.CreateModel(
+            name='AdvertisingAdGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ad_group_id', models.CharField(max_length=50)),
+                ('campaign_id', models.CharField(max_length=50)),
+                ('name', models.CharField(blank=True, default='', max_length=255)),
+                ('state', models.CharField(blank=True, max_length=20, null=True)),
+                ('serving_status', models.CharField(blank=True, max_length=50, null=True)),
+                ('default_bid', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('last_updated_date', models.DateTimeField(blank=True, help_text='lastUpdatedDate from the API, used for delta refresh', null=True)),
+                ('raw_data', models.JSONField(default=dict, help_text='Ad group as returned by the API')),
+                ('synced_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('advertising_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ad_groups', to='amazon_seller.amazonadvertisingaccount')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['advertising_account', 'campaign_id', 'name'], name='amazon_sell_adverti_5dca3b_idx'), models.Index(fields=['advertising_account', 'name'], name='amazon_sell_adverti_76dac8_idx')],
+                'constraints': [models.UniqueConstraint(fields=('advertising_account', 'ad_group_id'), name='unique_advertising_ad_group')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AdvertisingCampaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('campaign_id', models.CharField(max_length=50)),
+                ('name', models.CharField(blank=True, default='', max_length=255)),
+                ('campaign_type', models.CharField(blank=True, max_length=50, null=True)),
+                ('targeting_type', models.CharField(blank=True, max_length=20, null=True)),
+                ('state', models.CharField(blank=True, max_length=20, null=True)),
+                ('serving_status', models.CharField(blank=True, max_length=50, null=True)),
+                ('daily_budget', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('last_updated_date', models.DateTimeField(blank=True, help_text='lastUpdatedDate from the API, used for delta refresh', null=True)),
+                ('raw_data', models.JSONField(default=dict, help_text='Campaign as returned by the API')),
+                ('synced_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('advertising_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='campaigns', to='amazon_seller.amazonadvertisingaccount')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['advertising_account', 'name'], name='amazon_sell_adverti_d3806d_idx'), models.Index(fields=['advertising_account', 'state', 'name'], name='amazon_sell_adverti_1e9420_idx')],
+                'constraints': [models.UniqueConstraint(fields=('advertising_account', 'campaign_id'), name='unique_advertising_campaign')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:01
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_seller', '0007_advertising_catalog'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdvertisingMutationJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('source', models.CharField(blank=True, default='', help_text='Where the changes came from (e.g. an optimisation file)', max_length=255)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('PARTIAL', 'Partially Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('total', models.IntegerField(default=0)),
+                ('succeeded', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('advertising_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mutation_jobs', to='amazon_seller.amazonadvertisingaccount')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='advertising_mutation_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AdvertisingMutation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('campaigns', 'Campaign'), ('ad_groups', 'Ad Group'), ('keywords', 'Keyword'), ('targets', 'Product Target')], max_length=20)),
+                ('operation', models.CharField(choices=[('create', 'Create'), ('update', 'Update')], max_length=10)),
+                ('entity_id', models.CharField(blank=True, help_text='ID of the entity (returned by the API for creates)', max_length=50, null=True)),
+                ('payload', models.JSONField(help_text='Entity sent to the API')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('SUCCESS', 'Success'), ('ERROR', 'Error')], default='PENDING', max_length=10)),
+                ('error_code', models.CharField(blank=True, max_length=100, null=True)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mutations', to='amazon_seller.advertisingmutationjob')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['job', 'status'], name='amazon_sell_job_id_48b158_idx'), models.Index(fields=['job', 'entity_type', 'operation'], name='amazon_sell_job_id_e2028d_idx')],
+            },
+        ),
+    ]
@@ -19,6 +19,7 @@ class AmazonSellerAccount(models.Model):
     
     # Token lifecycle management
     token_expires_at = models.DateTimeField()
+    token_refresh_at = models.DateTimeField(null=True, blank=True, help_text="When the refresh task renews the token (jittered ahead of expiry)")
     last_refreshed_at = models.DateTimeField(auto_now=True)
     
     # Status
@@ -45,6 +46,7 @@ class AmazonSellerAccount(models.Model):
         indexes = [
             models.Index(fields=['seller_id']),
             models.Index(fields=['token_expires_at']),
+            models.Index(fields=['is_active', 'token_refresh_at']),
         ]
     
     def __str__(self):
@@ -68,6 +70,7 @@ class AmazonAdvertisingAccount(models.Model):
     
     # Token lifecycle management
     token_expires_at = models.DateTimeField()
+    token_refresh_at = models.DateTimeField(null=True, blank=True, help_text="When the refresh task renews the token (jittered ahead of expiry)")
     last_refreshed_at = models.DateTimeField(auto_now=True)
     
     # Status
@@ -88,6 +91,9 @@ class AmazonAdvertisingAccount(models.Model):
     # Scopes (permissions) granted during authorization
     scopes = models.TextField(blank=True, null=True, help_text="Space-separated list of authorized scopes")
     
+    # Local campaign / ad group catalog (see services/catalog.py)
+    catalog_synced_at = models.DateTimeField(null=True, blank=True, help_text="Last full sync of the campaign and ad group catalog")
+    
     # User relationship
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='amazon_advertising_accounts', null=True, blank=True)
     
@@ -100,6 +106,7 @@ class AmazonAdvertisingAccount(models.Model):
         indexes = [
             models.Index(fields=['profile_id']),
             models.Index(fields=['token_expires_at']),
+            models.Index(fields=['is_active', 'token_refresh_at']),
         ]
     
     def __str__(self):
@@ -131,6 +138,16 @@ class AdvertisingReport(models.Model):
     download_url = models.URLField(max_length=1024, null=True, blank=True, help_text="URL to download the report")
     report_data = models.JSONField(null=True, blank=True, help_text="Report data if stored directly")
     
+    # Downloaded rows are kept in a columnar file (see services/report_files.py); only summary stats are stored here
+    data_name = models.CharField(max_length=512, null=True, blank=True, help_text="Archive name of the downloaded report rows")
+    data_storage = models.CharField(max_length=20, null=True, blank=True, help_text="Storage of the rows file: azure_blob or local")
+    data_format = models.CharField(max_length=20, null=True, blank=True)
+    data_rows = models.IntegerField(null=True, blank=True, help_text="Number of rows in the report")
+    data_size = models.BigIntegerField(null=True, blank=True, help_text="Size of the rows file in bytes")
+    data_summary = models.JSONField(null=True, blank=True, help_text="Columns and totals of the numeric columns")
+    downloaded_at = models.DateTimeField(null=True, blank=True)
+    error_message = models.TextField(null=True, blank=True, help_text="Last download error")
+    
     # Relationship to an advertising account
     advertising_account = models.ForeignKey(
         AmazonAdvertisingAccount, 
@@ -215,6 +232,8 @@ class ReportSchedule(models.Model):
     is_active = models.BooleanField(default=True, help_text="Whether this schedule is active")
     last_run = models.DateTimeField(null=True, blank=True, help_text="When this schedule last generated a report")
     next_run = models.DateTimeField(help_text="When this schedule will next generate a report")
+    last_dispatch_latency_ms = models.IntegerField(null=True, blank=True, help_text="Delay between next_run and the report request being sent, in milliseconds")
+    last_error = models.TextField(null=True, blank=True, help_text="Error from the last dispatch attempt, if it failed")
     
     # Relationship to an advertising account
     advertising_account = models.ForeignKey(
@@ -319,3 +338,127 @@ class ReportSchedule(models.Model):
         if not self.next_run:
             self.calculate_next_run()
         super().save(*args, **kwargs)
+
+
+class AdvertisingCampaign(models.Model):
+    """Local copy of an advertising account's campaigns, synced from the Ads API"""
+    advertising_account = models.ForeignKey(AmazonAdvertisingAccount, on_delete=models.CASCADE, related_name='campaigns')
+    campaign_id = models.CharField(max_length=50)
+    name = models.CharField(max_length=255, blank=True, default='')
+    campaign_type = models.CharField(max_length=50, blank=True, null=True)
+    targeting_type = models.CharField(max_length=20, blank=True, null=True)
+    state = models.CharField(max_length=20, blank=True, null=True)
+    serving_status = models.CharField(max_length=50, blank=True, null=True)
+    daily_budget = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    last_updated_date = models.DateTimeField(null=True, blank=True, help_text="lastUpdatedDate from the API, used for delta refresh")
+    raw_data = models.JSONField(default=dict, help_text="Campaign as returned by the API")
+    synced_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['advertising_account', 'campaign_id'], name='unique_advertising_campaign'),
+        ]
+        indexes = [
+            models.Index(fields=['advertising_account', 'name']),
+            models.Index(fields=['advertising_account', 'state', 'name']),
+        ]
+    
+    def __str__(self):
+        return f"Campaign {self.campaign_id}: {self.name}"
+
+
+class AdvertisingAdGroup(models.Model):
+    """Local copy of an advertising account's ad groups, synced from the Ads API"""
+    advertising_account = models.ForeignKey(AmazonAdvertisingAccount, on_delete=models.CASCADE, related_name='ad_groups')
+    ad_group_id = models.CharField(max_length=50)
+    campaign_id = models.CharField(max_length=50)
+    name = models.CharField(max_length=255, blank=True, default='')
+    state = models.CharField(max_length=20, blank=True, null=True)
+    serving_status = models.CharField(max_length=50, blank=True, null=True)
+    default_bid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    last_updated_date = models.DateTimeField(null=True, blank=True, help_text="lastUpdatedDate from the API, used for delta refresh")
+    raw_data = models.JSONField(default=dict, help_text="Ad group as returned by the API")
+    synced_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['advertising_account', 'ad_group_id'], name='unique_advertising_ad_group'),
+        ]
+        indexes = [
+            models.Index(fields=['advertising_account', 'campaign_id', 'name']),
+            models.Index(fields=['advertising_account', 'name']),
+        ]
+    
+    def __str__(self):
+        return f"Ad group {self.ad_group_id}: {self.name}"
+
+
+class AdvertisingMutationJob(models.Model):
+    """A batch of campaign, ad group, keyword and target changes pushed to the Ads API"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    advertising_account = models.ForeignKey(AmazonAdvertisingAccount, on_delete=models.CASCADE, related_name='mutation_jobs')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='advertising_mutation_jobs', null=True, blank=True)
+    source = models.CharField(max_length=255, blank=True, default='', help_text="Where the changes came from (e.g. an optimisation file)")
+    
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('PARTIAL', 'Partially Completed'),
+        ('FAILED', 'Failed'),
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    total = models.IntegerField(default=0)
+    succeeded = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Mutation job {self.id} ({self.status})"
+
+
+class AdvertisingMutation(models.Model):
+    """One entity change of a mutation job and the result the API returned for it"""
+    job = models.ForeignKey(AdvertisingMutationJob, on_delete=models.CASCADE, related_name='mutations')
+    
+    ENTITY_CHOICES = [
+        ('campaigns', 'Campaign'),
+        ('ad_groups', 'Ad Group'),
+        ('keywords', 'Keyword'),
+        ('targets', 'Product Target'),
+    ]
+    entity_type = models.CharField(max_length=20, choices=ENTITY_CHOICES)
+    OPERATION_CHOICES = [
+        ('create', 'Create'),
+        ('update', 'Update'),
+    ]
+    operation = models.CharField(max_length=10, choices=OPERATION_CHOICES)
+    entity_id = models.CharField(max_length=50, blank=True, null=True, help_text="ID of the entity (returned by the API for creates)")
+    payload = models.JSONField(help_text="Entity sent to the API")
+    
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SUCCESS', 'Success'),
+        ('ERROR', 'Error'),
+    ]
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    error_code = models.CharField(max_length=100, blank=True, null=True)
+    error_message = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['job', 'status']),
+            models.Index(fields=['job', 'entity_type', 'operation']),
+        ]
+    
+    def __str__(self):
+        return f"{self.operation} {self.entity_type} {self.entity_id or ''} ({self.status})"
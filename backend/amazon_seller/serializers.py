@@ -36,9 +36,11 @@ class AdvertisingReportSerializer(serializers.ModelSerializer):
             'id', 'report_id', 'report_type', 'status',
             'metrics', 'start_date', 'end_date', 'segment',
             'advertising_account', 'user', 'created_at',
-            'completed_at', 'report_data'
+            'completed_at', 'report_data', 'data_rows', 'data_summary',
+            'downloaded_at', 'error_message'
         ]
         read_only_fields = [
             'report_id', 'status', 'user', 'created_at',
-            'completed_at', 'report_data'
+            'completed_at', 'report_data', 'data_rows', 'data_summary',
+            'downloaded_at', 'error_message'
         ] 
\ No newline at end of file
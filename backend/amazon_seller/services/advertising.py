@@ -7,8 +7,11 @@ import json
 from django.conf import settings
 from django.utils import timezone
 
+from core import http_client
+
 from ..models import AmazonAdvertisingAccount
 from .auth import AmazonAuthService
+from .token_manager import TokenManager
 
 logger = logging.getLogger(__name__)
 
@@ -52,20 +55,7 @@ class AmazonAdvertisingService:
         if account.is_token_expired():
             logger.info(f"Refreshing expired token for advertising account {account.profile_id}")
             
-            try:
-                token_data = AmazonAuthService.refresh_access_token(
-                    account.refresh_token, 
-                    region=account.region
-                )
-                
-                # Update account with new token data
-                account.access_token = token_data['access_token']
-                account.token_expires_at = token_data['token_expires_at']
-                account.save(update_fields=['access_token', 'token_expires_at', 'updated_at'])
-                
-                logger.info(f"Successfully refreshed token for advertising account {account.profile_id}")
-            except Exception as e:
-                logger.error(f"Failed to refresh token: {str(e)}")
+            TokenManager.refresh_token(account)
                 
         return account
     
@@ -101,7 +91,7 @@ class AmazonAdvertisingService:
         headers = cls._get_headers(account)
         
         try:
-            response = requests.get(url, headers=headers)
+            response = http_client.get(url, region=account.region, headers=headers)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -111,7 +101,8 @@ class AmazonAdvertisingService:
             raise
     
     @classmethod
-    def get_campaigns(cls, account, profile_id, state_filter=None, campaign_type=None):
+    def get_campaigns(cls, account, profile_id, state_filter=None, campaign_type=None,
+                      start_index=None, count=None, extended=False):
         """
         Get campaigns for a specific profile
         
@@ -120,6 +111,9 @@ class AmazonAdvertisingService:
             profile_id: The advertising profile ID
             state_filter: Optional campaign state filter
             campaign_type: Optional campaign type filter
+            start_index: Optional index of the first campaign (for paging)
+            count: Optional number of campaigns to return (for paging)
+            extended: Include serving status and lastUpdatedDate
             
         Returns:
             List of campaigns
@@ -127,18 +121,22 @@ class AmazonAdvertisingService:
         account = cls._ensure_fresh_token(account)
         
         base_url = cls._get_api_endpoint(account)
-        url = f"{base_url}/v2/campaigns"
+        url = f"{base_url}/v2/campaigns/extended" if extended else f"{base_url}/v2/campaigns"
         
         params = {}
         if state_filter:
             params['stateFilter'] = state_filter
         if campaign_type:
             params['campaignType'] = campaign_type
+        if start_index is not None:
+            params['startIndex'] = start_index
+        if count is not None:
+            params['count'] = count
             
         headers = cls._get_headers(account, profile_id)
         
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = http_client.get(url, region=account.region, headers=headers, params=params)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -147,6 +145,115 @@ class AmazonAdvertisingService:
                 logger.error(f"Response: {e.response.text}")
             raise
     
+    @classmethod
+    def get_campaign(cls, account, profile_id, campaign_id, extended=True):
+        """
+        Get a single campaign
+        
+        Args:
+            account: AmazonAdvertisingAccount instance
+            profile_id: The advertising profile ID
+            campaign_id: The campaign ID
+            extended: Include serving status and lastUpdatedDate
+            
+        Returns:
+            Campaign data
+        """
+        account = cls._ensure_fresh_token(account)
+        
+        base_url = cls._get_api_endpoint(account)
+        path = 'campaigns/extended' if extended else 'campaigns'
+        url = f"{base_url}/v2/{path}/{campaign_id}"
+        
+        headers = cls._get_headers(account, profile_id)
+        
+        try:
+            response = http_client.get(url, region=account.region, headers=headers)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error getting campaign {campaign_id}: {str(e)}")
+            if e.response:
+                logger.error(f"Response: {e.response.text}")
+            raise
+    
+    @classmethod
+    def get_ad_group(cls, account, profile_id, ad_group_id, extended=True):
+        """
+        Get a single ad group
+        
+        Args:
+            account: AmazonAdvertisingAccount instance
+            profile_id: The advertising profile ID
+            ad_group_id: The ad group ID
+            extended: Include serving status and lastUpdatedDate
+            
+        Returns:
+            Ad group data
+        """
+        account = cls._ensure_fresh_token(account)
+        
+        base_url = cls._get_api_endpoint(account)
+        path = 'ad-groups/extended' if extended else 'ad-groups'
+        url = f"{base_url}/v2/{path}/{ad_group_id}"
+        
+        headers = cls._get_headers(account, profile_id)
+        
+        try:
+            response = http_client.get(url, region=account.region, headers=headers)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error getting ad group {ad_group_id}: {str(e)}")
+            if e.response:
+                logger.error(f"Response: {e.response.text}")
+            raise
+    
+    @classmethod
+    def mutate_entities(cls, account, profile_id, path, method, entities):
+        """
+        Create or update several entities of one type in a single request
+        
+        Args:
+            account: AmazonAdvertisingAccount instance
+            profile_id: The advertising profile ID
+            path: Entity path under /v2 (campaigns, ad-groups, keywords, targets)
+            method: POST to create, PUT to update
+            entities: List of entity dicts (at most the API's batch size)
+            
+        Returns:
+            List of per-entity results ({code, <entity>Id, description}) in request order
+        """
+        account = cls._ensure_fresh_token(account)
+        
+        base_url = cls._get_api_endpoint(account)
+        url = f"{base_url}/v2/{path}"
+        
+        headers = cls._get_headers(account, profile_id)
+        
+        try:
+            response = http_client.request(
+                method,
+                url,
+                region=account.region,
+                headers=headers,
+                data=json.dumps(entities)
+            )
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error sending {len(entities)} {path} ({method}): {str(e)}")
+            if e.response:
+                logger.error(f"Response: {e.response.text}")
+            raise
+    
+    @classmethod
+    def _refresh_catalog(cls, account, profile_id, entity, result):
+        """Update the local catalog with the campaigns / ad groups a mutation returned"""
+        # Imported here because the catalog service builds on this one
+        from .catalog import AdvertisingCatalogService
+        AdvertisingCatalogService.refresh_from_mutation(account, profile_id, entity, result)
+    
     @classmethod
     def create_campaign(cls, account, profile_id, campaign_data):
         """
@@ -168,13 +275,16 @@ class AmazonAdvertisingService:
         headers = cls._get_headers(account, profile_id)
         
         try:
-            response = requests.post(
+            response = http_client.post(
                 url, 
+                region=account.region,
                 headers=headers, 
                 data=json.dumps(campaign_data)
             )
             response.raise_for_status()
-            return response.json()
+            result = response.json()
+            cls._refresh_catalog(account, profile_id, 'campaigns', result)
+            return result
         except requests.exceptions.RequestException as e:
             logger.error(f"Error creating campaign: {str(e)}")
             if e.response:
@@ -203,13 +313,16 @@ class AmazonAdvertisingService:
         headers = cls._get_headers(account, profile_id)
         
         try:
-            response = requests.put(
+            response = http_client.put(
                 url, 
+                region=account.region,
                 headers=headers, 
                 data=json.dumps(campaign_data)
             )
             response.raise_for_status()
-            return response.json()
+            result = response.json()
+            cls._refresh_catalog(account, profile_id, 'campaigns', result)
+            return result
         except requests.exceptions.RequestException as e:
             logger.error(f"Error updating campaign: {str(e)}")
             if e.response:
@@ -217,7 +330,8 @@ class AmazonAdvertisingService:
             raise
     
     @classmethod
-    def get_ad_groups(cls, account, profile_id, campaign_id=None, state_filter=None):
+    def get_ad_groups(cls, account, profile_id, campaign_id=None, state_filter=None,
+                      start_index=None, count=None, extended=False):
         """
         Get ad groups for a profile or campaign
         
@@ -226,6 +340,9 @@ class AmazonAdvertisingService:
             profile_id: The advertising profile ID
             campaign_id: Optional campaign ID filter
             state_filter: Optional ad group state filter
+            start_index: Optional index of the first ad group (for paging)
+            count: Optional number of ad groups to return (for paging)
+            extended: Include serving status and lastUpdatedDate
             
         Returns:
             List of ad groups
@@ -233,18 +350,22 @@ class AmazonAdvertisingService:
         account = cls._ensure_fresh_token(account)
         
         base_url = cls._get_api_endpoint(account)
-        url = f"{base_url}/v2/ad-groups"
+        url = f"{base_url}/v2/ad-groups/extended" if extended else f"{base_url}/v2/ad-groups"
         
         params = {}
         if campaign_id:
             params['campaignIdFilter'] = campaign_id
         if state_filter:
             params['stateFilter'] = state_filter
+        if start_index is not None:
+            params['startIndex'] = start_index
+        if count is not None:
+            params['count'] = count
             
         headers = cls._get_headers(account, profile_id)
         
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = http_client.get(url, region=account.region, headers=headers, params=params)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -274,13 +395,16 @@ class AmazonAdvertisingService:
         headers = cls._get_headers(account, profile_id)
         
         try:
-            response = requests.post(
+            response = http_client.post(
                 url, 
+                region=account.region,
                 headers=headers, 
                 data=json.dumps(ad_group_data)
             )
             response.raise_for_status()
-            return response.json()
+            result = response.json()
+            cls._refresh_catalog(account, profile_id, 'ad_groups', result)
+            return result
         except requests.exceptions.RequestException as e:
             logger.error(f"Error creating ad group: {str(e)}")
             if e.response:
@@ -320,8 +444,9 @@ class AmazonAdvertisingService:
         headers = cls._get_headers(account, profile_id)
         
         try:
-            response = requests.post(
+            response = http_client.post(
                 url, 
+                region=account.region,
                 headers=headers, 
                 data=json.dumps(report_data)
             )
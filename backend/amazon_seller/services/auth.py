@@ -11,6 +11,8 @@ from urllib.parse import urlencode
 from django.conf import settings
 from django.utils import timezone
 
+from core import http_client
+
 from ..models import AmazonSellerAccount, AmazonAdvertisingAccount
 
 logger = logging.getLogger(__name__)
@@ -157,7 +159,7 @@ class AmazonAuthService:
         }
         
         try:
-            response = requests.post(url, data=data)
+            response = http_client.post(url, region=region, data=data)
             response.raise_for_status()
             token_data = response.json()
             
@@ -202,7 +204,7 @@ class AmazonAuthService:
         }
         
         try:
-            response = requests.post(url, data=data)
+            response = http_client.post(url, region=region, data=data)
             response.raise_for_status()
             token_data = response.json()
             
@@ -250,7 +252,7 @@ class AmazonAuthService:
         }
         
         try:
-            response = requests.post(url, data=data)
+            response = http_client.post(url, region=region, data=data)
             response.raise_for_status()
             token_data = response.json()
             
@@ -293,7 +295,7 @@ class AmazonAuthService:
         }
         
         try:
-            response = requests.get(url, headers=headers)
+            response = http_client.get(url, region=region, headers=headers)
             response.raise_for_status()
             profiles = response.json()
             
@@ -0,0 +1,253 @@
+"""
+Local campaign and ad group catalog for advertising accounts
+
+Campaign and ad group pages are served from the AdvertisingCampaign and
+AdvertisingAdGroup tables instead of calling the Ads API on every view. The
+catalog is synced by paging through the extended list endpoints
+(startIndex/count). Only rows whose lastUpdatedDate changed are written, and
+rows the API no longer returns are removed. A sync is skipped while the
+catalog is younger than AMAZON_ADS_CATALOG_TTL_MINUTES.
+
+Campaigns and ad groups created or updated through AmazonAdvertisingService
+are re-fetched one by one right after the mutation. The catalog reflects the
+change immediately without a full sync.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import AmazonAdvertisingAccount, AdvertisingCampaign, AdvertisingAdGroup
+from .advertising import AmazonAdvertisingService
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+WRITE_BATCH_SIZE = 1000
+CATALOG_TTL = timedelta(minutes=getattr(settings, 'AMAZON_ADS_CATALOG_TTL_MINUTES', 60))
+
+
+def _timestamp(value):
+    """Convert an epoch milliseconds lastUpdatedDate to a datetime"""
+    if value in (None, ''):
+        return None
+    try:
+        return datetime.fromtimestamp(int(value) / 1000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def _date(value):
+    """Convert a YYYYMMDD date to a date"""
+    try:
+        return datetime.strptime(str(value), '%Y%m%d').date() if value else None
+    except ValueError:
+        return None
+
+
+def _decimal(value):
+    try:
+        return Decimal(str(value)) if value is not None else None
+    except InvalidOperation:
+        return None
+
+
+def _campaign(account, data, now):
+    return AdvertisingCampaign(
+        advertising_account=account,
+        campaign_id=str(data['campaignId']),
+        name=data.get('name') or '',
+        campaign_type=data.get('campaignType'),
+        targeting_type=data.get('targetingType'),
+        state=data.get('state'),
+        serving_status=data.get('servingStatus'),
+        daily_budget=_decimal(data.get('dailyBudget')),
+        start_date=_date(data.get('startDate')),
+        end_date=_date(data.get('endDate')),
+        last_updated_date=_timestamp(data.get('lastUpdatedDate')),
+        raw_data=data,
+        synced_at=now,
+    )
+
+
+def _ad_group(account, data, now):
+    return AdvertisingAdGroup(
+        advertising_account=account,
+        ad_group_id=str(data['adGroupId']),
+        campaign_id=str(data.get('campaignId') or ''),
+        name=data.get('name') or '',
+        state=data.get('state'),
+        serving_status=data.get('servingStatus'),
+        default_bid=_decimal(data.get('defaultBid')),
+        last_updated_date=_timestamp(data.get('lastUpdatedDate')),
+        raw_data=data,
+        synced_at=now,
+    )
+
+
+# How each entity is fetched (AmazonAdvertisingService methods), converted and stored
+ENTITIES = {
+    'campaigns': {
+        'model': AdvertisingCampaign,
+        'id_field': 'campaign_id',
+        'api_id': 'campaignId',
+        'list': 'get_campaigns',
+        'get': 'get_campaign',
+        'build': _campaign,
+        'update_fields': [
+            'name', 'campaign_type', 'targeting_type', 'state', 'serving_status', 'daily_budget',
+            'start_date', 'end_date', 'last_updated_date', 'raw_data', 'synced_at',
+        ],
+    },
+    'ad_groups': {
+        'model': AdvertisingAdGroup,
+        'id_field': 'ad_group_id',
+        'api_id': 'adGroupId',
+        'list': 'get_ad_groups',
+        'get': 'get_ad_group',
+        'build': _ad_group,
+        'update_fields': [
+            'campaign_id', 'name', 'state', 'serving_status', 'default_bid', 'last_updated_date',
+            'raw_data', 'synced_at',
+        ],
+    },
+}
+
+
+class AdvertisingCatalogService:
+    """Keeps the local campaign / ad group catalog of advertising accounts in sync"""
+
+    @classmethod
+    def is_stale(cls, account):
+        """Whether the account's catalog is missing or older than CATALOG_TTL"""
+        return not account.catalog_synced_at or account.catalog_synced_at + CATALOG_TTL <= timezone.now()
+
+    @classmethod
+    def ensure_synced(cls, account, force=False):
+        """
+        Sync an account's catalog if it is stale
+
+        Args:
+            account: AmazonAdvertisingAccount instance
+            force: Sync even if the catalog is fresh
+
+        Returns:
+            Sync statistics, or None if the catalog was fresh
+        """
+        if not force and not cls.is_stale(account):
+            return None
+        return cls.sync(account)
+
+    @classmethod
+    def sync(cls, account):
+        """
+        Sync an account's campaigns and ad groups from the Ads API
+
+        Args:
+            account: AmazonAdvertisingAccount instance
+
+        Returns:
+            Dict per entity with fetched, updated and removed counts
+        """
+        started = timezone.now()
+        results = {entity: cls._sync_entity(account, entity) for entity in ENTITIES}
+
+        account.catalog_synced_at = started
+        AmazonAdvertisingAccount.objects.filter(pk=account.pk).update(catalog_synced_at=started)
+
+        logger.info(f"Synced catalog for advertising account {account.profile_id}: {results}")
+        return results
+
+    @classmethod
+    def _upsert(cls, entity, records):
+        spec = ENTITIES[entity]
+        spec['model'].objects.bulk_create(
+            records,
+            update_conflicts=True,
+            unique_fields=['advertising_account', spec['id_field']],
+            update_fields=spec['update_fields']
+        )
+
+    @classmethod
+    def _sync_entity(cls, account, entity):
+        """Page through one entity, writing only new and changed rows"""
+        spec = ENTITIES[entity]
+        model = spec['model']
+        known = dict(
+            model.objects.filter(advertising_account=account).values_list(spec['id_field'], 'last_updated_date')
+        )
+
+        now = timezone.now()
+        seen = set()
+        changed = []
+        updated = 0
+        start_index = 0
+        while True:
+            page = getattr(AmazonAdvertisingService, spec['list'])(
+                account,
+                account.profile_id,
+                start_index=start_index,
+                count=PAGE_SIZE,
+                extended=True
+            ) or []
+            for data in page:
+                entity_id = str(data[spec['api_id']])
+                seen.add(entity_id)
+                last_updated = _timestamp(data.get('lastUpdatedDate'))
+                if entity_id in known and last_updated is not None and known[entity_id] == last_updated:
+                    continue
+                changed.append(spec['build'](account, data, now))
+            if len(changed) >= WRITE_BATCH_SIZE:
+                cls._upsert(entity, changed)
+                updated += len(changed)
+                changed = []
+            if len(page) < PAGE_SIZE:
+                break
+            start_index += PAGE_SIZE
+
+        if changed:
+            cls._upsert(entity, changed)
+            updated += len(changed)
+
+        removed = list(known.keys() - seen)
+        for start in range(0, len(removed), WRITE_BATCH_SIZE):
+            model.objects.filter(
+                advertising_account=account,
+                **{f"{spec['id_field']}__in": removed[start:start + WRITE_BATCH_SIZE]}
+            ).delete()
+
+        return {'fetched': len(seen), 'updated': updated, 'removed': len(removed)}
+
+    @classmethod
+    def refresh_from_mutation(cls, account, profile_id, entity, result):
+        """
+        Re-fetch the campaigns / ad groups returned by a create or update call
+
+        A failed refresh marks the catalog stale, so the next view re-syncs it.
+
+        Args:
+            account: AmazonAdvertisingAccount instance
+            profile_id: The advertising profile ID
+            entity: 'campaigns' or 'ad_groups'
+            result: Response of the mutation (a result dict or a list of them)
+        """
+        spec = ENTITIES[entity]
+        results = result if isinstance(result, list) else [result]
+        ids = [
+            item[spec['api_id']] for item in results
+            if isinstance(item, dict) and item.get(spec['api_id']) and item.get('code', 'SUCCESS') == 'SUCCESS'
+        ]
+        if not ids:
+            return
+
+        try:
+            now = timezone.now()
+            fetch = getattr(AmazonAdvertisingService, spec['get'])
+            records = [spec['build'](account, fetch(account, profile_id, entity_id), now) for entity_id in ids]
+            cls._upsert(entity, records)
+        except Exception as e:
+            logger.error(f"Error refreshing {entity} {ids} in the catalog, marking it stale: {str(e)}")
+            account.catalog_synced_at = None
+            AmazonAdvertisingAccount.objects.filter(pk=account.pk).update(catalog_synced_at=None)
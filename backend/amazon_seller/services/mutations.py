@@ -0,0 +1,367 @@
+"""
+Batched campaign, ad group, keyword and target changes for the Ads API
+
+The Ads API accepts arrays of entities on its create (POST) and update (PUT)
+endpoints. Changes are stored as AdvertisingMutation rows of a job, grouped by
+entity type and operation, chunked to the endpoint's batch size and sent
+concurrently. A token bucket per profile keeps the requests inside the API's
+rate limits. The API answers with one result per entity, and the results are
+written back with bulk updates.
+
+Entity types are applied in dependency order: campaigns, then ad groups,
+then keywords and targets.
+
+changes_from_bulk_sheet converts the "Bids Optimized" sheet written by the
+optimisers (sp/header.py save_to_excel) into changes, so an optimisation run
+can be pushed without uploading the file to Amazon by hand.
+"""
+import logging
+import math
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from core.dispatch import KeyedRateLimiter, dispatch_grouped
+from ..models import AmazonAdvertisingAccount, AdvertisingMutationJob, AdvertisingMutation
+from .advertising import AmazonAdvertisingService
+
+logger = logging.getLogger(__name__)
+
+# Endpoint, ID key and maximum entities per request of each entity type, in dependency order
+ENTITY_TYPES = {
+    'campaigns': {'path': 'campaigns', 'id_key': 'campaignId', 'batch_size': 100},
+    'ad_groups': {'path': 'ad-groups', 'id_key': 'adGroupId', 'batch_size': 100},
+    'keywords': {'path': 'keywords', 'id_key': 'keywordId', 'batch_size': 1000},
+    'targets': {'path': 'targets', 'id_key': 'targetId', 'batch_size': 1000},
+}
+METHODS = {'create': 'POST', 'update': 'PUT'}
+WRITE_BATCH_SIZE = 1000
+
+# Bulk sheet values -> API values
+BULK_STATES = {'enabled': 'enabled', 'paused': 'paused', 'archived': 'archived'}
+BULK_PLACEMENTS = {
+    'placement top': 'placementTop',
+    'placement product page': 'placementProductPage',
+    'placement rest of search': 'placementRestOfSearch',
+}
+BULK_BIDDING_STRATEGIES = {
+    'dynamic bids - down only': 'legacyForSales',
+    'dynamic bids - up and down': 'autoForSales',
+    'fixed bid': 'manual',
+}
+
+
+def _present(value):
+    if value is None:
+        return False
+    if isinstance(value, float) and math.isnan(value):
+        return False
+    return str(value).strip() != ''
+
+
+def _entity_id(value, column, row_number):
+    """
+    Normalise an ID cell (Excel turns IDs into floats unless read as text)
+
+    Raises:
+        ValueError: If the cell holds something other than a numeric ID
+    """
+    if not _present(value):
+        return None
+    value = str(value).strip()
+    value = value[:-2] if value.endswith('.0') else value
+    if not value.isdigit():
+        raise ValueError(f"Row {row_number}: {column} must be a numeric ID, got '{value}'")
+    return value
+
+
+def _number(value, digits=2):
+    if not _present(value):
+        return None
+    try:
+        return round(float(value), digits)
+    except (TypeError, ValueError):
+        return None
+
+
+def changes_from_bulk_sheet(rows):
+    """
+    Convert rows of an optimiser bulk sheet ("Bids Optimized") to mutation changes
+
+    Keyword and Product Targeting rows become keyword / target updates (bid
+    and state), and Campaign and Bidding Adjustment rows become one campaign
+    update per campaign (daily budget, state, bidding strategy and placement
+    adjustments). Rows with other entities or operations are skipped.
+
+    Args:
+        rows: DataFrame or list of dicts with the bulk sheet columns
+
+    Returns:
+        (changes, skipped) where changes is a list of
+        {'entity_type', 'operation', 'entity_id', 'payload'} dicts
+
+    Raises:
+        ValueError: If an ID cell is not a numeric ID; the message names the
+            sheet row (the header being row 1)
+    """
+    if hasattr(rows, 'to_dict'):
+        rows = rows.to_dict('records')
+
+    changes = []
+    campaigns = {}
+    skipped = 0
+    for row_number, row in enumerate(rows, start=2):
+        entity = str(row.get('Entity') or '').strip()
+        operation = str(row.get('Operation') or 'Update').strip().lower()
+        state = BULK_STATES.get(str(row.get('State') or '').strip().lower())
+        if operation != 'update':
+            skipped += 1
+            continue
+
+        if entity in ('Keyword', 'Product Targeting'):
+            key, entity_type = ('keywordId', 'keywords') if entity == 'Keyword' else ('targetId', 'targets')
+            column = 'Keyword ID' if entity == 'Keyword' else 'Product Targeting ID'
+            entity_id = _entity_id(row.get(column), column, row_number)
+            payload = {key: int(entity_id)} if entity_id else None
+            if payload is None:
+                skipped += 1
+                continue
+            bid = _number(row.get('Bid'))
+            if bid is not None:
+                payload['bid'] = bid
+            if state:
+                payload['state'] = state
+            if len(payload) > 1:
+                changes.append({'entity_type': entity_type, 'operation': 'update', 'entity_id': entity_id, 'payload': payload})
+            else:
+                skipped += 1
+
+        elif entity in ('Campaign', 'Bidding Adjustment'):
+            entity_id = _entity_id(row.get('Campaign ID'), 'Campaign ID', row_number)
+            if not entity_id:
+                skipped += 1
+                continue
+            payload = campaigns.setdefault(entity_id, {'campaignId': int(entity_id)})
+            if entity == 'Campaign':
+                budget = _number(row.get('Daily Budget'))
+                if budget is not None:
+                    payload['dailyBudget'] = budget
+                if state:
+                    payload['state'] = state
+                strategy = BULK_BIDDING_STRATEGIES.get(str(row.get('Bidding Strategy') or '').strip().lower())
+                if strategy:
+                    payload.setdefault('bidding', {})['strategy'] = strategy
+            else:
+                predicate = BULK_PLACEMENTS.get(str(row.get('Placement') or '').strip().lower())
+                percentage = _number(row.get('Percentage'), digits=0)
+                if predicate is None or percentage is None:
+                    skipped += 1
+                    continue
+                bidding = payload.setdefault('bidding', {})
+                bidding.setdefault('adjustments', []).append({'predicate': predicate, 'percentage': int(percentage)})
+        else:
+            skipped += 1
+
+    for entity_id, payload in campaigns.items():
+        if len(payload) > 1:
+            changes.append({'entity_type': 'campaigns', 'operation': 'update', 'entity_id': entity_id, 'payload': payload})
+    return changes, skipped
+
+
+class AdvertisingMutationService:
+    """Applies batches of entity changes to the Ads API and records per-entity results"""
+
+    # Per-profile spacing of mutation requests, shared by all jobs in the process
+    _profile_limiter = KeyedRateLimiter(
+        rate=getattr(settings, 'AMAZON_ADS_MUTATION_REQUESTS_PER_SECOND', 5),
+        burst=getattr(settings, 'AMAZON_ADS_MUTATION_BURST', 5)
+    )
+
+    @classmethod
+    def submit(cls, account, changes, user=None, source=''):
+        """
+        Store a job with its changes
+
+        Args:
+            account: AmazonAdvertisingAccount instance
+            changes: List of {'entity_type', 'operation', 'payload', 'entity_id' (optional)} dicts
+            user: Optional user who submitted the changes
+            source: Optional description of where the changes came from
+
+        Returns:
+            AdvertisingMutationJob instance
+
+        Raises:
+            ValueError: If a change has an unknown entity type or operation
+        """
+        for change in changes:
+            if change.get('entity_type') not in ENTITY_TYPES:
+                raise ValueError(f"Unknown entity type: {change.get('entity_type')}")
+            if change.get('operation') not in METHODS:
+                raise ValueError(f"Unknown operation: {change.get('operation')}")
+            if not isinstance(change.get('payload'), dict):
+                raise ValueError("Each change needs a payload object")
+
+        job = AdvertisingMutationJob.objects.create(
+            advertising_account=account,
+            user=user,
+            source=source[:255],
+            total=len(changes)
+        )
+        AdvertisingMutation.objects.bulk_create(
+            [
+                AdvertisingMutation(
+                    job=job,
+                    entity_type=change['entity_type'],
+                    operation=change['operation'],
+                    entity_id=cls._change_entity_id(change),
+                    payload=change['payload'],
+                )
+                for change in changes
+            ],
+            batch_size=WRITE_BATCH_SIZE
+        )
+        logger.info(f"Created mutation job {job.id} with {len(changes)} changes for profile {account.profile_id}")
+        return job
+
+    @classmethod
+    def _change_entity_id(cls, change):
+        entity_id = change.get('entity_id') or change['payload'].get(ENTITY_TYPES[change['entity_type']]['id_key'])
+        return str(entity_id) if entity_id else None
+
+    @classmethod
+    def run(cls, job, max_workers=None):
+        """
+        Send the pending changes of a job and record the result of each
+
+        Args:
+            job: AdvertisingMutationJob instance
+            max_workers: Concurrent requests, defaults to AMAZON_ADS_MUTATION_WORKERS
+
+        Returns:
+            The job, with its status and counts updated
+        """
+        max_workers = max_workers or getattr(settings, 'AMAZON_ADS_MUTATION_WORKERS', 4)
+        account = job.advertising_account
+        profile_id = account.profile_id
+
+        job.status = 'RUNNING'
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+
+        try:
+            # Refresh once here rather than in every worker thread
+            AmazonAdvertisingService._ensure_fresh_token(account)
+
+            pending = job.mutations.filter(status='PENDING')
+            for entity_type, spec in ENTITY_TYPES.items():
+                for operation, method in METHODS.items():
+                    mutations = list(pending.filter(entity_type=entity_type, operation=operation).order_by('id'))
+                    if not mutations:
+                        continue
+                    size = spec['batch_size']
+                    chunks = [mutations[start:start + size] for start in range(0, len(mutations), size)]
+
+                    def send(chunk, spec=spec, method=method):
+                        cls._profile_limiter.acquire(profile_id)
+                        return AmazonAdvertisingService.mutate_entities(
+                            account, profile_id, spec['path'], method, [mutation.payload for mutation in chunk]
+                        )
+
+                    outcomes = dispatch_grouped(
+                        chunks,
+                        group_key=id,  # Every chunk is its own group, so all of them can run concurrently
+                        handler=send,
+                        max_workers=max_workers
+                    )
+                    cls._record_results(outcomes, spec['id_key'])
+                    logger.info(f"Sent {len(mutations)} {entity_type} {operation}s in {len(chunks)} requests for job {job.id}")
+        except Exception as e:
+            cls.fail(job, e)
+            raise
+
+        return cls._finish(job)
+
+    @classmethod
+    def fail(cls, job, error):
+        """
+        Mark a job that could not be run (or stopped part way) as failed
+
+        Changes that were not sent yet are recorded as errors, so the job never
+        stays RUNNING with PENDING changes.
+
+        Args:
+            job: AdvertisingMutationJob instance
+            error: Exception or message describing the failure
+
+        Returns:
+            The job, with its status and counts updated
+        """
+        logger.error(f"Mutation job {job.id} failed: {str(error)}")
+        job.mutations.filter(status='PENDING').update(
+            status='ERROR',
+            error_code='JOB_FAILED',
+            error_message=str(error)[:2000],
+            updated_at=timezone.now()
+        )
+        return cls._finish(job, status='FAILED')
+
+    @classmethod
+    def _finish(cls, job, status=None):
+        """Count the results of a job and record its final status (derived from the counts unless given)"""
+        counts = dict(
+            job.mutations.order_by().values('status').annotate(count=Count('id')).values_list('status', 'count')
+        )
+        job.succeeded = counts.get('SUCCESS', 0)
+        job.failed = counts.get('ERROR', 0)
+        if status:
+            job.status = status
+        elif job.failed == 0:
+            job.status = 'COMPLETED'
+        elif job.succeeded == 0:
+            job.status = 'FAILED'
+        else:
+            job.status = 'PARTIAL'
+        job.completed_at = timezone.now()
+        job.save(update_fields=['status', 'succeeded', 'failed', 'completed_at'])
+
+        if job.succeeded:
+            # Budgets, states and bids changed; the next catalog view re-syncs (only changed rows)
+            AmazonAdvertisingAccount.objects.filter(pk=job.advertising_account_id).update(catalog_synced_at=None)
+
+        logger.info(f"Mutation job {job.id} {job.status}: {job.succeeded} succeeded, {job.failed} failed")
+        return job
+
+    @classmethod
+    def _record_results(cls, outcomes, id_key):
+        """Copy the per-entity results of each chunk onto its mutations and save them in bulk"""
+        now = timezone.now()
+        updated = []
+        for chunk, results, error in outcomes:
+            if error is None and (not isinstance(results, list) or len(results) != len(chunk)):
+                error = ValueError(f"Unexpected response for {len(chunk)} entities: {str(results)[:200]}")
+            for index, mutation in enumerate(chunk):
+                mutation.updated_at = now
+                if error is not None:
+                    mutation.status = 'ERROR'
+                    mutation.error_code = 'REQUEST_FAILED'
+                    mutation.error_message = str(error)[:2000]
+                else:
+                    result = results[index] or {}
+                    if result.get(id_key):
+                        mutation.entity_id = str(result[id_key])
+                    if result.get('code') == 'SUCCESS':
+                        mutation.status = 'SUCCESS'
+                        mutation.error_code = None
+                        mutation.error_message = None
+                    else:
+                        mutation.status = 'ERROR'
+                        mutation.error_code = result.get('code') or 'UNKNOWN'
+                        mutation.error_message = result.get('description') or result.get('details')
+                updated.append(mutation)
+        AdvertisingMutation.objects.bulk_update(
+            updated,
+            ['status', 'entity_id', 'error_code', 'error_message', 'updated_at'],
+            batch_size=WRITE_BATCH_SIZE
+        )
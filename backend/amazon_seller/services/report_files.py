@@ -0,0 +1,214 @@
+"""
+Columnar storage for downloaded advertising reports
+
+Report records are written to a Parquet file in row groups as they are
+decoded, so a report is never held in memory as a whole, and the file is
+stored through core.file_service next to the other archives. The
+AdvertisingReport row only keeps the file reference and summary stats.
+Pages are read from the file's footer and the row groups they overlap, with
+ranged reads when the file is in Azure Blob Storage.
+
+JSON does not distinguish 12 from 12.0 and a column can mix both, so numeric
+columns are stored as float64; nested values are stored as JSON strings. The
+columns and their types come from a first pass over all records
+(scan_columns), so keys that only appear late in a report are kept; a column
+holding values of more than one kind is stored as text.
+"""
+import json
+import logging
+
+from core import file_service
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+PARQUET_COMPRESSION = 'zstd'
+BATCH_ROWS = 10000
+
+
+def _value_kind(value):
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, (int, float)):
+        return 'number'
+    if isinstance(value, (dict, list)):
+        return 'json'
+    if value is None:
+        return None
+    return 'string'
+
+
+def scan_columns(records):
+    """
+    Work out the columns of a report and the kind of value each holds
+
+    Args:
+        records: Iterable of decoded records (non-object values are ignored)
+
+    Returns:
+        Dict of column name to kind ('number', 'bool', 'string' or 'json'), in first-seen order
+    """
+    kinds = {}
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        for name, value in record.items():
+            kind = _value_kind(value)
+            current = kinds.setdefault(name, kind)
+            if kind is not None and current != kind:
+                kinds[name] = kind if current is None else 'string'
+    # Columns that never hold a value are kept as text
+    return {name: kind or 'string' for name, kind in kinds.items()}
+
+
+def _coerce(value, kind):
+    """Convert a decoded JSON value to the type of its column (None when it cannot be)"""
+    if value is None:
+        return None
+    if kind == 'number':
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if kind == 'bool':
+        return value if isinstance(value, bool) else None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+class ReportRowWriter:
+    """
+    Writes report records to a Parquet file one row group at a time
+
+    Args:
+        path: Local file to write
+        batch_rows: Records buffered per row group, defaults to BATCH_ROWS (memory use is proportional to it)
+        columns: Column kinds from scan_columns; without them the columns are taken
+            from the first batch and keys first seen later are dropped
+    """
+
+    ARROW_TYPES = {'number': 'float64', 'bool': 'bool_', 'string': 'string', 'json': 'string'}
+
+    def __init__(self, path, batch_rows=None, columns=None):
+        if not PARQUET_AVAILABLE:
+            raise RuntimeError("pyarrow is not installed, cannot store report rows")
+        self.path = path
+        self.batch_rows = batch_rows or BATCH_ROWS
+        self.rows = 0
+        self.skipped = 0
+        self.totals = {}
+        self._kinds = None
+        self._schema = None
+        self._writer = None
+        self._pending = []
+        self._dropped = set()
+        self._columns = columns
+
+    def write(self, record):
+        """Add one record; non-object records are counted and skipped"""
+        if not isinstance(record, dict):
+            self.skipped += 1
+            return
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_rows:
+            self._flush()
+
+    def _open(self, batch):
+        self._kinds = self._columns if self._columns is not None else scan_columns(batch)
+        self._schema = pa.schema([
+            (name, getattr(pa, self.ARROW_TYPES[kind])()) for name, kind in self._kinds.items()
+        ])
+        self.totals = {name: 0.0 for name, kind in self._kinds.items() if kind == 'number'}
+        self._writer = pq.ParquetWriter(self.path, self._schema, compression=PARQUET_COMPRESSION)
+
+    def _flush(self):
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        if self._writer is None:
+            self._open(batch)
+
+        for record in batch:
+            extra = record.keys() - self._kinds.keys() - self._dropped
+            if extra:
+                logger.warning(f"Dropping columns not present in the first rows of the report: {sorted(extra)}")
+                self._dropped.update(extra)
+
+        columns = {
+            name: [_coerce(record.get(name), kind) for record in batch]
+            for name, kind in self._kinds.items()
+        }
+        table = pa.Table.from_pydict(columns, schema=self._schema)
+        self._writer.write_table(table)
+        for name in self.totals:
+            total = pc.sum(table.column(name)).as_py()
+            self.totals[name] += total or 0
+        self.rows += len(batch)
+
+    def close(self):
+        """
+        Flush the last row group and close the file
+
+        Returns:
+            Summary dict with rows, columns and totals of the numeric columns
+            (no file is written for a report without rows)
+        """
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+        if self.skipped:
+            logger.warning(f"Skipped {self.skipped} report values that were not records")
+        return {
+            'rows': self.rows,
+            'columns': list(self._kinds or {}),
+            'totals': {name: round(total, 6) for name, total in self.totals.items()},
+        }
+
+
+def load_rows(report, offset=0, limit=None):
+    """
+    Read rows of a downloaded report from its columnar file
+
+    Args:
+        report: AdvertisingReport instance with data_name set
+        offset: Index of the first row
+        limit: Optional number of rows
+
+    Returns:
+        List of row dicts, or None if the file cannot be read
+    """
+    if not PARQUET_AVAILABLE:
+        logger.error(f"Report {report.report_id} rows are stored as Parquet but pyarrow is not installed")
+        return None
+    source = file_service.open_archive_file(report.data_name, report.data_storage)
+    if source is None:
+        return None
+    with source:
+        return _read_page(pq.ParquetFile(source), offset, limit)
+
+
+def _read_page(parquet_file, offset, limit):
+    """Read a page of rows, fetching and decoding only the row groups that overlap it"""
+    metadata = parquet_file.metadata
+    end = metadata.num_rows if limit is None else min(offset + limit, metadata.num_rows)
+    groups = []
+    first_row = start = 0
+    for index in range(metadata.num_row_groups):
+        rows = metadata.row_group(index).num_rows
+        if start + rows > offset and start < end:
+            if not groups:
+                first_row = start
+            groups.append(index)
+        start += rows
+    if not groups:
+        return []
+    table = parquet_file.read_row_groups(groups)
+    return table.slice(offset - first_row, end - offset).to_pylist()
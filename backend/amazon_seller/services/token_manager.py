@@ -1,15 +1,43 @@
 """
-Service for managing Amazon Seller OAuth tokens
+Service for managing Amazon Seller and Advertising OAuth tokens
+
+Access tokens live for an hour and the refresh task runs every 15 minutes.
+Each refreshed token gets a refresh time REFRESH_LEAD plus a random jitter
+ahead of its expiry, so accounts that were connected or refreshed together
+drift apart instead of all coming due in the same run. Due accounts of both
+APIs are refreshed concurrently on a bounded pool and the new tokens are
+written back with one bulk UPDATE per model.
 """
+import random
 import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
 from django.utils import timezone
-from ..models import AmazonSellerAccount
+
+from core.dispatch import dispatch_grouped
+from ..models import AmazonSellerAccount, AmazonAdvertisingAccount
 from .auth import AmazonAuthService
 
 logger = logging.getLogger(__name__)
 
+# Tokens are renewed between REFRESH_LEAD and REFRESH_LEAD + REFRESH_JITTER before
+# they expire; REFRESH_LEAD must exceed the interval of the refresh task
+REFRESH_LEAD = timedelta(minutes=20)
+REFRESH_JITTER = timedelta(minutes=15)
+
+# Only these columns change on a refresh (bulk_update does not apply auto_now)
+TOKEN_FIELDS = ['access_token', 'token_type', 'token_expires_at', 'token_refresh_at', 'last_refreshed_at', 'updated_at']
+
+ACCOUNT_MODELS = {
+    'seller': AmazonSellerAccount,
+    'advertising': AmazonAdvertisingAccount,
+}
+
+
 class TokenManager:
-    """Manages the lifecycle of Amazon Seller OAuth tokens"""
+    """Manages the lifecycle of Amazon Seller and Advertising OAuth tokens"""
     
     @classmethod
     def get_valid_token(cls, seller_id):
@@ -39,13 +67,38 @@ class TokenManager:
             logger.error(f"No active Amazon seller account found for seller ID: {seller_id}")
             raise ValueError(f"No active Amazon seller account found for seller ID: {seller_id}")
     
+    @classmethod
+    def next_refresh_at(cls, expires_at):
+        """
+        Jittered time at which a token should be renewed
+        
+        Args:
+            expires_at: Token expiry time
+            
+        Returns:
+            datetime between REFRESH_LEAD + REFRESH_JITTER and REFRESH_LEAD before expires_at
+        """
+        jitter = random.uniform(0, REFRESH_JITTER.total_seconds())
+        return expires_at - REFRESH_LEAD - timedelta(seconds=jitter)
+    
+    @classmethod
+    def _apply_token(cls, account, token_data, now=None):
+        """Set the token fields of an account from refresh_access_token output (not saved)"""
+        now = now or timezone.now()
+        account.access_token = token_data['access_token']
+        account.token_type = token_data.get('token_type') or account.token_type
+        account.token_expires_at = token_data['token_expires_at']
+        account.token_refresh_at = cls.next_refresh_at(account.token_expires_at)
+        account.last_refreshed_at = now
+        account.updated_at = now
+    
     @classmethod
     def refresh_token(cls, account):
         """
         Refresh access token for an account and update the database
         
         Args:
-            account: AmazonSellerAccount instance
+            account: AmazonSellerAccount or AmazonAdvertisingAccount instance
             
         Returns:
             bool: Success or failure
@@ -56,44 +109,89 @@ class TokenManager:
                 region=account.region
             )
             
-            # Update the account with new token information
-            account.access_token = token_data['access_token']
-            account.token_type = token_data['token_type']
-            account.token_expires_at = token_data['token_expires_at']
-            account.save()
+            cls._apply_token(account, token_data)
+            account.save(update_fields=TOKEN_FIELDS)
             
-            logger.info(f"Token refreshed for seller {account.seller_id}")
+            logger.info(f"Token refreshed for {account}")
             return True
         except Exception as e:
-            logger.error(f"Error refreshing token for seller {account.seller_id}: {str(e)}")
+            logger.error(f"Error refreshing token for {account}: {str(e)}")
             return False
     
     @classmethod
-    def refresh_all_expiring_tokens(cls):
+    def due_accounts(cls, model, now=None):
         """
-        Refresh all tokens that will expire within 30 minutes
+        Active accounts whose token should be renewed now
+        
+        Accounts refreshed before scheduling existed have no refresh time yet
+        and are picked up by expiry instead.
         
+        Args:
+            model: AmazonSellerAccount or AmazonAdvertisingAccount
+            now: Reference time, defaults to now
+            
         Returns:
-            Dict with refresh statistics
+            QuerySet of accounts
         """
-        expiry_threshold = timezone.now() + timezone.timedelta(minutes=30)
-        expiring_accounts = AmazonSellerAccount.objects.filter(
-            token_expires_at__lte=expiry_threshold,
-            is_active=True
+        now = now or timezone.now()
+        return model.objects.filter(is_active=True).filter(
+            Q(token_refresh_at__lte=now) |
+            Q(token_refresh_at__isnull=True, token_expires_at__lte=now + REFRESH_LEAD + REFRESH_JITTER)
         )
+    
+    @classmethod
+    def refresh_all_expiring_tokens(cls, max_workers=None):
+        """
+        Refresh the tokens of all due seller and advertising accounts
         
-        logger.info(f"Found {expiring_accounts.count()} accounts with expiring tokens")
+        Token requests run concurrently; the new tokens are saved with one bulk
+        update per account model, touching only the token columns.
+        
+        Args:
+            max_workers: Concurrent token requests, defaults to AMAZON_TOKEN_REFRESH_WORKERS
+            
+        Returns:
+            Dict with refresh statistics, overall and per account type
+        """
+        max_workers = max_workers or getattr(settings, 'AMAZON_TOKEN_REFRESH_WORKERS', 16)
+        now = timezone.now()
+        
+        accounts = []
+        for model in ACCOUNT_MODELS.values():
+            accounts.extend(cls.due_accounts(model, now))
+        
+        logger.info(f"Found {len(accounts)} accounts with expiring tokens")
+        
+        outcomes = dispatch_grouped(
+            accounts,
+            group_key=lambda account: (account._meta.label, account.pk),
+            handler=lambda account: AmazonAuthService.refresh_access_token(account.refresh_token, region=account.region),
+            max_workers=max_workers
+        )
+        
+        refreshed = {name: [] for name in ACCOUNT_MODELS}
+        failed = {name: 0 for name in ACCOUNT_MODELS}
+        names = {model: name for name, model in ACCOUNT_MODELS.items()}
+        saved_at = timezone.now()
+        for account, token_data, error in outcomes:
+            name = names[type(account)]
+            if error is None:
+                cls._apply_token(account, token_data, saved_at)
+                refreshed[name].append(account)
+            else:
+                failed[name] += 1
+        
+        for name, updated in refreshed.items():
+            if updated:
+                ACCOUNT_MODELS[name].objects.bulk_update(updated, TOKEN_FIELDS, batch_size=500)
         
-        success_count = 0
-        for account in expiring_accounts:
-            if cls.refresh_token(account):
-                success_count += 1
-                
         results = {
-            'total': expiring_accounts.count(),
-            'success': success_count,
-            'failed': expiring_accounts.count() - success_count
+            'total': len(accounts),
+            'success': sum(len(updated) for updated in refreshed.values()),
+            'failed': sum(failed.values()),
         }
+        for name in ACCOUNT_MODELS:
+            results[name] = {'success': len(refreshed[name]), 'failed': failed[name]}
         
         logger.info(f"Token refresh results: {results}")
-        return results 
\ No newline at end of file
+        return results
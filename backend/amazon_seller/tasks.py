@@ -3,17 +3,46 @@ Celery tasks for Amazon Seller OAuth
 """
 import logging
 from celery import shared_task
+from .models import AmazonAdvertisingAccount, AdvertisingMutationJob
 from .services.token_manager import TokenManager
+from .services.catalog import AdvertisingCatalogService
+from .services.mutations import AdvertisingMutationService
 
 logger = logging.getLogger(__name__)
 
 @shared_task
 def refresh_amazon_tokens():
     """
-    Task to refresh all Amazon Seller tokens that will expire soon
+    Task to refresh all Amazon Seller and Advertising tokens that are due for renewal
     Should be scheduled to run periodically (e.g., every 15 minutes)
     """
     logger.info("Starting scheduled Amazon token refresh task")
     results = TokenManager.refresh_all_expiring_tokens()
     logger.info(f"Completed token refresh task: {results}")
-    return results 
\ No newline at end of file
+    return results
+
+@shared_task
+def sync_advertising_catalogs():
+    """
+    Task to re-sync the campaign / ad group catalog of every active advertising account
+    Runs more often than AMAZON_ADS_CATALOG_TTL_MINUTES so catalog pages never wait on the Ads API
+    """
+    results = {'synced': 0, 'failed': 0}
+    for account in AmazonAdvertisingAccount.objects.filter(is_active=True):
+        try:
+            AdvertisingCatalogService.sync(account)
+            results['synced'] += 1
+        except Exception as e:
+            logger.error(f"Error syncing catalog for advertising account {account.profile_id}: {str(e)}")
+            results['failed'] += 1
+    logger.info(f"Completed catalog sync task: {results}")
+    return results
+
+@shared_task
+def apply_advertising_mutations(job_id):
+    """
+    Task to send the pending changes of an advertising mutation job to the Ads API
+    """
+    job = AdvertisingMutationJob.objects.select_related('advertising_account').get(pk=job_id)
+    job = AdvertisingMutationService.run(job)
+    return {'status': job.status, 'succeeded': job.succeeded, 'failed': job.failed}
@@ -1,3 +1,579 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core import downloads, file_service
+from core.azure_blob_service import BlobRangeReader
+from .models import AmazonAdvertisingAccount, AmazonSellerAccount, AdvertisingMutation, AdvertisingReport
+from .services.advertising import AmazonAdvertisingService
+from .services.catalog import AdvertisingCatalogService
+from .services.auth import AmazonAuthService
+from .services.mutations import AdvertisingMutationService, changes_from_bulk_sheet
+from .services.reports import ReportingService
+from .services.token_manager import REFRESH_JITTER, REFRESH_LEAD, TokenManager
+from .services import catalog, report_files
+from .services.report_files import load_rows
+
+
+class FakeAdsApiHandler(BaseHTTPRequestHandler):
+    """Serves gzipped JSON report documents like the Ads API download endpoint, with a fixed latency"""
+    documents = {}
+    latency = 0.0
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        handler = type(self)
+        with handler.lock:
+            handler.active += 1
+            handler.max_active = max(handler.max_active, handler.active)
+        try:
+            time.sleep(handler.latency)
+            # /v2/reports/<report id>/download
+            body = handler.documents.get(self.path.split('/')[3])
+            if body is None or self.headers.get('Authorization') != 'Bearer test-token':
+                self.send_response(404 if body is None else 401)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            for start in range(0, len(body), 65536):
+                self.wfile.write(body[start:start + 65536])
+        finally:
+            with handler.lock:
+                handler.active -= 1
+
+
+def report_rows(count):
+    return [
+        {
+            'campaignId': str(1000 + i % 50),
+            'campaignName': f'Campaign {i % 50}',
+            'impressions': i % 997,
+            'clicks': i % 31,
+            'cost': round((i % 31) * 0.37, 2),
+            'attributedSales14d': 0 if i % 5 else 12.5,
+        }
+        for i in range(count)
+    ]
+
+
+class FakeBlobClient:
+    """In-memory stand-in for a BlobClient, counting the bytes of ranged downloads"""
+
+    def __init__(self, content):
+        self.content = content
+        self.downloaded = 0
+
+    def get_blob_properties(self):
+        return SimpleNamespace(size=len(self.content))
+
+    def download_blob(self, offset, length):
+        self.downloaded += length
+        return SimpleNamespace(readall=lambda: self.content[offset:offset + length])
+
+
+class DownloadCompletedReportsTest(TransactionTestCase):
+    """ReportingService.download_completed_reports against a local fake Ads API"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeAdsApiHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+
+        FakeAdsApiHandler.documents = {}
+        FakeAdsApiHandler.latency = 0.0
+        FakeAdsApiHandler.max_active = 0
+
+        for patcher in (
+            mock.patch.object(downloads, 'DOWNLOAD_DIR', f'{self.tmp_dir}/downloads'),
+            mock.patch.object(file_service, 'ARCHIVE_ROOT', f'{self.tmp_dir}/archive'),
+            mock.patch.object(file_service, 'USE_AZURE_STORAGE', False),
+            mock.patch.dict(AmazonAuthService.ADVERTISING_API_ENDPOINTS, {'FE': self.base_url}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.account = AmazonAdvertisingAccount.objects.create(
+            profile_id='1234567890',
+            access_token='test-token',
+            refresh_token='refresh-token',
+            token_expires_at=timezone.now() + timedelta(hours=1),
+            region='FE',
+        )
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def create_report(self, report_id, rows):
+        FakeAdsApiHandler.documents[report_id] = gzip.compress(json.dumps(rows).encode('utf-8'))
+        return AdvertisingReport.objects.create(
+            report_id=report_id,
+            report_type='campaigns',
+            status='COMPLETED',
+            metrics='impressions,clicks,cost',
+            end_date=timezone.now().date(),
+            download_url=f'{self.base_url}/v2/reports/{report_id}/download',
+            advertising_account=self.account,
+        )
+
+    def test_reports_are_downloaded_concurrently_into_columnar_files(self):
+        FakeAdsApiHandler.latency = 0.3
+        rows = report_rows(500)
+        for n in range(8):
+            self.create_report(f'report-{n}', rows)
+
+        started = time.monotonic()
+        downloaded = ReportingService.download_completed_reports(max_workers=4)
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(downloaded, 8)
+        self.assertGreater(FakeAdsApiHandler.max_active, 1)
+        # Serially the latency alone would take 8 x 0.3s
+        self.assertLess(elapsed, 8 * 0.3 * 0.75)
+
+        for report in AdvertisingReport.objects.all():
+            self.assertIsNone(report.report_data)
+            self.assertIsNone(report.error_message)
+            self.assertEqual(report.data_rows, 500)
+            self.assertEqual(report.data_format, 'parquet')
+            self.assertEqual(report.data_summary['totals']['clicks'], sum(r['clicks'] for r in rows))
+            stored = load_rows(report, offset=10, limit=2)
+            self.assertEqual(stored[0]['campaignName'], rows[10]['campaignName'])
+            self.assertEqual(stored[1]['impressions'], rows[11]['impressions'])
+
+        # Downloaded reports are not picked up again
+        self.assertEqual(ReportingService.download_completed_reports(max_workers=4), 0)
+
+    def test_memory_stays_bounded_for_large_reports(self):
+        rows = report_rows(100000)
+        decoded_size = len(json.dumps(rows))
+        report = self.create_report('large-report', rows)
+        del rows
+
+        tracemalloc.start()
+        try:
+            with mock.patch.object(report_files, 'BATCH_ROWS', 2000):
+                ReportingService.download_report(report)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        report.refresh_from_db()
+        self.assertEqual(report.data_rows, 100000)
+        # Only one row group of records is held at a time; decoding the whole
+        # report at once would need several times its JSON size
+        self.assertLess(peak, decoded_size / 4)
+
+    def test_columns_first_seen_late_are_kept(self):
+        rows = report_rows(30)
+        rows[25]['portfolioId'] = 'p-1'
+        rows[3]['cost'] = 'n/a'
+        report = self.create_report('late-columns', rows)
+
+        with mock.patch.object(report_files, 'BATCH_ROWS', 10):
+            ReportingService.download_report(report)
+
+        report.refresh_from_db()
+        self.assertIn('portfolioId', report.data_summary['columns'])
+        # A column mixing numbers and text is stored as text
+        self.assertNotIn('cost', report.data_summary['totals'])
+        stored = load_rows(report)
+        self.assertEqual(stored[25]['portfolioId'], 'p-1')
+        self.assertIsNone(stored[24]['portfolioId'])
+        self.assertEqual(stored[3]['cost'], 'n/a')
+        self.assertEqual(stored[4]['cost'], str(rows[4]['cost']))
+
+    def test_rows_are_paged_across_row_groups(self):
+        rows = report_rows(50)
+        report = self.create_report('paged-report', rows)
+        with mock.patch.object(report_files, 'BATCH_ROWS', 7):
+            ReportingService.download_report(report)
+        report.refresh_from_db()
+
+        for offset, limit in ((0, 5), (5, 10), (13, 1), (45, 10), (0, None), (21, None)):
+            stored = load_rows(report, offset=offset, limit=limit)
+            expected = rows[offset:None if limit is None else offset + limit]
+            self.assertEqual([row['impressions'] for row in stored], [row['impressions'] for row in expected])
+        self.assertEqual(load_rows(report, offset=60, limit=5), [])
+
+    def test_pages_fetch_only_the_overlapping_row_groups(self):
+        rows = report_rows(30000)
+        for i, row in enumerate(rows):
+            # Incompressible values, so the row groups outweigh the footer
+            row['adId'] = hashlib.sha1(str(i).encode()).hexdigest()
+        report = self.create_report('ranged-report', rows)
+        with mock.patch.object(report_files, 'BATCH_ROWS', 3000):
+            ReportingService.download_report(report)
+        report.refresh_from_db()
+        with open(f'{file_service.ARCHIVE_ROOT}/{report.data_name}', 'rb') as f:
+            blob = FakeBlobClient(f.read())
+
+        # The same file served from Azure Blob Storage through ranged reads
+        report.data_storage = 'azure_blob'
+        with mock.patch.object(file_service, 'AZURE_BLOB_AVAILABLE', True), \
+                mock.patch.object(file_service, 'open_blob', create=True, side_effect=lambda name: BlobRangeReader(blob)), \
+                mock.patch.object(file_service, 'read_archive_file') as read_archive_file:
+            stored = load_rows(report, offset=14990, limit=20)
+
+        self.assertEqual([row['impressions'] for row in stored], [row['impressions'] for row in rows[14990:15010]])
+        read_archive_file.assert_not_called()
+        # The footer and two of the ten row groups
+        self.assertLess(blob.downloaded, len(blob.content) / 3)
+
+    def test_failed_download_is_recorded_and_retried_later(self):
+        report = self.create_report('missing-report', report_rows(10))
+        FakeAdsApiHandler.documents.pop('missing-report')
+
+        self.assertEqual(ReportingService.download_completed_reports(), 0)
+        report.refresh_from_db()
+        self.assertIn('HTTP 404', report.error_message)
+        self.assertIsNone(report.downloaded_at)
+
+
+class TokenRefreshTest(TestCase):
+    """Due seller and advertising tokens are refreshed together and saved in bulk"""
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def account(self, model, key, refresh_token='refresh', refresh_in=None, expires_in=timedelta(hours=1), **fields):
+        identifier = {'seller_id': key} if model is AmazonSellerAccount else {'profile_id': key}
+        return model.objects.create(
+            **identifier, access_token='old-token', refresh_token=refresh_token,
+            token_expires_at=self.now + expires_in,
+            token_refresh_at=None if refresh_in is None else self.now + refresh_in,
+            **fields
+        )
+
+    def fake_refresh(self, refresh_token, region=None):
+        if refresh_token == 'revoked':
+            raise ValueError('invalid_grant')
+        return {'access_token': f'new-{refresh_token}', 'token_type': 'bearer', 'token_expires_at': self.now + timedelta(hours=1)}
+
+    def test_due_tokens_are_refreshed(self):
+        due = self.account(AmazonSellerAccount, 'due', refresh_token='s1', refresh_in=-timedelta(minutes=1))
+        # Never scheduled, picked up because it expires soon
+        legacy = self.account(AmazonSellerAccount, 'legacy', refresh_token='s2', expires_in=timedelta(minutes=10))
+        fresh = self.account(AmazonSellerAccount, 'fresh', refresh_in=timedelta(minutes=10))
+        self.account(AmazonSellerAccount, 'inactive', refresh_in=-timedelta(minutes=1), is_active=False)
+        advertising = self.account(AmazonAdvertisingAccount, '111', refresh_token='a1', refresh_in=-timedelta(minutes=1))
+        revoked = self.account(AmazonAdvertisingAccount, '222', refresh_token='revoked', refresh_in=-timedelta(minutes=1))
+
+        with mock.patch.object(AmazonAuthService, 'refresh_access_token', side_effect=self.fake_refresh) as refresh:
+            results = TokenManager.refresh_all_expiring_tokens(max_workers=4)
+
+        self.assertEqual(refresh.call_count, 4)
+        self.assertEqual(results, {
+            'total': 4, 'success': 3, 'failed': 1,
+            'seller': {'success': 2, 'failed': 0},
+            'advertising': {'success': 1, 'failed': 1},
+        })
+        for account, token in ((due, 'new-s1'), (legacy, 'new-s2'), (advertising, 'new-a1'), (fresh, 'old-token'), (revoked, 'old-token')):
+            account.refresh_from_db()
+            self.assertEqual(account.access_token, token)
+
+        # Renewal is scheduled ahead of expiry, with jitter
+        expires_at = due.token_expires_at
+        self.assertLessEqual(due.token_refresh_at, expires_at - REFRESH_LEAD)
+        self.assertGreaterEqual(due.token_refresh_at, expires_at - REFRESH_LEAD - REFRESH_JITTER)
+        self.assertEqual(TokenManager.due_accounts(AmazonSellerAccount).count(), 0)
+
+
+class AdvertisingCatalogTest(TestCase):
+    """Campaign and ad group pages served from the synced local catalog"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='seller', email='seller@example.com', password='password'
+        )
+        self.account = AmazonAdvertisingAccount.objects.create(
+            profile_id='1234567890',
+            access_token='test-token',
+            refresh_token='refresh-token',
+            token_expires_at=timezone.now() + timedelta(hours=1),
+            region='FE',
+            user=self.user,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('v1:amazon_seller:adv_campaigns', args=[self.account.profile_id])
+        self.campaigns = [
+            {'campaignId': 3, 'name': 'Gamma', 'state': 'paused', 'dailyBudget': 5, 'lastUpdatedDate': 1700000000000},
+            {'campaignId': 1, 'name': 'Alpha', 'state': 'enabled', 'dailyBudget': 10.5, 'startDate': '20260101', 'lastUpdatedDate': 1700000000000},
+            {'campaignId': 2, 'name': 'Beta', 'state': 'enabled', 'dailyBudget': 20, 'lastUpdatedDate': 1700000000000},
+        ]
+        self.pages = []
+        for name, rows in (('get_campaigns', lambda: self.campaigns), ('get_ad_groups', lambda: [])):
+            patcher = mock.patch.object(AmazonAdvertisingService, name, side_effect=self.fake_list(rows))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(catalog, 'PAGE_SIZE', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_list(self, rows):
+        def fake(account, profile_id, start_index=None, count=None, extended=False):
+            self.pages.append(start_index)
+            return rows()[start_index:start_index + count]
+        return fake
+
+    def test_campaigns_are_served_from_the_catalog(self):
+        response = self.client.get(self.url, {'state': 'enabled', 'limit': 1, 'offset': 1})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'count', 'offset', 'limit', 'syncedAt', 'data'})
+        self.assertEqual((response.data['count'], response.data['offset'], response.data['limit']), (2, 1, 1))
+        # Rows come back as the API returned them, ordered by name
+        self.assertEqual(response.data['data'], [self.campaigns[2]])
+        campaign = self.account.campaigns.get(campaign_id='1')
+        self.assertEqual((campaign.daily_budget, campaign.start_date), (Decimal('10.5'), date(2026, 1, 1)))
+        # Two campaign pages, one ad group page
+        self.assertEqual(self.pages, [0, 2, 0])
+
+        # A fresh catalog is served without calling the API
+        response = self.client.get(self.url, {'search': 'gam'})
+        self.assertEqual([row['name'] for row in response.data['data']], ['Gamma'])
+        self.assertEqual(len(self.pages), 3)
+
+    def test_sync_writes_only_changed_rows_and_removes_missing_ones(self):
+        self.assertEqual(AdvertisingCatalogService.sync(self.account)['campaigns'], {'fetched': 3, 'updated': 3, 'removed': 0})
+
+        self.campaigns[0] = dict(self.campaigns[0], name='Gamma 2', lastUpdatedDate=1800000000000)
+        del self.campaigns[2]
+        result = AdvertisingCatalogService.sync(self.account)
+
+        self.assertEqual(result['campaigns'], {'fetched': 2, 'updated': 1, 'removed': 1})
+        self.assertEqual(sorted(self.account.campaigns.values_list('name', flat=True)), ['Alpha', 'Gamma 2'])
+
+    def test_cached_catalog_is_served_when_a_sync_fails(self):
+        AdvertisingCatalogService.sync(self.account)
+
+        with mock.patch.object(AmazonAdvertisingService, 'get_campaigns', side_effect=ConnectionError('throttled')):
+            response = self.client.get(self.url, {'refresh': 'true'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+
+
+class ChangesFromBulkSheetTest(TestCase):
+    """changes_from_bulk_sheet on rows of an optimiser bulk sheet"""
+
+    def test_keyword_and_target_updates(self):
+        changes, skipped = changes_from_bulk_sheet([
+            {'Entity': 'Keyword', 'Operation': 'Update', 'Keyword ID': '111.0', 'Bid': 0.456, 'State': 'Paused'},
+            {'Entity': 'Product Targeting', 'Operation': 'Update', 'Product Targeting ID': 222, 'Bid': 1.2},
+            {'Entity': 'Keyword', 'Operation': 'Update', 'Keyword ID': '333'},
+            {'Entity': 'Keyword', 'Operation': 'Update', 'Keyword ID': float('nan'), 'Bid': 1},
+        ])
+
+        self.assertEqual(changes, [
+            {'entity_type': 'keywords', 'operation': 'update', 'entity_id': '111',
+             'payload': {'keywordId': 111, 'bid': 0.46, 'state': 'paused'}},
+            {'entity_type': 'targets', 'operation': 'update', 'entity_id': '222',
+             'payload': {'targetId': 222, 'bid': 1.2}},
+        ])
+        # Nothing to change and no ID
+        self.assertEqual(skipped, 2)
+
+    def test_campaign_and_placement_rows_are_merged(self):
+        changes, skipped = changes_from_bulk_sheet([
+            {'Entity': 'Campaign', 'Operation': 'Update', 'Campaign ID': '9.0', 'Daily Budget': '25',
+             'State': 'enabled', 'Bidding Strategy': 'Dynamic bids - down only'},
+            {'Entity': 'Bidding Adjustment', 'Operation': 'Update', 'Campaign ID': '9',
+             'Placement': 'Placement Top', 'Percentage': 35.4},
+            {'Entity': 'Bidding Adjustment', 'Operation': 'Update', 'Campaign ID': '9',
+             'Placement': 'Somewhere else', 'Percentage': 10},
+        ])
+
+        self.assertEqual(changes, [
+            {'entity_type': 'campaigns', 'operation': 'update', 'entity_id': '9', 'payload': {
+                'campaignId': 9,
+                'dailyBudget': 25.0,
+                'state': 'enabled',
+                'bidding': {'strategy': 'legacyForSales', 'adjustments': [{'predicate': 'placementTop', 'percentage': 35}]},
+            }},
+        ])
+        self.assertEqual(skipped, 1)
+
+    def test_other_entities_and_operations_are_skipped(self):
+        changes, skipped = changes_from_bulk_sheet([
+            {'Entity': 'Keyword', 'Operation': 'Create', 'Keyword ID': '1', 'Bid': 1},
+            {'Entity': 'Ad Group', 'Operation': 'Update', 'Ad Group ID': '2'},
+            {'Entity': 'Campaign', 'Operation': 'Update', 'Daily Budget': 10},
+        ])
+
+        self.assertEqual(changes, [])
+        self.assertEqual(skipped, 3)
+
+    def test_non_numeric_ids_are_rejected(self):
+        with self.assertRaisesMessage(ValueError, "Row 3: Keyword ID must be a numeric ID, got 'abc'"):
+            changes_from_bulk_sheet([
+                {'Entity': 'Keyword', 'Operation': 'Update', 'Keyword ID': '1', 'Bid': 1},
+                {'Entity': 'Keyword', 'Operation': 'Update', 'Keyword ID': 'abc', 'Bid': 1},
+            ])
+
+
+class AdvertisingMutationServiceTest(TestCase):
+    """Recording Ads API results and failed runs of mutation jobs"""
+
+    def setUp(self):
+        self.account = AmazonAdvertisingAccount.objects.create(
+            profile_id='1234567890',
+            access_token='test-token',
+            refresh_token='refresh-token',
+            token_expires_at=timezone.now() + timedelta(hours=1),
+            region='FE',
+        )
+
+    def submit(self, count, entity_type='keywords', operation='update'):
+        changes = [
+            {'entity_type': entity_type, 'operation': operation, 'payload': {'keywordId': index, 'bid': 1.0}}
+            for index in range(1, count + 1)
+        ]
+        return AdvertisingMutationService.submit(self.account, changes, source='test')
+
+    def test_results_are_recorded_per_entity(self):
+        job = self.submit(3, operation='create')
+        mutations = list(job.mutations.order_by('id'))
+
+        AdvertisingMutationService._record_results([(mutations, [
+            {'code': 'SUCCESS', 'keywordId': 501},
+            {'code': 'INVALID_ARGUMENT', 'description': 'Bid too low'},
+            None,
+        ], None)], 'keywordId')
+
+        mutations = list(job.mutations.order_by('id'))
+        self.assertEqual((mutations[0].status, mutations[0].entity_id), ('SUCCESS', '501'))
+        self.assertEqual(
+            (mutations[1].status, mutations[1].error_code, mutations[1].error_message),
+            ('ERROR', 'INVALID_ARGUMENT', 'Bid too low')
+        )
+        self.assertEqual((mutations[2].status, mutations[2].error_code), ('ERROR', 'UNKNOWN'))
+
+    def test_failed_or_mismatched_requests_fail_the_whole_chunk(self):
+        job = self.submit(3)
+        mutations = list(job.mutations.order_by('id'))
+
+        AdvertisingMutationService._record_results([
+            (mutations[:1], None, RuntimeError('HTTP 500')),
+            (mutations[1:], [{'code': 'SUCCESS'}], None),
+        ], 'keywordId')
+
+        for mutation in job.mutations.all():
+            self.assertEqual((mutation.status, mutation.error_code), ('ERROR', 'REQUEST_FAILED'))
+        self.assertIn('HTTP 500', job.mutations.order_by('id').first().error_message)
+        self.assertIn('Unexpected response', job.mutations.order_by('id').last().error_message)
+
+    def test_run_sends_changes_and_counts_results(self):
+        job = self.submit(2)
+
+        with mock.patch.object(AmazonAdvertisingService, '_ensure_fresh_token'), \
+                mock.patch.object(AmazonAdvertisingService, 'mutate_entities', side_effect=lambda account, profile_id, path, method, entities: [
+                    {'code': 'SUCCESS', 'keywordId': entity['keywordId']} for entity in entities
+                ]) as mutate:
+            job = AdvertisingMutationService.run(job)
+
+        self.assertEqual(mutate.call_args[0][2:4], ('keywords', 'PUT'))
+        self.assertEqual((job.status, job.succeeded, job.failed), ('COMPLETED', 2, 0))
+        self.account.refresh_from_db()
+        self.assertIsNone(self.account.catalog_synced_at)
+
+    def test_run_that_raises_fails_the_job(self):
+        job = self.submit(2)
+
+        with mock.patch.object(AmazonAdvertisingService, '_ensure_fresh_token', side_effect=RuntimeError('token refresh failed')):
+            with self.assertRaises(RuntimeError):
+                AdvertisingMutationService.run(job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.succeeded, job.failed), ('FAILED', 0, 2))
+        self.assertIsNotNone(job.completed_at)
+        self.assertFalse(job.mutations.filter(status='PENDING').exists())
+        self.assertEqual(
+            set(job.mutations.values_list('error_code', 'error_message')),
+            {('JOB_FAILED', 'token refresh failed')}
+        )
+
+
+class AdvertisingMutationsAPIViewTest(TestCase):
+    """Submitting changes queues a job instead of applying it in the request"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='seller', email='seller@example.com', password='password'
+        )
+        self.account = AmazonAdvertisingAccount.objects.create(
+            profile_id='1234567890',
+            access_token='test-token',
+            refresh_token='refresh-token',
+            token_expires_at=timezone.now() + timedelta(hours=1),
+            region='FE',
+            user=self.user,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('v1:amazon_seller:adv_mutations', args=[self.account.profile_id])
+        self.body = {'changes': [{'entityType': 'keywords', 'operation': 'update', 'payload': {'keywordId': 1, 'bid': 0.5}}]}
+
+    def test_job_is_queued(self):
+        with mock.patch('amazon_seller.views.apply_advertising_mutations.delay') as delay, \
+                mock.patch.object(AdvertisingMutationService, 'run') as run:
+            response = self.client.post(self.url, self.body, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'PENDING')
+        delay.assert_called_once_with(response.data['jobId'])
+        run.assert_not_called()
+        self.assertEqual(AdvertisingMutation.objects.filter(job_id=response.data['jobId'], status='PENDING').count(), 1)
+
+    def test_bulk_sheet_with_a_bad_id_is_rejected(self):
+        buffer = io.BytesIO()
+        pd.DataFrame([
+            {'Entity': 'Keyword', 'Operation': 'Update', 'Keyword ID': 'not-an-id', 'Bid': 0.5},
+        ]).to_excel(buffer, sheet_name='Bids Optimized', index=False)
+        upload = SimpleUploadedFile('bulk.xlsx', buffer.getvalue())
+
+        with mock.patch('amazon_seller.views.apply_advertising_mutations.delay') as delay:
+            response = self.client.post(self.url, {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Row 2: Keyword ID', response.data['error'])
+        delay.assert_not_called()
+        self.assertFalse(AdvertisingMutation.objects.exists())
+
+    def test_job_that_cannot_be_queued_is_failed(self):
+        with mock.patch('amazon_seller.views.apply_advertising_mutations.delay', side_effect=ConnectionError('broker down')):
+            response = self.client.post(self.url, self.body, format='json')
+
+        self.assertEqual(response.status_code, 503)
+        mutation = AdvertisingMutation.objects.get()
+        self.assertEqual((mutation.job.status, mutation.status, mutation.error_code), ('FAILED', 'ERROR', 'JOB_FAILED'))
@@ -25,6 +25,8 @@ urlpatterns = [
     path('advertising/campaigns/<str:profile_id>', views.AdvertisingCampaignsAPIView.as_view(), name='adv_campaigns'),
     path('advertising/ad-groups/<str:profile_id>', views.AdvertisingAdGroupsAPIView.as_view(), name='adv_ad_groups'),
     path('advertising/reports/<str:profile_id>', views.AdvertisingReportsAPIView.as_view(), name='adv_reports'),
+    path('advertising/mutations/job/<uuid:job_id>', views.AdvertisingMutationJobAPIView.as_view(), name='adv_mutation_job'),
+    path('advertising/mutations/<str:profile_id>', views.AdvertisingMutationsAPIView.as_view(), name='adv_mutations'),
     
     # Include router URLs
     path('', include(router.urls)),
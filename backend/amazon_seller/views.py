@@ -7,6 +7,7 @@ API views for Amazon Seller and Advertising OAuth flows
 """
 import logging
 import json
+import pandas as pd
 from django.http import JsonResponse, HttpResponseRedirect
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
@@ -22,10 +23,14 @@ from rest_framework import viewsets
 from rest_framework.decorators import action
 from django.shortcuts import get_object_or_404
 
-from .models import AmazonSellerAccount, AmazonAdvertisingAccount, AdvertisingReport, ReportSchedule
+from .models import AmazonSellerAccount, AmazonAdvertisingAccount, AdvertisingReport, ReportSchedule, AdvertisingMutationJob
 from .services.auth import AmazonAuthService
 from .services.advertising import AmazonAdvertisingService
 from .services.reports import ReportingService
+from .services.report_files import load_rows
+from .services.catalog import AdvertisingCatalogService
+from .services.mutations import AdvertisingMutationService, changes_from_bulk_sheet
+from .tasks import apply_advertising_mutations
 from .serializers import (
     ReportScheduleSerializer,
     AdvertisingReportSerializer,
@@ -414,12 +419,54 @@ class AdvertisingProfilesAPIView(APIView):
         return Response(profiles_data)
 
 
+def _catalog_page(request, account, queryset):
+    """
+    Sync the account's catalog if it is stale and return one page of a catalog queryset
+    
+    Args:
+        request: DRF request (offset, limit and refresh query params)
+        account: AmazonAdvertisingAccount instance
+        queryset: Filtered AdvertisingCampaign or AdvertisingAdGroup queryset
+        
+    Returns:
+        Response with the total count and the page of rows as returned by the API
+    """
+    try:
+        offset = max(int(request.query_params.get('offset', 0)), 0)
+        limit = min(max(int(request.query_params.get('limit', 100)), 1), 1000)
+    except ValueError:
+        return Response({"error": "offset and limit must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        AdvertisingCatalogService.ensure_synced(account, force=request.query_params.get('refresh') == 'true')
+    except Exception as e:
+        # Serve the last synced catalog if there is one
+        if not account.catalog_synced_at:
+            raise
+        logger.error(f"Error syncing catalog for profile {account.profile_id}, serving cached data: {str(e)}")
+    
+    rows = queryset.order_by('name', 'pk').values_list('raw_data', flat=True)[offset:offset + limit]
+    return Response({
+        'count': queryset.count(),
+        'offset': offset,
+        'limit': limit,
+        'syncedAt': account.catalog_synced_at,
+        'data': list(rows)
+    })
+
+
 class AdvertisingCampaignsAPIView(APIView):
     """View to list and create advertising campaigns"""
     permission_classes = [IsAuthenticated]
     
     def get(self, request, profile_id=None):
-        """Get campaigns for a specific profile"""
+        """
+        Get campaigns for a specific profile
+        
+        Campaigns are served from the local catalog, which is synced from the
+        Ads API when it is stale (query params: state, campaignType, search,
+        offset, limit, refresh=true to force a sync).
+        """
         user = request.user
         
         if not profile_id:
@@ -433,19 +480,20 @@ class AdvertisingCampaignsAPIView(APIView):
                 is_active=True
             )
             
+            campaigns = account.campaigns.all()
+            
             # Get optional query parameters
             state_filter = request.query_params.get('state')
             campaign_type = request.query_params.get('campaignType')
-            
-            # Get campaigns from the API
-            campaigns = AmazonAdvertisingService.get_campaigns(
-                account, 
-                profile_id, 
-                state_filter=state_filter,
-                campaign_type=campaign_type
-            )
-            
-            return Response(campaigns)
+            search = request.query_params.get('search')
+            if state_filter:
+                campaigns = campaigns.filter(state__in=state_filter.split(','))
+            if campaign_type:
+                campaigns = campaigns.filter(campaign_type=campaign_type)
+            if search:
+                campaigns = campaigns.filter(name__icontains=search)
+            
+            return _catalog_page(request, account, campaigns)
         except AmazonAdvertisingAccount.DoesNotExist:
             return Response(
                 {"error": f"No active advertising account found for profile {profile_id}"}, 
@@ -492,7 +540,13 @@ class AdvertisingAdGroupsAPIView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request, profile_id=None):
-        """Get ad groups for a specific profile"""
+        """
+        Get ad groups for a specific profile
+        
+        Ad groups are served from the local catalog, which is synced from the
+        Ads API when it is stale (query params: campaignId, state, search,
+        offset, limit, refresh=true to force a sync).
+        """
         user = request.user
         
         if not profile_id:
@@ -506,19 +560,20 @@ class AdvertisingAdGroupsAPIView(APIView):
                 is_active=True
             )
             
+            ad_groups = account.ad_groups.all()
+            
             # Get optional query parameters
             campaign_id = request.query_params.get('campaignId')
             state_filter = request.query_params.get('state')
-            
-            # Get ad groups from the API
-            ad_groups = AmazonAdvertisingService.get_ad_groups(
-                account, 
-                profile_id, 
-                campaign_id=campaign_id,
-                state_filter=state_filter
-            )
-            
-            return Response(ad_groups)
+            search = request.query_params.get('search')
+            if campaign_id:
+                ad_groups = ad_groups.filter(campaign_id__in=campaign_id.split(','))
+            if state_filter:
+                ad_groups = ad_groups.filter(state__in=state_filter.split(','))
+            if search:
+                ad_groups = ad_groups.filter(name__icontains=search)
+            
+            return _catalog_page(request, account, ad_groups)
         except AmazonAdvertisingAccount.DoesNotExist:
             return Response(
                 {"error": f"No active advertising account found for profile {profile_id}"}, 
@@ -560,6 +615,136 @@ class AdvertisingAdGroupsAPIView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _mutation_job_data(job, request=None):
+    """Summary of a mutation job, with one page of its per-entity results when a request is given"""
+    data = {
+        'jobId': str(job.id),
+        'status': job.status,
+        'source': job.source,
+        'total': job.total,
+        'succeeded': job.succeeded,
+        'failed': job.failed,
+        'createdAt': job.created_at,
+        'startedAt': job.started_at,
+        'completedAt': job.completed_at,
+    }
+    if request is None:
+        return data
+    
+    offset = max(int(request.query_params.get('offset', 0)), 0)
+    limit = min(max(int(request.query_params.get('limit', 100)), 1), 1000)
+    mutations = job.mutations.order_by('id')
+    status_filter = request.query_params.get('status')
+    if status_filter:
+        mutations = mutations.filter(status__in=status_filter.split(','))
+    data['offset'] = offset
+    data['limit'] = limit
+    data['results'] = list(
+        mutations.values(
+            'entity_type', 'operation', 'entity_id', 'status', 'error_code', 'error_message'
+        )[offset:offset + limit]
+    )
+    return data
+
+
+class AdvertisingMutationsAPIView(APIView):
+    """View to apply batches of campaign, ad group, keyword and target changes"""
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, profile_id=None):
+        """
+        Apply a batch of changes for a specific profile
+        
+        The body is either JSON with a "changes" list of
+        {entityType, operation, payload} objects, or a multipart "file" with an
+        optimiser bulk sheet ("Bids Optimized" sheet), whose bid, state, budget
+        and placement changes are applied.
+        
+        The changes are sent by the apply_advertising_mutations task; the response
+        carries the job ID to follow on the job endpoint.
+        """
+        user = request.user
+        
+        if not profile_id:
+            return Response({"error": "Profile ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            # Get the advertising account
+            account = AmazonAdvertisingAccount.objects.get(
+                profile_id=profile_id,
+                user=user,
+                is_active=True
+            )
+            
+            skipped = 0
+            uploaded = request.FILES.get('file')
+            if uploaded:
+                try:
+                    rows = pd.read_excel(
+                        uploaded,
+                        sheet_name=request.data.get('sheet', 'Bids Optimized'),
+                        dtype={'Campaign ID': str, 'Ad Group ID': str, 'Keyword ID': str, 'Product Targeting ID': str}
+                    )
+                    changes, skipped = changes_from_bulk_sheet(rows)
+                except ValueError as e:
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+                source = uploaded.name
+            else:
+                changes = [
+                    {
+                        'entity_type': change.get('entityType'),
+                        'operation': change.get('operation'),
+                        'entity_id': change.get('entityId'),
+                        'payload': change.get('payload'),
+                    }
+                    for change in request.data.get('changes') or []
+                ]
+                source = request.data.get('source') or 'api'
+            
+            if not changes:
+                return Response({"error": "No changes to apply"}, status=status.HTTP_400_BAD_REQUEST)
+            
+            try:
+                job = AdvertisingMutationService.submit(account, changes, user=user, source=source)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            
+            try:
+                apply_advertising_mutations.delay(str(job.id))
+            except Exception as e:
+                AdvertisingMutationService.fail(job, f"Could not queue the job: {str(e)}")
+                return Response({"error": "Could not queue the changes, please try again"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            
+            data = _mutation_job_data(job)
+            data['skipped'] = skipped
+            return Response(data, status=status.HTTP_202_ACCEPTED)
+        except AmazonAdvertisingAccount.DoesNotExist:
+            return Response(
+                {"error": f"No active advertising account found for profile {profile_id}"}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except Exception as e:
+            logger.error(f"Error applying advertising changes: {str(e)}")
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AdvertisingMutationJobAPIView(APIView):
+    """View to check the results of a mutation job"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, job_id=None):
+        """
+        Get a mutation job with one page of its per-entity results
+        
+        Query params: status (e.g. ERROR), offset, limit.
+        """
+        job = get_object_or_404(AdvertisingMutationJob, pk=job_id, advertising_account__user=request.user)
+        try:
+            return Response(_mutation_job_data(job, request))
+        except ValueError:
+            return Response({"error": "offset and limit must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+
 class AdvertisingReportsAPIView(APIView):
     """View to generate advertising reports"""
     permission_classes = [IsAuthenticated]
@@ -695,9 +880,36 @@ class ReportAPIView(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
-        """Download report data"""
+        """
+        Download report data
+        
+        Rows of downloaded reports are read from their columnar file one page at a
+        time (query params: offset, default 0, and limit, default 1000).
+        """
         report = self.get_object()
         
+        if report.data_name:
+            try:
+                offset = max(int(request.query_params.get('offset', 0)), 0)
+                limit = min(max(int(request.query_params.get('limit', 1000)), 1), 10000)
+            except ValueError:
+                return Response({
+                    'status': 'error',
+                    'message': 'offset and limit must be integers'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            rows = load_rows(report, offset=offset, limit=limit)
+            if rows is not None:
+                return Response({
+                    'reportId': report.report_id,
+                    'status': report.status,
+                    'rows': report.data_rows,
+                    'summary': report.data_summary,
+                    'offset': offset,
+                    'limit': limit,
+                    'data': rows
+                })
+        
         if not report.report_data:
             return Response({
                 'status': 'error',
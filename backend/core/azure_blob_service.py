@@ -1,129 +1,238 @@
+import io
 import os
 import uuid
+import hashlib
 import logging
+import threading
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from django.conf import settings
-from azure.storage.blob import BlobServiceClient, BlobSasPermissions, generate_blob_sas
+from azure.storage.blob import BlobServiceClient, BlobSasPermissions, ContentSettings, generate_blob_sas
 from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
-import tempfile
+
+# The async client needs aiohttp at request time
+from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
 
 # Set up logger
 logger = logging.getLogger('file_service')
 
 # Configuration with default values
-# These should be set in settings.py and accessed here
+# These should be set in settings.py and accessed here. For local development
+# and tests, AZURE_STORAGE_CONNECTION_STRING can point at the Azurite emulator
+# (UseDevelopmentStorage=true or an explicit BlobEndpoint).
 AZURE_STORAGE_CONNECTION_STRING = getattr(settings, 'AZURE_STORAGE_CONNECTION_STRING', None)
 AZURE_CONTAINER_NAME = getattr(settings, 'AZURE_CONTAINER_NAME', 'tempfiles')
 AZURE_BLOB_EXPIRY_HOURS = getattr(settings, 'AZURE_BLOB_EXPIRY_HOURS', 4)  # Files expire after 4 hours
+# Blobs larger than AZURE_MAX_SINGLE_PUT_SIZE are uploaded as blocks of
+# AZURE_BLOCK_SIZE, AZURE_MAX_CONCURRENCY at a time (downloads use the same concurrency)
+AZURE_MAX_SINGLE_PUT_SIZE = getattr(settings, 'AZURE_MAX_SINGLE_PUT_SIZE', 8 * 1024 * 1024)
+AZURE_BLOCK_SIZE = getattr(settings, 'AZURE_BLOCK_SIZE', 8 * 1024 * 1024)
+AZURE_MAX_CONCURRENCY = getattr(settings, 'AZURE_MAX_CONCURRENCY', 8)
+# Most sub-requests the blob batch API accepts in one call
+BLOB_BATCH_SIZE = 256
 
-def get_blob_service_client():
-    """Get Azure Blob Service client from connection string."""
+# One client and container handle per process: the SDK clients are thread-safe
+# and keep their connection pool. Async clients are bound to the aiohttp session
+# of one event loop, so they are opened per operation and closed after it.
+_client = None
+_container_client = None
+_client_lock = threading.Lock()
+_container_lock = threading.Lock()
+_async_container_checked = False
+
+def _client_options():
     if not AZURE_STORAGE_CONNECTION_STRING:
         logger.error("Azure Storage connection string not configured")
         raise ValueError("Azure Storage connection string not configured")
-    
-    return BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
+    return {
+        'max_single_put_size': AZURE_MAX_SINGLE_PUT_SIZE,
+        'max_block_size': AZURE_BLOCK_SIZE,
+    }
+
+def get_blob_service_client():
+    """Get the process-wide Azure Blob Service client, built from the connection string once."""
+    global _client
+    if _client is None:
+        options = _client_options()
+        with _client_lock:
+            if _client is None:
+                _client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING, **options)
+    return _client
 
 def ensure_container_exists():
-    """Ensure the container exists in Azure Blob Storage."""
-    try:
-        client = get_blob_service_client()
+    """Get the container client, creating the container on first use in the process."""
+    global _container_client
+    if _container_client is not None:
+        return _container_client
+    
+    with _container_lock:
+        if _container_client is None:
+            container_client = get_blob_service_client().get_container_client(AZURE_CONTAINER_NAME)
+            try:
+                container_client.get_container_properties()
+                logger.debug(f"Container '{AZURE_CONTAINER_NAME}' already exists")
+            except ResourceNotFoundError:
+                # Container doesn't exist, create it
+                logger.info(f"Container '{AZURE_CONTAINER_NAME}' not found, creating")
+                try:
+                    container_client.create_container()
+                    logger.info(f"Created container '{AZURE_CONTAINER_NAME}'")
+                except ResourceExistsError:
+                    # Created by another process between check and create
+                    logger.info(f"Container '{AZURE_CONTAINER_NAME}' already exists (race condition)")
+                except Exception as e:
+                    logger.error(f"Failed to create container: {str(e)}")
+                    raise
+            _container_client = container_client
+    return _container_client
+
+@asynccontextmanager
+async def get_async_container_client():
+    """
+    Async container client for one operation, creating the container on first use in the process.
+    
+    Use as "async with get_async_container_client() as container_client"; the
+    client and its aiohttp session are closed on exit.
+    """
+    global _async_container_checked
+    client = AsyncBlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING, **_client_options())
+    async with client:
         container_client = client.get_container_client(AZURE_CONTAINER_NAME)
+        if not _async_container_checked:
+            try:
+                await container_client.get_container_properties()
+            except ResourceNotFoundError:
+                try:
+                    await container_client.create_container()
+                    logger.info(f"Created container '{AZURE_CONTAINER_NAME}'")
+                except ResourceExistsError:
+                    pass
+            _async_container_checked = True
+        yield container_client
+
+def _md5(stream):
+    """MD5 digest of the rest of a seekable stream, which is left where it was."""
+    start = stream.tell()
+    digest = hashlib.md5()
+    for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+        digest.update(chunk)
+    stream.seek(start)
+    return digest.digest()
+
+def _verify_md5(blob_name, expected, data):
+    """Compare downloaded content with the MD5 stored on the blob, if it has one."""
+    if expected and hashlib.md5(data).digest() != bytes(expected):
+        raise ValueError(f"Content MD5 mismatch for blob '{blob_name}'")
+
+def _prepare_upload(file_obj, custom_filename=None, expires=True):
+    """
+    Blob name, open stream and upload_blob arguments for a file.
+    
+    The whole-file MD5 is stored as the blob's Content-MD5 (checked again by
+    download_blob), and validate_content has the service check an MD5 of
+    every block as it is received.
+    
+    Returns:
+        tuple: (blob_name, stream, opened, upload kwargs), where opened is
+        True if the stream was opened here and has to be closed by the caller
+    """
+    # Generate a unique blob name if none provided
+    if custom_filename:
+        blob_name = custom_filename
+    else:
+        # Get file extension
+        if hasattr(file_obj, 'name'):
+            file_extension = os.path.splitext(file_obj.name)[1]
+        elif isinstance(file_obj, str) and os.path.exists(file_obj):
+            file_extension = os.path.splitext(file_obj)[1]
+        else:
+            file_extension = '.tmp'
         
-        # Try to get container properties to check if it exists
-        container_client.get_container_properties()
-        logger.debug(f"Container '{AZURE_CONTAINER_NAME}' already exists")
-        
-        return container_client
-    except ResourceNotFoundError:
-        # Container doesn't exist, create it
-        logger.info(f"Container '{AZURE_CONTAINER_NAME}' not found, creating")
-        try:
-            client = get_blob_service_client()
-            container_client = client.create_container(AZURE_CONTAINER_NAME)
-            logger.info(f"Created container '{AZURE_CONTAINER_NAME}'")
-            return container_client
-        except ResourceExistsError:
-            # Handle race condition where container was created between check and create
-            logger.info(f"Container '{AZURE_CONTAINER_NAME}' already exists (race condition)")
-            return client.get_container_client(AZURE_CONTAINER_NAME)
-        except Exception as e:
-            logger.error(f"Failed to create container: {str(e)}")
-            raise
+        # Create unique blob name with timestamp
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        blob_name = f"{timestamp}_{uuid.uuid4().hex}{file_extension}"
+    
+    if hasattr(file_obj, 'read'):
+        # File-like object or Django uploaded file, streamed as is
+        if hasattr(file_obj, 'chunks'):
+            file_obj.seek(0)
+        stream, opened = file_obj, False
+    elif isinstance(file_obj, str) and os.path.exists(file_obj):
+        # Path string
+        stream, opened = open(file_obj, 'rb'), True
+    else:
+        raise ValueError("Unsupported file object type")
+    
+    # Set blob metadata with expiry information
+    metadata = {
+        'original_filename': custom_filename or getattr(file_obj, 'name', blob_name)
+    }
+    if expires:
+        expiry_time = datetime.utcnow() + timedelta(hours=AZURE_BLOB_EXPIRY_HOURS)
+        metadata['expires_at'] = expiry_time.isoformat()
+    
+    seekable = getattr(stream, 'seekable', lambda: hasattr(stream, 'seek'))()
+    content_settings = ContentSettings(content_md5=_md5(stream)) if seekable else None
+    
+    return blob_name, stream, opened, {
+        'overwrite': True,
+        'metadata': metadata,
+        'content_settings': content_settings,
+        'validate_content': True,
+        'max_concurrency': AZURE_MAX_CONCURRENCY,
+    }
 
-def upload_blob(file_obj, custom_filename=None):
+def upload_blob(file_obj, custom_filename=None, expires=True):
     """
     Upload a file to Azure Blob Storage.
     
+    Large files are uploaded as parallel blocks (AZURE_MAX_CONCURRENCY at a
+    time), each checked against its MD5 by the service.
+    
     Args:
         file_obj: A file-like object, path string, or Django uploaded file
         custom_filename: Optional custom filename to use
+        expires: If False the blob gets no expiry metadata, so
+            cleanup_expired_blobs leaves it in place (used for archives)
     
     Returns:
         tuple: (blob_name, blob_url)
     """
     try:
-        # Generate a unique blob name if none provided
-        if custom_filename:
-            blob_name = custom_filename
-        else:
-            # Get file extension
-            if hasattr(file_obj, 'name'):
-                file_extension = os.path.splitext(file_obj.name)[1]
-            elif isinstance(file_obj, str) and os.path.exists(file_obj):
-                file_extension = os.path.splitext(file_obj)[1]
-            else:
-                file_extension = '.tmp'
-            
-            # Create unique blob name with timestamp
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            blob_name = f"{timestamp}_{uuid.uuid4().hex}{file_extension}"
-        
-        # Ensure container exists
-        container_client = ensure_container_exists()
-        
-        # Get blob client
-        blob_client = container_client.get_blob_client(blob_name)
+        blob_name, stream, opened, upload_kwargs = _prepare_upload(file_obj, custom_filename, expires)
+        try:
+            blob_client = ensure_container_exists().get_blob_client(blob_name)
+            blob_client.upload_blob(stream, **upload_kwargs)
+        finally:
+            if opened:
+                stream.close()
         
-        # Upload the file
-        if hasattr(file_obj, 'chunks'):
-            # Django uploaded file
-            temp_file = tempfile.NamedTemporaryFile(delete=False)
-            try:
-                for chunk in file_obj.chunks():
-                    temp_file.write(chunk)
-                temp_file.close()
-                
-                with open(temp_file.name, "rb") as data:
-                    blob_client.upload_blob(data, overwrite=True)
-            finally:
-                # Clean up temp file
-                if os.path.exists(temp_file.name):
-                    os.unlink(temp_file.name)
-                    
-        elif hasattr(file_obj, 'read'):
-            # File-like object
-            blob_client.upload_blob(file_obj, overwrite=True)
-            
-        elif isinstance(file_obj, str) and os.path.exists(file_obj):
-            # Path string
-            with open(file_obj, "rb") as data:
-                blob_client.upload_blob(data, overwrite=True)
-                
-        else:
-            raise ValueError("Unsupported file object type")
+        # Generate SAS URL with expiry
+        blob_url = get_blob_sas_url(blob_name)
         
-        # Set blob metadata with expiry information
-        expiry_time = datetime.utcnow() + timedelta(hours=AZURE_BLOB_EXPIRY_HOURS)
-        metadata = {
-            'expires_at': expiry_time.isoformat(),
-            'original_filename': custom_filename or getattr(file_obj, 'name', blob_name)
-        }
-        blob_client.set_blob_metadata(metadata)
+        logger.info(f"Uploaded blob '{blob_name}' successfully")
+        return blob_name, blob_url
         
-        # Generate SAS URL with expiry
-        blob_url = get_blob_sas_url(blob_name, expiry_time)
+    except Exception as e:
+        logger.error(f"Error uploading to Azure Blob Storage: {str(e)}")
+        raise
+
+async def upload_blob_async(file_obj, custom_filename=None, expires=True):
+    """
+    Upload a file to Azure Blob Storage without blocking the event loop (for ASGI views).
+    
+    Same arguments and result as upload_blob.
+    """
+    try:
+        blob_name, stream, opened, upload_kwargs = _prepare_upload(file_obj, custom_filename, expires)
+        try:
+            async with get_async_container_client() as container_client:
+                await container_client.get_blob_client(blob_name).upload_blob(stream, **upload_kwargs)
+        finally:
+            if opened:
+                stream.close()
         
+        blob_url = get_blob_sas_url(blob_name)
         logger.info(f"Uploaded blob '{blob_name}' successfully")
         return blob_name, blob_url
         
@@ -146,24 +255,14 @@ def get_blob_sas_url(blob_name, expiry_time=None):
         expiry_time = datetime.utcnow() + timedelta(hours=AZURE_BLOB_EXPIRY_HOURS)
     
     try:
-        # Parse connection string to extract account info
-        conn_str = AZURE_STORAGE_CONNECTION_STRING
-        # Split connection string and convert to dictionary
-        parts = {
-            part.split('=', 1)[0]: part.split('=', 1)[1]
-            for part in conn_str.split(';')
-            if '=' in part
-        }
-        
-        account_name = parts.get('AccountName')
-        account_key = parts.get('AccountKey')
-        
-        if not account_name or not account_key:
+        client = get_blob_service_client()
+        account_key = getattr(client.credential, 'account_key', None)
+        if not account_key:
             raise ValueError("Connection string missing AccountName or AccountKey")
             
         # Generate SAS token with explicit account key
         sas_token = generate_blob_sas(
-            account_name=account_name,
+            account_name=client.account_name,
             container_name=AZURE_CONTAINER_NAME,
             blob_name=blob_name,
             account_key=account_key,
@@ -171,14 +270,141 @@ def get_blob_sas_url(blob_name, expiry_time=None):
             expiry=expiry_time
         )
         
-        # Build URL
-        blob_url = f"https://{account_name}.blob.core.windows.net/{AZURE_CONTAINER_NAME}/{blob_name}?{sas_token}"
+        # Build URL from the client's endpoint (also right for Azurite)
+        blob_url = f"{client.get_blob_client(AZURE_CONTAINER_NAME, blob_name).url}?{sas_token}"
         return blob_url
         
     except Exception as e:
         logger.error(f"Error generating SAS URL: {str(e)}")
         raise
 
+def download_blob(blob_name, stream=None, max_concurrency=AZURE_MAX_CONCURRENCY):
+    """
+    Download the full content of a blob, checked against its stored Content-MD5.
+    
+    Args:
+        blob_name: Name of the blob
+        stream: Optional writable, seekable buffer to stream the content
+            into, instead of returning it as bytes
+        max_concurrency: Parallel range requests for large blobs
+    
+    Returns:
+        bytes: Blob content, or the number of bytes written to stream
+    """
+    try:
+        blob_client = ensure_container_exists().get_blob_client(blob_name)
+        downloader = blob_client.download_blob(max_concurrency=max_concurrency)
+        expected_md5 = downloader.properties.content_settings.content_md5
+        if stream is None:
+            data = downloader.readall()
+            _verify_md5(blob_name, expected_md5, data)
+            return data
+        
+        start = stream.tell()
+        size = downloader.readinto(stream)
+        if expected_md5:
+            stream.seek(start)
+            _verify_md5(blob_name, expected_md5, stream.read(size))
+        return size
+    except Exception as e:
+        logger.error(f"Error downloading blob '{blob_name}': {str(e)}")
+        raise
+
+class BlobRangeReader(io.RawIOBase):
+    """
+    Read-only, seekable file object over a blob that downloads only the byte ranges read.
+    
+    Lets readers of self-describing formats (e.g. a Parquet footer and a few of
+    its row groups) take what they need from a large blob. Ranges are not checked
+    against the blob's Content-MD5, which covers the whole blob.
+    
+    Args:
+        blob_client: BlobClient of an existing blob
+    """
+    
+    def __init__(self, blob_client):
+        super().__init__()
+        self._blob_client = blob_client
+        self._size = blob_client.get_blob_properties().size
+        self._position = 0
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def tell(self):
+        return self._position
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._position = position
+        return position
+    
+    def _download(self, length):
+        length = min(length, self._size - self._position)
+        if length <= 0:
+            return b''
+        data = self._blob_client.download_blob(offset=self._position, length=length).readall()
+        self._position += len(data)
+        return data
+    
+    def readinto(self, buffer):
+        data = self._download(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+    
+    def readall(self):
+        # One request for the rest of the blob, not one per default buffer size
+        return self._download(self._size - self._position)
+
+def open_blob(blob_name):
+    """
+    Open a blob for ranged reads.
+    
+    Args:
+        blob_name: Name of the blob
+    
+    Returns:
+        BlobRangeReader positioned at the start of the blob
+    """
+    try:
+        return BlobRangeReader(ensure_container_exists().get_blob_client(blob_name))
+    except Exception as e:
+        logger.error(f"Error opening blob '{blob_name}': {str(e)}")
+        raise
+
+async def download_blob_async(blob_name, max_concurrency=AZURE_MAX_CONCURRENCY):
+    """
+    Download the full content of a blob without blocking the event loop (for ASGI views).
+    
+    Args:
+        blob_name: Name of the blob
+        max_concurrency: Parallel range requests for large blobs
+    
+    Returns:
+        bytes: Blob content
+    """
+    try:
+        async with get_async_container_client() as container_client:
+            downloader = await container_client.get_blob_client(blob_name).download_blob(max_concurrency=max_concurrency)
+            data = await downloader.readall()
+        _verify_md5(blob_name, downloader.properties.content_settings.content_md5, data)
+        return data
+    except Exception as e:
+        logger.error(f"Error downloading blob '{blob_name}': {str(e)}")
+        raise
+
 def delete_blob(blob_name):
     """
     Delete a blob from Azure Blob Storage.
@@ -190,11 +416,8 @@ def delete_blob(blob_name):
         bool: True if deletion was successful, False otherwise
     """
     try:
-        # Get container client
-        container_client = ensure_container_exists()
-        
         # Get blob client
-        blob_client = container_client.get_blob_client(blob_name)
+        blob_client = ensure_container_exists().get_blob_client(blob_name)
         
         # Delete the blob
         blob_client.delete_blob()
@@ -208,34 +431,69 @@ def delete_blob(blob_name):
         logger.error(f"Error deleting blob '{blob_name}': {str(e)}")
         return False
 
-def cleanup_expired_blobs():
-    """Delete blobs that have expired based on their metadata."""
+def delete_blobs(blob_names):
+    """
+    Delete blobs through the blob batch API, BLOB_BATCH_SIZE per request.
+    
+    Args:
+        blob_names: Names of the blobs to delete
+    
+    Returns:
+        set: Names of the blobs that were deleted or did not exist
+    """
+    container_client = ensure_container_exists()
+    blob_names = list(blob_names)
+    deleted = set()
+    for start in range(0, len(blob_names), BLOB_BATCH_SIZE):
+        batch = blob_names[start:start + BLOB_BATCH_SIZE]
+        try:
+            responses = container_client.delete_blobs(*batch, raise_on_any_failure=False)
+        except Exception as e:
+            logger.error(f"Error deleting a batch of {len(batch)} blobs: {str(e)}")
+            continue
+        for blob_name, response in zip(batch, responses):
+            if response.status_code in (202, 404):
+                deleted.add(blob_name)
+            else:
+                logger.warning(f"Could not delete blob '{blob_name}': HTTP {response.status_code}")
+    logger.info(f"Deleted {len(deleted)} of {len(blob_names)} blobs")
+    return deleted
+
+def cleanup_expired_blobs(dry_run=False):
+    """
+    Delete blobs that have expired based on their metadata, in batches.
+    
+    Catches blobs whose registry entry is already gone; blobs without an
+    expires_at (archives) are left in place.
+    
+    Args:
+        dry_run: Only count the expired blobs, without deleting them
+    
+    Returns:
+        tuple: (blobs deleted, bytes reclaimed)
+    """
     try:
-        # Get container client
-        container_client = ensure_container_exists()
-        
         # Current time
         now = datetime.utcnow()
         
-        # List all blobs
-        blob_list = container_client.list_blobs(include=['metadata'])
-        
-        # Check each blob for expiry
-        for blob in blob_list:
+        # List all blobs, keeping the size of each expired one
+        expired = {}
+        for blob in ensure_container_exists().list_blobs(include=['metadata']):
             if blob.metadata and 'expires_at' in blob.metadata:
                 try:
                     # Parse expiry time from metadata
                     expiry_time = datetime.fromisoformat(blob.metadata['expires_at'].replace('Z', '+00:00'))
-                    
-                    # If expired, delete it
                     if expiry_time < now:
-                        blob_client = container_client.get_blob_client(blob.name)
-                        blob_client.delete_blob()
-                        logger.info(f"Deleted expired blob '{blob.name}'")
+                        expired[blob.name] = blob.size or 0
                 except (ValueError, TypeError) as e:
                     logger.warning(f"Invalid expiry time in metadata for blob '{blob.name}': {str(e)}")
         
-        return True
+        if not expired:
+            return 0, 0
+        if dry_run:
+            return len(expired), sum(expired.values())
+        deleted = delete_blobs(expired)
+        return len(deleted), sum(expired[name] for name in deleted)
     except Exception as e:
         logger.error(f"Error cleaning up expired blobs: {str(e)}")
-        return False 
\ No newline at end of file
+        return 0, 0
@@ -0,0 +1,277 @@
+"""
+Resumable file downloads for Amazon report documents
+
+Report documents are streamed straight to a file on disk instead of being
+buffered in memory. If the connection drops part way through, the next
+attempt sends an HTTP Range request for the remaining bytes, so a failure at
+90% costs the last 10% rather than the whole file. The file is fsynced
+periodically while it grows and its final size is checked against what the
+server announced before it is handed to the caller.
+
+Partial files are kept between calls when the destination path is stable, so
+a download interrupted in one cron run resumes in the next.
+"""
+import codecs
+import gzip
+import json
+import logging
+import os
+import re
+import time
+import zipfile
+
+import requests
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+from django.conf import settings
+
+from core import http_client
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_DIR = getattr(settings, 'AMAZON_REPORT_DOWNLOAD_DIR', os.path.join(settings.MEDIA_ROOT, 'downloads'))
+CHUNK_SIZE = 1024 * 1024
+TEXT_CHUNK_SIZE = 64 * 1024  # Decompressed bytes decoded at a time by iter_json_records
+FSYNC_EVERY = 16 * 1024 * 1024
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = 2  # seconds, multiplied by the attempt number
+DOWNLOAD_TIMEOUT = (10, 300)  # 10s connect, 300s between bytes
+
+# Errors raised while reading the body of a streamed response
+STREAM_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    Urllib3HTTPError,
+    ConnectionError,
+    TimeoutError,
+)
+
+CONTENT_RANGE_RE = re.compile(r'bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)')
+
+# Marks a value that runs past the end of the text read so far
+_INCOMPLETE = object()
+
+
+class DownloadError(Exception):
+    """Raised when a download cannot be completed"""
+
+
+class _PartialMismatch(DownloadError):
+    """The partial file could not be resumed; it has been truncated and the next attempt starts over"""
+
+
+def download_path(name):
+    """
+    Stable path for a download, so interrupted downloads can be resumed by a later call
+
+    Args:
+        name: File name, unique per document (e.g. '<report id>.gz')
+
+    Returns:
+        Absolute path inside the download directory (created if needed)
+    """
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    return os.path.join(DOWNLOAD_DIR, name)
+
+
+def _parse_content_range(value):
+    """Return (start, total) from a Content-Range header, None for unknown parts"""
+    match = CONTENT_RANGE_RE.match(value or '')
+    if not match:
+        return None, None
+    start = int(match.group(1)) if match.group(1) is not None else None
+    total = int(match.group(3)) if match.group(3) != '*' else None
+    return start, total
+
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _fetch(url, path, offset, region, headers, chunk_size, fsync_every):
+    """
+    One request for the bytes of a file from offset onwards
+
+    Returns:
+        Expected total size in bytes, or None if the server did not say
+    """
+    headers = dict(headers or {})
+    if offset:
+        headers['Range'] = f'bytes={offset}-'
+    with http_client.get(url, region=region, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        if response.status_code == 416 and offset:
+            # Nothing left to send: either the file is complete or our partial is bogus
+            _, total = _parse_content_range(response.headers.get('Content-Range'))
+            if total == offset:
+                return total
+            logger.warning(f"Range {offset}- not satisfiable for {url.split('?', 1)[0]}, restarting download")
+            open(path, 'wb').close()
+            raise _PartialMismatch("Partial file does not match the remote file")
+
+        if response.status_code == 206:
+            start, total = _parse_content_range(response.headers.get('Content-Range'))
+            if start != offset:
+                open(path, 'wb').close()
+                raise _PartialMismatch(f"Server resumed at byte {start}, expected {offset}")
+            mode = 'ab'
+        elif response.status_code == 200:
+            # Full body (first request, or the server ignored the Range header)
+            length = response.headers.get('Content-Length')
+            total = int(length) if length and length.isdigit() else None
+            mode = 'wb'
+        else:
+            raise DownloadError(f"HTTP {response.status_code}")
+
+        unsynced = 0
+        with open(path, mode) as f:
+            # Raw bytes: sizes and Range offsets refer to the encoded body
+            for chunk in response.raw.stream(chunk_size, decode_content=False):
+                f.write(chunk)
+                unsynced += len(chunk)
+                if unsynced >= fsync_every:
+                    _fsync(f)
+                    unsynced = 0
+            _fsync(f)
+        return total
+
+
+def download_to_file(url, path, region=None, headers=None, max_attempts=MAX_ATTEMPTS, chunk_size=CHUNK_SIZE,
+                     fsync_every=FSYNC_EVERY, resume=True):
+    """
+    Stream a URL to a file, resuming with Range requests after connection drops
+
+    Args:
+        url: Document URL (e.g. a pre-signed S3 report URL)
+        path: Destination file; an existing partial file is resumed when resume is True
+        region: Optional Amazon region used to select the connection pool
+        headers: Optional request headers (e.g. authorization for API download endpoints)
+        max_attempts: Attempts in a row that may fail without making progress
+        chunk_size: Bytes read from the socket at a time
+        fsync_every: Bytes written between fsyncs
+        resume: Continue from an existing partial file instead of starting over
+
+    Returns:
+        Size of the completed file in bytes
+
+    Raises:
+        DownloadError: If the server refuses the request, or the file could not be completed
+    """
+    if not resume and os.path.exists(path):
+        os.remove(path)
+
+    failures = 0
+    while True:
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        try:
+            total = _fetch(url, path, offset, region, headers, chunk_size, fsync_every)
+            size = os.path.getsize(path)
+            if total is None or size == total:
+                if offset:
+                    logger.info(f"Resumed download completed at {size} bytes (from byte {offset})")
+                return size
+            error = f"Incomplete download: {size} of {total} bytes"
+        except STREAM_ERRORS as e:
+            error = f"Connection error: {str(e)}"
+        except _PartialMismatch as e:
+            error = str(e)
+
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        # Only attempts that made no progress count towards the limit
+        failures = 1 if size > offset else failures + 1
+        if failures >= max_attempts:
+            raise DownloadError(f"{error} (gave up at {size} bytes after {failures} attempts without progress)")
+        logger.warning(f"{error}; resuming from byte {size} (attempt {failures + 1}/{max_attempts})")
+        time.sleep(RETRY_BACKOFF * failures)
+
+
+def open_decompressed(path):
+    """
+    Open a downloaded document for reading, decompressing GZIP or ZIP transparently
+
+    The content is decompressed as it is read rather than loaded first, so a
+    caller can json.load() the result or iterate over it line by line.
+
+    Args:
+        path: Downloaded file
+
+    Returns:
+        Binary file-like object (close it, or use it as a context manager)
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+
+    if magic[:2] == b'\x1f\x8b':
+        return gzip.open(path, 'rb')
+    if magic == b'PK\x03\x04':
+        with zipfile.ZipFile(path) as archive:
+            # The member keeps the underlying file open after the archive is closed
+            return archive.open(archive.namelist()[0])
+    return open(path, 'rb')
+
+
+def iter_json_records(f, chunk_size=TEXT_CHUNK_SIZE):
+    """
+    Yield the values of a JSON array (or of concatenated / line-delimited JSON) one at a time
+
+    Only the value being decoded and one chunk of text are held in memory, so
+    a report with millions of rows can be processed in constant memory.
+
+    Args:
+        f: Binary file-like object, e.g. from open_decompressed
+        chunk_size: Bytes read at a time
+
+    Yields:
+        Decoded JSON values (the records of the report)
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        # Skip whitespace and the array punctuation between records
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+            position += 1
+        if position < len(buffer):
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                value = _INCOMPLETE
+            if value is not _INCOMPLETE and (end < len(buffer) or eof):
+                yield value
+                position = end
+                continue
+        elif eof:
+            return
+
+        # Need more text: drop what has been consumed and read the next chunk
+        buffer = buffer[position:]
+        position = 0
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer += utf8.decode(chunk, final=eof)
+
+
+def iter_json_batches(f, batch_size, chunk_size=TEXT_CHUNK_SIZE):
+    """
+    Same as iter_json_records, grouped into lists of up to batch_size values
+
+    Args:
+        f: Binary file-like object, e.g. from open_decompressed
+        batch_size: Maximum number of values per list
+        chunk_size: Bytes read at a time
+
+    Yields:
+        Lists of decoded JSON values
+    """
+    batch = []
+    for value in iter_json_records(f, chunk_size):
+        batch.append(value)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -1,20 +1,25 @@
+import io
 import os
 import uuid
 import base64
-import json
 import logging
+import operator
+import tempfile
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from django.conf import settings
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
+from django.db.models import F, Sum
 from django.utils import timezone
-from django.http import HttpResponse, JsonResponse, FileResponse
+from django.http import HttpResponseRedirect, FileResponse
 import pandas as pd
 from urllib.parse import urljoin
 
+from .models import StoredFile
+
 # Import Azure Blob Storage service
 try:
-    from .azure_blob_service import upload_blob, get_blob_sas_url, delete_blob, cleanup_expired_blobs
+    from .azure_blob_service import upload_blob, get_blob_sas_url, delete_blob, delete_blobs, cleanup_expired_blobs, download_blob, open_blob
     AZURE_BLOB_AVAILABLE = True
 except ImportError:
     AZURE_BLOB_AVAILABLE = False
@@ -22,20 +27,36 @@ except ImportError:
 # Set up logger
 logger = logging.getLogger('file_service')
 
-# Dictionary to track file references
-# Structure: {file_id: {path: str, created_at: datetime, access_count: int, expires_at: datetime}}
-file_registry = {}
-
-# Additional dictionary to track Azure blobs
-# Structure: {file_id: {blob_name: str, blob_url: str, created_at: datetime, expires_at: datetime}}
-azure_blob_registry = {}
+# Registered files live in the StoredFile table (keyed by file_id), so every
+# worker sees the same registry and lookups are a primary key query instead of
+# a reload of a registry file and a scan of the temp directory.
 
 # Configuration
 TEMP_FILE_EXPIRY_HOURS = 4  # Files expire after 4 hours
-FILE_CLEANUP_THRESHOLD = 100  # Clean up when registry exceeds this size
+FILE_CLEANUP_THRESHOLD = 100  # Clean up when there are more local files than this
+CLEANUP_BATCH_SIZE = 256  # Registry rows (and blobs) deleted per batch by cleanup_old_files
+# Unregistered files in the temp directory are removed once they are this old
+# (younger ones may still be in use by a request)
+ORPHAN_GRACE = timedelta(minutes=getattr(settings, 'TEMP_ORPHAN_GRACE_MINUTES', 60))
 AZURE_TEMP_PATH = '/home/site/wwwroot/temp_files'  # Use absolute path for consistency
-REGISTRY_FILE = os.path.join(AZURE_TEMP_PATH, 'file_registry.json')
-AZURE_REGISTRY_FILE = os.path.join(AZURE_TEMP_PATH, 'azure_blob_registry.json')
+# Output workbooks are built in memory and only spill to a temp file past this size
+OUTPUT_SPILL_BYTES = getattr(settings, 'OUTPUT_SPILL_BYTES', 100 * 1024 * 1024)
+# Memory budget of the parsed sheet cache behind get_excel_data
+EXCEL_SHEET_CACHE_BYTES = getattr(settings, 'EXCEL_SHEET_CACHE_BYTES', 256 * 1024 * 1024)
+# Rows per sheet returned by processing endpoints and by default by the preview API
+PREVIEW_PAGE_SIZE = getattr(settings, 'PREVIEW_PAGE_SIZE', 100)
+PREVIEW_MAX_LIMIT = 1000
+PREVIEW_FILTER_OPS = {
+    'eq': operator.eq,
+    'ne': operator.ne,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+    'contains': None,
+}
+# Long-lived files (e.g. raw report archives) that are never expired by cleanup
+ARCHIVE_ROOT = getattr(settings, 'FILE_ARCHIVE_ROOT', os.path.join(settings.MEDIA_ROOT, 'archive'))
 
 # Check if Azure Blob Storage should be used
 USE_AZURE_STORAGE = getattr(settings, 'AZURE_STORAGE_CONNECTION_STRING', None) and AZURE_BLOB_AVAILABLE
@@ -51,7 +72,7 @@ def normalize_azure_path(path):
 
 def ensure_temp_dir():
     """Ensure the temp directory exists and is writable."""
-    global AZURE_TEMP_PATH, REGISTRY_FILE, AZURE_REGISTRY_FILE
+    global AZURE_TEMP_PATH
     
     if not os.path.exists(AZURE_TEMP_PATH):
         try:
@@ -84,8 +105,6 @@ def ensure_temp_dir():
             try:
                 os.makedirs(fallback_path, exist_ok=True)
                 AZURE_TEMP_PATH = fallback_path
-                REGISTRY_FILE = os.path.join(AZURE_TEMP_PATH, 'file_registry.json')
-                AZURE_REGISTRY_FILE = os.path.join(AZURE_TEMP_PATH, 'azure_blob_registry.json')
             except Exception as e2:
                 logger.critical(f"Failed to create fallback temp directory: {str(e2)}")
 
@@ -95,172 +114,91 @@ def get_temp_path(filename):
     # Ensure consistent path separators
     return os.path.join(AZURE_TEMP_PATH, filename).replace('\\', '/')
 
-def load_registry():
-    """Load file registry from JSON file."""
-    global file_registry, azure_blob_registry
-    ensure_temp_dir()
-    
-    # Load local file registry
-    try:
-        if os.path.exists(REGISTRY_FILE):
-            with open(REGISTRY_FILE, 'r') as f:
-                data = json.load(f)
-                
-                # Convert string dates back to datetime objects
-                for file_id, info in data.items():
-                    if 'created_at' in info and isinstance(info['created_at'], str):
-                        info['created_at'] = timezone.datetime.fromisoformat(info['created_at'].replace('Z', '+00:00'))
-                    if 'expires_at' in info and isinstance(info['expires_at'], str):
-                        info['expires_at'] = timezone.datetime.fromisoformat(info['expires_at'].replace('Z', '+00:00'))
-                    
-                    # Normalize paths for Azure
-                    if 'path' in info and isinstance(info['path'], str):
-                        info['path'] = normalize_azure_path(info['path'])
-                
-                file_registry = data
-                logger.info(f"Loaded {len(file_registry)} files from registry file")
-    except Exception as e:
-        logger.error(f"Error loading file registry: {e}")
-        file_registry = {}
+def get_stored_file(file_id):
+    """Look up a registered file by ID, or None if it is not registered."""
+    if not file_id:
+        return None
+    return StoredFile.objects.filter(pk=file_id).first()
+
+def register_file(filename, expires_at, local_path=None, blob_name=None, blob_url=None, size=None):
+    """
+    Register a stored file and return its StoredFile row.
     
-    # Load Azure blob registry
-    if USE_AZURE_STORAGE:
-        try:
-            if os.path.exists(AZURE_REGISTRY_FILE):
-                with open(AZURE_REGISTRY_FILE, 'r') as f:
-                    data = json.load(f)
-                    
-                    # Convert string dates back to datetime objects
-                    for file_id, info in data.items():
-                        if 'created_at' in info and isinstance(info['created_at'], str):
-                            info['created_at'] = timezone.datetime.fromisoformat(info['created_at'].replace('Z', '+00:00'))
-                        if 'expires_at' in info and isinstance(info['expires_at'], str):
-                            info['expires_at'] = timezone.datetime.fromisoformat(info['expires_at'].replace('Z', '+00:00'))
-                    
-                    azure_blob_registry = data
-                    logger.info(f"Loaded {len(azure_blob_registry)} Azure blobs from registry file")
-        except Exception as e:
-            logger.error(f"Error loading Azure blob registry: {e}")
-            azure_blob_registry = {}
-        
-    # Scan temp directory for files not in registry
+    Args:
+        filename: Display filename
+        expires_at: When the file (or, for blobs, its SAS URL) expires
+        local_path: Path of a local file
+        blob_name: Name of an Azure blob
+        blob_url: SAS URL of the Azure blob
+        size: Size in bytes, if known
+    """
+    return StoredFile.objects.create(
+        file_id=uuid.uuid4().hex,
+        filename=filename,
+        local_path=local_path,
+        blob_name=blob_name,
+        blob_url=blob_url,
+        expires_at=expires_at,
+        is_blob=blob_name is not None,
+        size=size
+    )
+
+def _file_size(file_obj):
+    """Bytes left to read from a path, Django file or seekable stream; None if unknown."""
     try:
-        scan_temp_directory()
-    except Exception as e:
-        logger.error(f"Error scanning temp directory: {e}")
+        if isinstance(file_obj, str):
+            return os.path.getsize(file_obj)
+        if getattr(file_obj, 'size', None) is not None:
+            return file_obj.size
+        position = file_obj.tell()
+        end = file_obj.seek(0, os.SEEK_END)
+        file_obj.seek(position)
+        return end - position
+    except (AttributeError, OSError, ValueError):
+        return None
 
-def save_registry():
-    """Save file registry to JSON file."""
-    ensure_temp_dir()
+def resolve_local_path(stored):
+    """
+    Path of a registered local file on disk, or None if it is missing.
     
-    # Save local file registry
-    try:
-        # Normalize paths before serializing
-        for file_id, info in file_registry.items():
-            if 'path' in info and isinstance(info['path'], str):
-                info['path'] = normalize_azure_path(info['path'])
-        
-        # Convert datetime objects to ISO format strings for JSON serialization
-        serializable_registry = {}
-        for file_id, info in file_registry.items():
-            serializable_info = info.copy()
-            if 'created_at' in info and hasattr(info['created_at'], 'isoformat'):
-                serializable_info['created_at'] = info['created_at'].isoformat()
-            if 'expires_at' in info and hasattr(info['expires_at'], 'isoformat'):
-                serializable_info['expires_at'] = info['expires_at'].isoformat()
-            serializable_registry[file_id] = serializable_info
-            
-        with open(REGISTRY_FILE, 'w') as f:
-            json.dump(serializable_registry, f)
-        logger.debug(f"Registry saved with {len(file_registry)} entries")
-    except Exception as e:
-        logger.error(f"Error saving file registry: {e}")
+    The stored path is normalized for Azure; if the file is not there, the temp
+    directory is checked for the filename and the registry is corrected.
+    """
+    file_path = normalize_azure_path(stored.local_path)
+    if file_path and os.path.exists(file_path):
+        return file_path
     
-    # Save Azure blob registry
-    if USE_AZURE_STORAGE:
+    potential_path = get_temp_path(stored.filename)
+    if os.path.exists(potential_path):
+        logger.info(f"Found file at alternative path: {potential_path}")
+        StoredFile.objects.filter(pk=stored.pk).update(local_path=potential_path)
+        stored.local_path = potential_path
+        return potential_path
+    
+    logger.warning(f"File {stored.file_id} not found at {file_path} or {potential_path}")
+    return None
+
+def get_blob_url(stored):
+    """SAS URL of a registered blob, refreshed when the stored one has expired."""
+    if stored.expires_at <= timezone.now() and AZURE_BLOB_AVAILABLE:
         try:
-            # Convert datetime objects to ISO format strings for JSON serialization
-            serializable_registry = {}
-            for file_id, info in azure_blob_registry.items():
-                serializable_info = info.copy()
-                if 'created_at' in info and hasattr(info['created_at'], 'isoformat'):
-                    serializable_info['created_at'] = info['created_at'].isoformat()
-                if 'expires_at' in info and hasattr(info['expires_at'], 'isoformat'):
-                    serializable_info['expires_at'] = info['expires_at'].isoformat()
-                serializable_registry[file_id] = serializable_info
-                
-            with open(AZURE_REGISTRY_FILE, 'w') as f:
-                json.dump(serializable_registry, f)
-            logger.debug(f"Azure blob registry saved with {len(azure_blob_registry)} entries")
+            expires_at = timezone.now() + timedelta(hours=settings.AZURE_BLOB_EXPIRY_HOURS)
+            stored.blob_url = get_blob_sas_url(stored.blob_name)
+            stored.expires_at = expires_at
+            StoredFile.objects.filter(pk=stored.pk).update(blob_url=stored.blob_url, expires_at=expires_at)
         except Exception as e:
-            logger.error(f"Error saving Azure blob registry: {e}")
+            logger.error(f"Error refreshing Azure blob URL: {str(e)}")
+    return stored.blob_url
 
-def scan_temp_directory():
-    """Scan temp directory for files not in registry."""
-    ensure_temp_dir()
-    
-    # Get all files currently registered in the file system
-    registered_paths = set()
-    for info in file_registry.values():
-        if 'path' in info:
-            # Add both home and root versions of the path for comparison
-            path = info['path']
-            if path is not None:  # Check for None
-                registered_paths.add(path)
-                if isinstance(path, str):  # Ensure path is a string before using startswith
-                    if path.startswith('/home/'):
-                        registered_paths.add(path.replace('/home/', '/root/', 1))
-                    elif path.startswith('/root/'):
-                        registered_paths.add(path.replace('/root/', '/home/', 1))
-    
-    logger.debug(f"Registered paths: {len(registered_paths)}")
-    
-    # Scan the temp directory for files
-    try:
-        all_files = os.listdir(AZURE_TEMP_PATH)
-        logger.debug(f"Found {len(all_files)} files in temp directory")
-        
-        for filename in all_files:
-            file_path = os.path.join(AZURE_TEMP_PATH, filename)
-            
-            # Skip directories and registry file
-            if os.path.isdir(file_path) or filename == 'file_registry.json':
-                continue
-                
-            # If file isn't in registry, add it
-            if file_path not in registered_paths:
-                # Create a new file ID
-                file_id = uuid.uuid4().hex
-                
-                # Register the file
-                file_registry[file_id] = {
-                    'path': file_path,
-                    'filename': filename,
-                    'created_at': timezone.now(),
-                    'access_count': 0,
-                    'expires_at': timezone.now() + timedelta(hours=TEMP_FILE_EXPIRY_HOURS)
-                }
-                
-                logger.info(f"Found unregistered file: {filename}, registered as {file_id}")
-                
-        # If we found new files, save the registry
-        save_registry()
-    except Exception as e:
-        logger.error(f"Error scanning temp directory: {e}")
-
-# Load registry at module import time
-load_registry()
+def record_access(stored):
+    """Count an access to a registered file; local files also get their expiry extended."""
+    updates = {'access_count': F('access_count') + 1}
+    if not stored.is_blob:
+        updates['expires_at'] = timezone.now() + timedelta(hours=TEMP_FILE_EXPIRY_HOURS)
+    StoredFile.objects.filter(pk=stored.pk).update(**updates)
 
 def save_temp_file(file_obj, custom_filename=None):
     """Save a file either to local temp dir or Azure Blob Storage."""
-    # Store in database if possible
-    try:
-        from .models import StoredFile
-        db_available = True
-    except (ImportError, ModuleNotFoundError):
-        db_available = False
-        logger.warning("StoredFile model not available, using file-based registry only")
-
     # If Azure Blob Storage is available and configured, use it
     if USE_AZURE_STORAGE:
         try:
@@ -273,11 +211,9 @@ def save_temp_file(file_obj, custom_filename=None):
                 unique_filename = None
                 
             # Upload to Azure Blob Storage
+            size = _file_size(file_obj)
             blob_name, blob_url = upload_blob(file_obj, unique_filename)
             
-            # Generate consistent file ID
-            file_id = uuid.uuid4().hex
-            
             # Display filename for UI
             if custom_filename:
                 display_filename = custom_filename
@@ -288,61 +224,36 @@ def save_temp_file(file_obj, custom_filename=None):
             else:
                 display_filename = blob_name
                 
-            # Expiry time
-            expires_at = timezone.now() + timedelta(hours=settings.AZURE_BLOB_EXPIRY_HOURS)
-                
-            # Store in database if available
-            if db_available:
-                try:
-                    StoredFile.objects.create(
-                        file_id=file_id,
-                        filename=display_filename,
-                        blob_name=blob_name,
-                        blob_url=blob_url,
-                        local_path=None,
-                        expires_at=expires_at,
-                        is_blob=True
-                    )
-                    logger.info(f"File saved to database with ID: {file_id}")
-                except Exception as e:
-                    logger.error(f"Error saving to database: {str(e)}")
-                
-            # Register in memory caches for backward compatibility
-            blob_info = {
-                'blob_name': blob_name,
-                'blob_url': blob_url,
-                'filename': display_filename,
-                'created_at': timezone.now(),
-                'expires_at': expires_at
-            }
-            
-            # Update both registries
-            azure_blob_registry[file_id] = blob_info
-            file_registry[file_id] = {
-                'path': None,
-                'filename': display_filename,
-                'created_at': timezone.now(),
-                'access_count': 0,
-                'expires_at': expires_at,
-                'is_azure_blob': True,
-                'blob_name': blob_name,
-                'blob_url': blob_url
-            }
-            
-            # Save both registries
-            save_registry()
+            stored = register_file(
+                display_filename,
+                timezone.now() + timedelta(hours=settings.AZURE_BLOB_EXPIRY_HOURS),
+                blob_name=blob_name,
+                blob_url=blob_url,
+                size=size
+            )
             
             # Log the success
-            logger.info(f"File saved to Azure: ID={file_id}, blob={blob_name}")
+            logger.info(f"File saved to Azure: ID={stored.file_id}, blob={blob_name}")
             
             # Return both file_id and URL
-            return {"file_id": file_id, "url": blob_url, "filename": display_filename}
+            return {"file_id": stored.file_id, "url": blob_url, "filename": display_filename}
             
         except Exception as e:
             logger.error(f"Azure upload failed: {str(e)}")
     
     # Original local file storage logic
     ensure_temp_dir()
+    expires_at = timezone.now() + timedelta(hours=TEMP_FILE_EXPIRY_HOURS)
+    
+    # If file_obj is already a path, just register it
+    if isinstance(file_obj, str) and os.path.exists(file_obj):
+        stored = register_file(
+            os.path.basename(file_obj), expires_at, local_path=file_obj, size=os.path.getsize(file_obj)
+        )
+        logger.info(f"Existing file path registered with ID: {stored.file_id}")
+        
+        # Return file_id only for local files
+        return {"file_id": stored.file_id, "filename": stored.filename}
     
     # Generate a unique filename if none provided
     if custom_filename:
@@ -353,35 +264,6 @@ def save_temp_file(file_obj, custom_filename=None):
     
     file_path = get_temp_path(filename)
     
-    # If file_obj is already a path, just register it
-    if isinstance(file_obj, str) and os.path.exists(file_obj):
-        file_id = uuid.uuid4().hex
-        file_registry[file_id] = {
-            'path': file_obj,
-            'filename': os.path.basename(file_obj),
-            'created_at': timezone.now(),
-            'access_count': 0,
-            'expires_at': timezone.now() + timedelta(hours=TEMP_FILE_EXPIRY_HOURS)
-        }
-        save_registry()
-        
-        # Store in database if available
-        if db_available:
-            try:
-                StoredFile.objects.create(
-                    file_id=file_id,
-                    filename=os.path.basename(file_obj),
-                    local_path=file_obj,
-                    expires_at=timezone.now() + timedelta(hours=TEMP_FILE_EXPIRY_HOURS),
-                    is_blob=False
-                )
-                logger.info(f"Existing file path saved to database with ID: {file_id}")
-            except Exception as e:
-                logger.error(f"Error saving existing path to database: {str(e)}")
-        
-        # Return file_id only for local files
-        return {"file_id": file_id, "filename": os.path.basename(file_obj)}
-    
     # Save file from request.FILES or similar
     if hasattr(file_obj, 'chunks'):
         with open(file_path, 'wb+') as destination:
@@ -391,209 +273,203 @@ def save_temp_file(file_obj, custom_filename=None):
     elif hasattr(file_obj, 'read'):
         with open(file_path, 'wb+') as destination:
             destination.write(file_obj.read())
-    # Save file from a string path
-    elif isinstance(file_obj, str) and os.path.exists(file_obj):
-        file_path = file_obj  # Just use the existing path
     else:
         raise ValueError("Unsupported file object type")
     
-    # Register the file
-    file_id = uuid.uuid4().hex
-    expires_at = timezone.now() + timedelta(hours=TEMP_FILE_EXPIRY_HOURS)
+    # Register the file (expired and surplus files are removed by cleanup_old_files,
+    # which runs on a schedule rather than here)
+    stored = register_file(filename, expires_at, local_path=file_path, size=os.path.getsize(file_path))
+    logger.info(f"Local file registered with ID: {stored.file_id}")
     
-    file_registry[file_id] = {
-        'path': file_path,
-        'filename': filename,
-        'created_at': timezone.now(),
-        'access_count': 0,
-        'expires_at': expires_at
-    }
-    
-    # Store in database if available
-    if db_available:
-        try:
-            StoredFile.objects.create(
-                file_id=file_id,
-                filename=filename,
-                local_path=file_path,
-                expires_at=expires_at,
-                is_blob=False
-            )
-            logger.info(f"Local file saved to database with ID: {file_id}")
-        except Exception as e:
-            logger.error(f"Error saving local file to database: {str(e)}")
+    # Return only file_id for local files
+    return {"file_id": stored.file_id, "filename": filename}
+
+def cleanup_old_files(batch_size=CLEANUP_BATCH_SIZE, dry_run=False):
+    """
+    Remove expired and surplus temp files; run on a schedule by the
+    cleanup_temp_files task and management command.
     
-    # Clean up if registry is getting too large
-    cleanup_old_files()
+    - Registered files past their expiry, found through the expiry index,
+      are deleted batch_size at a time (blobs through the blob batch API)
+    - The least accessed local files beyond FILE_CLEANUP_THRESHOLD are deleted,
+      except files created within ORPHAN_GRACE, which may still be in use
+    - Unregistered files older than ORPHAN_GRACE are removed from the temp
+      directory in one pass
+    - Blobs past the expiry in their metadata are deleted, in case their
+      registry entry is already gone
     
-    # Save the updated registry
-    save_registry()
+    Args:
+        batch_size: Registry entries (and blobs) deleted per batch
+        dry_run: Only count what would be deleted; bytes of registered local
+            files come from their recorded size
     
-    # Return only file_id for local files
-    return {"file_id": file_id, "filename": filename}
-
-def cleanup_old_files():
-    """Clean up expired or least accessed files if registry is too large."""
+    Returns:
+        dict: Counts of expired, evicted and orphaned files, blobs deleted
+        and bytes reclaimed
+    """
     now = timezone.now()
+    report = {'expired': 0, 'evicted': 0, 'orphans': 0, 'blobs': 0, 'bytes_reclaimed': 0}
     
-    # Handle local file cleanups
-    # Remove expired files
-    expired_ids = [fid for fid, info in file_registry.items() if info['expires_at'] < now]
-    for file_id in expired_ids:
-        delete_file(file_id)
+    def add(result):
+        report['blobs'] += result[0]
+        report['bytes_reclaimed'] += result[1]
     
-    # If still too many files, remove least accessed
-    if len(file_registry) > FILE_CLEANUP_THRESHOLD:
-        # Sort by access count and creation time
-        sorted_files = sorted(file_registry.items(), 
-                            key=lambda x: (x[1]['access_count'], x[1]['created_at']))
-        
-        # Remove oldest, least accessed files until under threshold
-        for file_id, _ in sorted_files[:len(file_registry) - FILE_CLEANUP_THRESHOLD + 10]:  # +10 for buffer
-            delete_file(file_id)
+    expired = StoredFile.objects.filter(expires_at__lt=now)
+    if dry_run:
+        # Their blobs are counted by cleanup_expired_blobs below
+        report['expired'] = expired.count()
+        report['bytes_reclaimed'] += expired.filter(is_blob=False).aggregate(total=Sum('size'))['total'] or 0
+    else:
+        while True:
+            batch = list(expired.order_by('expires_at')[:batch_size])
+            if not batch:
+                break
+            add(_delete_stored_files(batch))
+            report['expired'] += len(batch)
+    
+    # If still too many local files, remove least accessed
+    local_files = StoredFile.objects.filter(is_blob=False, expires_at__gte=now)
+    excess = local_files.count() - FILE_CLEANUP_THRESHOLD
+    if excess > 0:
+        # Remove oldest, least accessed files until under threshold (+10 for buffer),
+        # leaving files that may still be being written or downloaded
+        surplus = list(
+            local_files.filter(created_at__lt=now - ORPHAN_GRACE)
+            .order_by('access_count', 'created_at')[:excess + 10]
+        )
+        if dry_run:
+            report['bytes_reclaimed'] += sum(stored.size or 0 for stored in surplus)
+        else:
+            add(_delete_stored_files(surplus))
+        report['evicted'] = len(surplus)
+    
+    report['orphans'], orphan_bytes = _remove_orphaned_files(now, dry_run=dry_run)
+    report['bytes_reclaimed'] += orphan_bytes
     
-    # Handle Azure blob cleanups if enabled
     if USE_AZURE_STORAGE:
-        # Clean up expired blobs in our registry
-        expired_blob_ids = [fid for fid, info in azure_blob_registry.items() if info['expires_at'] < now]
-        for file_id in expired_blob_ids:
-            if file_id in azure_blob_registry:
-                try:
-                    # Try to delete from Azure
-                    blob_name = azure_blob_registry[file_id]['blob_name']
-                    delete_blob(blob_name)
-                except Exception as e:
-                    logger.error(f"Error deleting expired Azure blob: {str(e)}")
-                # Remove from registry regardless
-                del azure_blob_registry[file_id]
-        
-        # Run Azure blob cleanup function to delete any orphaned blobs
-        try:
-            cleanup_expired_blobs()
-        except Exception as e:
-            logger.error(f"Error cleaning up expired Azure blobs: {str(e)}")
+        add(cleanup_expired_blobs(dry_run=dry_run))
     
-    # Save the updated registry
-    if expired_ids or len(file_registry) > FILE_CLEANUP_THRESHOLD or (USE_AZURE_STORAGE and expired_blob_ids):
-        save_registry()
+    logger.info(f"Temp file cleanup{' (dry run)' if dry_run else ''}: {report}")
+    return report
 
-def delete_file(file_id):
-    """Delete a file from the registry and filesystem."""
-    # Check if it's an Azure blob
-    if USE_AZURE_STORAGE and file_id in azure_blob_registry:
+def _remove_orphaned_files(now, dry_run=False):
+    """
+    Remove files in the temp directory that no registry entry points to.
+    
+    Args:
+        now: Current time; files modified within ORPHAN_GRACE of it are kept
+        dry_run: Only count the files, without removing them
+    
+    Returns:
+        tuple: (files removed, bytes reclaimed)
+    """
+    if not os.path.isdir(AZURE_TEMP_PATH):
+        return 0, 0
+    registered = {
+        os.path.normpath(normalize_azure_path(path))
+        for path in StoredFile.objects.filter(local_path__isnull=False).values_list('local_path', flat=True)
+    }
+    cutoff = (now - ORPHAN_GRACE).timestamp()
+    removed, reclaimed = 0, 0
+    with os.scandir(AZURE_TEMP_PATH) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False) or os.path.normpath(entry.path) in registered:
+                continue
+            try:
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime >= cutoff:
+                    continue
+                if not dry_run:
+                    os.remove(entry.path)
+                removed += 1
+                reclaimed += stat.st_size
+            except OSError as e:
+                logger.error(f"Error removing orphaned file {entry.path}: {str(e)}")
+    if removed and not dry_run:
+        logger.info(f"Removed {removed} orphaned files from {AZURE_TEMP_PATH}")
+    return removed, reclaimed
+
+def _delete_stored_files(stored_files):
+    """
+    Delete registered files' blobs and local files, and their registry entries.
+    
+    Returns:
+        tuple: (blobs deleted, bytes reclaimed)
+    """
+    blobs_deleted, reclaimed = 0, 0
+    blobs = {stored.blob_name: stored for stored in stored_files if stored.is_blob and stored.blob_name}
+    if blobs and USE_AZURE_STORAGE:
         try:
-            # Delete from Azure
-            blob_name = azure_blob_registry[file_id]['blob_name']
-            delete_blob(blob_name)
-            # Remove from registry
-            del azure_blob_registry[file_id]
-            save_registry()
-            return True
+            for blob_name in delete_blobs(blobs):
+                blobs_deleted += 1
+                reclaimed += blobs[blob_name].size or 0
         except Exception as e:
-            logger.error(f"Error deleting Azure blob: {str(e)}")
-            # Continue to check local files in case of fallback
+            logger.error(f"Error deleting Azure blobs: {str(e)}")
     
-    # Check local file
-    if file_id in file_registry:
-        file_path = file_registry[file_id]['path']
-        try:
-            if os.path.exists(file_path):
+    for stored in stored_files:
+        file_path = normalize_azure_path(stored.local_path)
+        if file_path:
+            try:
+                size = os.path.getsize(file_path)
                 os.remove(file_path)
+                reclaimed += size
                 logger.info(f"Deleted file {file_path}")
-            else:
+            except FileNotFoundError:
                 logger.warning(f"File to delete does not exist: {file_path}")
-        except (OSError, IOError) as e:
-            logger.error(f"Error deleting file {file_path}: {str(e)}")
-        
-        del file_registry[file_id]
-        save_registry()
-        return True
+            except (OSError, IOError) as e:
+                logger.error(f"Error deleting file {file_path}: {str(e)}")
+        sheet_cache.evict(stored.file_id)
     
-    return False
+    # Another worker may have removed some already
+    StoredFile.objects.filter(pk__in=[stored.pk for stored in stored_files]).delete()
+    return blobs_deleted, reclaimed
+
+def _delete_stored_file(stored):
+    """Delete a registered file's blob or local file, and its registry entry."""
+    _delete_stored_files([stored])
+
+def delete_file(file_id):
+    """Delete a file from the registry and from storage."""
+    stored = get_stored_file(file_id)
+    if stored is None:
+        return False
+    _delete_stored_file(stored)
+    return True
 
 def get_file_response(file_id, as_attachment=True):
     """Generate a FileResponse for a registered file."""
     logger.debug(f"Fetching file with ID: {file_id}")
     
-    # Check if it's an Azure blob
-    if USE_AZURE_STORAGE and file_id in azure_blob_registry:
-        # For Azure blobs, we'll redirect to the blob URL
-        try:
-            blob_info = azure_blob_registry[file_id]
-            # Check if URL is still valid or needs refresh
-            if 'expires_at' in blob_info and blob_info['expires_at'] < timezone.now():
-                # URL is expired, refresh it
-                try:
-                    blob_url = get_blob_sas_url(blob_info['blob_name'])
-                    blob_info['blob_url'] = blob_url
-                    blob_info['expires_at'] = timezone.now() + timedelta(hours=settings.AZURE_BLOB_EXPIRY_HOURS)
-                    save_registry()
-                except Exception as e:
-                    logger.error(f"Error refreshing Azure blob URL: {str(e)}")
-                    # Try to fall back to local file if it exists
-                    if file_id in file_registry:
-                        return get_file_response_local(file_id, as_attachment)
-                    return None
-            
-            # Return redirect response to the blob URL
-            from django.http import HttpResponseRedirect
-            return HttpResponseRedirect(blob_info['blob_url'])
-        
-        except Exception as e:
-            logger.error(f"Error creating response for Azure blob: {str(e)}")
-            # Try to fall back to local file if it exists
-            if file_id in file_registry:
-                return get_file_response_local(file_id, as_attachment)
-            return None
+    stored = get_stored_file(file_id)
+    if stored is None:
+        logger.warning(f"File ID {file_id} not found in registry")
+        return None
     
-    # If not Azure or fallback, use local file response
-    return get_file_response_local(file_id, as_attachment)
+    # For Azure blobs, we'll redirect to the blob URL
+    if stored.is_blob:
+        record_access(stored)
+        return HttpResponseRedirect(get_blob_url(stored))
+    
+    return get_file_response_local(file_id, as_attachment, stored=stored)
 
-def get_file_response_local(file_id, as_attachment=True):
-    """Generate a FileResponse for a local file (original implementation)."""
+def get_file_response_local(file_id, as_attachment=True, stored=None):
+    """Generate a FileResponse for a local file."""
     logger.debug(f"Fetching local file with ID: {file_id}")
     
-    if file_id not in file_registry:
-        # Try to reload registry
-        logger.warning(f"File ID {file_id} not found in registry, reloading")
-        load_registry()
-        
-        if file_id not in file_registry:
-            logger.warning(f"File ID {file_id} still not found after reload")
-            return None
-    
-    file_info = file_registry[file_id]
-    
-    # Normalize path for Azure
-    file_path = normalize_azure_path(file_info['path'])
-    file_info['path'] = file_path  # Update registry entry with normalized path
-    
-    logger.debug(f"File path from registry (normalized): {file_path}")
+    stored = stored or get_stored_file(file_id)
+    if stored is None:
+        logger.warning(f"File ID {file_id} not found in registry")
+        return None
     
-    if not os.path.exists(file_path):
-        logger.warning(f"File doesn't exist at normalized path: {file_path}")
-        
-        # Check if the filename exists in the temp dir (registry might have wrong path)
-        filename = file_info['filename']
-        potential_path = get_temp_path(filename)
-        if os.path.exists(potential_path):
-            logger.info(f"Found file at alternative path: {potential_path}")
-            # Update registry with correct path
-            file_info['path'] = potential_path
-            file_path = potential_path
-            save_registry()
-        else:
-            logger.error(f"File not found at alternative path either: {potential_path}")
-            delete_file(file_id)  # Clean up registry entry
-            return None
+    file_path = resolve_local_path(stored)
+    if file_path is None:
+        delete_file(file_id)  # Clean up registry entry
+        return None
     
     # Update access stats
-    file_info['access_count'] += 1
-    file_info['expires_at'] = timezone.now() + timedelta(hours=TEMP_FILE_EXPIRY_HOURS)
-    save_registry()
+    record_access(stored)
     
     try:
-        # Open the file with explicit encoding to handle potential issues
         file_obj = open(file_path, 'rb')
         response = FileResponse(
             file_obj,
@@ -601,7 +477,7 @@ def get_file_response_local(file_id, as_attachment=True):
         )
         
         if as_attachment:
-            response['Content-Disposition'] = f'attachment; filename="{file_info["filename"]}"'
+            response['Content-Disposition'] = f'attachment; filename="{stored.filename}"'
         
         logger.info(f"Successfully created response for file: {file_id}")
         return response
@@ -611,25 +487,10 @@ def get_file_response_local(file_id, as_attachment=True):
 
 def get_file_url(file_id, request=None):
     """Generate a URL for downloading a file."""
-    # Check if it's an Azure blob
-    if USE_AZURE_STORAGE and file_id in azure_blob_registry:
-        # For Azure blobs, we can return the direct blob URL
-        blob_info = azure_blob_registry[file_id]
-        
-        # Check if URL is still valid or needs refresh
-        if 'expires_at' in blob_info and blob_info['expires_at'] < timezone.now():
-            # URL is expired, refresh it
-            try:
-                blob_url = get_blob_sas_url(blob_info['blob_name'])
-                blob_info['blob_url'] = blob_url
-                blob_info['expires_at'] = timezone.now() + timedelta(hours=settings.AZURE_BLOB_EXPIRY_HOURS)
-                save_registry()
-                return blob_url
-            except Exception as e:
-                logger.error(f"Error refreshing Azure blob URL: {str(e)}")
-                # Fall back to API URL
-        
-        return blob_info['blob_url']
+    # For Azure blobs, we can return the direct blob URL
+    stored = get_stored_file(file_id)
+    if stored is not None and stored.is_blob:
+        return get_blob_url(stored)
     
     # Fix for local files - use the download endpoint instead of direct for better compatibility
     if request:
@@ -641,144 +502,395 @@ def get_file_url(file_id, request=None):
 
 def get_file_metadata(file_id):
     """Get metadata for a file."""
-    # Check if it's an Azure blob
-    if USE_AZURE_STORAGE and file_id in azure_blob_registry:
-        info = azure_blob_registry[file_id]
-        return {
-            'filename': info['filename'],
-            'created_at': info['created_at'].isoformat(),
-            'expires_at': info['expires_at'].isoformat(),
-            'storage_type': 'azure_blob'
-        }
-    
-    # Fall back to original implementation for local files
-    if file_id not in file_registry:
+    stored = get_stored_file(file_id)
+    if stored is None:
         return None
     
-    info = file_registry[file_id]
-    return {
-        'filename': info['filename'],
-        'created_at': info['created_at'].isoformat(),
-        'expires_at': info['expires_at'].isoformat(),
-        'access_count': info['access_count'],
-        'storage_type': 'local'
+    metadata = {
+        'filename': stored.filename,
+        'created_at': stored.created_at.isoformat(),
+        'expires_at': stored.expires_at.isoformat(),
+        'storage_type': 'azure_blob' if stored.is_blob else 'local'
     }
+    if not stored.is_blob:
+        metadata['access_count'] = stored.access_count
+    return metadata
 
-def get_excel_data(file_id, sheet_name=None):
-    """Get data from an Excel file as a dict."""
-    # For Azure blobs
-    if USE_AZURE_STORAGE and file_id in azure_blob_registry:
+def new_output_buffer():
+    """Writable buffer for an output file, kept in memory up to OUTPUT_SPILL_BYTES."""
+    return tempfile.SpooledTemporaryFile(max_size=OUTPUT_SPILL_BYTES)
+
+def write_excel_buffer(sheets, buffer=None):
+    """
+    Write DataFrames to an xlsx workbook in memory.
+    
+    Args:
+        sheets: Dict of sheet name to DataFrame, in workbook order
+        buffer: Optional writable buffer, defaults to new_output_buffer()
+    
+    Returns:
+        The buffer, rewound, ready for save_temp_file
+    """
+    buffer = buffer if buffer is not None else new_output_buffer()
+    # in_memory keeps xlsxwriter from staging the workbook parts in temp files
+    with pd.ExcelWriter(buffer, engine="xlsxwriter", engine_kwargs={'options': {'in_memory': True}}) as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    buffer.seek(0)
+    return buffer
+
+def frames_to_records(sheets):
+    """Rows of in-memory sheets ({sheet: DataFrame}) in the shape get_excel_data returns."""
+    return {name: df.to_dict(orient="records") for name, df in sheets.items()}
+
+class SheetCache:
+    """
+    LRU cache of parsed result sheets, keyed by (file_id, sheet name).
+    
+    Registered files never change under their file_id, so entries only leave
+    the cache when it grows past max_bytes (measured as the DataFrames'
+    memory usage) or when the file is deleted.
+    """
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._sheets = OrderedDict()  # (file_id, sheet) -> (DataFrame, bytes)
+        self._sheet_names = {}  # file_id -> sheet names in workbook order
+        self._lock = threading.Lock()
+    
+    def get(self, file_id, sheet_name):
+        with self._lock:
+            entry = self._sheets.get((file_id, sheet_name))
+            if entry is None:
+                return None
+            self._sheets.move_to_end((file_id, sheet_name))
+            return entry[0]
+    
+    def put(self, file_id, sheet_name, df):
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            key = (file_id, sheet_name)
+            if key in self._sheets:
+                self.size -= self._sheets.pop(key)[1]
+            self._sheets[key] = (df, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                (evicted_id, _), (_, evicted_bytes) = self._sheets.popitem(last=False)
+                self.size -= evicted_bytes
+                if not any(cached_id == evicted_id for cached_id, _ in self._sheets):
+                    self._sheet_names.pop(evicted_id, None)
+    
+    def sheet_names(self, file_id):
+        with self._lock:
+            return self._sheet_names.get(file_id)
+    
+    def set_sheet_names(self, file_id, names):
+        with self._lock:
+            self._sheet_names[file_id] = list(names)
+    
+    def evict(self, file_id):
+        with self._lock:
+            for key in [key for key in self._sheets if key[0] == file_id]:
+                self.size -= self._sheets.pop(key)[1]
+            self._sheet_names.pop(file_id, None)
+    
+    def clear(self):
+        with self._lock:
+            self._sheets.clear()
+            self._sheet_names.clear()
+            self.size = 0
+
+sheet_cache = SheetCache(EXCEL_SHEET_CACHE_BYTES)
+
+def _read_blob(stored):
+    """Stream a registered blob into memory through the SDK client."""
+    buffer = io.BytesIO()
+    download_blob(stored.blob_name, stream=buffer)
+    buffer.seek(0)
+    return buffer
+
+def _excel_source(stored):
+    """In-memory copy of a blob, or the path of a local file; None if neither is available."""
+    if stored.is_blob and stored.blob_name and AZURE_BLOB_AVAILABLE:
         try:
-            info = azure_blob_registry[file_id]
-            blob_url = info['blob_url']
-            
-            # Use a unique temp file for each request
-            import tempfile
-            import random
-            import time
-            
-            # Create a temporary file with more unique name to avoid conflicts
-            temp_name = f"excel_{time.time()}_{random.randint(1000,9999)}.xlsx"
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=f"_{temp_name}")
-            
-            try:
-                # Download the file
-                import requests
-                response = requests.get(blob_url)
-                response.raise_for_status()
-                
-                # Write to temp file
-                with open(temp_file.name, 'wb') as f:
-                    f.write(response.content)
-                
-                # Close the file before reading
-                f.close()
-                
-                # Read with pandas
-                result = pd.read_excel(temp_file.name, sheet_name=sheet_name)
-                if sheet_name is None:
-                    # Handle multiple sheets
-                    result_dict = {}
-                    with pd.ExcelFile(temp_file.name) as xls:
-                        for s in xls.sheet_names:
-                            result_dict[s] = pd.read_excel(xls, sheet_name=s).to_dict(orient="records")
-                    return result_dict
-                else:
-                    return result.to_dict(orient="records")
-                    
-            finally:
-                # Make sure to properly close and delete the temp file
-                try:
-                    if os.path.exists(temp_file.name):
-                        # Don't use temp_file.handle, just close and remove
-                        temp_file.close()
-                        os.unlink(temp_file.name)
-                except Exception as cleanup_err:
-                    logger.warning(f"Failed to clean up temp file: {str(cleanup_err)}")
-                    
+            return _read_blob(stored)
         except Exception as e:
             logger.error(f"Error reading Excel file from Azure blob: {str(e)}")
-            # Try to fall back to local file if it exists
-            if file_id in file_registry:
-                pass  # Continue to local file logic
-            else:
+            # Try to fall back to a local copy if there is one
+            if not stored.local_path:
                 return None
     
-    # Original implementation for local files
-    if file_id not in file_registry:
-        return None
+    file_path = resolve_local_path(stored)
+    if file_path is None:
+        _delete_stored_file(stored)
+    return file_path
+
+def load_excel_sheets(file_id, sheet_names=None):
+    """
+    Parsed sheets of a registered Excel file, served from sheet_cache when possible.
     
-    file_path = file_registry[file_id]['path']
+    Only the requested sheets are parsed; the workbook is fetched at most once
+    per call. The returned DataFrames are shared with the cache and must not
+    be modified.
     
-    if not os.path.exists(file_path):
-        delete_file(file_id)
+    Args:
+        file_id: Registered file ID
+        sheet_names: Optional list of sheet names, defaults to every sheet
+    
+    Returns:
+        Dict of sheet name to DataFrame in the requested order, or None if
+        the file or a sheet cannot be read
+    """
+    wanted = sheet_names or sheet_cache.sheet_names(file_id)
+    sheets = {}
+    if wanted is not None:
+        sheets = {name: sheet_cache.get(file_id, name) for name in wanted}
+        if all(df is not None for df in sheets.values()):
+            return sheets
+    
+    stored = get_stored_file(file_id)
+    if stored is None:
+        return None
+    source = _excel_source(stored)
+    if source is None:
         return None
     
     try:
-        with pd.ExcelFile(file_path) as xls:
-            # If sheet_name is None, read all sheets
-            if sheet_name is None:
-                result = {}
-                for s in xls.sheet_names:
-                    result[s] = pd.read_excel(xls, sheet_name=s).to_dict(orient="records")
-                return result
-            else:
-                # Read specific sheet
-                return pd.read_excel(xls, sheet_name=sheet_name).to_dict(orient="records")
+        with pd.ExcelFile(source) as xls:
+            sheet_cache.set_sheet_names(file_id, xls.sheet_names)
+            result = {}
+            for name in sheet_names or xls.sheet_names:
+                df = sheets.get(name)
+                if df is None:
+                    df = pd.read_excel(xls, sheet_name=name)
+                    sheet_cache.put(file_id, name, df)
+                result[name] = df
+            return result
     except Exception as e:
         logger.error(f"Error reading Excel file: {str(e)}")
         return None
 
+def get_excel_data(file_id, sheet_name=None):
+    """Get data from an Excel file as a dict (rows of one sheet if sheet_name is given)."""
+    sheets = load_excel_sheets(file_id, None if sheet_name is None else [sheet_name])
+    if sheets is None:
+        return None
+    if sheet_name is None:
+        return frames_to_records(sheets)
+    return sheets[sheet_name].to_dict(orient="records")
+
+def cache_excel_sheets(file_id, sheets):
+    """Seed sheet_cache with the DataFrames a registered file was written from."""
+    sheet_cache.set_sheet_names(file_id, sheets.keys())
+    for name, df in sheets.items():
+        sheet_cache.put(file_id, name, df)
+
+def read_excel_buffer(buffer):
+    """
+    Parse every sheet of a workbook written to memory, as load_excel_sheets would.
+    
+    The buffer is rewound, so it can still be passed to save_temp_file; the
+    sheets can then seed sheet_cache with cache_excel_sheets instead of the
+    saved copy being fetched and parsed again.
+    """
+    buffer.seek(0)
+    sheets = pd.read_excel(buffer, sheet_name=None)
+    buffer.seek(0)
+    return sheets
+
+def _json_rows(df):
+    """Rows of a DataFrame with NaN/inf replaced by None, so they serialize as JSON."""
+    df = df.astype(object)
+    return df.where(df.notna() & ~df.isin([float('inf'), float('-inf')]), None).to_dict(orient="records")
+
+def parse_preview_filter(value):
+    """
+    Parse a preview filter of the form "<column>:<op>:<value>".
+    
+    Returns:
+        (column, op, value)
+    
+    Raises:
+        ValueError: If the filter is malformed or the op is unknown
+    """
+    parts = value.split(':', 2)
+    if len(parts) != 3 or not parts[0]:
+        raise ValueError(f"Filters must look like <column>:<op>:<value>, got '{value}'")
+    if parts[1] not in PREVIEW_FILTER_OPS:
+        raise ValueError(f"Unknown filter op '{parts[1]}', expected one of {', '.join(PREVIEW_FILTER_OPS)}")
+    return tuple(parts)
+
+def filter_sheet(df, filters):
+    """
+    Rows of a sheet matching every filter.
+    
+    contains is a case-insensitive substring match. The other ops compare
+    numerically on numeric columns and as text otherwise.
+    
+    Args:
+        df: Sheet DataFrame
+        filters: List of (column, op, value) tuples
+    
+    Raises:
+        ValueError: On an unknown column, or a non-numeric value for a numeric column
+    """
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        if column not in df.columns:
+            raise ValueError(f"Unknown column: {column}")
+        series = df[column]
+        if op == 'contains':
+            mask &= series.astype(str).str.contains(value, case=False, regex=False) & series.notna()
+            continue
+        if pd.api.types.is_numeric_dtype(series):
+            try:
+                value = float(value)
+            except ValueError:
+                raise ValueError(f"Column {column} is numeric, got '{value}'")
+        else:
+            series = series.astype(str)
+        mask &= PREVIEW_FILTER_OPS[op](series, value) & df[column].notna()
+    return df[mask]
+
+def sheet_page(df, offset=0, limit=PREVIEW_PAGE_SIZE, sort=None, descending=False, filters=None):
+    """
+    One page of a sheet, after filtering and sorting.
+    
+    Args:
+        df: Sheet DataFrame
+        offset: First row of the page
+        limit: Rows per page
+        sort: Optional column to sort by (empty values last)
+        descending: Sort descending
+        filters: Optional list of (column, op, value) tuples, see filter_sheet
+    
+    Returns:
+        Dict with the total rows after filtering, offset, limit and the rows of the page
+    """
+    if filters:
+        df = filter_sheet(df, filters)
+    if sort:
+        if sort not in df.columns:
+            raise ValueError(f"Unknown column: {sort}")
+        try:
+            df = df.sort_values(sort, ascending=not descending, kind='stable', na_position='last')
+        except TypeError:
+            # Mixed text and numbers
+            df = df.sort_values(
+                sort, ascending=not descending, kind='stable', na_position='last', key=lambda s: s.astype(str).where(s.notna())
+            )
+    return {
+        'total_rows': len(df),
+        'offset': offset,
+        'limit': limit,
+        'rows': _json_rows(df.iloc[offset:offset + limit]),
+    }
+
+def get_sheet_preview(file_id, sheet_name=None, offset=0, limit=PREVIEW_PAGE_SIZE, sort=None, descending=False, filters=None):
+    """
+    A page of one sheet of a registered Excel file, served from sheet_cache.
+    
+    Args:
+        file_id: Registered file ID
+        sheet_name: Optional sheet name, defaults to the first sheet
+        offset, limit, sort, descending, filters: See sheet_page
+    
+    Returns:
+        Dict with the sheet names, columns and page, or None if the file cannot be read
+    
+    Raises:
+        ValueError: On an unknown sheet, column or filter
+    """
+    def unknown_sheet():
+        names = sheet_cache.sheet_names(file_id)
+        return sheet_name is not None and names is not None and sheet_name not in names
+    
+    if unknown_sheet():
+        raise ValueError(f"Unknown sheet: {sheet_name}")
+    # Only the requested sheet is parsed on a cache miss
+    sheets = load_excel_sheets(file_id, None if sheet_name is None else [sheet_name])
+    if sheets is None:
+        # Opening the workbook records its sheet names
+        if unknown_sheet():
+            raise ValueError(f"Unknown sheet: {sheet_name}")
+        return None
+    name = sheet_name or next(iter(sheets), None)
+    if name not in sheets:
+        raise ValueError(f"Unknown sheet: {sheet_name}")
+    df = sheets[name]
+    return {
+        'file_id': file_id,
+        'sheet': name,
+        'sheets': sheet_cache.sheet_names(file_id) or list(sheets),
+        'columns': [str(column) for column in df.columns],
+        **sheet_page(df, offset, limit, sort, descending, filters),
+    }
+
+def preview_row_limit(request):
+    """
+    Rows per sheet a processing response carries, from its preview_rows parameter.
+    
+    Defaults to PREVIEW_PAGE_SIZE, the rest being served by the preview API
+    (files/preview/<file_id>/). "all" returns every row, for clients that do
+    not page through the preview API yet.
+    """
+    params = getattr(request, 'data', None) or request.POST
+    value = params.get('preview_rows') or request.GET.get('preview_rows')
+    if value == 'all':
+        return None
+    try:
+        return min(max(int(value), 1), PREVIEW_MAX_LIMIT)
+    except (TypeError, ValueError):
+        return PREVIEW_PAGE_SIZE
+
+def get_excel_preview(file_id, limit=PREVIEW_PAGE_SIZE, exclude=()):
+    """
+    First page and metadata of every sheet of a registered Excel file, for processing responses.
+    
+    Further pages come from the preview API (files/preview/<file_id>/).
+    
+    Args:
+        file_id: Registered file ID
+        limit: Rows per sheet, None for all of them (see preview_row_limit)
+        exclude: Sheet names to leave out
+    
+    Returns:
+        Dict with 'data' ({sheet: rows}, None if the file cannot be read)
+        and 'sheets' (name, total_rows and columns of each sheet)
+    """
+    sheets = load_excel_sheets(file_id)
+    if sheets is None:
+        return {'data': None, 'sheets': []}
+    sheets = {name: df for name, df in sheets.items() if name not in exclude}
+    return {
+        'data': {name: _json_rows(df if limit is None else df.head(limit)) for name, df in sheets.items()},
+        'sheets': [
+            {'name': name, 'total_rows': len(df), 'columns': [str(column) for column in df.columns]}
+            for name, df in sheets.items()
+        ],
+    }
+
 def get_file_content_base64(file_id):
     """Get file content as base64 encoded string."""
+    stored = get_stored_file(file_id)
+    if stored is None:
+        return None
+    
     # For Azure blobs, we need to download the file first
-    if USE_AZURE_STORAGE and file_id in azure_blob_registry:
+    if stored.is_blob:
         try:
-            info = azure_blob_registry[file_id]
-            blob_url = info['blob_url']
-            
-            # Download the file
-            import requests
-            response = requests.get(blob_url)
-            response.raise_for_status()
-            
-            # Return base64 encoded content
-            return base64.b64encode(response.content).decode('utf-8')
+            return base64.b64encode(_read_blob(stored).getvalue()).decode('utf-8')
         except Exception as e:
             logger.error(f"Error getting base64 content from Azure blob: {str(e)}")
-            # Try to fall back to local file if it exists
-            if file_id in file_registry:
-                pass  # Continue to local file logic
-            else:
+            # Try to fall back to a local copy if there is one
+            if not stored.local_path:
                 return None
     
-    # Original implementation for local files
-    if file_id not in file_registry:
-        return None
-    
-    file_path = file_registry[file_id]['path']
-    
-    if not os.path.exists(file_path):
+    file_path = resolve_local_path(stored)
+    if file_path is None:
         delete_file(file_id)
         return None
     
@@ -791,34 +903,157 @@ def get_file_content_base64(file_id):
 
 def get_blob_url_by_filename(filename):
     """Find a blob URL by filename as fallback."""
-    for file_id, info in azure_blob_registry.items():
-        if info.get('filename') == filename:
-            logger.info(f"Found blob by filename: {filename}, ID: {file_id}")
-            return info.get('blob_url')
-    return None
+    stored = StoredFile.objects.filter(filename=filename, is_blob=True).order_by('-created_at').first()
+    if stored is None:
+        return None
+    logger.info(f"Found blob by filename: {filename}, ID: {stored.file_id}")
+    return get_blob_url(stored)
 
 def download_file(request, file_id):
-    """Generate a FileResponse for a registered file."""
+    """Redirect to the blob URL of a registered Azure blob."""
     logger.info(f"File download requested: {file_id}")
     
-    # Check if file exists in Azure registry
-    if USE_AZURE_STORAGE and file_id in azure_blob_registry:
-        # Get the blob URL and redirect directly to it
-        blob_info = azure_blob_registry[file_id]
-        blob_url = blob_info['blob_url']
-        
-        # Check if URL is expired and refresh if needed
-        if blob_info['expires_at'] < timezone.now():
-            try:
-                blob_url = get_blob_sas_url(blob_info['blob_name'])
-                blob_info['blob_url'] = blob_url
-                blob_info['expires_at'] = timezone.now() + timedelta(hours=settings.AZURE_BLOB_EXPIRY_HOURS)
-                save_registry()
-            except Exception as e:
-                logger.error(f"Error refreshing blob URL: {str(e)}")
-        
-        # Redirect to the blob URL
-        from django.http import HttpResponseRedirect
+    stored = get_stored_file(file_id)
+    if stored is not None and stored.is_blob:
+        record_access(stored)
         logger.info(f"Redirecting to Azure blob URL for file ID: {file_id}")
-        return HttpResponseRedirect(blob_url)
+        return HttpResponseRedirect(get_blob_url(stored))
+    
+
+def save_archive_file(data, archive_name):
+    """
+    Store bytes as a permanent archive file (Azure Blob Storage when configured, local disk otherwise).
+    
+    Archive files are not registered in the temp file registries and never expire.
+    
+    Args:
+        data: Bytes to store
+        archive_name: Relative path/name of the archive, e.g. 'ads_reports/<tenant>/<report>.parquet'
+    
+    Returns:
+        dict: {'storage': 'azure_blob' or 'local', 'name': archive_name, 'size': bytes written}
+    """
+    from io import BytesIO
+    
+    if USE_AZURE_STORAGE:
+        try:
+            blob_name, _ = upload_blob(BytesIO(data), archive_name, expires=False)
+            logger.info(f"Archive saved to Azure: {blob_name} ({len(data)} bytes)")
+            return {'storage': 'azure_blob', 'name': blob_name, 'size': len(data)}
+        except Exception as e:
+            logger.error(f"Azure archive upload failed, falling back to local disk: {str(e)}")
+    
+    file_path = os.path.join(ARCHIVE_ROOT, archive_name)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    # Write to a temporary name first so readers never see a partial file
+    tmp_path = f"{file_path}.part"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, file_path)
+    logger.info(f"Archive saved locally: {file_path} ({len(data)} bytes)")
+    return {'storage': 'local', 'name': archive_name, 'size': len(data)}
+
+def save_archive_path(path, archive_name):
+    """
+    Store a local file as a permanent archive file without reading it into memory.
+    
+    Same as save_archive_file, for content that has been written to disk (e.g. a
+    columnar file produced in row groups).
+    
+    Args:
+        path: Local file to store; it is left in place
+        archive_name: Relative path/name of the archive
+    
+    Returns:
+        dict: {'storage': 'azure_blob' or 'local', 'name': archive_name, 'size': bytes written}
+    """
+    import shutil
+    
+    size = os.path.getsize(path)
+    if USE_AZURE_STORAGE:
+        try:
+            blob_name, _ = upload_blob(path, archive_name, expires=False)
+            logger.info(f"Archive saved to Azure: {blob_name} ({size} bytes)")
+            return {'storage': 'azure_blob', 'name': blob_name, 'size': size}
+        except Exception as e:
+            logger.error(f"Azure archive upload failed, falling back to local disk: {str(e)}")
+    
+    file_path = os.path.join(ARCHIVE_ROOT, archive_name)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    # Copy to a temporary name first so readers never see a partial file
+    tmp_path = f"{file_path}.part"
+    shutil.copyfile(path, tmp_path)
+    os.replace(tmp_path, file_path)
+    logger.info(f"Archive saved locally: {file_path} ({size} bytes)")
+    return {'storage': 'local', 'name': archive_name, 'size': size}
+
+def read_archive_file(archive_name, storage):
+    """
+    Read the content of an archive file written by save_archive_file.
+    
+    Args:
+        archive_name: Name returned by save_archive_file
+        storage: Storage returned by save_archive_file ('azure_blob' or 'local')
+    
+    Returns:
+        bytes: Archive content, or None if it does not exist
+    """
+    if storage == 'azure_blob':
+        if not AZURE_BLOB_AVAILABLE:
+            logger.error(f"Archive {archive_name} is in Azure but Azure Blob Storage is unavailable")
+            return None
+        try:
+            return download_blob(archive_name)
+        except Exception:
+            return None
+    
+    file_path = os.path.join(ARCHIVE_ROOT, archive_name)
+    if not os.path.exists(file_path):
+        logger.warning(f"Archive file does not exist: {file_path}")
+        return None
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+def open_archive_file(archive_name, storage):
+    """
+    Open an archive file written by save_archive_file for random access reads.
+    
+    Local archives are opened from disk and Azure archives are read with ranged
+    requests, so readers that only need part of the file (e.g. a few Parquet row
+    groups) do not download all of it.
+    
+    Args:
+        archive_name: Name returned by save_archive_file
+        storage: Storage returned by save_archive_file ('azure_blob' or 'local')
+    
+    Returns:
+        Seekable binary file object to close after use, or None if it does not exist
+    """
+    if storage == 'azure_blob':
+        if not AZURE_BLOB_AVAILABLE:
+            logger.error(f"Archive {archive_name} is in Azure but Azure Blob Storage is unavailable")
+            return None
+        try:
+            return open_blob(archive_name)
+        except Exception:
+            return None
+    
+    file_path = os.path.join(ARCHIVE_ROOT, archive_name)
+    if not os.path.exists(file_path):
+        logger.warning(f"Archive file does not exist: {file_path}")
+        return None
+    return open(file_path, 'rb')
+
+def delete_archive_file(archive_name, storage):
+    """Delete an archive file written by save_archive_file."""
+    if storage == 'azure_blob':
+        return AZURE_BLOB_AVAILABLE and delete_blob(archive_name)
     
+    file_path = os.path.join(ARCHIVE_ROOT, archive_name)
+    try:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+            return True
+    except (OSError, IOError) as e:
+        logger.error(f"Error deleting archive file {file_path}: {str(e)}")
+    return False
@@ -0,0 +1,209 @@
+"""
+Shared HTTP client for Amazon API integrations
+
+Keeps one keep-alive connection pool per region (and per process) so repeated
+calls to the Ads, SP-API and LWA endpoints reuse TLS connections instead of
+opening a new one for every request. Retries, backoff and timeouts are
+configured in one place and honour the Retry-After header sent with 429/503
+responses.
+"""
+import os
+import time
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Configuration with default values
+# These should be set in settings.py and accessed here
+CONNECT_TIMEOUT = getattr(settings, 'AMAZON_API_CONNECT_TIMEOUT', 10)
+READ_TIMEOUT = getattr(settings, 'AMAZON_API_READ_TIMEOUT', 60)
+MAX_RETRIES = getattr(settings, 'AMAZON_API_MAX_RETRIES', 3)
+BACKOFF_FACTOR = getattr(settings, 'AMAZON_API_BACKOFF_FACTOR', 1)
+POOL_MAXSIZE = getattr(settings, 'AMAZON_API_POOL_MAXSIZE', 20)
+
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# Status codes that are safe to retry. 429 and 503 are throttling responses
+# where Amazon has not processed the request, so they are retried for every
+# method (including POST); the 5xx gateway errors only for idempotent methods.
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+THROTTLE_STATUS_CODES = (429, 503)
+
+# Pool key used when the caller does not know the region (e.g. S3 download URLs)
+DEFAULT_POOL = 'default'
+
+# Sessions keyed by (pid, pool key) so forked workers never share sockets
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# Callables invoked after every response: hook(method, url, status_code, elapsed_seconds, pool)
+_timing_hooks = []
+
+
+class AmazonRetry(Retry):
+    """Retry policy that also retries non-idempotent requests when throttled"""
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code in THROTTLE_STATUS_CODES and self.total:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def build_retry(max_retries=None, backoff_factor=None):
+    """
+    Build the retry policy used by the pooled sessions
+
+    Args:
+        max_retries: Optional override for the number of retries
+        backoff_factor: Optional override for the exponential backoff factor
+
+    Returns:
+        AmazonRetry instance
+    """
+    return AmazonRetry(
+        total=MAX_RETRIES if max_retries is None else max_retries,
+        connect=MAX_RETRIES if max_retries is None else max_retries,
+        backoff_factor=BACKOFF_FACTOR if backoff_factor is None else backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        respect_retry_after_header=True,
+        # Hand the final response back to the caller instead of raising,
+        # existing callers inspect status_code themselves
+        raise_on_status=False,
+    )
+
+
+def register_timing_hook(hook):
+    """
+    Register a callable that is notified of every completed request
+
+    Args:
+        hook: Callable accepting (method, url, status_code, elapsed_seconds, pool)
+    """
+    if hook not in _timing_hooks:
+        _timing_hooks.append(hook)
+
+
+def unregister_timing_hook(hook):
+    """Remove a previously registered timing hook"""
+    if hook in _timing_hooks:
+        _timing_hooks.remove(hook)
+
+
+def _make_response_hook(pool):
+    """Create a requests response hook that reports request timing"""
+    def _response_hook(response, *args, **kwargs):
+        elapsed = response.elapsed.total_seconds() if response.elapsed else 0.0
+        method = response.request.method if response.request else None
+        # Never log query strings, pre-signed URLs carry credentials there
+        url = response.url.split('?', 1)[0] if response.url else None
+
+        logger.debug(f"{method} {url} -> {response.status_code} in {elapsed * 1000:.0f} ms (pool={pool})")
+
+        for hook in list(_timing_hooks):
+            try:
+                hook(method, url, response.status_code, elapsed, pool)
+            except Exception as e:
+                logger.warning(f"Timing hook {hook!r} failed: {str(e)}")
+        return response
+
+    return _response_hook
+
+
+def _create_session(pool):
+    """Create a session with a pooled, retrying adapter"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=POOL_MAXSIZE,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=build_retry(),
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.hooks['response'].append(_make_response_hook(pool))
+    logger.info(f"Created pooled HTTP session for pool '{pool}' in process {os.getpid()}")
+    return session
+
+
+def get_session(region=None):
+    """
+    Get the shared keep-alive session for a region
+
+    Args:
+        region: The Amazon region (NA, EU, FE, IN) or None for the default pool
+
+    Returns:
+        requests.Session instance
+    """
+    pool = region or DEFAULT_POOL
+    key = (os.getpid(), pool)
+
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _create_session(pool)
+                _sessions[key] = session
+    return session
+
+
+def request(method, url, region=None, timeout=None, **kwargs):
+    """
+    Make an HTTP request through the pooled session for a region
+
+    Args:
+        method: HTTP method (GET, POST, PUT, DELETE)
+        url: Full request URL
+        region: Optional Amazon region used to select the connection pool
+        timeout: Optional timeout (seconds or (connect, read) tuple)
+        **kwargs: Passed through to requests.Session.request
+
+    Returns:
+        requests.Response object
+    """
+    started = time.monotonic()
+    try:
+        return get_session(region).request(
+            method,
+            url,
+            timeout=timeout or DEFAULT_TIMEOUT,
+            **kwargs
+        )
+    except requests.exceptions.RequestException as e:
+        elapsed = time.monotonic() - started
+        logger.warning(f"{method} {url.split('?', 1)[0]} failed after {elapsed:.2f}s: {str(e)}")
+        raise
+
+
+def get(url, region=None, **kwargs):
+    """Make a GET request through the pooled session"""
+    return request('GET', url, region=region, **kwargs)
+
+
+def post(url, region=None, **kwargs):
+    """Make a POST request through the pooled session"""
+    return request('POST', url, region=region, **kwargs)
+
+
+def put(url, region=None, **kwargs):
+    """Make a PUT request through the pooled session"""
+    return request('PUT', url, region=region, **kwargs)
+
+
+def delete(url, region=None, **kwargs):
+    """Make a DELETE request through the pooled session"""
+    return request('DELETE', url, region=region, **kwargs)
+
+
+def close_sessions():
+    """Close all sessions owned by the current process"""
+    pid = os.getpid()
+    with _sessions_lock:
+        for key in [k for k in _sessions if k[0] == pid]:
+            _sessions.pop(key).close()
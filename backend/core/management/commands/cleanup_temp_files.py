@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+import logging
+import time
+
+from core.file_service import cleanup_old_files, CLEANUP_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Delete expired and surplus temp files, expired blobs and orphaned files in the temp directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=CLEANUP_BATCH_SIZE,
+            help='Registry entries (and blobs) deleted per batch'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be deleted without deleting anything'
+        )
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        self.stdout.write(self.style.SUCCESS(f'Started temp file cleanup at {timezone.now()}'))
+
+        try:
+            report = cleanup_old_files(batch_size=options['batch_size'], dry_run=options['dry_run'])
+            self.stdout.write(
+                f"{'Dry run, would delete: ' if options['dry_run'] else ''}{report['expired']} expired, {report['evicted']} surplus and {report['orphans']} orphaned files, "
+                f"{report['blobs']} blobs; {report['bytes_reclaimed'] / (1024 * 1024):.1f} MB reclaimed"
+            )
+
+            elapsed_time = time.time() - start_time
+            self.stdout.write(self.style.SUCCESS(
+                f'Successfully cleaned up temp files in {elapsed_time:.2f} seconds'
+            ))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error cleaning up temp files: {str(e)}'))
+            logger.exception("Error in cleanup_temp_files command")
+            raise
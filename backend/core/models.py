@@ -11,6 +11,7 @@ class StoredFile(models.Model):
     expires_at = models.DateTimeField()
     access_count = models.IntegerField(default=0)
     is_blob = models.BooleanField(default=False)
+    size = models.BigIntegerField(null=True, blank=True)  # Bytes, reported as reclaimed by cleanup
 
     class Meta:
         app_label = 'core'
@@ -175,11 +175,17 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # File upload settings
 DATA_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100 MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 104857600   # 100 MB
+OUTPUT_SPILL_BYTES = 104857600  # 100 MB; larger output workbooks spill from memory to a temp file
+EXCEL_SHEET_CACHE_BYTES = 268435456  # 256 MB of parsed result sheets kept in memory per process
 
 # Azure Blob Storage settings
 AZURE_STORAGE_CONNECTION_STRING = os.environ.get('AZURE_STORAGE_CONNECTION_STRING', '')
 AZURE_CONTAINER_NAME = os.environ.get('AZURE_CONTAINER_NAME', 'tempfiles')
 AZURE_BLOB_EXPIRY_HOURS = 4  # Files expire after 4 hours
+AZURE_MAX_SINGLE_PUT_SIZE = 8388608  # 8 MB; larger blobs are uploaded as parallel blocks
+AZURE_BLOCK_SIZE = 8388608  # 8 MB blocks
+AZURE_MAX_CONCURRENCY = 8  # Parallel block uploads / range downloads per blob
+TEMP_ORPHAN_GRACE_MINUTES = 60  # Unregistered files in the temp directory are removed after this
 
 # Increase timeouts for long-running processes
 # 15 minute timeout for requests
@@ -192,6 +198,48 @@ AMAZON_REDIRECT_URI = os.environ.get('AMAZON_REDIRECT_URI', 'http://localhost:80
 AMAZON_ADVERTISING_REDIRECT_URI = os.environ.get('AMAZON_ADVERTISING_REDIRECT_URI', 'http://localhost:8000/api/v1/amazon/advertising/auth/callback')
 FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
 
+# Shared HTTP client settings for Amazon APIs (see core/http_client.py)
+AMAZON_API_CONNECT_TIMEOUT = float(os.environ.get('AMAZON_API_CONNECT_TIMEOUT', 10))  # seconds
+AMAZON_API_READ_TIMEOUT = float(os.environ.get('AMAZON_API_READ_TIMEOUT', 60))  # seconds
+AMAZON_API_MAX_RETRIES = int(os.environ.get('AMAZON_API_MAX_RETRIES', 3))
+AMAZON_API_BACKOFF_FACTOR = float(os.environ.get('AMAZON_API_BACKOFF_FACTOR', 1))
+AMAZON_API_POOL_MAXSIZE = int(os.environ.get('AMAZON_API_POOL_MAXSIZE', 20))  # Connections kept alive per host
+
+# Scheduled report dispatch (see core/dispatch.py)
+AMAZON_SCHEDULER_MAX_WORKERS = int(os.environ.get('AMAZON_SCHEDULER_MAX_WORKERS', 16))  # Profiles dispatched in parallel
+AMAZON_PROFILE_REQUESTS_PER_SECOND = float(os.environ.get('AMAZON_PROFILE_REQUESTS_PER_SECOND', 1))
+AMAZON_PROFILE_REQUEST_BURST = int(os.environ.get('AMAZON_PROFILE_REQUEST_BURST', 2))
+# Equivalent report requests reuse a completed report younger than this
+AMAZON_ADS_REPORT_REUSE_HOURS = int(os.environ.get('AMAZON_ADS_REPORT_REUSE_HOURS', 12))
+# In-flight reports with no result after this long are failed and stop blocking equivalent requests
+AMAZON_ADS_REPORT_STALE_HOURS = int(os.environ.get('AMAZON_ADS_REPORT_STALE_HOURS', 24))
+
+# Report documents are streamed here and resumed after dropped connections (see core/downloads.py)
+AMAZON_REPORT_DOWNLOAD_DIR = os.environ.get('AMAZON_REPORT_DOWNLOAD_DIR', os.path.join(MEDIA_ROOT, 'downloads'))
+AMAZON_REPORT_DOWNLOAD_WORKERS = int(os.environ.get('AMAZON_REPORT_DOWNLOAD_WORKERS', 8))  # Reports downloaded in parallel
+AMAZON_TOKEN_REFRESH_WORKERS = int(os.environ.get('AMAZON_TOKEN_REFRESH_WORKERS', 16))  # Concurrent LWA token refreshes (amazon_seller/services/token_manager.py)
+AMAZON_ADS_CATALOG_TTL_MINUTES = int(os.environ.get('AMAZON_ADS_CATALOG_TTL_MINUTES', 60))  # Campaign / ad group catalog age before it is re-synced
+# Batched campaign / ad group / keyword / target changes (see amazon_seller/services/mutations.py)
+AMAZON_ADS_MUTATION_WORKERS = int(os.environ.get('AMAZON_ADS_MUTATION_WORKERS', 4))  # Concurrent mutation requests
+AMAZON_ADS_MUTATION_REQUESTS_PER_SECOND = float(os.environ.get('AMAZON_ADS_MUTATION_REQUESTS_PER_SECOND', 5))  # Per profile
+AMAZON_ADS_MUTATION_BURST = int(os.environ.get('AMAZON_ADS_MUTATION_BURST', 5))
+
+# Incremental SP-API orders sync (see amazon_auth/orders_sync.py)
+SP_API_ORDERS_SYNC_WORKERS = int(os.environ.get('SP_API_ORDERS_SYNC_WORKERS', 8))  # Concurrent order item requests
+SP_API_ORDERS_INITIAL_DAYS = int(os.environ.get('SP_API_ORDERS_INITIAL_DAYS', 30))  # History pulled by the first run
+
+# Report status polling (see amazon_ads_reports/polling.py)
+AMAZON_ADS_POLL_MIN_SECONDS = int(os.environ.get('AMAZON_ADS_POLL_MIN_SECONDS', 30))
+AMAZON_ADS_POLL_MAX_SECONDS = int(os.environ.get('AMAZON_ADS_POLL_MAX_SECONDS', 900))
+AMAZON_ADS_POLL_DEFAULT_SECONDS = int(os.environ.get('AMAZON_ADS_POLL_DEFAULT_SECONDS', 120))  # First poll when there is no history
+
+# Local Parquet mirror of the ads data tables, queried with DuckDB (see amazon_ads_reports/analytics.py)
+ADS_ANALYTICS_ROOT = os.environ.get('ADS_ANALYTICS_ROOT', os.path.join(MEDIA_ROOT, 'analytics'))
+
+# Raw ads report rows older than this many whole months are archived and deleted by
+# the prune_ads_data command (see amazon_ads_reports/retention.py); 0 keeps everything
+ADS_DATA_RETENTION_MONTHS = int(os.environ.get('ADS_DATA_RETENTION_MONTHS', 25))
+
 # Firebase settings
 FIREBASE_API_KEY = os.environ.get('FIREBASE_API_KEY', '')
 FIREBASE_AUTH_DOMAIN = os.environ.get('FIREBASE_AUTH_DOMAIN', '')
@@ -216,6 +264,14 @@ try:
         'task': 'amazon_seller.tasks.refresh_amazon_tokens',
         'schedule': crontab(minute='*/15'),  # Run every 15 minutes
     }
+    CELERY_BEAT_SCHEDULE['sync-advertising-catalogs'] = {
+        'task': 'amazon_seller.tasks.sync_advertising_catalogs',
+        'schedule': crontab(minute='*/30'),  # Keep campaign / ad group catalogs warm
+    }
+    CELERY_BEAT_SCHEDULE['cleanup-temp-files'] = {
+        'task': 'core.tasks.cleanup_temp_files',
+        'schedule': crontab(minute='*/10'),  # Keep temp storage bounded, off the request path
+    }
 except ImportError:
     # Celery not installed, don't schedule the task
     pass
@@ -0,0 +1,18 @@
+"""
+Celery tasks for temp file storage
+"""
+import logging
+from celery import shared_task
+from .file_service import cleanup_old_files
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def cleanup_temp_files():
+    """
+    Task to delete expired and surplus temp files, blobs and orphaned local files
+    Scheduled every 10 minutes so cleanup never runs in request handling
+    """
+    results = cleanup_old_files()
+    logger.info(f"Completed temp file cleanup task: {results}")
+    return results
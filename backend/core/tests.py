@@ -0,0 +1,519 @@
+import asyncio
+import base64
+import gc
+import io
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
+
+import pandas as pd
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core import azure_blob_service, file_service, http_client
+from core.models import StoredFile
+from core.tasks import cleanup_temp_files
+from core.file_service import (
+    PREVIEW_MAX_LIMIT,
+    PREVIEW_PAGE_SIZE,
+    cache_excel_sheets,
+    get_excel_preview,
+    get_sheet_preview,
+    parse_preview_filter,
+    preview_row_limit,
+    read_excel_buffer,
+    register_file,
+    sheet_cache,
+    write_excel_buffer,
+)
+
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    """Answers each request with the next status of `statuses` (200 once they run out)"""
+    statuses = []
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self):
+        handler = type(self)
+        handler.requests.append((self.command, self.path))
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        status = handler.statuses.pop(0) if handler.statuses else 200
+        self.send_response(status)
+        if status in (429, 503):
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    do_GET = do_POST = reply
+
+
+def result_sheets(rows=250):
+    return {
+        'Keywords': pd.DataFrame({
+            'Keyword': [f'keyword {index}' for index in range(rows)],
+            'Clicks': [index % 7 for index in range(rows)],
+            'Spend': [float(index) if index % 10 else None for index in range(rows)],
+        }),
+        'Summary': pd.DataFrame({'Metric': ['Clicks', 'Spend'], 'Value': [1, 2]}),
+    }
+
+
+class SheetPreviewTest(TestCase):
+    """Paging, sorting and filtering result sheets through sheet_cache"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        patcher = mock.patch.object(file_service, 'USE_AZURE_STORAGE', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sheet_cache.clear()
+        self.addCleanup(sheet_cache.clear)
+
+        self.sheets = result_sheets()
+        path = os.path.join(self.tmp_dir, 'result.xlsx')
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(write_excel_buffer(self.sheets), f)
+        self.file_id = register_file('result.xlsx', timezone.now() + timedelta(hours=1), local_path=path).file_id
+
+    def test_pages_are_filtered_and_sorted(self):
+        preview = get_sheet_preview(
+            self.file_id, 'Keywords', offset=2, limit=3, sort='Spend', descending=True,
+            filters=[parse_preview_filter('Clicks:gte:5'), parse_preview_filter('Keyword:contains:KEYWORD 1')]
+        )
+
+        expected = self.sheets['Keywords']
+        expected = expected[(expected['Clicks'] >= 5) & expected['Keyword'].str.startswith('keyword 1')]
+        expected = expected.sort_values('Spend', ascending=False, na_position='last')
+        self.assertEqual(preview['total_rows'], len(expected))
+        self.assertEqual(preview['sheets'], ['Keywords', 'Summary'])
+        self.assertEqual(preview['columns'], ['Keyword', 'Clicks', 'Spend'])
+        self.assertEqual([row['Keyword'] for row in preview['rows']], list(expected['Keyword'][2:5]))
+
+    def test_empty_values_sort_last_and_serialize_as_null(self):
+        preview = get_sheet_preview(self.file_id, 'Keywords', offset=220, limit=100, sort='Spend')
+
+        self.assertEqual(preview['total_rows'], 250)
+        self.assertEqual(len(preview['rows']), 30)
+        self.assertTrue(all(row['Spend'] is None for row in preview['rows'][-25:]))
+
+    def test_only_the_requested_sheet_is_parsed(self):
+        with mock.patch.object(pd, 'read_excel', wraps=pd.read_excel) as read_excel:
+            preview = get_sheet_preview(self.file_id, 'Summary')
+            get_sheet_preview(self.file_id, 'Summary', offset=1)
+
+        self.assertEqual(preview['rows'], [{'Metric': 'Clicks', 'Value': 1}, {'Metric': 'Spend', 'Value': 2}])
+        self.assertEqual(preview['sheets'], ['Keywords', 'Summary'])
+        self.assertEqual([call.kwargs['sheet_name'] for call in read_excel.call_args_list], ['Summary'])
+
+    def test_unknown_sheets_columns_and_filters_are_rejected(self):
+        with self.assertRaisesMessage(ValueError, 'Unknown sheet'):
+            get_sheet_preview(self.file_id, 'Missing')
+        with self.assertRaisesMessage(ValueError, 'Unknown column'):
+            get_sheet_preview(self.file_id, 'Keywords', sort='Missing')
+        with self.assertRaisesMessage(ValueError, 'numeric'):
+            get_sheet_preview(self.file_id, 'Keywords', filters=[('Clicks', 'gt', 'many')])
+        with self.assertRaisesMessage(ValueError, 'Unknown filter op'):
+            parse_preview_filter('Clicks:between:1')
+
+    def test_preview_endpoint(self):
+        url = reverse('v1:files:preview_file', args=[self.file_id])
+
+        response = self.client.get(url, {'sheet': 'Keywords', 'limit': 5, 'filter': ['Clicks:eq:3']})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(data['total_rows'], len(self.sheets['Keywords'].query('Clicks == 3')))
+        self.assertEqual(len(data['rows']), 5)
+
+        response = self.client.get(url, {'filter': 'Clicks'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('v1:files:preview_file', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_processing_preview_returns_the_first_page(self):
+        preview = get_excel_preview(self.file_id)
+
+        self.assertEqual(len(preview['data']['Keywords']), PREVIEW_PAGE_SIZE)
+        self.assertEqual(preview['sheets'][0], {'name': 'Keywords', 'total_rows': 250, 'columns': ['Keyword', 'Clicks', 'Spend']})
+        self.assertEqual(len(get_excel_preview(self.file_id, limit=None)['data']['Keywords']), 250)
+        self.assertEqual(list(get_excel_preview(self.file_id, exclude=('Keywords',))['data']), ['Summary'])
+
+    def test_preview_rows_parameter(self):
+        factory = RequestFactory()
+        cases = {None: PREVIEW_PAGE_SIZE, 'all': None, '10': 10, '0': 1, '100000': PREVIEW_MAX_LIMIT, 'lots': PREVIEW_PAGE_SIZE}
+        for value, expected in cases.items():
+            with self.subTest(value=value):
+                data = {} if value is None else {'preview_rows': value}
+                self.assertEqual(preview_row_limit(factory.post('/', data)), expected)
+        self.assertIsNone(preview_row_limit(factory.get('/', {'preview_rows': 'all'})))
+
+    def test_sheets_parsed_from_memory_seed_the_cache(self):
+        buffer = write_excel_buffer(self.sheets)
+        sheets = read_excel_buffer(buffer)
+        self.assertEqual(buffer.tell(), 0)
+        stored = register_file('gone.xlsx', timezone.now() + timedelta(hours=1), local_path=os.path.join(self.tmp_dir, 'gone.xlsx'))
+        cache_excel_sheets(stored.file_id, sheets)
+
+        # The registered file does not exist, so the preview can only come from the cache
+        preview = get_excel_preview(stored.file_id)
+        self.assertEqual([sheet['total_rows'] for sheet in preview['sheets']], [250, 2])
+        self.assertEqual(get_sheet_preview(stored.file_id, 'Summary')['total_rows'], 2)
+
+
+class SheetCacheTest(TestCase):
+    """Blobs streamed through the SDK and parsed sheets kept in sheet_cache"""
+
+    def setUp(self):
+        self.workbook = write_excel_buffer(result_sheets(rows=10)).read()
+        self.downloads = []
+        for patcher in (
+            mock.patch.object(file_service, 'AZURE_BLOB_AVAILABLE', True),
+            mock.patch.object(file_service, 'USE_AZURE_STORAGE', False),
+            mock.patch.object(file_service, 'download_blob', self.download_blob, create=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        sheet_cache.clear()
+        self.addCleanup(sheet_cache.clear)
+        self.file_id = register_file('result.xlsx', timezone.now() + timedelta(hours=1), blob_name='result.xlsx', blob_url='https://blob/result.xlsx').file_id
+
+    def download_blob(self, blob_name, stream=None):
+        self.downloads.append(blob_name)
+        stream.write(self.workbook)
+        return len(self.workbook)
+
+    def test_blobs_are_downloaded_and_parsed_once(self):
+        with mock.patch.object(pd, 'read_excel', wraps=pd.read_excel) as read_excel:
+            summary = file_service.load_excel_sheets(self.file_id, ['Summary'])
+            self.assertEqual(list(file_service.load_excel_sheets(self.file_id, ['Summary'])), ['Summary'])
+            sheets = file_service.load_excel_sheets(self.file_id)
+            file_service.get_excel_data(self.file_id, 'Keywords')
+
+        self.assertEqual(list(sheets), ['Keywords', 'Summary'])
+        self.assertIs(sheets['Summary'], summary['Summary'])
+        self.assertEqual([call.kwargs['sheet_name'] for call in read_excel.call_args_list], ['Summary', 'Keywords'])
+        self.assertEqual(self.downloads, ['result.xlsx', 'result.xlsx'])
+        self.assertEqual(file_service.get_file_content_base64(self.file_id), base64.b64encode(self.workbook).decode())
+
+    def test_deleting_a_file_evicts_its_sheets(self):
+        file_service.load_excel_sheets(self.file_id)
+        self.assertEqual(sheet_cache.sheet_names(self.file_id), ['Keywords', 'Summary'])
+
+        file_service.delete_file(self.file_id)
+
+        self.assertIsNone(sheet_cache.sheet_names(self.file_id))
+        self.assertIsNone(sheet_cache.get(self.file_id, 'Keywords'))
+        self.assertEqual(sheet_cache.size, 0)
+        self.assertIsNone(file_service.load_excel_sheets(self.file_id))
+
+    def test_least_recently_used_sheets_are_evicted_by_size(self):
+        df = pd.DataFrame({'Value': range(100)})
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        cache = file_service.SheetCache(max_bytes=2 * nbytes)
+        cache.set_sheet_names('a', ['one'])
+        cache.put('a', 'one', df)
+        cache.put('b', 'one', df)
+        cache.get('a', 'one')
+
+        cache.put('c', 'one', df)
+
+        self.assertIsNone(cache.get('b', 'one'))
+        self.assertIs(cache.get('a', 'one'), df)
+        self.assertEqual(cache.size, 2 * nbytes)
+        cache.put('d', 'one', pd.DataFrame({'Value': range(1000)}))
+        self.assertIsNone(cache.get('d', 'one'))
+
+        cache.put('b', 'one', df)
+        cache.put('c', 'two', df)
+        self.assertIsNone(cache.get('a', 'one'))
+        self.assertIsNone(cache.sheet_names('a'))
+
+
+class OutputBufferTest(TestCase):
+    """Output workbooks built in memory and saved to the file service in one write"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        for patcher in (
+            mock.patch.object(file_service, 'AZURE_TEMP_PATH', self.tmp_dir),
+            mock.patch.object(file_service, 'USE_AZURE_STORAGE', False),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.sheets = {
+            'Bids': pd.DataFrame({'Keyword': ['red shoes', 'blue shoes'], 'Bid': [0.5, 1.25]}),
+            'Summary': pd.DataFrame({'Metric': ['Clicks'], 'Value': [3]}),
+        }
+
+    def test_workbooks_stay_in_memory_below_the_spill_size(self):
+        buffer = write_excel_buffer(self.sheets)
+        self.assertFalse(buffer._rolled)
+        self.assertEqual(buffer.tell(), 0)
+
+        with mock.patch.object(file_service, 'OUTPUT_SPILL_BYTES', 1024):
+            spilled = write_excel_buffer(self.sheets)
+        self.assertTrue(spilled._rolled)
+        self.assertEqual(read_excel_buffer(spilled)['Bids'].to_dict(orient='records'), self.sheets['Bids'].to_dict(orient='records'))
+
+    def test_records_match_the_written_workbook(self):
+        buffer = write_excel_buffer(self.sheets)
+
+        records = file_service.frames_to_records(self.sheets)
+
+        self.assertEqual(records['Bids'], [{'Keyword': 'red shoes', 'Bid': 0.5}, {'Keyword': 'blue shoes', 'Bid': 1.25}])
+        self.assertEqual(file_service.frames_to_records(read_excel_buffer(buffer)), records)
+        self.assertEqual(buffer.tell(), 0)
+
+    def test_buffers_are_saved_with_a_single_write(self):
+        buffer = write_excel_buffer(self.sheets)
+
+        result = file_service.save_temp_file(buffer, 'SP_Output_bulk.xlsx')
+
+        self.assertEqual(os.listdir(self.tmp_dir), ['SP_Output_bulk.xlsx'])
+        self.assertEqual(file_service.get_excel_data(result['file_id']), file_service.frames_to_records(self.sheets))
+
+
+class HttpClientTest(TestCase):
+    """Pooled sessions, retries and timing hooks of core.http_client"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ScriptedHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/v2/profiles?token=secret'
+        ScriptedHandler.statuses = []
+        ScriptedHandler.requests = []
+        # Sessions built by the tests retry without sleeping between attempts
+        patcher = mock.patch.object(http_client, 'BACKOFF_FACTOR', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        http_client.close_sessions()
+        self.addCleanup(http_client.close_sessions)
+
+    def test_sessions_are_shared_per_region(self):
+        self.assertIs(http_client.get_session('EU'), http_client.get_session('EU'))
+        self.assertIsNot(http_client.get_session('EU'), http_client.get_session('NA'))
+        self.assertIs(http_client.get_session(), http_client.get_session(http_client.DEFAULT_POOL))
+
+    def test_throttled_posts_are_retried(self):
+        ScriptedHandler.statuses = [429, 503]
+
+        response = http_client.post(self.url, region='EU', json={})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ScriptedHandler.requests), 3)
+
+    def test_server_errors_are_retried_for_idempotent_methods_only(self):
+        ScriptedHandler.statuses = [500]
+        self.assertEqual(http_client.post(self.url, region='EU', json={}).status_code, 500)
+
+        ScriptedHandler.statuses = [500]
+        self.assertEqual(http_client.get(self.url, region='EU').status_code, 200)
+        self.assertEqual([method for method, _ in ScriptedHandler.requests], ['POST', 'GET', 'GET'])
+
+    def test_final_response_is_returned_when_retries_run_out(self):
+        ScriptedHandler.statuses = [429] * (http_client.MAX_RETRIES + 1)
+
+        response = http_client.get(self.url, region='EU')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(len(ScriptedHandler.requests), http_client.MAX_RETRIES + 1)
+
+    def test_timing_hooks_see_urls_without_query_strings(self):
+        calls = []
+        hook = lambda *args: calls.append(args)
+        http_client.register_timing_hook(hook)
+        self.addCleanup(http_client.unregister_timing_hook, hook)
+
+        http_client.get(self.url, region='FE')
+
+        method, url, status_code, elapsed, pool = calls[0]
+        self.assertEqual((method, url, status_code, pool), ('GET', self.url.split('?')[0], 200, 'FE'))
+        self.assertGreaterEqual(elapsed, 0)
+
+
+class FileRegistryTest(TestCase):
+    """StoredFile registry lookups, access counting and the file endpoints"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        for patcher in (
+            mock.patch.object(file_service, 'AZURE_TEMP_PATH', self.tmp_dir),
+            mock.patch.object(file_service, 'USE_AZURE_STORAGE', False),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_saved_files_are_registered(self):
+        result = file_service.save_temp_file(io.BytesIO(b'report'), 'report.xlsx')
+
+        stored = file_service.get_stored_file(result['file_id'])
+        self.assertEqual((stored.filename, stored.size, stored.is_blob), ('report.xlsx', 6, False))
+        with open(stored.local_path, 'rb') as f:
+            self.assertEqual(f.read(), b'report')
+        self.assertIsNone(file_service.get_stored_file('missing'))
+        self.assertIsNone(file_service.get_stored_file(None))
+
+    def test_downloads_count_accesses_and_extend_expiry(self):
+        file_id = file_service.save_temp_file(io.BytesIO(b'report'), 'report.xlsx')['file_id']
+        StoredFile.objects.filter(pk=file_id).update(expires_at=timezone.now() + timedelta(minutes=5))
+
+        for _ in range(2):
+            response = self.client.get(reverse('v1:files:download_file', args=[file_id]))
+            self.assertEqual(b''.join(response.streaming_content), b'report')
+            response.close()
+
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="report.xlsx"')
+        stored = file_service.get_stored_file(file_id)
+        self.assertEqual(stored.access_count, 2)
+        self.assertGreater(stored.expires_at, timezone.now() + timedelta(hours=1))
+        info = self.client.get(reverse('v1:files:file_info', args=[file_id])).json()['data']
+        self.assertEqual((info['filename'], info['storage_type'], info['access_count']), ('report.xlsx', 'local', 2))
+
+    def test_moved_files_are_found_in_the_temp_dir(self):
+        path = os.path.join(self.tmp_dir, 'report.xlsx')
+        with open(path, 'wb') as f:
+            f.write(b'report')
+        stored = register_file('report.xlsx', timezone.now() + timedelta(hours=1), local_path='/elsewhere/report.xlsx')
+
+        self.assertEqual(file_service.resolve_local_path(stored), file_service.get_temp_path('report.xlsx'))
+        self.assertEqual(file_service.get_stored_file(stored.file_id).local_path, file_service.get_temp_path('report.xlsx'))
+
+        os.remove(path)
+        response = self.client.get(reverse('v1:files:download_file', args=[stored.file_id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_delete_removes_the_file_and_its_entry(self):
+        file_id = file_service.save_temp_file(io.BytesIO(b'report'), 'report.xlsx')['file_id']
+        path = file_service.get_stored_file(file_id).local_path
+
+        response = self.client.delete(reverse('v1:files:remove_file', args=[file_id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredFile.objects.filter(pk=file_id).exists())
+        self.assertEqual(self.client.delete(reverse('v1:files:remove_file', args=[file_id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('v1:files:file_info', args=[file_id])).status_code, 404)
+
+
+class TempFileCleanupTest(TestCase):
+    """cleanup_old_files selection, through the scheduled task and the management command"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        for patcher in (
+            mock.patch.object(file_service, 'AZURE_TEMP_PATH', self.tmp_dir),
+            mock.patch.object(file_service, 'USE_AZURE_STORAGE', False),
+            mock.patch.object(file_service, 'FILE_CLEANUP_THRESHOLD', 3),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.now = timezone.now()
+
+    def make_file(self, name, expires_in=timedelta(hours=1), age=timedelta(hours=2), access_count=0, register=True):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 100)
+        modified = (self.now - age).timestamp()
+        os.utime(path, (modified, modified))
+        if not register:
+            return path
+        stored = register_file(name, self.now + expires_in, local_path=path, size=100)
+        StoredFile.objects.filter(pk=stored.pk).update(created_at=self.now - age, access_count=access_count)
+        return path
+
+    def remaining(self):
+        return sorted(os.listdir(self.tmp_dir))
+
+    def make_files(self):
+        self.make_file('expired.xlsx', expires_in=-timedelta(minutes=1))
+        # Four live files over a threshold of 3: old ones are evicted, least accessed
+        # first and ten past the threshold
+        self.make_file('popular.xlsx', access_count=5)
+        self.make_file('used.xlsx', access_count=1)
+        self.make_file('idle.xlsx')
+        # Just created and maybe still being downloaded
+        self.make_file('fresh.xlsx', age=timedelta(minutes=1))
+        self.make_file('orphan.tmp', register=False)
+        self.make_file('writing.tmp', age=timedelta(minutes=1), register=False)
+
+    def test_task_deletes_by_age_and_count(self):
+        self.make_files()
+
+        report = cleanup_temp_files()
+
+        self.assertEqual(report, {'expired': 1, 'evicted': 3, 'orphans': 1, 'blobs': 0, 'bytes_reclaimed': 500})
+        self.assertEqual(self.remaining(), ['fresh.xlsx', 'writing.tmp'])
+        self.assertEqual(list(StoredFile.objects.values_list('filename', flat=True)), ['fresh.xlsx'])
+
+    def test_files_in_use_are_left_alone(self):
+        with mock.patch.object(file_service, 'FILE_CLEANUP_THRESHOLD', 10):
+            self.make_files()
+            report = cleanup_temp_files()
+
+        self.assertEqual((report['expired'], report['evicted'], report['orphans']), (1, 0, 1))
+        self.assertEqual(self.remaining(), ['fresh.xlsx', 'idle.xlsx', 'popular.xlsx', 'used.xlsx', 'writing.tmp'])
+
+    def test_command_dry_run_deletes_nothing(self):
+        self.make_files()
+        before = self.remaining()
+        out = io.StringIO()
+
+        call_command('cleanup_temp_files', '--dry-run', stdout=out)
+
+        self.assertIn('Dry run, would delete: 1 expired, 3 surplus and 1 orphaned files', out.getvalue())
+        self.assertEqual(self.remaining(), before)
+        self.assertEqual(StoredFile.objects.count(), 5)
+
+        call_command('cleanup_temp_files', '--batch-size', '1', stdout=io.StringIO())
+        self.assertEqual(self.remaining(), ['fresh.xlsx', 'writing.tmp'])
+
+
+@skipUnless(os.environ.get('AZURITE_CONNECTION_STRING'), 'Set AZURITE_CONNECTION_STRING to run against the Azurite emulator')
+class AsyncBlobClientTest(TestCase):
+    """Async uploads and downloads close their clients, on any number of event loops"""
+
+    def setUp(self):
+        container = f'test-{os.getpid()}-{id(self)}'
+        for patcher in (
+            mock.patch.object(azure_blob_service, 'AZURE_STORAGE_CONNECTION_STRING', os.environ['AZURITE_CONNECTION_STRING']),
+            mock.patch.object(azure_blob_service, 'AZURE_CONTAINER_NAME', container),
+            mock.patch.object(azure_blob_service, '_client', None),
+            mock.patch.object(azure_blob_service, '_container_client', None),
+            mock.patch.object(azure_blob_service, '_async_container_checked', False),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: azure_blob_service.get_blob_service_client().delete_container(container))
+
+    def test_round_trip_on_separate_event_loops(self):
+        content = os.urandom(64 * 1024)
+        path = os.path.join(tempfile.mkdtemp(), 'upload.bin')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), ignore_errors=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+        # An unclosed aiohttp session is reported through the asyncio logger when collected
+        with self.assertNoLogs('asyncio', level='ERROR'):
+            blob_name, blob_url = asyncio.run(azure_blob_service.upload_blob_async(path, 'upload.bin'))
+            # Each asyncio.run has its own loop, which a cached client would outlive
+            self.assertEqual(asyncio.run(azure_blob_service.download_blob_async(blob_name)), content)
+            self.assertEqual(asyncio.run(azure_blob_service.download_blob_async(blob_name)), content)
+            gc.collect()
+
+        self.assertIn(blob_name, blob_url)
+        self.assertEqual(azure_blob_service.download_blob(blob_name), content)
@@ -7,8 +7,8 @@ import os
 from openpyxl.utils.dataframe import dataframe_to_rows
 warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
 
-def load_data(file_path: str, sheet_name: str) -> pd.DataFrame:
-    """Load data from an Excel file."""
+def load_data(file_path, sheet_name: str) -> pd.DataFrame:
+    """Load data from an Excel file (a path or an open pd.ExcelFile)."""
     return pd.read_excel(file_path, sheet_name=sheet_name)
 
 def extract_asin(data: pd.DataFrame) -> pd.DataFrame:
@@ -102,8 +102,8 @@ def save_ngram_analysis(
     bulk_data: pd.DataFrame,
     target_acos: float
 ) -> None:
-    """Save n-gram analysis results to an Excel file."""
-    with pd.ExcelWriter(output_path, engine="xlsxwriter") as writer:
+    """Save n-gram analysis results to an Excel file (a path or a writable buffer)."""
+    with pd.ExcelWriter(output_path, engine="xlsxwriter", engine_kwargs={"options": {"in_memory": True}}) as writer:
         for asin, ngram_data in asin_ngram_metrics.items():
             unigram_df = pd.DataFrame.from_dict(ngram_data['unigram'], orient='index')
             unigram_df['RPC'] = unigram_df.apply(lambda row: row['Sales'] / row['Clicks'] if row['Clicks'] > 0 else 0, axis=1)
@@ -159,6 +159,8 @@ def save_ngram_analysis(
     unique_ad_groups_df = bulk_data[["Ad Group ID", "Campaign Name (Informational only)", "Campaign ID", "Ad Group Name (Informational only)"]].drop_duplicates(subset=["Ad Group ID"])
     unique_ad_groups_df.reset_index(drop=True, inplace=True)
     
+    if hasattr(output_path, "seek"):
+        output_path.seek(0)
     with pd.ExcelWriter(output_path, engine="openpyxl", mode="a") as writer:
         for asin in asin_ngram_metrics.keys():
             # Filter campaigns that start with the ASIN
@@ -191,7 +193,12 @@ def save_ngram_analysis(
                 campaign_df.to_excel(writer, sheet_name=asin, startrow=0, index=False)
 
 def process_ngram_file(bulk_file_path, output_path_sk, output_path_mk, target_acos=0.2):
-    """Main processing function for ngram analysis."""
+    """
+    Main processing function for ngram analysis.
+    
+    The bulk file may be a path or an open pd.ExcelFile, and the outputs
+    paths or writable buffers, so an upload can be processed without touching disk.
+    """
     try:
         # Load data
         data = load_data(bulk_file_path, 'SP Search Term Report')
@@ -1,12 +1,13 @@
-import os
-import base64
 import pandas as pd
 from rest_framework.decorators import api_view, parser_classes
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from .ngram_processor import process_ngram_file
-from core.file_service import save_temp_file, get_excel_data, get_file_url, get_temp_path
+from core.file_service import (
+    save_temp_file, get_file_url, new_output_buffer, get_excel_preview, read_excel_buffer, cache_excel_sheets,
+    preview_row_limit
+)
 
 def create_response(request, data, status=200):
     """Create a consistent response format."""
@@ -34,54 +35,47 @@ def process_ngram(request):
         if not file.name.endswith((".xlsx", ".xls")):
             return create_response(request, {"error": "Invalid file type. Only Excel files are supported."}, 400)
         
-        # Setup file paths using get_temp_path to ensure proper directory structure
-        temp_file_path = get_temp_path(file.name)
-        output_file_path_sk = get_temp_path(f"ngram_analysis_results_by_asin_sk_{file.name}")
-        output_file_path_mk = get_temp_path(f"ngram_analysis_results_by_asin_mk_{file.name}")
-        
-        # Save uploaded file temporarily
-        with open(temp_file_path, 'wb+') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
-
         # Get target ACOS from request parameters
         target_acos = float(request.data.get('target_acos', 0.2))
+        
+        # Outputs are written to memory buffers (spilled to disk only when very large)
+        output_sk = new_output_buffer()
+        output_mk = new_output_buffer()
                 
-        # Process the file
+        # Process the upload straight from the request (kept in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE)
         try:
-            result = process_ngram_file(temp_file_path, output_file_path_sk, output_file_path_mk, target_acos)
+            with pd.ExcelFile(file) as xls:
+                result = process_ngram_file(xls, output_sk, output_mk, target_acos)
         except Exception as e:
             return create_response(request, {"error": f"Error processing file: {str(e)}"}, 500)
         
-        if not (os.path.exists(output_file_path_sk) and os.path.exists(output_file_path_mk)):
+        if not (output_sk.tell() and output_mk.tell()):
             return create_response(request, {"error": "Failed to generate output files"}, 500)
         
-        # Save files to file service and get their IDs
-        file_result_sk = save_temp_file(output_file_path_sk, f"ngram_analysis_results_by_asin_sk_{file.name}")
-        file_result_mk = save_temp_file(output_file_path_mk, f"ngram_analysis_results_by_asin_mk_{file.name}")
+        # Parse the outputs while they are still in memory, so the previews
+        # do not fetch the saved copies (from Azure) and parse them again
+        sheets_sk = read_excel_buffer(output_sk)
+        sheets_mk = read_excel_buffer(output_mk)
         
-        # Extract data from the output Excel files for JSON response
-        result_data = {}
+        # Save the buffers to file service and get their IDs
+        file_result_sk = save_temp_file(output_sk, f"ngram_analysis_results_by_asin_sk_{file.name}")
+        file_result_mk = save_temp_file(output_mk, f"ngram_analysis_results_by_asin_mk_{file.name}")
+        cache_excel_sheets(file_result_sk['file_id'], sheets_sk)
+        cache_excel_sheets(file_result_mk['file_id'], sheets_mk)
         
-        # Read B0 ASINs data
-        sk_data = get_excel_data(file_result_sk['file_id'])
-        mk_data = get_excel_data(file_result_mk['file_id'])
-        
-        if sk_data:
-            for sheet_name, sheet_data in sk_data.items():
-                if sheet_name not in result_data:
-                    result_data[sheet_name] = []
-                for record in sheet_data:
-                    record["file_source"] = "B0_ASINs"
-                    result_data[sheet_name].append(record)
-                    
-        if mk_data:
-            for sheet_name, sheet_data in mk_data.items():
-                if sheet_name not in result_data:
-                    result_data[sheet_name] = []
-                for record in sheet_data:
-                    record["file_source"] = "non_B0_ASINs"
-                    result_data[sheet_name].append(record)
+        # First page of each output sheet of both files (or as many rows as preview_rows asks for),
+        # tagged with the file it came from; further pages come from files/preview/<file_id>/
+        preview_limit = preview_row_limit(request)
+        result_data = {}
+        sheets = []
+        for file_result, source in ((file_result_sk, "B0_ASINs"), (file_result_mk, "non_B0_ASINs")):
+            preview = get_excel_preview(file_result['file_id'], limit=preview_limit)
+            for sheet_name, rows in (preview['data'] or {}).items():
+                for record in rows:
+                    record["file_source"] = source
+                result_data.setdefault(sheet_name, []).extend(rows)
+            for sheet in preview['sheets']:
+                sheets.append({**sheet, 'file_id': file_result['file_id'], 'file_source': source})
         
         # Create response with file URLs and JSON data
         response_data = {
@@ -90,6 +84,7 @@ def process_ngram(request):
             'sk_asin_count': result.get('sk_asin_count', 0),
             'mk_asin_count': result.get('mk_asin_count', 0),
             'data': result_data,
+            'sheets': sheets,
             'files': [
                 {
                     'filename': file_result_sk['filename'],
@@ -106,17 +101,7 @@ def process_ngram(request):
             ]
         }
         
-        # Clean up temporary files
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-            
         return create_response(request, response_data)
 
     except Exception as e:
-        # Clean up any temporary files
-        temp_files = [temp_file_path]
-        for file_path in temp_files:
-            if 'file_path' in locals() and os.path.exists(file_path):
-                os.remove(file_path)
-                
-        return create_response(request, {"error": f"Unexpected error: {str(e)}"}, 500) 
\ No newline at end of file
+        return create_response(request, {"error": f"Unexpected error: {str(e)}"}, 500)
\ No newline at end of file
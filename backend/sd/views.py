@@ -18,7 +18,7 @@ from fuzzywuzzy import fuzz
 from fuzzywuzzy import process
 from .header import load_and_process_reports
 import base64
-from core.file_service import save_temp_file, get_excel_data, get_file_url
+from core.file_service import save_temp_file, get_excel_preview, preview_row_limit, get_file_url
 
 
 class ProcessedFileViewSet(viewsets.ModelViewSet):
@@ -87,12 +87,14 @@ def process_sdads(request):
         # Save file to file service and get its ID
         file_result = save_temp_file(output_file_path, f"Optimized_SD_{file.name}")
             
-        # Extract data from the output Excel file for JSON response
-        result_data = get_excel_data(file_result['file_id'])
+        # First page of each output sheet (or as many rows as preview_rows asks for);
+        # further pages come from files/preview/<file_id>/
+        preview = get_excel_preview(file_result['file_id'], limit=preview_row_limit(request))
         
         # Create response with JSON data and file reference
         response_data = {
-            'data': result_data,
+            'data': preview['data'],
+            'sheets': preview['sheets'],
             'file': {
                 'filename': file_result['filename'],
                 'url': file_result.get('url') or get_file_url(file_result['file_id'], request),
@@ -10,6 +10,10 @@ from .placement_optimise_mk_ab_net import placement_optimize_mk_ab_net
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
 
+EXPECTED_HEADERS_STR = ["Product", "Campaign ID", "Ad Group ID", "Keyword ID", "Product Targeting ID", "Campaign Name (Informational only)", "Ad Group Name (Informational only)", "Portfolio Name (Informational only)", "State", "Campaign State (Informational only)", "Bid", "Keyword Text", "Match Type", "Product Targeting Expression", "Resolved Product Targeting Expression (Informational only)", "Customer Search Term", "Impressions", "Clicks", "Click-through Rate", "Spend", "Sales", "Orders", "Units", "Conversion Rate", "ACOS", "CPC", "ROAS"]
+
+EXPECTED_HEADERS_BULK = ["Product", "Entity", "Operation", "Campaign ID", "Ad Group ID", "Portfolio ID", "Ad ID", "Keyword ID", "Product Targeting ID", "Campaign Name", "Ad Group Name", "Campaign Name (Informational only)", "Ad Group Name (Informational only)", "Portfolio Name (Informational only)", "Start Date", "End Date", "Targeting Type", "State", "Campaign State (Informational only)", "Ad Group State (Informational only)", "Daily Budget", "SKU", "ASIN", "Eligibility Status (Informational only)", "Reason for Ineligibility (Informational only)", "Ad Group Default Bid", "Ad Group Default Bid (Informational only)", "Bid", "Keyword Text", "Native Language Keyword", "Native Language Locale", "Match Type", "Bidding Strategy", "Placement", "Percentage", "Product Targeting Expression", "Resolved Product Targeting Expression (Informational only)", "Impressions", "Clicks", "Click-through Rate", "Spend", "Sales", "Orders", "Units", "Conversion Rate", "ACOS", "CPC", "ROAS"]
+
 def match_headers(actual_headers, expected_headers):  
     header_mapping = {}
     for header in actual_headers:
@@ -33,13 +37,17 @@ def filter_campaign_data(df, prefix):
 def process_campaign_data(file_path, sheet_name_bulk, sheet_name_str):
     
     
-    expected_headers_str = ["Product", "Campaign ID", "Ad Group ID", "Keyword ID", "Product Targeting ID", "Campaign Name (Informational only)", "Ad Group Name (Informational only)", "Portfolio Name (Informational only)", "State", "Campaign State (Informational only)", "Bid", "Keyword Text", "Match Type", "Product Targeting Expression", "Resolved Product Targeting Expression (Informational only)", "Customer Search Term", "Impressions", "Clicks", "Click-through Rate", "Spend", "Sales", "Orders", "Units", "Conversion Rate", "ACOS", "CPC", "ROAS"]
-    
-    expected_headers_bulk = ["Product", "Entity", "Operation", "Campaign ID", "Ad Group ID", "Portfolio ID", "Ad ID", "Keyword ID", "Product Targeting ID", "Campaign Name", "Ad Group Name", "Campaign Name (Informational only)", "Ad Group Name (Informational only)", "Portfolio Name (Informational only)", "Start Date", "End Date", "Targeting Type", "State", "Campaign State (Informational only)", "Ad Group State (Informational only)", "Daily Budget", "SKU", "ASIN", "Eligibility Status (Informational only)", "Reason for Ineligibility (Informational only)", "Ad Group Default Bid", "Ad Group Default Bid (Informational only)", "Bid", "Keyword Text", "Native Language Keyword", "Native Language Locale", "Match Type", "Bidding Strategy", "Placement", "Percentage", "Product Targeting Expression", "Resolved Product Targeting Expression (Informational only)", "Impressions", "Clicks", "Click-through Rate", "Spend", "Sales", "Orders", "Units", "Conversion Rate", "ACOS", "CPC", "ROAS"]
-    
-    str_df = load_and_standardize_data(file_path, sheet_name_str, expected_headers_str)
-    bulk_df = load_and_standardize_data(file_path, sheet_name_bulk, expected_headers_bulk)
+    str_df = load_and_standardize_data(file_path, sheet_name_str, EXPECTED_HEADERS_STR)
+    bulk_df = load_and_standardize_data(file_path, sheet_name_bulk, EXPECTED_HEADERS_BULK)
+
+    return split_campaign_data(str_df, bulk_df)
 
+def standardize_campaign_data(str_df, bulk_df):
+    # Same header matching as process_campaign_data, for sheets that were already read (e.g. from an upload in memory)
+    return standardize_headers(str_df, EXPECTED_HEADERS_STR), standardize_headers(bulk_df, EXPECTED_HEADERS_BULK)
+
+def split_campaign_data(str_df, bulk_df):
+    # Split already standardized search term and bulk frames into single-keyword (b0...) and multi-keyword campaigns
     bulk_df = bulk_df[~bulk_df["Campaign Name (Informational only)"].str.lower().str.startswith("catchall")]
     
     str_sk = filter_campaign_data(str_df, "b0")
@@ -53,7 +61,14 @@ def process_campaign_data(file_path, sheet_name_bulk, sheet_name_str):
 
 def process_data(file_path, target_acos, sheet_name_bulk, sheet_name_str):
     str_sk, str_mk, bulk_sk, bulk_mk, bulk_df = process_campaign_data(file_path, sheet_name_bulk, sheet_name_str)
-    
+    return optimise_campaign_data(str_sk, str_mk, bulk_sk, bulk_mk, bulk_df, target_acos)
+
+def process_frames(str_df, bulk_df, target_acos):
+    # Same as process_data for frames that already carry the standard bulk / search term headers
+    str_sk, str_mk, bulk_sk, bulk_mk, bulk_df = split_campaign_data(str_df, bulk_df)
+    return optimise_campaign_data(str_sk, str_mk, bulk_sk, bulk_mk, bulk_df, target_acos)
+
+def optimise_campaign_data(str_sk, str_mk, bulk_sk, bulk_mk, bulk_df, target_acos):
     deduped_df, result_df = harvest_data_sk(str_df=str_sk, bulk_df=bulk_sk, target_acos=target_acos)
     campaign_df = build_campaign_rows(deduped_df)
     pt_df, kw_df = campaign_negation_sk(str_df=str_sk, bulk_df=bulk_sk, target_acos=target_acos, multiplier=1.5)
@@ -66,7 +81,8 @@ def process_data(file_path, target_acos, sheet_name_bulk, sheet_name_str):
     
     return deduped_df, result_df, campaign_df, pt_df, kw_df, pt_df_mk, kw_df_mk, filtered_bulk_df, valid_campaigns_sk, RPC_df, asin_summary, filtered_bulk_df_mk, RPC_df_mk, bulk_summary_mk, budget_bulk_df_mk, new_bid_df_mk, valid_campaigns_mk
 
-def save_to_excel(output_file_path, deduped_df, result_df, campaign_df, pt_df, kw_df, pt_df_mk, kw_df_mk, filtered_bulk_df, valid_campaigns_sk, RPC_df, asin_summary, filtered_bulk_df_mk,  RPC_df_mk, bulk_summary_mk, budget_bulk_df_mk, new_bid_df_mk, valid_campaigns_mk):
+def build_output_sheets(deduped_df, result_df, campaign_df, pt_df, kw_df, pt_df_mk, kw_df_mk, filtered_bulk_df, valid_campaigns_sk, RPC_df, asin_summary, filtered_bulk_df_mk,  RPC_df_mk, bulk_summary_mk, budget_bulk_df_mk, new_bid_df_mk, valid_campaigns_mk):
+    # Output sheets of the optimiser, in workbook order
     
     # Combine filtered_bulk_df and new_bid_df_mk by appending new_bid_df_mk to filtered_bulk_df
     combined_df = pd.concat([filtered_bulk_df, new_bid_df_mk, budget_bulk_df_mk, valid_campaigns_mk, valid_campaigns_sk], ignore_index=True)
@@ -89,34 +105,40 @@ def save_to_excel(output_file_path, deduped_df, result_df, campaign_df, pt_df, k
     if "ASIN_Derived" in combined_df.columns:
         combined_df = combined_df.drop(columns=["ASIN_Derived"])
 
-    with pd.ExcelWriter(output_file_path, engine="xlsxwriter") as writer:
-        # Write each DataFrame to a specific sheet
+    return {
         # Main essential sheets
-        deduped_df.to_excel(writer, sheet_name="New campaigns", index=False)
-        combined_df.to_excel(writer, sheet_name="Bids Optimized", index=False)
-        result_df.to_excel(writer, sheet_name="Harvested Campaign", index=False)
-        
+        "New campaigns": deduped_df,
+        "Bids Optimized": combined_df,
+        "Harvested Campaign": result_df,
+
         # Commenting out less essential sheets to reduce file size
-        # campaign_df.to_excel(writer, sheet_name="New campaigns-df", index=False)
-        # pt_combined_df.to_excel(writer, sheet_name="Product Negation", index=False)
-        # kw_combined_df.to_excel(writer, sheet_name="Keyword Negation", index=False)
-        # RPC_combined_df.to_excel(writer, sheet_name="RPC & Bids", index=False)
-        # bulk_summary_combined_df.to_excel(writer, sheet_name="ASIN Summary", index=False)
-        
+        # "New campaigns-df": campaign_df,
+        # "Product Negation": pt_combined_df,
+        # "Keyword Negation": kw_combined_df,
+        # "RPC & Bids": RPC_combined_df,
+        # "ASIN Summary": bulk_summary_combined_df,
+
         # Commenting out detailed debug/test sheets
-        # pt_df.to_excel(writer, sheet_name="Product Negation SK", index=False)
-        # pt_df_mk.to_excel(writer, sheet_name="Product Negation MK", index=False)
-        # kw_df.to_excel(writer, sheet_name="Keyword Negation SK", index=False)
-        # kw_df_mk.to_excel(writer, sheet_name="Keyword Negation MK", index=False)
-        # filtered_bulk_df.to_excel(writer, sheet_name="Bids Optimized SK", index=False)
-        # filtered_bulk_df_mk.to_excel(writer, sheet_name="Bids Optimized MK", index=False)
-        # new_bid_df_mk.to_excel(writer, sheet_name="Budget Optimized MK", index=False)
-        # valid_campaigns_sk.to_excel(writer, sheet_name="Placement Optimized SK", index=False)
-        # valid_campaigns_mk.to_excel(writer, sheet_name="Placement Optimized MK", index=False)
-        # RPC_df.to_excel(writer, sheet_name="RPC & Bids SK", index=False)
-        # RPC_df_mk.to_excel(writer, sheet_name="RPC & Bids MK", index=False)
-        # bulk_summary_mk.to_excel(writer, sheet_name="ASIN Summary MK", index=False)
-        # asin_summary.to_excel(writer, sheet_name="ASIN Summary SK", index=False)
+        # "Product Negation SK": pt_df,
+        # "Product Negation MK": pt_df_mk,
+        # "Keyword Negation SK": kw_df,
+        # "Keyword Negation MK": kw_df_mk,
+        # "Bids Optimized SK": filtered_bulk_df,
+        # "Bids Optimized MK": filtered_bulk_df_mk,
+        # "Budget Optimized MK": new_bid_df_mk,
+        # "Placement Optimized SK": valid_campaigns_sk,
+        # "Placement Optimized MK": valid_campaigns_mk,
+        # "RPC & Bids SK": RPC_df,
+        # "RPC & Bids MK": RPC_df_mk,
+        # "ASIN Summary MK": bulk_summary_mk,
+        # "ASIN Summary SK": asin_summary,
+    }
+
+def save_to_excel(output_file_path, *data):
+    with pd.ExcelWriter(output_file_path, engine="xlsxwriter") as writer:
+        # Write each DataFrame to a specific sheet
+        for sheet_name, df in build_output_sheets(*data).items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
     print(f"DataFrames have been successfully exported to {output_file_path}")
 
 def final_sp_optimisation(file_path, output_file_path, target_acos, sheet_name_bulk, sheet_name_str):
@@ -124,3 +146,14 @@ def final_sp_optimisation(file_path, output_file_path, target_acos, sheet_name_b
     
     data = process_data(file_path, target_acos, sheet_name_bulk, sheet_name_str)
     save_to_excel(output_file_path, *data) 
+
+def final_sp_optimisation_from_frames(str_df, bulk_df, output_file_path, target_acos):
+    # Entry point for data that never went through an uploaded workbook (e.g. ingested Ads API reports)
+    data = process_frames(str_df, bulk_df, target_acos)
+    save_to_excel(output_file_path, *data)
+
+def sp_optimisation_sheets(str_df, bulk_df, target_acos):
+    # In-memory entry point: raw search term / bulk sheets in, output sheets (name -> DataFrame) out
+    str_df, bulk_df = standardize_campaign_data(str_df, bulk_df)
+    data = process_frames(str_df, bulk_df, target_acos)
+    return build_output_sheets(*data)
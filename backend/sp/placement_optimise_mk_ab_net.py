@@ -10,7 +10,7 @@ def placement_optimize_mk_ab_net( bulk_df: pd.DataFrame, target_acos: float ) ->
     ].copy() 
     
     if df_placement.empty:
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
     # Grouped summary of ASIN and Placement
     summary = df_placement.groupby(["Campaign Name (Informational only)", "Placement"], observed=True).agg({
         "Impressions": "sum",
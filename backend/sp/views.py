@@ -16,10 +16,10 @@ import os
 import fuzzywuzzy
 from fuzzywuzzy import fuzz
 from fuzzywuzzy import process
-from .header import final_sp_optimisation, match_headers, standardize_headers
+from .header import final_sp_optimisation, sp_optimisation_sheets, match_headers, standardize_headers
 import base64
 from io import BytesIO
-from core.file_service import save_temp_file, get_excel_data, get_file_url
+from core.file_service import save_temp_file, get_excel_preview, preview_row_limit, get_file_url, write_excel_buffer, cache_excel_sheets
 
 # Import SB and SD modules (wrapped in try-except to handle potential import errors)
 try:
@@ -79,20 +79,9 @@ def process_spads(request):
         except ValueError:
             return create_response(request, {"error": "Invalid target ACOS format"}, 400)
 
-        # Python code for Azure compatibility
-        temp_dir = os.environ.get('TEMP', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'temp'))
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        temp_file_path = os.path.join(temp_dir, file.name)
-        output_file_path = os.path.join(temp_dir, f"SP_Output_{file.name}")
-        
-        with open(temp_file_path, 'wb+') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
-
-        # Verify that required sheets exist
+        # Read both sheets straight from the upload (kept in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE)
         try:
-            with pd.ExcelFile(temp_file_path) as xls:
+            with pd.ExcelFile(file) as xls:
                 sheet_names = xls.sheet_names
                 if "SP Search Term Report" not in sheet_names:
                     return create_response(request, {"error": "SP Search Term Report not found in the uploaded file"}, 400)
@@ -100,50 +89,41 @@ def process_spads(request):
                     return create_response(request, {"error": "Sponsored Products Campaigns not found in the uploaded file"}, 400)
                 
                 # Check if sheets are empty
-                str_df = pd.read_excel(temp_file_path, sheet_name="SP Search Term Report")
+                str_df = pd.read_excel(xls, sheet_name="SP Search Term Report")
                 if str_df.empty:
                     return create_response(request, {"error": "SP Search Term Report is empty"}, 400)
                 
-                bulk_df = pd.read_excel(temp_file_path, sheet_name="Sponsored Products Campaigns")
+                bulk_df = pd.read_excel(xls, sheet_name="Sponsored Products Campaigns")
                 if bulk_df.empty:
                     return create_response(request, {"error": "Sponsored Products Campaigns is empty"}, 400)
         except Exception as e:
             return create_response(request, {"error": f"Error reading Excel file: {str(e)}"}, 500)
 
-        # Process the data using the final_sp_optimisation function
-        final_sp_optimisation(temp_file_path, output_file_path, target_acos, 
-                             "Sponsored Products Campaigns", "SP Search Term Report")
-        
-        if not os.path.exists(output_file_path):
-            return create_response(request, {"error": "Failed to process the file"}, 500)
+        # Process the sheets already read, keeping the output sheets in memory
+        sheets = sp_optimisation_sheets(str_df, bulk_df, target_acos)
             
-        # Save file to file service and get its ID
-        file_result = save_temp_file(output_file_path, f"Optimized_SP_{file.name}")
+        # Write the workbook to a memory buffer and save that buffer to file service
+        file_result = save_temp_file(write_excel_buffer(sheets), f"Optimized_SP_{file.name}")
             
-        # Extract data from the output Excel file for JSON response
-        result_data = get_excel_data(file_result['file_id'])
+        # First page of each output sheet (or as many rows as preview_rows asks for), from
+        # the DataFrames already in memory; further pages come from files/preview/<file_id>/
+        cache_excel_sheets(file_result['file_id'], sheets)
+        preview = get_excel_preview(file_result['file_id'], limit=preview_row_limit(request))
         
         # Create response with JSON data and file reference
         response_data = {
-            'data': result_data,
+            'data': preview['data'],
+            'sheets': preview['sheets'],
             'file': {
                 'filename': file_result['filename'],
                 'url': file_result.get('url') or get_file_url(file_result['file_id'], request),
                 'file_id': file_result['file_id']
             }
         }
-        
-        # Clean up temporary files
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
             
         return create_response(request, response_data)
 
     except Exception as e:
-        # Clean up any temporary files
-        if 'temp_file_path' in locals() and os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-                
         return create_response(request, {"error": f"Unexpected error: {str(e)}"}, 500)
 
 
@@ -525,14 +505,16 @@ def optimize_all(request):
                                 df.to_excel(writer, sheet_name=f"SD_{sheet_name}", index=False)
                 
                 # Save combined file to file service and get the file ID
-                file_id = save_temp_file(combined_output_path)
+                file_id = save_temp_file(combined_output_path)['file_id']
                 
-                # Extract ALL data from the output Excel file for JSON response
-                combined_data = get_excel_data(file_id)
+                # First page of each sheet (or as many rows as preview_rows asks for);
+                # further pages come from files/preview/<file_id>/
+                preview = get_excel_preview(file_id, limit=preview_row_limit(request))
                 
                 # Create response with file reference instead of base64
                 response_data = {
-                    'data': combined_data,
+                    'data': preview['data'],
+                    'sheets': preview['sheets'],
                     'file': {
                         'filename': f"Optimized_{file.name}",
                         'url': get_file_url(file_id),
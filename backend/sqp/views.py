@@ -6,7 +6,7 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from .sqp_processor import process_sqp_file
-from core.file_service import save_temp_file, get_excel_data, get_file_url, get_temp_path
+from core.file_service import save_temp_file, get_excel_preview, preview_row_limit, get_file_url, get_temp_path
 import logging
 
 # Set up logger
@@ -86,16 +86,15 @@ def process_sqp(request):
         file_result = save_temp_file(output_file_path, f"SQP_Analysis_{os.path.splitext(file.name)[0]}.xlsx")
         logger.info(f"Saved output file with ID: {file_result['file_id']}")
             
-        # Extract data from the output Excel file for JSON response
-        result_data = get_excel_data(file_result['file_id'])
+        # First page of each output sheet (or as many rows as preview_rows asks for);
+        # further pages come from files/preview/<file_id>/
+        # (without the Keywords sheet, which is redundant with the keywords field)
+        preview = get_excel_preview(file_result['file_id'], limit=preview_row_limit(request), exclude=('Keywords',))
         
-        # Remove the Keywords sheet since it's redundant with the keywords field
-        if result_data and 'Keywords' in result_data:
-            del result_data['Keywords']
-            
         # Create response with JSON data and file reference
         response_data = {
-            'data': result_data,
+            'data': preview['data'],
+            'sheets': preview['sheets'],
             'keywords': sqp_kw,
             'file': {
                 'filename': file_result['filename'],
@@ -6,7 +6,7 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from .topical_processor import process_topical_file
-from core.file_service import save_temp_file, get_excel_data, get_file_url, get_temp_path
+from core.file_service import save_temp_file, get_excel_preview, preview_row_limit, get_file_url, get_temp_path
 import logging
 
 # Set up logger
@@ -70,8 +70,9 @@ def process_topical(request):
         file_result = save_temp_file(output_file_path, f"ASIN_Top_80_Percent_Data_{file.name}")
         logger.info(f"Saved output file with ID: {file_result['file_id']}")
             
-        # Extract data from the output Excel file for JSON response
-        result_data = get_excel_data(file_result['file_id'])
+        # First page of each output sheet (or as many rows as preview_rows asks for);
+        # further pages come from files/preview/<file_id>/
+        preview = get_excel_preview(file_result['file_id'], limit=preview_row_limit(request))
         
         # Create response with file URL and JSON data
         response_data = {
@@ -79,7 +80,8 @@ def process_topical(request):
             'message': result.get('message', 'Topical analysis completed successfully'),
             'b0_asin_count': result.get('b0_asin_count', 0),
             'non_b0_asin_count': result.get('non_b0_asin_count', 0),
-            'data': result_data,
+            'data': preview['data'],
+            'sheets': preview['sheets'],
             'file': {
                 'filename': file_result['filename'],
                 'url': file_result.get('url') or get_file_url(file_result['file_id'], request),
@@ -9,6 +9,9 @@ export const cerebroService = {
   processCerebro: async (payload: CerebroPayload): Promise<CerebroResponse> => {
     const formData = new FormData();
     formData.append('file', payload.file);
+    // The result views still read every row from data; drop this once they
+    // page through the files/preview endpoint
+    formData.append('preview_rows', 'all');
     formData.append('min_search_volume', payload.min_search_volume.toString());
 
     try {
@@ -9,6 +9,9 @@ export const spService = {
   processSpAds: async (payload: SpAdsPayload): Promise<SpAdsResponse> => {
     const formData = new FormData();
     formData.append('file', payload.file);
+    // The result views still read every row from data; drop this once they
+    // page through the files/preview endpoint
+    formData.append('preview_rows', 'all');
     
     // Handle different modes of ACOS parameters
     if (payload.useUnifiedAcos && payload.target_acos !== undefined) {
@@ -12,6 +12,9 @@ export const sqpService = {
       
       const formData = new FormData();
       formData.append('file', payload.file);
+      // The result views still read every row from data; drop this once they
+      // page through the files/preview endpoint
+      formData.append('preview_rows', 'all');
       
       // Log when request starts
       const startTime = Date.now();